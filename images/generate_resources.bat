@@ -1,4 +1,4 @@
 pushd %~dp0
-pyside6-rcc.exe multigit_resources.qrc -o ..\src\multigit_resources_rc.py
+pyside6-rcc.exe --binary multigit_resources.qrc -o ..\src\multigit_resources.rcc
 popd
 pause
@@ -13,10 +13,11 @@
 #     See the License for the specific language governing permissions and
 #     limitations under the License.
 #
-from typing import Union, List, Optional, cast
+from typing import Union, List, Optional, Dict, Set, Tuple, cast
 import os, sys
 import argparse, sys, os
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 
 if __package__:
     # when running inside a package, src/* is not on the path, only multigit_gx is.
@@ -26,10 +27,12 @@ if __package__:
 
 from src import mg_const as mgc
 from src.mg_json_mgit_parser import ProjectStructure
-from src.mg_tools import RunProcess, ExecGit, MgExecutable, CmdType, ExecStatus
+# only Qt-free modules here, so that the command-line starts without loading PySide6
+from src.mg_exec_core import run_process_blocking, GitProgram, MgExecutable, CmdType, ExecStatus
+from src.mg_clone_graph import computeCloneParents
 
 HELP = '''
-mgitcmd clone path_to_mgit_file.mgit [--dest path_to_dir] [--shallow] 
+mgitcmd clone path_to_mgit_file.mgit [--dest path_to_dir] [--shallow] [--jobs N]
     Clone a group of repositories according to path_to_mgit_file.mgit
 
     --dest path_to_dir: Clones into the target directory. If not provided,
@@ -39,6 +42,11 @@ mgitcmd clone path_to_mgit_file.mgit [--dest path_to_dir] [--shallow]
                 and branches, will not work for HEAD specified as a commit. This
                 speeds up the clone process by downloading less data.
 
+    --jobs N: Clone up to N repositories in parallel. Nested repositories are
+              cloned only after their parent repository. The output of each
+              repository is displayed in one block when its clone completes.
+              Default is 1 (one repository at a time).
+
 
 mgitcmd --version
     Displays version information and exits.
@@ -52,7 +60,83 @@ mgitcmd --help
 VERSION_LINE = 'Multigit Command-line version v%s' % mgc.VERSION
 
 
-def cmd_clone(fname: str, dest_dir: Optional[str], shallow: bool) -> None:
+# one clone job: a header describing the job, followed by git commands
+CloneJob = List[Union[str, List[str]]]
+
+
+# result of a clone job: output of all commands, and status of the failing command if any
+CloneJobResult = Tuple[str, Optional[Tuple[ExecStatus, int, str]]]
+
+
+def run_clone_job(exec: MgExecutable, job: CloneJob) -> CloneJobResult:
+    '''Run all the git commands of a clone job, stopping at the first failure.
+
+    Return the output of all the commands, and the (exec_status, exit_code, cmd_out) of
+    the command which failed, or None if the job succeeded.
+
+    Called from worker threads, so nothing is printed here.'''
+    output: List[str] = []
+    for task in job:
+        if type(task) is str:
+            output.append('[[ %s ]]' % task)
+            continue
+
+        task = cast(List[str], task)
+
+        output.append('> ' + ' '.join([exec.path, *task]))
+        exec_status, exit_code, cmd_out = run_process_blocking(exec, cmd_args=task)
+        output.append(cmd_out)
+
+        if exec_status != ExecStatus.Ok or exit_code != 0:
+            return '\n'.join(output), (exec_status, exit_code, cmd_out)
+
+    return '\n'.join(output), None
+
+
+def run_clone_jobs(exec: MgExecutable, jobs: Dict[str, CloneJob], parents: Dict[str, Optional[str]], nb_jobs: int) -> bool:
+    '''Run the clone jobs with at most nb_jobs jobs in parallel.
+
+    A job is started only when the job of its parent repository has completed successfully.
+    The output of each job is printed in one block when the job completes.
+
+    Return True if all jobs succeeded.
+    '''
+    children: Dict[str, List[str]] = {name: [] for name in jobs}
+    ready: List[str] = []
+    for name in jobs:
+        parent = parents.get(name)
+        if parent is None:
+            ready.append(name)
+        else:
+            children[parent].append(name)
+
+    success = True
+    running: Dict['Future[CloneJobResult]', str] = {}
+    with ThreadPoolExecutor(max_workers=max(1, nb_jobs)) as executor:
+        while ready or running:
+            # once a job has failed, let the running jobs finish but do not start new ones
+            while success and ready and len(running) < nb_jobs:
+                name = ready.pop(0)
+                running[executor.submit(run_clone_job, exec, jobs[name])] = name
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                job_out, failure = future.result()
+                print(job_out)
+                if failure is None:
+                    ready.extend(children[name])
+                else:
+                    GitProgram.handle_process_return(*failure, allow_errors=False)
+                    success = False
+
+    return success
+
+
+def cmd_clone(fname: str, dest_dir: Optional[str], shallow: bool, nb_jobs: int = 1) -> None:
     if not Path(fname).exists():
         print('Mgit file does not exist: %s' % fname)
         sys.exit(0)
@@ -66,12 +150,15 @@ def cmd_clone(fname: str, dest_dir: Optional[str], shallow: bool) -> None:
     reposToClone.sort(key=lambda r: r.destination)
 
     errors = []
-    tasks: List[Union[str, List[str]]] = []
+    jobs: Dict[str, CloneJob] = {}
     for repo in reposToClone:
         if Path(repo.dest_fullpath).exists():
             errors.append('Directory already exists, can not clone: %s' % repo.dest_fullpath)
         if repo.url == '':
             errors.append('Can not clone repository with empty URL: %s' % repo.destination)
+        if repo.destination in jobs:
+            errors.append('Multiple repositories with the same destination: %s' % repo.destination)
+        tasks: CloneJob = jobs.setdefault(repo.destination, [])
         tasks.append('Cloning ' + repo.destination)
         clone_cmd = ['clone', repo.url, repo.dest_fullpath]
         tasks.append(clone_cmd)
@@ -92,27 +179,16 @@ def cmd_clone(fname: str, dest_dir: Optional[str], shallow: bool) -> None:
         print('Aborting')
         sys.exit(-1)
 
-    exec = ExecGit.get_executable()
+    exec = GitProgram.get_executable()
     if exec.is_empty():
         print('Can not find git with executable!')
         print('Please put it on the path or define git location in the Multigit settings.')
         sys.exit(-1)
 
-    for task in tasks:
-        if type(task) is str:
-            print('[[ %s ]]' % task)
-            continue
-
-        task = cast(List[str], task)
-
-        print('> ' + ' '.join([exec.path, *task]))
-        exec_status, exit_code, cmd_out = RunProcess().exec_blocking(exec, cmd_args=task)
-        print(cmd_out)
-
-        ExecGit.handle_process_return(exec_status, exit_code, cmd_out, allow_errors=False, with_msg_box=False)
-
-        if exec_status != ExecStatus.Ok or exit_code != 0:
-            sys.exit(-1)
+    # nested repositories must be cloned after the repository containing them
+    parents = computeCloneParents(list(jobs.keys()))
+    if not run_clone_jobs(exec, jobs, parents, nb_jobs):
+        sys.exit(-1)
 
     print('Clone successful.')
 
@@ -130,10 +206,15 @@ def main() -> None:
     parser.add_argument('clone', nargs=2)
     parser.add_argument('--dest', nargs=1)
     parser.add_argument('--shallow', action='store_true', default=False)
+    parser.add_argument('--jobs', type=int, default=1)
     parse_result = parser.parse_args()
 
+    if parse_result.jobs < 1:
+        print('--jobs must be at least 1')
+        sys.exit(-1)
+
     print(VERSION_LINE)
-    cmd_clone(parse_result.clone[1], (parse_result.dest or [None])[0], parse_result.shallow)
+    cmd_clone(parse_result.clone[1], (parse_result.dest or [None])[0], parse_result.shallow, parse_result.jobs)
 
 if __name__ == '__main__':
     main()
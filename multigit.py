@@ -25,21 +25,26 @@ import traceback as tb_module
 from typing import Type, Optional
 from types import TracebackType
 
-from concurrent_log_handler import ConcurrentRotatingFileHandler
-
-from PySide6.QtWidgets import QApplication, QMessageBox
-from PySide6 import QtGui
-
 if __package__:
     # when running inside a package, src/* is not on the path, only multigit_gx is.
     # we must add it explicitely
     path = os.path.dirname(__file__)
     sys.path.insert(0, path)
 
-import src.multigit_resources_rc        # uses side-effects to make resources available
+if '--import-profile' in sys.argv:
+    # must be started before the imports of Qt and Multigit modules which are measured
+    from src.mg_import_profile import start_import_profile, stop_import_profile
+    start_import_profile()
+
+from concurrent_log_handler import ConcurrentRotatingFileHandler
+
+from PySide6.QtWidgets import QApplication, QMessageBox
+from PySide6.QtCore import QResource
+from PySide6 import QtGui
+
 from src.mg_window import MgMainWindow
 from src import mg_const
-from src.mg_tools import isRunningInsideFlatpak
+from src.mg_exec_core import isRunningInsideFlatpak
 
 # by default Qt abort on Python exceptions so we need to provide
 # our own hook that does the job
@@ -92,9 +97,27 @@ def set_windows_app_id(app_id: str = 'Multigit') -> None:
         logging.warning('Could not set Windows AppUserModelID', exc_info=True)
 
 
+# images of Multigit, compiled by pyside6-rcc --binary from images/multigit_resources.qrc
+RESOURCES_RCC_FNAME = 'multigit_resources.rcc'
+
+
+def register_resources() -> None:
+    '''Make the images of Multigit available under ":/img/".
+
+    The resources are registered from a binary file, which Qt memory-maps, instead of being unmarshalled
+    from a Python module at startup.
+    '''
+    # with pyinstaller, data files are extracted in sys._MEIPASS
+    base_dir = pathlib.Path(getattr(sys, '_MEIPASS', pathlib.Path(__file__).parent))
+    rcc_path = base_dir / 'src' / RESOURCES_RCC_FNAME
+    if not QResource.registerResource(str(rcc_path)):
+        logging.warning('Could not register resources from %s, images will be missing' % rcc_path)
+
+
 def main_gui() -> None:
     global app
     set_windows_app_id()
+    register_resources()
     app = QApplication([])
     app.setDesktopFileName('io.github.idemia.Multigit')
     icon = QtGui.QIcon()
@@ -260,6 +283,11 @@ def main() -> None:
             print('- Qt for Python version not available')
         sys.exit(0)
 
+    if '--import-profile' in sys.argv:
+        # report the cost of the imports done at startup, without launching Multigit
+        stop_import_profile()
+        sys.exit(0)
+
     # to avoid crashes when Python exceptions are raised inside Qt slots
     sys.excepthook = handle_exception
     # sys.argv.append('--debug')
@@ -179,7 +179,7 @@ a = Analysis(
     ['..\\..\\multigit.py'],
     pathex=[],
     binaries=[],
-    datas=[],
+    datas=[('..\\..\\src\\multigit_resources.rcc', 'src')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -3,7 +3,7 @@
 ################################################################################
 ## Form generated from reading UI file 'ui_multigit_widget.ui'
 ##
-## Created by: Qt User Interface Compiler version 6.11.0
+## Created by: Qt User Interface Compiler version 6.12.0
 ##
 ## WARNING! All changes made in this file will be lost when recompiling UI file!
 ################################################################################
@@ -17,8 +17,8 @@ from PySide6.QtGui import (QBrush, QColor, QConicalGradient, QCursor,
     QPalette, QPixmap, QRadialGradient, QTransform)
 from PySide6.QtWidgets import (QAbstractItemView, QApplication, QHBoxLayout, QHeaderView,
     QLabel, QLineEdit, QPushButton, QSizePolicy,
-    QSplitter, QTabWidget, QTextEdit, QTreeWidgetItem,
-    QVBoxLayout, QWidget)
+    QSpacerItem, QSplitter, QTabWidget, QTextEdit,
+    QTreeWidgetItem, QVBoxLayout, QWidget)
 
 from src.mg_button_history import MgButtonHistory
 from src.mg_repo_tree import MgRepoTree
@@ -102,8 +102,8 @@ class Ui_MultigitWidget(object):
         self.tabWidget.addTab(self.tabLastCommit, "")
         self.tabModifiedFiles = QWidget()
         self.tabModifiedFiles.setObjectName(u"tabModifiedFiles")
-        self.horizontalLayout_4 = QHBoxLayout(self.tabModifiedFiles)
-        self.horizontalLayout_4.setObjectName(u"horizontalLayout_4")
+        self.verticalLayoutModFiles = QVBoxLayout(self.tabModifiedFiles)
+        self.verticalLayoutModFiles.setObjectName(u"verticalLayoutModFiles")
         self.textEditModFiles = QTextEdit(self.tabModifiedFiles)
         self.textEditModFiles.setObjectName(u"textEditModFiles")
         font = QFont()
@@ -111,7 +111,26 @@ class Ui_MultigitWidget(object):
         self.textEditModFiles.setFont(font)
         self.textEditModFiles.setReadOnly(True)
 
-        self.horizontalLayout_4.addWidget(self.textEditModFiles)
+        self.verticalLayoutModFiles.addWidget(self.textEditModFiles)
+
+        self.horizontalLayoutLoadMoreDiff = QHBoxLayout()
+        self.horizontalLayoutLoadMoreDiff.setObjectName(u"horizontalLayoutLoadMoreDiff")
+        self.labelDiffTruncated = QLabel(self.tabModifiedFiles)
+        self.labelDiffTruncated.setObjectName(u"labelDiffTruncated")
+
+        self.horizontalLayoutLoadMoreDiff.addWidget(self.labelDiffTruncated)
+
+        self.horizontalSpacerLoadMoreDiff = QSpacerItem(40, 20, QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
+
+        self.horizontalLayoutLoadMoreDiff.addItem(self.horizontalSpacerLoadMoreDiff)
+
+        self.buttonLoadMoreDiff = QPushButton(self.tabModifiedFiles)
+        self.buttonLoadMoreDiff.setObjectName(u"buttonLoadMoreDiff")
+
+        self.horizontalLayoutLoadMoreDiff.addWidget(self.buttonLoadMoreDiff)
+
+
+        self.verticalLayoutModFiles.addLayout(self.horizontalLayoutLoadMoreDiff)
 
         self.tabWidget.addTab(self.tabModifiedFiles, "")
         self.splitter.addWidget(self.tabWidget)
@@ -124,6 +143,7 @@ class Ui_MultigitWidget(object):
         QWidget.setTabOrder(self.repoTree, self.tabWidget)
         QWidget.setTabOrder(self.tabWidget, self.textEditCommit)
         QWidget.setTabOrder(self.textEditCommit, self.textEditModFiles)
+        QWidget.setTabOrder(self.textEditModFiles, self.buttonLoadMoreDiff)
 
         self.retranslateUi(MultigitWidget)
 
@@ -159,6 +179,8 @@ class Ui_MultigitWidget(object):
 "</style></head><body style=\" font-family:'Courier New'; font-size:9pt; font-weight:400; font-style:normal;\">\n"
 "<p style=\" margin-top:0px; margin-bottom:0px; margin-left:0px; margin-right:0px; -qt-block-indent:0; text-indent:0px;\"><span style=\" font-family:'MS Shell Dlg 2'; font-size:8pt; color:#0000ff;\">@@ this is a description @@</span><span style=\" font-family:'MS Shell Dlg 2'; font-size:8pt;\"> bla bla bla<br />this line is plain<br /></span><span style=\" font-family:'MS Shell Dlg 2'; font-size:8pt; color:#aa0000;\">- this line is removed</span><span style=\" font-family:'MS Shell Dlg 2'; font-size:8pt;\"><br /></spa"
                         "n><span style=\" font-family:'MS Shell Dlg 2'; font-size:8pt; color:#00aa00;\">+ this line is added</span><span style=\" font-family:'MS Shell Dlg 2'; font-size:8pt;\"><br /><br /></span></p></body></html>", None))
+        self.labelDiffTruncated.setText(QCoreApplication.translate("MultigitWidget", u"Diff is too big to be displayed in total.", None))
+        self.buttonLoadMoreDiff.setText(QCoreApplication.translate("MultigitWidget", u"Load more", None))
         self.tabWidget.setTabText(self.tabWidget.indexOf(self.tabModifiedFiles), QCoreApplication.translate("MultigitWidget", u"Modified Files", None))
     # retranslateUi
 
@@ -3,7 +3,7 @@
 ################################################################################
 ## Form generated from reading UI file 'ui_preferences.ui'
 ##
-## Created by: Qt User Interface Compiler version 6.11.0
+## Created by: Qt User Interface Compiler version 6.12.0
 ##
 ## WARNING! All changes made in this file will be lost when recompiling UI file!
 ################################################################################
@@ -188,6 +188,12 @@ class Ui_Preferences(object):
 
         self.verticalLayout_2.addLayout(self.horizontalLayout_2)
 
+        self.radioButtonGitProcAdaptive = QRadioButton(self.groupBox_7)
+        self.radioButtonGitProcAdaptive.setObjectName(u"radioButtonGitProcAdaptive")
+        self.radioButtonGitProcAdaptive.setFont(font1)
+
+        self.verticalLayout_2.addWidget(self.radioButtonGitProcAdaptive)
+
 
         self.verticalLayout_3.addWidget(self.groupBox_7)
 
@@ -912,7 +918,8 @@ class Ui_Preferences(object):
         QWidget.setTabOrder(self.pushButtonColorTag, self.radioButtonGitProcUnlimited)
         QWidget.setTabOrder(self.radioButtonGitProcUnlimited, self.radioButtonGitProcLimit)
         QWidget.setTabOrder(self.radioButtonGitProcLimit, self.spinBoxLimitValue)
-        QWidget.setTabOrder(self.spinBoxLimitValue, self.comboUpdateFrequency)
+        QWidget.setTabOrder(self.spinBoxLimitValue, self.radioButtonGitProcAdaptive)
+        QWidget.setTabOrder(self.radioButtonGitProcAdaptive, self.comboUpdateFrequency)
         QWidget.setTabOrder(self.comboUpdateFrequency, self.checkBoxConfirmWhenQuitting)
         QWidget.setTabOrder(self.checkBoxConfirmWhenQuitting, self.radioGitAutoDetect)
         QWidget.setTabOrder(self.radioGitAutoDetect, self.lineEditGitAutoDetect)
@@ -990,7 +997,6 @@ class Ui_Preferences(object):
         self.checkBoxTortoiseGit.toggled.connect(self.labelExecTGitChoose.setEnabled)
         self.checkBoxTortoiseGit.toggled.connect(self.radioTGitAutoDetect.setEnabled)
         self.checkBoxTortoiseGit.toggled.connect(self.radioTGitManual.setEnabled)
-        self.radioButtonGitProcUnlimited.toggled.connect(self.spinBoxLimitValue.setDisabled)
         self.radioButtonGitProcLimit.toggled.connect(self.spinBoxLimitValue.setEnabled)
         self.radioExplorerManual.toggled.connect(self.lineEditExplorerManual.setEnabled)
         self.radioExplorerManual.toggled.connect(self.pushButtonExplorerManualBrowse.setEnabled)
@@ -1044,6 +1050,10 @@ class Ui_Preferences(object):
         self.groupBox_7.setTitle(QCoreApplication.translate("Preferences", u"Number of parallel git processes", None))
         self.radioButtonGitProcUnlimited.setText(QCoreApplication.translate("Preferences", u"Unlimited", None))
         self.radioButtonGitProcLimit.setText(QCoreApplication.translate("Preferences", u"Limit number to :", None))
+#if QT_CONFIG(tooltip)
+        self.radioButtonGitProcAdaptive.setToolTip(QCoreApplication.translate("Preferences", u"Adjust the number of git processes automatically, depending on the speed of the git commands, the git failures and the CPU load", None))
+#endif // QT_CONFIG(tooltip)
+        self.radioButtonGitProcAdaptive.setText(QCoreApplication.translate("Preferences", u"Adaptive", None))
         self.groupBox_6.setTitle(QCoreApplication.translate("Preferences", u"MultiGit Updates", None))
         self.label_10.setText(QCoreApplication.translate("Preferences", u"Check fo MultiGit new versions : ", None))
         self.comboUpdateFrequency.setItemText(0, QCoreApplication.translate("Preferences", u"every day", None))
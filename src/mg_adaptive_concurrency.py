@@ -0,0 +1,152 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from typing import Optional, Callable, List
+import os, time, logging
+from functools import lru_cache
+
+logger = logging.getLogger('mg_adaptive_concurrency')
+dbg = logger.debug
+
+# bounds of the number of concurrent git processes in adaptive mode
+ADAPTIVE_MIN_LIMIT = 1
+ADAPTIVE_MAX_LIMIT = 64
+
+# relative change of throughput which is considered as significant
+THROUGHPUT_TOLERANCE = 0.05
+
+# the latency of the jobs is considered inflated when it exceeds the best latency observed by this factor
+LATENCY_INFLATION_FACTOR = 2.0
+
+# number of runnable processes per cpu above which the cpu is considered busy (no more increase)
+# or overloaded (decrease)
+CPU_LOAD_BUSY = 1.0
+CPU_LOAD_OVERLOADED = 1.5
+
+
+@lru_cache(maxsize=1)
+def get_adaptive_concurrency_instance() -> 'MgAdaptiveConcurrency':
+    '''Return the adaptive concurrency controller shared by all git executions, so that
+    what is learned on one execution benefits to the next ones'''
+    return MgAdaptiveConcurrency()
+
+
+def cpu_load() -> Optional[float]:
+    '''Return the average number of runnable processes per cpu over the last minute,
+    or None if this is not available on this platform'''
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (AttributeError, OSError):
+        # not available on Windows
+        return None
+
+
+class MgAdaptiveConcurrency:
+    '''Tune the number of git processes running concurrently, depending on how the jobs behave.
+
+    Completed jobs are observed in windows of as many jobs as the current limit. A git crash or an authentication
+    failure halves the limit immediately. At the end of a window:
+    - the limit is increased by one if the throughput improved compared to the previous window,
+      unless the cpu is busy
+    - the limit is decreased by one if the throughput degraded, if the latency of the jobs got inflated without
+      any throughput gain or if the cpu is overloaded
+    '''
+
+    def __init__(self,
+                 initial_limit: Optional[int] = None,
+                 min_limit: int = ADAPTIVE_MIN_LIMIT,
+                 max_limit: int = ADAPTIVE_MAX_LIMIT,
+                 get_cpu_load: Callable[[], Optional[float]] = cpu_load,
+                 clock: Callable[[], float] = time.monotonic,
+                 ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.get_cpu_load = get_cpu_load
+        self.clock = clock
+        if initial_limit is None:
+            initial_limit = os.cpu_count() or ADAPTIVE_MIN_LIMIT
+        self.limit = self.clamp(initial_limit)
+        self.new_session()
+
+
+    def new_session(self) -> None:
+        '''Called when a new set of jobs is started. The limit learned so far is kept but the
+        measurements are reset, they depend on the git command being run.'''
+        self.best_latency: Optional[float] = None
+        self.last_throughput: Optional[float] = None
+        self.start_window()
+
+
+    def clamp(self, limit: int) -> int:
+        return max(self.min_limit, min(self.max_limit, limit))
+
+
+    def start_window(self) -> None:
+        '''Start a new observation window'''
+        self.window_start = self.clock()
+        self.window_latencies: List[float] = []
+
+
+    def set_limit(self, limit: int, reason: str) -> None:
+        limit = self.clamp(limit)
+        if limit != self.limit:
+            dbg(f'Adjusting number of concurrent git processes from {self.limit} to {limit}: {reason}')
+        self.limit = limit
+
+
+    def job_done(self, latency: float, crashed: bool = False, auth_failed: bool = False) -> None:
+        '''Record a completed job, with its duration in seconds and whether git crashed or failed to authenticate'''
+        if crashed or auth_failed:
+            # back off immediately and forget about the throughput measured with the previous limit
+            self.set_limit(self.limit // 2, 'git crash' if crashed else 'authentication failure')
+            self.last_throughput = None
+            self.start_window()
+            return
+
+        self.window_latencies.append(latency)
+        if self.best_latency is None or latency < self.best_latency:
+            self.best_latency = latency
+
+        if len(self.window_latencies) < self.limit:
+            return
+
+        elapsed = max(self.clock() - self.window_start, 1e-6)
+        throughput = len(self.window_latencies) / elapsed
+        mean_latency = sum(self.window_latencies) / len(self.window_latencies)
+        last_throughput = self.last_throughput
+        self.last_throughput = throughput
+        self.start_window()
+
+        load = self.get_cpu_load()
+        if load is not None and load > CPU_LOAD_OVERLOADED:
+            self.set_limit(self.limit - 1, f'cpu overloaded ({load:.1f} processes per cpu)')
+            return
+
+        improved = last_throughput is None or throughput > last_throughput * (1 + THROUGHPUT_TOLERANCE)
+        degraded = last_throughput is not None and throughput < last_throughput * (1 - THROUGHPUT_TOLERANCE)
+        assert self.best_latency is not None
+        latency_inflated = mean_latency > self.best_latency * LATENCY_INFLATION_FACTOR
+
+        if degraded:
+            self.set_limit(self.limit - 1, f'throughput degraded to {throughput:.2f} jobs/s')
+        elif improved:
+            if load is not None and load > CPU_LOAD_BUSY:
+                dbg(f'Throughput improved but cpu is busy ({load:.1f} processes per cpu), keeping the limit')
+                return
+            self.set_limit(self.limit + 1, f'throughput improved to {throughput:.2f} jobs/s')
+        elif latency_inflated:
+            self.set_limit(self.limit - 1, f'latency inflated to {mean_latency:.2f}s without throughput gain')
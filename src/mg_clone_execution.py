@@ -15,7 +15,7 @@
 #
 
 
-from typing import TYPE_CHECKING, List, Optional, cast, Set
+from typing import TYPE_CHECKING, List, Optional, cast, Set, Dict
 import logging, os
 import enum
 import tempfile
@@ -30,6 +30,7 @@ from src.mg_repo_info import MgRepoInfo
 from src.mg_exec_window import MgExecWindow
 from src.mg_exec_task_item import MgExecTaskGroup, after_other_taskgroup_is_started_and_dir_exists, MgTaskMoveDirectory, MgTaskDelDirectory
 from src.mg_utils import tryHardDeletingDirList
+from src.mg_clone_graph import TaskNode, splitRepoName, findParentTaskGroup, computeCloneParents
 
 logger = logging.getLogger('mg_clone_from_dialog')
 dbg = logger.debug
@@ -197,60 +198,16 @@ def cloneFromDialog(structureToClone: 'ProjectStructure', window: 'MgMainWindow'
     gitExecWindow.finished.connect( lambda result: window.openDir(str(structureToClone.base_path)) )
 
 
-class TaskNode:
-    def __init__(self, parent: Optional['TaskNode'], name: str, taskGroup: Optional[MgExecTaskGroup]) -> None:
-        self.parent = parent
-        self.name = name
-        self.taskGroup = taskGroup
-        self.children: List['TaskNode'] = []
-
-
-    def addChild(self, parts: List[str], taskGroup: MgExecTaskGroup ) -> 'TaskNode':
-        '''Add a child in the graph, in the right node'''
-        if len(parts) == 0:
-            # we are ready to set the task group
-            self.taskGroup = taskGroup
-            return self
-
-        for child in self.children:
-            if child.name == parts[0]:
-                # we have found our children !
-                break
-        else:
-            # we have found no children, create one
-            child = TaskNode(self, parts[0], None)
-            self.children.append(child)
-
-        # continue the search
-        return child.addChild(parts[1:], taskGroup)
-
-
 def build_taskgroup_dep_graph(taskGroups: List[MgExecTaskGroup]) -> TaskNode:
     '''Build a dependency graph with the nodes and return the top node of the graph'''
     topNode = TaskNode(None, '', None)
 
     for taskGroup in taskGroups:
-        splitter = '/'
-        if not splitter in taskGroup.repo.name and '\\' in taskGroup.repo.name:
-            splitter = '\\'
-        topNode.addChild( taskGroup.repo.name.split(splitter), taskGroup )
+        topNode.addChild( splitRepoName(taskGroup.repo.name), taskGroup, taskGroup.repo.name )
 
     return topNode
 
 
-def findParentTaskGroup(node: TaskNode) -> Optional[TaskNode]:
-    '''Walk the parent of this tasknode until another tasknode is found and return it.
-
-    If no tasknode is found, return None'''
-    while node.parent is not None:
-        if node.parent.taskGroup is not None:
-            return node.parent
-
-        node = node.parent
-
-    return None
-
-
 def addPreconditionsToTaskGroup(node: TaskNode) -> None:
     '''Using the graph, modify the taskGroup objects in place by adding preconditions
     when one taskGroup depends on another one.'''
@@ -296,6 +253,7 @@ def addPreconditionToEnsureCloneOrderLogic(taskGroups: List[MgExecTaskGroup]) ->
 
     return taskGroups
 
+
 # TODO
 # - rename Structure  to JsonFileStructure
 # - rename Repository to JsonFileRepo
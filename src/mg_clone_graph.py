@@ -0,0 +1,110 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from typing import TYPE_CHECKING, List, Optional, Dict
+import logging
+
+if TYPE_CHECKING:
+    from src.mg_exec_task_item import MgExecTaskGroup
+
+logger = logging.getLogger('mg_clone_graph')
+dbg = logger.debug
+
+
+class TaskNode:
+    def __init__(self, parent: Optional['TaskNode'], name: str, taskGroup: Optional['MgExecTaskGroup'],
+                 repoName: Optional[str] = None) -> None:
+        self.parent = parent
+        self.name = name
+        self.taskGroup = taskGroup
+        # full name of the repository for this node, None for intermediate directories
+        self.repoName = repoName
+        self.children: List['TaskNode'] = []
+
+
+    def addChild(self, parts: List[str], taskGroup: Optional['MgExecTaskGroup'], repoName: str) -> 'TaskNode':
+        '''Add a child in the graph, in the right node'''
+        if len(parts) == 0:
+            # we are ready to set the task group
+            self.taskGroup = taskGroup
+            self.repoName = repoName
+            return self
+
+        for child in self.children:
+            if child.name == parts[0]:
+                # we have found our children !
+                break
+        else:
+            # we have found no children, create one
+            child = TaskNode(self, parts[0], None)
+            self.children.append(child)
+
+        # continue the search
+        return child.addChild(parts[1:], taskGroup, repoName)
+
+
+def splitRepoName(repoName: str) -> List[str]:
+    '''Split a repository name into its path components, using / or \\ as separator'''
+    splitter = '/'
+    if not splitter in repoName and '\\' in repoName:
+        splitter = '\\'
+    return repoName.split(splitter)
+
+
+def build_repo_dep_graph(repoNames: List[str]) -> TaskNode:
+    '''Build a dependency graph from repository names only and return the top node of the graph.
+
+    Same as build_taskgroup_dep_graph(), for callers which have no task groups (like mgitcmd)'''
+    topNode = TaskNode(None, '', None)
+
+    for repoName in repoNames:
+        topNode.addChild( splitRepoName(repoName), None, repoName )
+
+    return topNode
+
+
+def findParentTaskGroup(node: TaskNode) -> Optional[TaskNode]:
+    '''Walk the parent of this tasknode until another tasknode is found and return it.
+
+    If no tasknode is found, return None'''
+    while node.parent is not None:
+        if node.parent.repoName is not None:
+            return node.parent
+
+        node = node.parent
+
+    return None
+
+
+def computeCloneParents(repoNames: List[str]) -> Dict[str, Optional[str]]:
+    '''Return for each repository name the name of the repository which must be cloned before it,
+    or None if it does not depend on any other repository.
+
+    This is the same ordering logic as addPreconditionToEnsureCloneOrderLogic(), for callers
+    working directly with repository names.
+    '''
+    parents: Dict[str, Optional[str]] = {}
+
+    def walk(node: TaskNode) -> None:
+        if node.repoName is not None:
+            parentNode = findParentTaskGroup(node)
+            parents[node.repoName] = parentNode.repoName if parentNode else None
+        for n in node.children:
+            walk(n)
+
+    walk(build_repo_dep_graph(repoNames))
+    return parents
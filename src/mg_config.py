@@ -24,10 +24,6 @@ import logging, traceback
 import datetime, shutil
 from functools import lru_cache
 
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QMessageBox, QApplication
-from PySide6.QtGui import QColor
-
 SUFFIX_ACTIVATED        = '_ACTIVATED'
 SUFFIX_AUTODETECT       = '_AUTODETECT'
 SUFFIX_MANUAL_PATH      = '_MANUAL_PATH'
@@ -40,6 +36,10 @@ CONFIG_MAINWINDOW_GEOMETRY = 'MAINWINDOW_GEOMETRY'
 CONFIG_LAST_OPENED = 'LAST_OPENED'
 CONFIG_TABS_OPENED = 'CONFIG_TABS_OPENED'
 CONFIG_TABS_CURRENT = 'CONFIG_TABS_CURRENT'
+# names of the repositories of the base directory of each tab, to display their count before the tab is loaded
+CONFIG_TABS_REPO_NAMES = 'CONFIG_TABS_REPO_NAMES'
+# load the tabs not activated yet in the background when the machine is idle (default False)
+CONFIG_WARM_TABS_WHEN_IDLE = 'CONFIG_WARM_TABS_WHEN_IDLE'
 CONFIG_SPLITTER_STATE = 'SPLITTER_STATE'
 CONFIG_SPLITTER_STATE_V2 = 'SPLITTER_STATE_V2'
 CONFIG_TAG_HISTORY = 'CONFIG_TAG_HISTORY'
@@ -63,10 +63,22 @@ CONFIG_FETCH_ON_STARTUP = 'CONFIG_FETCH_ON_STARTUP'
 CONFIG_DISPLAY_FETCH_ON_STARTUP_COUNTDOWN = 'CONFIG_DISPLAY_FETCH_ON_STARTUP_COUNTDOWN'
 CONFIG_CONFIRM_BEFORE_QUIT = 'CONFIG_CONFIRM_BEFORE_QUIT'
 CONFIG_SHOW_GETTING_STARTED = 'CONFIG_SHOW_GETTING_STARTED'
+# options for scanning the base directory for git repositories
+CONFIG_SCAN_IGNORE_GLOBS = 'CONFIG_SCAN_IGNORE_GLOBS'
+CONFIG_SCAN_MAX_DEPTH = 'CONFIG_SCAN_MAX_DEPTH'
+CONFIG_SCAN_NESTED_REPOS = 'CONFIG_SCAN_NESTED_REPOS'
+# inside flatpak, run the commands on the host through a persistent helper (default True)
+CONFIG_FLATPAK_HOST_HELPER = 'CONFIG_FLATPAK_HOST_HELPER'
 
 # Format is: 0xAARRGGBB with AA = alpha, RR = red, GG = green, BB = blue
-DEFAULT_CONFIG_HEAD_COLOR_BRANCH = QColor(Qt.GlobalColor.blue).rgb()
-DEFAULT_CONFIG_HEAD_COLOR_TAG = QColor(Qt.GlobalColor.darkCyan).rgb()
+# the values are Qt.GlobalColor.blue and Qt.GlobalColor.darkCyan, written directly so that the
+# configuration can be used without PySide6
+DEFAULT_CONFIG_HEAD_COLOR_BRANCH = 0xff0000ff
+DEFAULT_CONFIG_HEAD_COLOR_TAG = 0xff008080
+
+# Values for CONFIG_NB_GIT_PROC: 0 for unlimited, a positive number for a fixed limit, or adaptive
+NB_GIT_PROC_UNLIMITED = 0
+NB_GIT_PROC_ADAPTIVE = -1
 
 logger = logging.getLogger('mg_config')
 dbg = logger.debug
@@ -105,6 +117,18 @@ def get_config_instance() -> 'MgConfig':
     return __CONFIG_INSTANCE
 
 
+def warning_msg_box(title: str, msg: str) -> None:
+    '''Display a warning message box if the GUI is running.
+
+    PySide6 is not imported here when it is not already loaded, the command-line tool does not use it.'''
+    if 'PySide6.QtWidgets' not in sys.modules:
+        return
+
+    from PySide6.QtWidgets import QMessageBox, QApplication
+    if QApplication.instance():
+        QMessageBox.warning(None, title, msg)
+
+
 class MgConfig:
     '''MultiGit configuration management'''
 
@@ -146,8 +170,7 @@ class MgConfig:
         logger.error(msg2)
 
         # if QApplication exists, let's display a warning message
-        if QApplication.instance():
-            QMessageBox.warning(None, msg1, msg2 )
+        warning_msg_box(msg1, msg2)
 
         invalidFileName = self.config_path.parent / \
                           ('multigit-invalid-config-file-%s.config' % datetime.datetime.now().isoformat().replace(':', '.'))
@@ -156,8 +179,7 @@ class MgConfig:
         try:
             shutil.move(str(self.config_path), invalidFileName)
             logger.error(msg2)
-            if QApplication.instance():
-                QMessageBox.warning(None, msg1, msg2)
+            warning_msg_box(msg1, msg2)
 
             # corrupted config file is gone, let's create a new one
             self.do_not_save = False
@@ -166,8 +188,7 @@ class MgConfig:
             try:
                 shutil.copy(self.config_path, invalidFileName)
                 logger.error(msg2)
-                if QApplication.instance():
-                    QMessageBox.warning(None, msg1, msg2)
+                warning_msg_box(msg1, msg2)
 
                 # corrupted config file is gone, let's create a new one
                 self.do_not_save = False
@@ -182,8 +203,7 @@ class MgConfig:
                        + f'Or you can simply erase the file, MultiGit will create a new empty configuration.\n'
                        + f'\nThe configuration file is :\n{self.config_path}'
                         )
-                if QApplication.instance():
-                    QMessageBox.warning(None, msg1, msg2)
+                warning_msg_box(msg1, msg2)
 
 
     def save(self) -> None:
@@ -26,6 +26,8 @@ import pathlib, platform
 VERSION = '1.8.0'
 
 MAX_DIFF_LINES = 1000
+# above this total size of modified files, the patience diff algorithm is too slow and the default one is used
+MAX_PATIENCE_DIFF_SIZE = 1024*1024
 MAX_GIT_DBG_OUT_CHAR = 5000
 
 COL_UPDATE = 0
@@ -79,12 +81,20 @@ MSG_REMOTE_NA = 'N.A.'
 DISPLAY_IN_ITALIC_MSG = [ MSG_REMOTE_BRANCH_GONE, MSG_LOCAL_BRANCH ]
 DISPLAY_IN_BOLD_MSG   = [ 'to push', 'to pull', MSG_REMOTE_BRANCH_GONE ]
 
-try:
-    from PySide6.QtCore import qVersion
-    pyqt_version_info = '* Qt for Python v%s\n' % qVersion()
-    pyqt_version_info = pyqt_version_info.strip('\n')
-except ImportError:
-    pyqt_version_info = ''
+
+def msg_about_multigit() -> str:
+    '''Return the about message of MultiGit, with the version of its components.
+
+    The Qt version is looked up here and not at import time, so that this module can be used without PySide6.'''
+    try:
+        from PySide6.QtCore import qVersion
+        pyqt_version_info = '* Qt for Python v%s\n' % qVersion()
+        pyqt_version_info = pyqt_version_info.strip('\n')
+    except ImportError:
+        pyqt_version_info = ''
+
+    return MSG_ABOUT_MULTIGIT % (VERSION, platform.python_version(), pyqt_version_info)
+
 
 MSG_ABOUT_MULTIGIT = """MultiGit OpenSource v%s
 
@@ -101,7 +111,7 @@ MultiGit is based on the following software:
 * PyInstaller v5.0
 
 Icons provided freely by icons8 (see https://icons8.com )
-""" % (VERSION, platform.python_version(), pyqt_version_info)
+"""
 
 MSG_GIT_EXEC_STARTING_EXEC  = 'Git batch execution %d of %d'
 MSG_GIT_EXEC_FAILED  = 'Git execution crashed or was interrupted'
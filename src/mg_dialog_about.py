@@ -25,7 +25,6 @@ from PySide6.QtCore import qVersion
 
 from src.gui.ui_about import Ui_dialogAbout
 from src.gui.ui_about_license import Ui_FullLicenseInfoDialog
-from src.gui.content_full_license_info import content_html
 from src.mg_const import VERSION
 
 MULTIGIT_VERSION_MARKER = '[version]'
@@ -57,6 +56,8 @@ class MgAboutDialog(QDialog):
         dlg.setWindowFlag(Qt.WindowType.WindowContextHelpButtonHint, False)
         ui = Ui_FullLicenseInfoDialog()
         ui.setupUi(dlg)
+        # the license information is big and rarely displayed, it is only loaded on first use
+        from src.gui.content_full_license_info import content_html
         ui.textBrowser.setHtml(content_html)
         dlg.show()
 
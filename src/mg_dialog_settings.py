@@ -25,7 +25,8 @@ if TYPE_CHECKING:
     from src.mg_repo_tree import MgRepoTree
 from src.gui.ui_preferences import Ui_Preferences
 from src.mg_tools import ExecGit, ExecTortoiseGit, ExecSourceTree, ExecSublimeMerge, ExecGitBash, ExecExplorer, \
-    ExecGitGui, ExecGitK, CmdType, MgExecutable, ExecTool
+    ExecGitGui, ExecGitK, ExecTool
+from src.mg_exec_core import CmdType, MgExecutable
 import src.mg_const as mg_const
 import src.mg_config as mgc
 
@@ -238,14 +239,18 @@ class MgDialogSettings(QDialog):
         double_click_action = config[mgc.CONFIG_DOUBLE_CLICK_ACTION] or ''
         self.ui.comboBoxDoubleClickAction.setCurrentText(double_click_action)
 
-        nb_git_proc_limit = mgc.get_config_instance().get(mgc.CONFIG_NB_GIT_PROC, 0)
-        if nb_git_proc_limit == 0:
+        nb_git_proc_limit = mgc.get_config_instance().get(mgc.CONFIG_NB_GIT_PROC, mgc.NB_GIT_PROC_UNLIMITED)
+        if nb_git_proc_limit == mgc.NB_GIT_PROC_UNLIMITED:
             self.ui.radioButtonGitProcUnlimited.setChecked(True)
             self.ui.radioButtonGitProcLimit.setChecked(False)
+        elif nb_git_proc_limit == mgc.NB_GIT_PROC_ADAPTIVE:
+            self.ui.radioButtonGitProcAdaptive.setChecked(True)
         else:
             self.ui.radioButtonGitProcUnlimited.setChecked(False)
             self.ui.radioButtonGitProcLimit.setChecked(True)
             self.ui.spinBoxLimitValue.setValue(nb_git_proc_limit)
+        # the spin box is enabled by the toggling of radioButtonGitProcLimit only, see ui_preferences.ui
+        self.ui.spinBoxLimitValue.setEnabled(self.ui.radioButtonGitProcLimit.isChecked())
 
         self.ui.checkBoxFetchOnStartup.setChecked(bool(config[mgc.CONFIG_FETCH_ON_STARTUP]))
 
@@ -419,8 +424,12 @@ def runDialogEditSettings(parent: QWidget, tabPage: Union[Literal[0], Literal[1]
     config[mgc.CONFIG_DOUBLE_CLICK_ACTION]  = dlg.ui.comboBoxDoubleClickAction.currentText()
     config[mgc.CONFIG_HEAD_COLOR_BRANCH]  = dlg.colorBranch.rgb()
     config[mgc.CONFIG_HEAD_COLOR_TAG]  = dlg.colorTag.rgb()
-    config[mgc.CONFIG_NB_GIT_PROC] = (0 if dlg.ui.radioButtonGitProcUnlimited.isChecked()
-                                                else dlg.ui.spinBoxLimitValue.value())
+    if dlg.ui.radioButtonGitProcUnlimited.isChecked():
+        config[mgc.CONFIG_NB_GIT_PROC] = mgc.NB_GIT_PROC_UNLIMITED
+    elif dlg.ui.radioButtonGitProcAdaptive.isChecked():
+        config[mgc.CONFIG_NB_GIT_PROC] = mgc.NB_GIT_PROC_ADAPTIVE
+    else:
+        config[mgc.CONFIG_NB_GIT_PROC] = dlg.ui.spinBoxLimitValue.value()
     config[mgc.CONFIG_FETCH_ON_STARTUP]  = dlg.ui.checkBoxFetchOnStartup.isChecked()
     config[mgc.CONFIG_CONFIRM_BEFORE_QUIT] = dlg.ui.checkBoxConfirmWhenQuitting.isChecked()
 
@@ -20,8 +20,6 @@ from typing import Optional
 from PySide6.QtWidgets import QWidget, QDialog, QTextEdit, QPushButton, QVBoxLayout, QHBoxLayout, QFrame, QMessageBox
 from PySide6.QtCore import Qt
 
-from src.gui.content_whatisnew import content_html as whatsnew_html_content
-from src.gui.content_getting_started import content_html as getting_started_html_content
 from src.mg_const import *
 import src.mg_config as mgc
 
@@ -57,11 +55,15 @@ def showLaunchDialog() -> None:
         return
 
 
+# the html contents are only loaded on first use, they are not needed on most launches
+
 def showWhatIsNew(parent: Optional[QWidget] = None) -> None:
+    from src.gui.content_whatisnew import content_html as whatsnew_html_content
     showDialogWithHtmlContent(whatsnew_html_content, parent)
 
 
 def showGettingStarted(parent: Optional[QWidget] = None) -> None:
+    from src.gui.content_getting_started import content_html as getting_started_html_content
     showDialogWithHtmlContent(getting_started_html_content, parent)
 
 
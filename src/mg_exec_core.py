@@ -0,0 +1,529 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+'''Execution of external programs without Qt: executable lookup and blocking process runner.
+
+This is used directly by the command-line tool mgitcmd, so that it starts without loading PySide6.
+The GUI builds on it in mg_tools, with asynchronous execution through QProcess and message boxes.
+'''
+
+from typing import Any, List, Dict, Type, Optional, Tuple
+import logging, sys, os, subprocess
+from pathlib import Path
+from enum import Enum
+from dataclasses import dataclass
+
+from src import mg_config
+import src.mg_const as mg_const
+
+logger = logging.getLogger('mg_exec_core')
+dbg = logger.debug
+warn = logger.warning
+log_git_cmd = logging.getLogger(mg_const.LOGGER_GIT_CMD).info
+
+GIT_EXIT_CODE_SEGFAULT_OF_GIT_WITH_STACKTRACE = -100
+GIT_EXIT_CODE_SEGFAULT_OF_GIT_NO_STACKTRACE = -101
+EXIT_CODE_COULD_NOT_START_PROCESS = -102
+GIT_EXIT_CODE_STOPPED_BECAUSE_AUTH_FAILURE = -103
+EXIT_CODE_CRASHED = -104
+
+FLATPAK_SPAWN = ['flatpak-spawn', '--host']
+SNAP_BIN_DIR = '/snap/bin'
+
+class CmdType(Enum):
+    NoCmd               = 'NoCmd'         # empty value, means that the program could not be found
+    DirectCmd           = 'DirectCmd'
+    FlatpakProgram      = 'FlatpakProgram'
+    SnapProgram         = 'SnapProgram'
+
+
+class ExecStatus(Enum):
+    Ok            = 'Ok'
+    FailedToStart = 'Failed to start'
+    Crashed       = 'Crash'
+    OtherError    = 'Other error'
+
+
+@dataclass
+class MgExecutable:
+    '''Class to represent an executable program with its type and path'''
+    cmd_type: CmdType = CmdType.NoCmd
+
+    # used to launch the command, this is the name of the executable available on the command-line
+    # or the path to the executable, to be launched either directly or with flatpak spawn depending on cmd_type
+    path: str = ''
+
+    # flatpak program ID, when cmd_type is CmdType.FlatpakProgram
+    name: str = ''
+
+    def is_empty(self) -> bool:
+        '''Shortcut to check if the executable is empty (not found)'''
+        return self.cmd_type == CmdType.NoCmd
+    
+    def __str__(self) -> str:
+        if self.is_empty():
+            return 'NoCmd()'
+        elif self.cmd_type == CmdType.FlatpakProgram:
+            return f'FlatpakProgram({self.name})'
+        else:
+            return f'{self.cmd_type}({self.path})'
+
+
+def isRunningInsideFlatpak() -> bool:
+    """Return TTrue if running inside a flatpak container.
+
+    Used to use proper flatpak launcher when launching an external program"""
+    return 'FLATPAK_ID' in os.environ
+
+
+def build_cmd_line(exec: MgExecutable, cmd_args: List[str], flatpak_spawn: bool = True) -> List[str]:
+    '''Return the full command-line to run the executable with the arguments cmd_args
+
+    exec: the executable to run, with the information to run it properly (path for a direct command, snap name for a snap
+     program, flatpak app id for a flatpak program
+
+    If running inside a flatpak container, the command is executed on the host with flatpak-spawn, unless
+    flatpak_spawn is False (for commands sent to the host helper)
+    '''
+    assert not exec.is_empty(), f'Can not execute: {exec}'
+
+    cmd_line = cmd_args
+
+    if exec.cmd_type == CmdType.DirectCmd:
+        cmd_line = [exec.path] + cmd_line
+
+    if exec.cmd_type == CmdType.FlatpakProgram:
+        cmd_line = ['flatpak', 'run', exec.name] + cmd_line
+
+    if exec.cmd_type == CmdType.SnapProgram:
+        cmd_line = [f'{SNAP_BIN_DIR}/{exec.name}'] + cmd_line
+
+    if flatpak_spawn and isRunningInsideFlatpak():
+        cmd_line = FLATPAK_SPAWN + cmd_line
+
+    return cmd_line
+
+
+def log_process_output(cmd_line: List[str], cmd_out: str) -> None:
+    '''Log the output of a finished process, truncated to MAX_GIT_DBG_OUT_CHAR characters'''
+    cmd_out_dbg = cmd_out if len(cmd_out) < mg_const.MAX_GIT_DBG_OUT_CHAR else \
+        cmd_out[:mg_const.MAX_GIT_DBG_OUT_CHAR] + '\n<output truncated to {} characters>'.format(mg_const.MAX_GIT_DBG_OUT_CHAR)
+    dbg('stdout: {}'.format(cmd_out_dbg))
+
+    log_git_cmd(' '.join(cmd_line))
+    log_git_cmd('\t' + '\n\t'.join(cmd_out_dbg.split('\n')))
+
+
+def subprocess_creationflags() -> int:
+    '''Return the creation flags of the processes started with the subprocess module: like QProcess, do not open
+    a console window for each process on Windows'''
+    return getattr(subprocess, 'CREATE_NO_WINDOW', 0) if sys.platform == 'win32' else 0
+
+
+def run_process_blocking(exec: MgExecutable, cmd_args: List[str], working_dir: str = '') -> Tuple[ExecStatus, int, str]:
+    '''Execute a program in blocking mode, with stdout and stderr merged.
+
+    This is the Qt-free equivalent of RunProcess.exec_blocking(), it can be called from any thread.
+
+    Return the execution status, the program exit code and the output of the command.
+    '''
+    if isRunningInsideFlatpak():
+        from src.mg_host_helper import get_host_helper
+        helper = get_host_helper()
+        if helper is not None:
+            cmd_line = build_cmd_line(exec, cmd_args, flatpak_spawn=False)
+            dbg('Executing blocking with host helper: {}'.format(' '.join(cmd_line)))
+            exec_status, exit_code, cmd_out = helper.exec_blocking(cmd_line, working_dir)
+            log_process_output(cmd_line, cmd_out)
+            return exec_status, exit_code, cmd_out
+
+    cmd_line = build_cmd_line(exec, cmd_args)
+    dbg('Executing blocking: {}'.format(' '.join(cmd_line)))
+
+    try:
+        completed = subprocess.run(cmd_line, cwd=working_dir or None, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   creationflags=subprocess_creationflags())
+    except OSError as exc:
+        dbg(f'run_process_blocking() - could not start the process: {exc}')
+        return ExecStatus.FailedToStart, EXIT_CODE_COULD_NOT_START_PROCESS, ''
+
+    cmd_out = completed.stdout.decode('utf8', errors='replace').replace('\r', '\n')
+    log_process_output(cmd_line, cmd_out)
+
+    exit_code = completed.returncode
+    dbg('Process finished for "%s" with exit code %d' % (' '.join(cmd_line), exit_code))
+    if exit_code < 0:
+        # killed by a signal
+        return ExecStatus.Crashed, EXIT_CODE_CRASHED, cmd_out
+
+    return ExecStatus.Ok, exit_code, cmd_out
+
+
+def flatpak_host_file_exists(fpath: Path) -> bool:
+    '''Check whether a given file exists on the flatpak host file system, by asking the host helper, or else
+    by using sh to run a test command on the host.'''
+    assert isRunningInsideFlatpak(), 'flatpak_host_file_exists() should only be called when running inside flatpak'
+    from src.mg_host_helper import get_host_helper
+    helper = get_host_helper()
+    if helper is not None:
+        return helper.file_exists(fpath)
+
+    # assumption here: sh is on the path on the host. Very very likely
+    # If it turns out to be a wrong assumption we can always organise a search for a shell or a python
+    USE_SH_TO_CHECK_THAT_FILE_EXISTS = ['sh', '-c', f'[ -e "{fpath}" ]']
+    exec = MgExecutable(CmdType.DirectCmd, path=USE_SH_TO_CHECK_THAT_FILE_EXISTS[0])
+    exec_status, exit_code, output = run_process_blocking(exec, cmd_args=USE_SH_TO_CHECK_THAT_FILE_EXISTS[1:])
+    return exec_status == ExecStatus.Ok and exit_code == 0
+
+
+def process_failure_msg(display_name: str, exec_status: ExecStatus, exit_code: int, output: str,
+                        allow_errors: bool) -> Optional[Tuple[bool, str, str]]:
+    '''Describe the failure of a process execution, for reporting it to the user.
+
+    allow_errors:
+        True, could not start program (== wrong path) or bad exit code are ignored
+
+    Crash and other errors are always reported, whatever the value of allow_errors
+
+    Return None if the execution is successful or the error is within the allowed errors. Else, return
+    (is_critical, title, message).
+    '''
+    if exec_status == ExecStatus.FailedToStart and not allow_errors:
+        return (True, f'Could not start {display_name}',
+                f'Error: Could not start {display_name}\n\nPlease adjust the execution information in the preference dialog')
+
+    if exec_status == ExecStatus.Crashed:
+        return (True, f'Execution error for {display_name}',
+                f'Error: Execution of {display_name} crashed.\n\nPlease check the logs and adjust the execution information in the preference dialog')
+
+    if exec_status == ExecStatus.OtherError:
+        return (True, f'Execution error for {display_name}',
+                f'Error: Execution of {display_name} failed.\n\nPlease check the logs and adjust the execution information in the preference dialog')
+
+    if exit_code != 0 and not allow_errors:
+        return (False, f'Execution error for {display_name}',
+                f'Error: {display_name} returned with exit code {exit_code}.\n\nOutput:\n{output}')
+
+    return None
+
+
+class ExecProgram:
+    '''Description of an external program: where to find it on each platform and how its location is configured.
+
+    This part does not depend on Qt. The GUI actions and the asynchronous execution are provided by ExecTool.
+    '''
+
+    # Program display name to use when presenting to the user
+    DISPLAY_NAME: str = ''
+
+    # List of platform (as returned by sys.platform()) where we can run this tool
+    SUPPORTED_PLATFORMS: List[str]
+
+    WIN32_PATH_CANDIDATES: List[Path] = []
+    LINUX_PATH_CANDIDATES: List[Path] = []
+    DARWIN_PATH_CANDIDATES: List[Path] = []
+
+    EXEC_NAME_WIN32: str = ''
+    EXEC_NAME_DARWIN: str = ''
+    EXEC_NAME_LINUX: str = ''
+    # Snap executable name under /snap/bin 
+    EXEC_NAME_SNAP: str = ''
+    # Flatpak application ID (for example org.gnome.gitg). Empty means "no Flatpak app".
+    EXEC_NAME_FLATPAK: str = ''
+
+    # When False,the program we are looking for is specific and we can filter the browse dialog with
+    # the program executable name. If True, the program is generic and we will not filter the the browse
+    # dialog box.
+    GENERIC_PROGRAM: bool = False
+
+    # if not None, this is a command which we can run to detect the program. Typically, this is ['--version']
+    INNOCUOUS_COMMAND: Optional[List[str]] = None
+
+    # name of the configuration entry to store the executable configuration
+    # information (path, auto-detection, flatpak app name, ...). The prefix 
+    # is completed with CONFIG_SUFFIX_* to store the different information.
+    CONFIG_ENTRY_BASE: str
+
+    SESSION_CACHE: Dict[Type['ExecProgram'], MgExecutable] = {
+    }
+
+
+    @classmethod
+    def platform_supported(cls) -> bool:
+        '''Return whether the current platform is supported'''
+        return sys.platform in cls.SUPPORTED_PLATFORMS
+
+
+    @classmethod
+    def flatpak_supported(cls) -> bool:
+        '''Return whether the current platform supports Flatpak'''
+        return sys.platform == 'linux'
+
+
+    @classmethod
+    def snap_supported(cls) -> bool:
+        '''Return whether the current platform supports Snap'''
+        return sys.platform == 'linux'
+
+
+    @classmethod
+    def config_read_entry(cls, suffix: str, default_value: Any = None) -> Any:
+        '''Read the configuration entry CONFIG_ENTRY_BASE + suffix and return its value'''
+        config = mg_config.get_config_instance()
+        return config.get(cls.CONFIG_ENTRY_BASE + suffix, default_value=default_value)
+
+
+    @classmethod
+    def config_write_entry(cls, suffix: str, value: Any) -> None:
+        '''Write the value in the configuration entry CONFIG_ENTRY_BASE + suffix'''
+        config = mg_config.get_config_instance()
+        config[cls.CONFIG_ENTRY_BASE + suffix] = value
+
+
+    @classmethod
+    def config_read_exec(cls) -> MgExecutable:
+        '''Read the configuration entry and return an MgExecutanble with the stored information.
+
+        A default empty exec is returned if:
+        - the config entry does not exist
+        - the config entry for cmd_type has an unknown value
+        - the config entry declares flatpak but this is not supported on this platform
+        - the config entry declares snap but this is not supported on this platform
+        '''
+        config = mg_config.get_config_instance()
+        cmd_type_config_entry = cls.CONFIG_ENTRY_BASE + mg_config.SUFFIX_CMD_TYPE
+        cmd_type_str = config.get(cmd_type_config_entry)
+        if cmd_type_str is None:
+            dbg(f'config_read_exec() - no config entry for cmd type: {cmd_type_config_entry}, returning empty MgExecutable')
+            return MgExecutable()
+        name = config.get(cls.CONFIG_ENTRY_BASE + mg_config.SUFFIX_APP_NAME, '')
+        path = config.get(cls.CONFIG_ENTRY_BASE + mg_config.SUFFIX_MANUAL_PATH, '')
+        try:
+            exec = MgExecutable(cmd_type=CmdType(cmd_type_str), name=name, path=path)
+        except ValueError:
+            warn(f'config_read_exec() - Unsupported config value for {cmd_type_config_entry} : {cmd_type_str}')
+            dbg('config_read_exec() - Returning empty MgExecutable')
+            return MgExecutable()
+
+        if (not cls.flatpak_supported()) and exec.cmd_type == CmdType.FlatpakProgram \
+                or (not cls.snap_supported()) and exec.cmd_type == CmdType.SnapProgram:
+            # config is inconsistent, fix it
+            warn(f'config_read_exec() - Config inconsistent with platform capabilities: cmd_type={exec.cmd_type}')
+            dbg('config_read_exec() - Returning empty MgExecutable')
+            return MgExecutable()
+
+        dbg(f'config_read_exec() - Returning {exec}')
+        return exec
+
+
+    @classmethod
+    def autodetect_executable(cls) -> MgExecutable:
+        '''Autodetect the executable location according to the command defintions and return a MgExecutable.
+
+        The order of detection is:
+        - run the on the command line the command defined in INNOCUOUS_COMMAND
+        - scan the locations defined in the relevant *_PATH_CANDIDATES for the current platform
+        - if EXEC_NAME_FLATPAK is defined, look for a Flatpak app with this ID
+
+        The MgExecutable is empty when the program could not be found. Else it contains the information to launch the program.
+        '''
+        if not cls.platform_supported():
+            return MgExecutable()
+
+        # check if we have it in cache
+        if cls in cls.SESSION_CACHE:
+            return cls.SESSION_CACHE[cls]
+
+        if cls.INNOCUOUS_COMMAND:
+            exec = MgExecutable(CmdType.DirectCmd, path=cls.get_exec_name())
+
+            exec_status, exit_code, _output = run_process_blocking(exec, cmd_args=cls.INNOCUOUS_COMMAND)
+            if exec_status == ExecStatus.Ok and exit_code == 0:
+                # program is on the path, use it
+                cls.SESSION_CACHE[cls] = exec
+                return exec
+
+        exec = cls.find_prog_exec()
+
+        # put it in cash for next time
+        if not exec.is_empty():
+            cls.SESSION_CACHE[cls] = exec
+
+        # return the result even if we could not find anything
+        return exec
+
+
+    @classmethod
+    def get_executable(cls) -> MgExecutable:
+        '''Check if the configuration `autodetect` is True or None and in this case,
+        auto-detects the program location. 
+        
+        Else, simply return the value stored in the configuration file.
+        '''
+        if not cls.platform_supported():
+            return MgExecutable()
+
+        if cls.config_read_entry(mg_config.SUFFIX_AUTODETECT) in (None, True):
+            result = cls.autodetect_executable()
+        else:
+            result = cls.config_read_exec()
+        return result
+
+
+    @classmethod
+    def get_exec_name(cls) -> str:
+        if sys.platform == 'win32':
+            return cls.EXEC_NAME_WIN32
+        elif sys.platform == 'linux':
+            return cls.EXEC_NAME_LINUX
+        elif sys.platform == 'darwin':
+            return cls.EXEC_NAME_DARWIN
+        else:
+            raise ValueError('Platform not supported: ', sys.platform)
+
+
+    @classmethod
+    def get_path_candidates(cls) -> List[Path]:
+        if sys.platform == 'win32':
+            path_candidates = list(cls.WIN32_PATH_CANDIDATES)
+        elif sys.platform == 'linux':
+            path_candidates = list(cls.LINUX_PATH_CANDIDATES)
+        elif sys.platform == 'darwin':
+            path_candidates = list(cls.DARWIN_PATH_CANDIDATES)
+        else:
+            raise ValueError(f'Unsupported platform for find_prog_exed(): {sys.platform}')
+
+        return path_candidates
+
+
+    @classmethod
+    def find_prog_exec(cls) -> MgExecutable:
+        '''Scans locations path_candidates to see if the expected program exists. When running inside a flatpak sandbox,
+        looks for the program on the host file system with flatpak-spawn.
+
+        If not found, and if EXEC_NAME_SNAP is defined, looks for a an executable with this name in /snap/bin.
+
+        If not found, and if EXEC_NAME_FLATPAK is defined, looks for a Flatpak app with this ID.
+        
+        Return the program at this location if found or an empty MgExecutable
+        '''
+        path_candidates = cls.get_path_candidates()
+        exec_name = cls.get_exec_name()
+        
+        dbg(f'find_prog_exec({cls.__name__}) - exec_name={exec_name}, path_candidates={path_candidates}')
+
+        possible_full_paths = [
+            Path(possible_path) / exec_name for possible_path in path_candidates
+        ]
+        if cls.EXEC_NAME_SNAP:
+            possible_full_paths.append(Path(SNAP_BIN_DIR) / cls.EXEC_NAME_SNAP)
+        
+        for candidate_path in possible_full_paths:
+            dbg('find_prog_exec() - looking at: {}'.format(str(candidate_path)))
+
+            if isRunningInsideFlatpak():
+                if not flatpak_host_file_exists(candidate_path):
+                    continue
+                dbg('Found program at flatpak host: {}'.format(str(candidate_path)))
+                return MgExecutable(CmdType.DirectCmd, str(candidate_path))
+            else:
+                if not candidate_path.exists():
+                    continue
+                dbg('Found program at: {}'.format(str(candidate_path)))
+                return MgExecutable(CmdType.DirectCmd, str(candidate_path))
+            
+        # not found on the path candidates
+
+        result = MgExecutable()
+        if cls.EXEC_NAME_FLATPAK:
+            # look for program in flatpak list of program
+            # ok, we have it !
+            result = cls.find_flatpak_program()
+
+        # could not find the wanted program
+        return result
+
+
+    @classmethod
+    def find_flatpak_program(cls) -> MgExecutable:
+        '''Detect a Flatpak app by ID and return a filled MgExecutable if found, else an empty MgExecutable.'''
+        app_id = cls.EXEC_NAME_FLATPAK.strip()
+        if not app_id:
+            return MgExecutable()
+
+        exec = MgExecutable(CmdType.DirectCmd, path='flatpak')
+        cmd_args = ['info', '--show-ref', app_id]
+        exec_status, exit_code, _output = run_process_blocking(exec, cmd_args)
+
+        if exec_status == ExecStatus.Ok and exit_code == 0:
+            dbg(f'find_flatpak_program() - found flatpak app: {app_id}')
+            return MgExecutable(CmdType.FlatpakProgram, name=app_id)
+
+        dbg(f'find_flatpak_program() - flatpak app not found: {app_id}')
+        return MgExecutable()
+
+
+    @classmethod
+    def handle_process_return(cls, exec_status: ExecStatus, exit_code: int, output: str, allow_errors: bool) -> bool:
+        '''Handle process execution errors, by printing them on stdout. See process_failure_msg() for allow_errors.
+
+        return True if the execution is successful or error is within the allowed errors.
+        '''
+        failure = process_failure_msg(cls.DISPLAY_NAME, exec_status, exit_code, output, allow_errors)
+        if failure is not None:
+            print(failure[2])
+            return False
+
+        # ok, execution was successful
+        assert exec_status == ExecStatus.Ok, exec_status
+
+        return True
+
+
+class GitProgram(ExecProgram):
+    DISPLAY_NAME = 'Git'
+
+    SUPPORTED_PLATFORMS = ['win32', 'linux', 'darwin']
+
+    WIN32_PATH_CANDIDATES: List[Path] = [
+        Path(os.environ.get("ProgramFiles", '')) / "Git" / "bin",
+        Path(os.environ.get("ProgramFiles", '')) / "Git" / "cmd",
+        Path(os.environ.get("ProgramFiles(x86)", '')) / "Git" / "bin",
+        Path(os.environ.get("ProgramFiles(x86)", '')) / "Git" / "cmd",
+        Path(os.environ.get("PROGRAMW6432", '')) / "Git" / "bin",
+        Path(os.environ.get("PROGRAMW6432", '')) / "Git" / "cmd",
+    ]
+
+    LINUX_PATH_CANDIDATES = [
+        Path('/usr/local/bin'),
+        Path('/usr/bin'),
+    ]
+
+    DARWIN_PATH_CANDIDATES = [
+        Path('/usr/local/bin'),
+        Path('/usr/bin'),
+    ]
+
+    EXEC_NAME_LINUX = 'git'
+    EXEC_NAME_DARWIN = 'git'
+    EXEC_NAME_WIN32 = 'git.exe'
+    EXEC_NAME_FLATPAK = ''
+
+    INNOCUOUS_COMMAND = ['--version']
+
+    CONFIG_ENTRY_BASE = 'CONFIG_GIT'
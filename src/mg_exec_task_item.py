@@ -27,9 +27,12 @@ from PySide6.QtCore import Signal, QObject, Qt, QThread
 from PySide6.QtGui import QIcon, QPixmap, QFont
 from PySide6.QtWidgets import QWidget, QPushButton, QLabel, QHBoxLayout, QVBoxLayout, QTreeWidgetItem, QApplication
 
-from src.mg_tools import CmdType, MgExecutable, RunProcess, ExecGit, ExecStatus
-from src.mg_repo_info import MgRepoInfo
-from src.mg_utils import handle_cr_in_text, ignoreCppObjectDeletedError, tryHardDeletingDirList
+from src.mg_exec_core import CmdType, MgExecutable, ExecStatus, GIT_EXIT_CODE_STOPPED_BECAUSE_AUTH_FAILURE, \
+    GIT_EXIT_CODE_SEGFAULT_OF_GIT_WITH_STACKTRACE, GIT_EXIT_CODE_SEGFAULT_OF_GIT_NO_STACKTRACE
+from src.mg_tools import RunProcess, ExecGit
+from src.mg_repo_info import MgRepoInfo, RefreshScope
+from src.mg_repo_cache import repo_fingerprint
+from src.mg_utils import CrTextAccumulator, ignoreCppObjectDeletedError, tryHardDeletingDirList, hasGitAuthFailureMsg
 
 logger = logging.getLogger('mg_exec_task')
 dbg = logger.debug
@@ -39,6 +42,15 @@ error = logger.error
 MAX_LINES_PER_ITEM = 1
 QTREE_WIDGET_ITEM_BUTTONBAR_TYPE = cast(int, QTreeWidgetItem.ItemType.UserType)+1
 
+# information of the repository which the git commands may change, only this part is refreshed after them.
+# The other git commands may change anything.
+GIT_CMD_REFRESH_SCOPE = {
+    'fetch': RefreshScope.RemoteSynchro | RefreshScope.Tags,
+    'push': RefreshScope.RemoteSynchro,
+    'tag': RefreshScope.Tags,
+    'ls-remote': RefreshScope.Nothing,
+}
+
 class PreConditionState(enum.Enum):
     NotFulfilled = enum.auto()
     FulFilled = enum.auto()
@@ -94,6 +106,26 @@ def getIcon(icon: IconSet) -> QIcon:
     return QIcon(ICON_FNAME_DICT[icon])
 
 
+def gitCmdRefreshScope(git_args: List[str]) -> RefreshScope:
+    '''Return the information of the repository which the git command may change'''
+    idx = 0
+    # skip the options of git itself, like "-C <path>"
+    while idx < len(git_args) and git_args[idx].startswith('-'):
+        idx += 2 if git_args[idx] in ('-C', '-c') else 1
+    if idx >= len(git_args):
+        return RefreshScope.All
+    return GIT_CMD_REFRESH_SCOPE.get(git_args[idx], RefreshScope.All)
+
+
+def refreshRepoAfterTasks(repo: MgRepoInfo, scope: RefreshScope) -> None:
+    '''Refresh the information of the repository which the tasks may have changed.
+
+    The tasks are over, so the fingerprint of the repository is recorded now: the repository watcher does not
+    refresh it a second time for the modifications performed by the tasks.'''
+    repo.fingerprint = repo_fingerprint(repo.fullpath)
+    repo.partial_refresh(scope)
+
+
 
 class MgExecTask(QObject):
     '''Generic task class, inherited by specialized task class
@@ -106,6 +138,9 @@ class MgExecTask(QObject):
     sig_task_done: ClassVar[Signal] = Signal(bool, str, IconSet)
     sig_partial_output: ClassVar[Signal] = Signal(str)
 
+    # information of the repository which the task may change, refreshed when the task is over
+    refresh_scope: RefreshScope = RefreshScope.All
+
     def __init__(self, desc: str, repo: MgRepoInfo, ignore_failure: bool = False, icon_success_hint: IconSet = IconSet.Success):
         super().__init__()
         self.desc = desc
@@ -195,6 +230,9 @@ class MgExecTask(QObject):
 
 class MgExecTaskCollectRemoteUrl(MgExecTask):
     '''Task for running a function'''
+
+    refresh_scope = RefreshScope.Nothing
+
     def __init__(self,
                  desc: str,
                  repo: MgRepoInfo,
@@ -389,6 +427,8 @@ class MgTaskMoveDirectory(MgExecTask):
 class MgTaskComment(MgExecTask):
     '''Display a comment'''
 
+    refresh_scope = RefreshScope.Nothing
+
     def __init__(self,
                  comment: str,
                  repo: MgRepoInfo,
@@ -439,6 +479,9 @@ class MgExecTaskGit(MgExecTask):
         self.git_args = git_args
         self.run_inside_git_repo = run_inside_git_repo
         self.run_process = None
+        # filled when the git command is completed
+        self.git_exit_code: Optional[int] = None
+        self.git_auth_failed = False
 
         if self.run_inside_git_repo:
             if self.repo is None:
@@ -446,6 +489,13 @@ class MgExecTaskGit(MgExecTask):
             self.git_args = ['-C', self.repo.fullpath] + self.git_args
 
         self.short_desc = 'git ' + ' '.join(git_args)
+        self.refresh_scope = gitCmdRefreshScope(git_args)
+
+    @property
+    def git_crashed(self) -> bool:
+        '''Return True if git crashed while running this task'''
+        return self.git_exit_code in (GIT_EXIT_CODE_SEGFAULT_OF_GIT_WITH_STACKTRACE, GIT_EXIT_CODE_SEGFAULT_OF_GIT_NO_STACKTRACE)
+
 
     def _do_run(self) -> None:
         dbg(f'MgExecTaskGit.run() - {self.short_desc}')
@@ -460,6 +510,9 @@ class MgExecTaskGit(MgExecTask):
         dbg(f'MgExecTaskGit.git_task_done(git_exit_code={git_exit_code}) - "{self}"')
 
         self.run_process = None
+        self.git_exit_code = git_exit_code
+        self.git_auth_failed = (git_exit_code == GIT_EXIT_CODE_STOPPED_BECAUSE_AUTH_FAILURE
+                                or (git_exit_code != 0 and hasGitAuthFailureMsg(git_stdout)))
         if git_exit_code != 0:
             if len(git_stdout) != 0:
                 git_stdout += '\n'
@@ -519,6 +572,14 @@ class MgExecTaskGroup:
         self.tasks.append(git_task)
 
 
+    def refresh_scope(self) -> RefreshScope:
+        '''Return the information of the repository which the tasks of the group may change'''
+        scope = RefreshScope.Nothing
+        for task in self.tasks:
+            scope |= task.refresh_scope
+        return scope
+
+
     def is_precondition_fulfilled(self) -> PreConditionState:
         '''Return whether the precondition for starting this task are fulfilled. The possibilities are:
         - FulFilled: no precondition, or precondition is fulfilled
@@ -621,6 +682,8 @@ def after_other_taskgroup_is_started_and_dir_exists(task_group: MgExecTaskGroup)
 
     # mark the dependency in the function, it's convenient for verification
     is_taskgroup_started_and_dir_exists.task_group = task_group   # type: ignore[attr-defined] # mypy does not know about this attribute
+    # the creation of the directory is not notified, the scheduler must check it periodically
+    is_taskgroup_started_and_dir_exists.check_periodically = True   # type: ignore[attr-defined]
 
     return is_taskgroup_started_and_dir_exists
 
@@ -673,6 +736,7 @@ class MgExecItemOneCmd(MgExecItemBase):
         self.task.sig_partial_output.connect(self.slotProgressiveOutput)
         self.setIcon(0, getIcon(IconSet.Empty))
         self.gitContentItem: Optional[QTreeWidgetItem] = None
+        self.outputLines = CrTextAccumulator()
         self.abortRequested = False
 
 
@@ -682,8 +746,9 @@ class MgExecItemOneCmd(MgExecItemBase):
         # setting icon must be done before calling run(), because run() may actually complete
         # the task and call self.slotTaskDone() which will set the icon to success
         self.setIcon(0, getIcon(IconSet.InProgress))
-        self.task.run()
+        # the task may complete synchronously, so the content must be initialised before running it
         self.setContentItem('')
+        self.task.run()
 
 
     @ignoreCppObjectDeletedError
@@ -697,55 +762,58 @@ class MgExecItemOneCmd(MgExecItemBase):
         impossible to show on screen an item with more lines than the screen height
         can show
 
-        This method may be called multiple times, always with the full output. It will update
-        the existing items of the previous lines have changed, remove extra line if the content
-        has diminished, add items for new lines being added.
+        This method is called with the full output, the progressive output is handled
+        by slotProgressiveOutput(). It will update the existing items of the previous lines
+        have changed, remove extra line if the content has diminished, add items for new lines being added.
         '''
-        output = ''
+        self.outputLines = CrTextAccumulator()
         if self.task.short_desc:
-            output += f"> {self.task.short_desc}\n"
-        output += task_output
-        output = handle_cr_in_text(output)
-        out_lines = output.split('\n')
+            self.outputLines.feed(f"> {self.task.short_desc}\n")
+        self.outputLines.feed(task_output)
+        self.updateContentItems(0)
 
         # strip out empty lines at the end
-        while out_lines and out_lines[-1] == '':
-            del out_lines[-1]
+        while self.childCount():
+            lastChild = self.child(self.childCount()-1)
+            if lastChild is None or lastChild.text(0) != '':
+                break
+            self.takeChild(self.childCount()-1)
+        self.gitContentItem = self.child(self.childCount()-1) if self.childCount() else None
 
-        out_idx = 0
 
-        # update the existing items
-        for child_idx in range(self.childCount()):
-            # do we have a text for this child ? If not, get out
-            if out_idx >= len(out_lines):
-                break
+    def updateContentItems(self, first_line_idx: int) -> None:
+        '''Update the items showing the output, starting at line first_line_idx.
+        Items of the lines before are left untouched.'''
+        line_idx = min(first_line_idx, self.childCount())
+        nb_lines = self.outputLines.nb_lines()
 
-            child = self.child(child_idx)
-            if child.text(0) != out_lines[out_idx]:
-                child.setText(0, out_lines[out_idx])
-            out_idx += 1
+        # update the existing items
+        while line_idx < min(nb_lines, self.childCount()):
+            child = self.child(line_idx)
+            line = self.outputLines.line(line_idx)
+            if child is not None and child.text(0) != line:
+                child.setText(0, line)
+            line_idx += 1
 
         # if we have less lines of text than during the previous update, remove the extra
-        while out_idx > self.childCount():
+        while nb_lines < self.childCount():
             self.takeChild( self.childCount()-1 )
             self.gitContentItem = self.child(self.childCount()-1)
 
         # fill content with new items
-        while out_idx < len(out_lines):
+        while line_idx < nb_lines:
             self.gitContentItem = QTreeWidgetItem()
             self.gitContentItem.setFont(0, self.fixedFont)
             self.gitContentItem.setIcon(0, getIcon(IconSet.Empty))
             self.addChild(self.gitContentItem)
-            self.gitContentItem.setText(0, out_lines[out_idx])
-            out_idx += 1
+            self.gitContentItem.setText(0, self.outputLines.line(line_idx))
+            line_idx += 1
 
 
     @ignoreCppObjectDeletedError
     def slotProgressiveOutput(self, output: str) -> None:
-        item = self.gitContentItem
-        while item:
-            item = item.parent()
-        self.setContentItem(output)
+        '''Called with the new output of the task, since the previous call'''
+        self.updateContentItems(self.outputLines.feed(output))
 
 
     @ignoreCppObjectDeletedError
@@ -772,7 +840,7 @@ class MgExecItemOneCmd(MgExecItemBase):
             # We are in a single-git command context
             # if the command is not successful, the state of the repo has not changed, there is no need to refresh
             if self.task.repo:
-                self.task.repo.refresh()
+                refreshRepoAfterTasks(self.task.repo, self.task.refresh_scope)
 
         # new text might need column adjustment
         self.autoAdjustColumnSize()
@@ -959,7 +1027,7 @@ class MgExecItemMultiCmd(MgExecItemBase):
 
         if self.ignoreUpdates:
             dbg('MgExecitemMultiCmd.slotOneCmdDone() - ignore updates and aborting early')
-            self.taskGroup.repo.refresh()
+            refreshRepoAfterTasks(self.taskGroup.repo, self.taskGroup.refresh_scope())
             return
 
 
@@ -1003,7 +1071,7 @@ class MgExecItemMultiCmd(MgExecItemBase):
         self.cbExecDone(self.nbError == 0 and not self.abortRequested)
 
         # url does not need to be refreshed that often...
-        self.taskGroup.repo.refresh()
+        refreshRepoAfterTasks(self.taskGroup.repo, self.taskGroup.refresh_scope())
 
 
     def askQuestionAfterCmdFailed(self) -> None:
@@ -15,8 +15,8 @@
 #
 
 
-from typing import Sequence, cast, Any, Tuple, List
-import logging, time
+from typing import Sequence, cast, Any, Tuple, List, Dict, Deque, Optional
+import logging, time, collections, functools
 
 from PySide6.QtCore import Qt, QTimer, QPoint
 from PySide6.QtGui import QGuiApplication, QAction
@@ -27,6 +27,7 @@ import src.mg_config as mgc
 from src.mg_utils import collectColumnText
 from src.mg_repo_info import MgRepoInfo
 from src.mg_auth_failure_mgr import MgAuthFailureMgr
+from src.mg_adaptive_concurrency import get_adaptive_concurrency_instance
 from src.mg_exec_task_item import MgExecTaskGit, MgExecTask, MgExecItemBase, MgExecItemMultiCmd, MgExecTaskGroup, \
     PreConditionState
 
@@ -45,6 +46,11 @@ error = logger.error
 # to the user.
 DELTA_BETWEEN_CONCURRENT_GIT_RUN = 0.10
 
+# Interval in ms for checking again the preconditions which can not be notified, like the creation of a directory
+PRECONDITION_POLLING_INTERVAL = 100
+
+# Interval in ms for checking again whether the git authentication failure dialog is closed
+AUTH_DIALOG_POLLING_INTERVAL = 1000
 
 
 # noinspection PyAttributeOutsideInit
@@ -93,6 +99,18 @@ class MgExecWindow(QDialog):
         self.ui.treeGitJobs.customContextMenuRequested.connect(self.slotCustomContextMenuRequested)
         self.buttonCopyLog.clicked.connect( self.slotCopyLog )
         self.delta_between_concurrent_git_run = delta_between_concurrent_git_run
+
+        # timer used to leave some time between the start of two git processes
+        self.jobStartTimer = QTimer(self)
+        self.jobStartTimer.setSingleShot(True)
+        self.jobStartTimer.timeout.connect(self.startNewJobs)
+
+        # timer used to check the preconditions which are not triggered by the start or end of another job
+        self.preconditionPollTimer = QTimer(self)
+        self.preconditionPollTimer.setSingleShot(True)
+        self.preconditionPollTimer.setInterval(PRECONDITION_POLLING_INTERVAL)
+        self.preconditionPollTimer.timeout.connect(self.slotPollPreconditions)
+
         self.clear()
         MgAuthFailureMgr.newSession()
 
@@ -102,6 +120,16 @@ class MgExecWindow(QDialog):
         for item in self.getAllJobItems():
             item.clearRepoConnections()
         self.ui.treeGitJobs.clear()
+        self.jobStartTimer.stop()
+        self.preconditionPollTimer.stop()
+        # jobs whose precondition is fulfilled, in the order they should be started
+        self.ready_jobs: Deque[MgExecItemMultiCmd] = collections.deque()
+        # jobs waiting for another task group to start or finish, keyed by this other task group
+        self.jobs_waiting_for: Dict[MgExecTaskGroup, List[MgExecItemMultiCmd]] = {}
+        # jobs whose precondition must be checked periodically
+        self.jobs_polling_precondition: List[MgExecItemMultiCmd] = []
+        # start time of the task groups currently running
+        self.started_task_groups: Dict[MgExecTaskGroup, float] = {}
         self.nb_errors = 0
         self.nb_jobs = 0
         self.nb_jobs_running = 0
@@ -195,11 +223,14 @@ class MgExecWindow(QDialog):
         self.ui.treeGitJobs.addTopLevelItem( tli )
         tli.setExpanded(True)
 
-        jobitem: MgExecItemBase
+        jobItems: List[MgExecItemMultiCmd] = []
         for taskGroup in taskGroups:
             # multiple jobs to run, even if there is only one item
-            jobitem = MgExecItemMultiCmd(taskGroup, self.oneMoreJobDone, self.askQuestionUponFailure)
-            tli.addChild( jobitem )
+            jobItem = MgExecItemMultiCmd(taskGroup,
+                                         functools.partial(self.oneMoreJobDone, taskGroup=taskGroup),
+                                         self.askQuestionUponFailure)
+            tli.addChild( jobItem )
+            jobItems.append(jobItem)
 
         # 1/3 for starting the job
         # +2/3 for job completion
@@ -210,88 +241,116 @@ class MgExecWindow(QDialog):
         self.duration = 0.0
         self.first_started_job_time = time.time()
         self.updateProgress()
+        if self.isConcurrencyAdaptive():
+            get_adaptive_concurrency_instance().new_session()
 
         self.last_started_job_time = time.time() - self.delta_between_concurrent_git_run - 0.1 # note: force the delta to run the first job
+        for jobItem in jobItems:
+            self.scheduleJob(jobItem)
+        self.startNewJobs()
+
+
+    def scheduleJob(self, jobItem: MgExecItemMultiCmd) -> None:
+        '''Put a job which is not started in the ready queue if its precondition is fulfilled, else register it
+        for being scheduled again when the task group it depends on starts or finishes.'''
+        if self.abort_requested or jobItem.isStarted or jobItem.abortRequested:
+            return
+
+        taskGroup = jobItem.taskGroup
+        precondition_state = taskGroup.is_precondition_fulfilled()
+        if precondition_state == PreConditionState.FulFilled:
+            self.ready_jobs.append(jobItem)
+            return
+
+        if precondition_state == PreConditionState.Errored:
+            dbg(f'scheduleJob() - condition already in error for {taskGroup}, aborting the item')
+            jobItem.abortItem()
+            return
+
+        dbg(f'scheduleJob() - condition not fullfilled for {taskGroup}, waiting')
+        otherTaskGroup: Optional[MgExecTaskGroup] = getattr(taskGroup.pre_condition, 'task_group', None)
+        check_periodically = getattr(taskGroup.pre_condition, 'check_periodically', False)
+        if otherTaskGroup is not None and not otherTaskGroup.is_finished() \
+                and (not otherTaskGroup.is_started() or not check_periodically):
+            # the start or the end of the other task group will schedule this job again
+            self.jobs_waiting_for.setdefault(otherTaskGroup, []).append(jobItem)
+            return
+
+        # nothing will notify us when this precondition gets fulfilled
+        self.jobs_polling_precondition.append(jobItem)
+        if not self.preconditionPollTimer.isActive():
+            self.preconditionPollTimer.start()
+
+
+    def scheduleJobsWaitingFor(self, taskGroup: MgExecTaskGroup) -> None:
+        '''Called when a task group starts or finishes, to schedule again the jobs depending on it'''
+        for jobItem in self.jobs_waiting_for.pop(taskGroup, []):
+            self.scheduleJob(jobItem)
+
+
+    def slotPollPreconditions(self) -> None:
+        '''Check again the preconditions which can not be notified'''
+        jobItems = self.jobs_polling_precondition
+        self.jobs_polling_precondition = []
+        for jobItem in jobItems:
+            self.scheduleJob(jobItem)
         self.startNewJobs()
 
 
     def startNewJobs(self) -> None:
+        '''Start the jobs of the ready queue, within the limit of the number of git processes.
+
+        Two jobs are not started in less than delta_between_concurrent_git_run seconds, a timer
+        calls back this method when the next job can be started.'''
         dbg('startNewJobs')
         if self.abort_requested:
             dbg('startNewJobs() - Avoid starting new jobs because abort was requested')
             return
 
-        nb_jobs_started = 0
-        nb_jobs_blocked_by_precondition = 0
-        max_git_process = mgc.get_config_instance().get(mgc.CONFIG_NB_GIT_PROC, 0)
-        for jobItem in self.getAllJobItems():
-            if max_git_process and self.nb_jobs_running == max_git_process:
+        max_git_process = self.maxGitProcess()
+        while self.ready_jobs:
+            if max_git_process and self.nb_jobs_running >= max_git_process:
                 dbg('startNewJobs() - max number of process reached')
-                # we have reach our maximum
+                # we have reached our maximum, the next job completion will call us back
                 return
 
             if MgAuthFailureMgr.isUserDialogShowing():
                 dbg('startNewJobs() - Avoid starting new jobs because a git authentication failure dialog is showing')
-                QTimer.singleShot(1000, self.startNewJobs)
+                self.jobStartTimer.start(AUTH_DIALOG_POLLING_INTERVAL)
+                return
+
+            # leave some time between each run of process, else you get a git crash
+            # this is a git/cygwin concurrency issue so limit the concurrency here
+            # also, it is better visually.
+            cur_time = time.time()
+            remaining_delay = self.last_started_job_time + self.delta_between_concurrent_git_run - cur_time
+            if remaining_delay > 0:
+                if not self.jobStartTimer.isActive():
+                    self.jobStartTimer.start(int(remaining_delay * 1000) + 1)
                 return
 
+            jobItem = self.ready_jobs.popleft()
+            if jobItem.isStarted or jobItem.abortRequested:
+                # job was started or aborted since it was put in the queue
+                continue
 
-            dbg('startNewJobs() - looking at job to start: %s' % jobItem)
-            if not jobItem.isStarted:
-                if jobItem.taskGroup.is_precondition_fulfilled() == PreConditionState.NotFulfilled :
-                    dbg(f'startNewjobs() - condition not fullfilled for {jobItem.taskGroup}, choosing the next one')
-                    nb_jobs_blocked_by_precondition += 1
-                    continue
+            dbg('startNewJobs() - actually starting: %s' % jobItem)
+            self.last_started_job_time = cur_time
+            self.nb_jobs_running += 1
+            self.started_task_groups[jobItem.taskGroup] = cur_time
+            jobItem.run()
+            self.scheduleJobsWaitingFor(jobItem.taskGroup)
 
-                if jobItem.taskGroup.is_precondition_fulfilled() == PreConditionState.Errored :
-                    dbg(f'startNewjobs() - condition already in error for {jobItem.taskGroup}, aborting the item')
-                    jobItem.abortItem()
-                    continue
 
-                # condition is fulfilled, we can start
-
-                # leave some time between each run of process, else you get a git crash
-                # this is a git/cygwin concurrency issue so limit the concurrency here
-                # also, it is better visually.
-                cur_time = time.time()
-                while cur_time - self.last_started_job_time < self.delta_between_concurrent_git_run:
-                    QApplication.processEvents()
-                    cur_time = time.time()
-
-                # note: the processEvent() call may catch another job finishing, triggering
-                #       a call to startNewJobs() in parallel to the currently running one.
-                #       This in-between call may start the job which we are currently looking at, or
-                #       an abort request from the user can be propagated in the meantine.
-                #       So be sure to check again that the job is not started.
-
-                if jobItem.isStarted:
-                    # job was started in the interim
-                    dbg('startNewJobs() - job started while we were waiting: {}'.format(jobItem))
-                    dbg('startNewJobs() - proceed to the next job')
-                    return
-
-                if jobItem.abortRequested:
-                    # job was aborted in the interim
-                    dbg('startNewJobs() - job aborted while we were waiting: {}'.format(jobItem))
-                    dbg('startNewJobs() - proceed to the next job')
-                    return
-
-                dbg('startNewJobs() - actually starting: %s' % jobItem)
-                self.last_started_job_time = cur_time
-                self.nb_jobs_running += 1
-                nb_jobs_started += 1
-                jobItem.run()
-
-        if nb_jobs_blocked_by_precondition > 0 and not self.abort_requested \
-                and (not max_git_process or self.nb_jobs_running < max_git_process):
-            # we have room to start new jobs, but we did not do it, certainly because of non fulfilled
-            # preconditions. In this case, let's give some delay for the preconditions and call back this
-            # method again.
-            # If we don't to this, we rely on job completion to call startNewJobs(), but some precondition
-            # can fulfill before any job completion.
-            dbg('startNewJobs() - give a chance to start jobs again in one second')
-            QTimer.singleShot(1000, self.startNewJobs)
-            return
+    def isConcurrencyAdaptive(self) -> bool:
+        return bool(mgc.get_config_instance().get(mgc.CONFIG_NB_GIT_PROC, mgc.NB_GIT_PROC_UNLIMITED) == mgc.NB_GIT_PROC_ADAPTIVE)
+
+
+    def maxGitProcess(self) -> int:
+        '''Return the maximum number of git processes to run concurrently, 0 meaning unlimited'''
+        if self.isConcurrencyAdaptive():
+            return get_adaptive_concurrency_instance().limit
+        return cast(int, mgc.get_config_instance().get(mgc.CONFIG_NB_GIT_PROC, mgc.NB_GIT_PROC_UNLIMITED))
 
 
     def getAllJobItems(self) -> List[MgExecItemMultiCmd]:
@@ -325,11 +384,19 @@ class MgExecWindow(QDialog):
         self.ui.buttonBox.button(QDialogButtonBox.StandardButton.Ok).setEnabled(completed)
 
 
-    def oneMoreJobDone(self, success: bool) -> None:
+    def oneMoreJobDone(self, success: bool, taskGroup: MgExecTaskGroup) -> None:
         '''Called when one job is completed, with the success status'''
         dbg(f'oneMoreJobDone(success={success})')
         self.nb_jobs_done += 1
-        self.nb_jobs_running -= 1
+        if taskGroup in self.started_task_groups:
+            # jobs aborted before being started were not counted as running
+            self.nb_jobs_running -= 1
+            start_time = self.started_task_groups.pop(taskGroup)
+            if self.isConcurrencyAdaptive() and not taskGroup.is_aborted():
+                gitTasks = [task for task in taskGroup.tasks if isinstance(task, MgExecTaskGit)]
+                get_adaptive_concurrency_instance().job_done(time.time() - start_time,
+                                                             crashed=any(task.git_crashed for task in gitTasks),
+                                                             auth_failed=any(task.git_auth_failed for task in gitTasks))
         if self.nb_jobs_done == self.nb_jobs:
             # we are done !
             self.duration = time.time() - self.first_started_job_time
@@ -340,6 +407,8 @@ class MgExecWindow(QDialog):
         self.updateProgress()
         self.autoAdjustColumnSize()
 
+        self.scheduleJobsWaitingFor(taskGroup)
+
         if not self.abort_requested and self.nb_jobs_done < self.nb_jobs:
             # we have not started all our jobs (probably because of the MAX_PROCESS limitation),
             # start the remaining ones
@@ -351,6 +420,11 @@ class MgExecWindow(QDialog):
         '''Triggered when abort is requested'''
         dbg('Aborting...')
         self.abort_requested = True
+        self.jobStartTimer.stop()
+        self.preconditionPollTimer.stop()
+        self.ready_jobs.clear()
+        self.jobs_waiting_for.clear()
+        self.jobs_polling_precondition.clear()
         for topLevelIdx in range(self.ui.treeGitJobs.topLevelItemCount()-1, -1, -1):
             topLevel = self.ui.treeGitJobs.topLevelItem(topLevelIdx)
             assert topLevel is not None
@@ -0,0 +1,491 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+'''Persistent "git cat-file --batch" workers, to read objects of a repository without starting one git process
+for each lookup, and the rendering of the last commit like "git log -1 --decorate=short" from these objects.'''
+
+from typing import Callable, Dict, List, Optional, Tuple
+import os, re, time, logging, threading, subprocess, codecs, datetime
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+from src.mg_exec_core import MgExecutable, GitProgram, build_cmd_line, subprocess_creationflags
+from src.mg_git_refs import MgGitRefs, global_git_config
+
+logger = logging.getLogger('mg_git_cat_file')
+dbg = logger.debug
+warn = logger.warning
+
+# maximum number of cat-file processes open at the same time, for all the repositories
+CAT_FILE_MAX_WORKERS = 16
+
+# a cat-file process not used for this time (in seconds) is closed
+CAT_FILE_IDLE_TIMEOUT = 60.0
+
+# maximum number of objects requested before reading the answers, so that the pipe to git never fills up
+CAT_FILE_MAX_PIPELINED = 256
+
+# (sha1, type, content) of an object, or None if the object does not exist
+GitObject = Optional[Tuple[str, str, bytes]]
+
+# references shown by default by "git log --decorate", with the short name git displays for them
+DECORATION_PREFIXES = [('refs/heads/', ''), ('refs/remotes/', ''), ('refs/tags/', 'tag: ')]
+DECORATION_REFS = ['refs/stash']
+
+# references which change the output of "git log": notes are displayed, objects are replaced
+LOG_CHANGING_REF_PREFIXES = ('refs/notes/', 'refs/replace/')
+
+# configuration sections which change the output of "git log"
+LOG_CONFIG_SECTIONS = ['log', 'format', 'pretty', 'mailmap', 'i18n', 'notes']
+
+# git log expands the tabs of the commit message with this tab size
+LOG_TAB_SIZE = 8
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+re_ident = re.compile(r'^(.*<.*>) (\d+) ([+-])(\d\d)(\d\d)$')
+
+
+@lru_cache(maxsize=1)
+def get_cat_file_pool() -> 'MgCatFilePool':
+    '''Return the pool of cat-file workers, shared by all repositories'''
+    return MgCatFilePool(GitProgram.get_executable)
+
+
+class MgCatFileWorker:
+    '''A "git cat-file --batch" process kept open for one repository.
+
+    Each lookup costs a round trip on the pipe of the process instead of starting git.'''
+
+    def __init__(self, repo_fullpath: str, git_exec: MgExecutable) -> None:
+        self.repo_fullpath = repo_fullpath
+        self.cmd_line = build_cmd_line(git_exec, ['-C', repo_fullpath, 'cat-file', '--batch'])
+        self.process: Optional['subprocess.Popen[bytes]'] = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+    def start(self) -> bool:
+        '''Start the cat-file process, return whether it could be started'''
+        dbg(f'start() - {self.cmd_line}')
+        try:
+            self.process = subprocess.Popen(self.cmd_line, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL, creationflags=subprocess_creationflags())
+        except OSError as exc:
+            warn(f'Could not start git cat-file for {self.repo_fullpath}: {exc}')
+            return False
+        return True
+
+
+    def close(self) -> None:
+        '''Stop the cat-file process'''
+        if self.process is None:
+            return
+        dbg(f'close() - {self.repo_fullpath}')
+        process, self.process = self.process, None
+        try:
+            assert process.stdin
+            process.stdin.close()
+        except OSError:
+            pass
+        try:
+            process.wait(1)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+    def read_objects(self, revs: List[str]) -> Optional[List[GitObject]]:
+        '''Return the objects designated by the revisions (sha1, reference, <rev>^{}, <rev>:<path>, ...),
+        with None for the revisions which do not designate an object.
+
+        Return None if git cat-file failed, the worker is then closed.
+        '''
+        with self.lock:
+            self.last_used = time.monotonic()
+            if self.process is None or self.process.poll() is not None:
+                return None
+
+            assert self.process.stdin and self.process.stdout
+            objects: List[GitObject] = []
+            try:
+                for chunk_start in range(0, len(revs), CAT_FILE_MAX_PIPELINED):
+                    chunk = revs[chunk_start:chunk_start+CAT_FILE_MAX_PIPELINED]
+                    self.process.stdin.write(''.join(rev + '\n' for rev in chunk).encode('utf8'))
+                    self.process.stdin.flush()
+                    for _rev in chunk:
+                        objects.append(self.read_response())
+            except OSError as exc:
+                warn(f'git cat-file failed for {self.repo_fullpath}: {exc}')
+                self.close()
+                return None
+
+            return objects
+
+
+    def read_response(self) -> GitObject:
+        '''Read the answer to one request: "<sha1> <type> <size>" followed by the content, or "<rev> missing"'''
+        assert self.process and self.process.stdout
+        header = self.process.stdout.readline()
+        if not header.endswith(b'\n'):
+            raise OSError('git cat-file has exited')
+
+        fields = header.decode('utf8', errors='replace').split()
+        if len(fields) != 3 or not fields[2].isdigit():
+            # missing or ambiguous
+            return None
+
+        size = int(fields[2])
+        content = self.process.stdout.read(size + 1)
+        if len(content) != size + 1:
+            raise OSError('git cat-file output is truncated')
+        return fields[0], fields[1], content[:-1]
+
+
+class MgCatFilePool:
+    '''The cat-file workers of the repositories, created on first use.
+
+    At most max_workers workers are open, the least recently used one is closed to open a new one. A worker
+    is also closed after idle_timeout seconds without being used.
+    '''
+
+    def __init__(self, git_exec_getter: Callable[[], MgExecutable],
+                 max_workers: int = CAT_FILE_MAX_WORKERS, idle_timeout: float = CAT_FILE_IDLE_TIMEOUT) -> None:
+        self.git_exec_getter = git_exec_getter
+        self.max_workers = max_workers
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.workers: 'OrderedDict[str, MgCatFileWorker]' = OrderedDict()
+        self.reaper: Optional[threading.Thread] = None
+
+
+    def __len__(self) -> int:
+        return len(self.workers)
+
+
+    def read_objects(self, repo_fullpath: str, revs: List[str]) -> Optional[List[GitObject]]:
+        '''Read objects of the repository with its worker, see MgCatFileWorker.read_objects()
+
+        Return None if the objects could not be read this way, the caller should then run git.'''
+        if not revs:
+            return []
+
+        worker = self.get_worker(repo_fullpath)
+        if worker is None:
+            return None
+
+        objects = worker.read_objects(revs)
+        if objects is None:
+            with self.lock:
+                if self.workers.get(repo_fullpath) is worker:
+                    del self.workers[repo_fullpath]
+        return objects
+
+
+    def get_worker(self, repo_fullpath: str) -> Optional[MgCatFileWorker]:
+        '''Return the worker of the repository, starting it if needed'''
+        evicted: List[MgCatFileWorker] = []
+        with self.lock:
+            worker = self.workers.get(repo_fullpath)
+            if worker is not None:
+                self.workers.move_to_end(repo_fullpath)
+                return worker
+
+            git_exec = self.git_exec_getter()
+            if git_exec.is_empty():
+                return None
+
+            while len(self.workers) >= self.max_workers:
+                evicted.append(self.workers.popitem(last=False)[1])
+
+            worker = MgCatFileWorker(repo_fullpath, git_exec)
+            if worker.start():
+                self.workers[repo_fullpath] = worker
+                self.start_reaper()
+            else:
+                worker = None
+
+        for evicted_worker in evicted:
+            with evicted_worker.lock:
+                evicted_worker.close()
+        return worker
+
+
+    def start_reaper(self) -> None:
+        '''Start the thread closing the idle workers, if not running'''
+        if self.reaper is not None and self.reaper.is_alive():
+            return
+        self.reaper = threading.Thread(target=self.reap_idle_workers, name='mg_cat_file_reaper', daemon=True)
+        self.reaper.start()
+
+
+    def reap_idle_workers(self) -> None:
+        '''Thread closing the idle workers, running as long as some workers are open'''
+        while True:
+            time.sleep(self.idle_timeout / 2)
+            self.close_idle_workers()
+            with self.lock:
+                if not self.workers:
+                    self.reaper = None
+                    return
+
+
+    def close_idle_workers(self) -> None:
+        '''Close the workers not used for idle_timeout seconds'''
+        now = time.monotonic()
+        with self.lock:
+            idle = [repo_fullpath for repo_fullpath, worker in self.workers.items()
+                    if now - worker.last_used > self.idle_timeout]
+            idle_workers = [self.workers.pop(repo_fullpath) for repo_fullpath in idle]
+
+        for worker in idle_workers:
+            with worker.lock:
+                worker.close()
+
+
+    def close_workers_under(self, dir_paths: List[str]) -> None:
+        '''Close the workers of the repositories inside these directories, before the directories are deleted'''
+        dir_paths = [os.path.normcase(os.path.abspath(dir_path)) for dir_path in dir_paths]
+
+        def is_under(repo_fullpath: str) -> bool:
+            repo_fullpath = os.path.normcase(os.path.abspath(repo_fullpath))
+            return any(repo_fullpath == dir_path or repo_fullpath.startswith(dir_path.rstrip(os.sep) + os.sep)
+                       for dir_path in dir_paths)
+
+        with self.lock:
+            workers = [self.workers.pop(repo_fullpath) for repo_fullpath in list(self.workers) if is_under(repo_fullpath)]
+
+        for worker in workers:
+            with worker.lock:
+                worker.close()
+
+
+    def close_all(self) -> None:
+        '''Close all the workers'''
+        with self.lock:
+            workers = list(self.workers.values())
+            self.workers.clear()
+
+        for worker in workers:
+            with worker.lock:
+                worker.close()
+
+
+def refs_pointing_at(repo_fullpath: str, git_refs: MgGitRefs, refs: Dict[str, str], sha1: str,
+                     pool: MgCatFilePool) -> Optional[List[str]]:
+    '''Return the sorted list of references pointing to the commit, directly or through an annotated tag.
+    refs are all the references of the repository, as returned by MgGitRefs.list_refs()
+
+    Return None if this could not be determined without running git.'''
+    result = [refname for refname, ref_sha1 in refs.items() if ref_sha1 == sha1]
+
+    # annotated tags point to a tag object, pointing to the commit
+    packed_peeled = git_refs.read_packed_refs_peeled()
+    to_peel = []
+    for refname, ref_sha1 in refs.items():
+        if ref_sha1 == sha1 or not refname.startswith('refs/tags/'):
+            continue
+        if git_refs.read_loose_ref(refname) is None:
+            if refname in packed_peeled:
+                if packed_peeled[refname] == sha1:
+                    result.append(refname)
+                continue
+            if git_refs.packed_refs_fully_peeled:
+                # not an annotated tag
+                continue
+        to_peel.append(refname)
+
+    peeled_objects = pool.read_objects(repo_fullpath, [refs[refname] + '^{}' for refname in to_peel])
+    if peeled_objects is None:
+        return None
+    result.extend(refname for refname, obj in zip(to_peel, peeled_objects) if obj is not None and obj[0] == sha1)
+
+    return sorted(result)
+
+
+def format_decorations(head_ref: str, refnames: List[str]) -> Optional[str]:
+    '''Return the decoration displayed by "git log --decorate=short" for the commit HEAD points to,
+    for example: " (HEAD -> main, tag: v1.0, origin/main)"
+
+    head_ref is the branch reference HEAD points to, or an empty string when HEAD is detached.
+    refnames are the references pointing to the commit.
+
+    Return None if some references are not decorated the same way by all git versions.
+    '''
+    decorations = []
+    # git lists the references in reverse order
+    for refname in sorted(refnames, reverse=True):
+        if refname == head_ref:
+            continue
+        if refname in DECORATION_REFS:
+            decorations.append(refname)
+            continue
+        for prefix, display_prefix in DECORATION_PREFIXES:
+            if refname.startswith(prefix):
+                decorations.append(display_prefix + refname[len(prefix):])
+                break
+        else:
+            # recent git versions do not show other references by default, older versions do
+            return None
+
+    if head_ref:
+        decorations.insert(0, 'HEAD -> ' + head_ref[len('refs/heads/'):])
+    else:
+        decorations.insert(0, 'HEAD')
+    return ' (%s)' % ', '.join(decorations)
+
+
+def format_git_date(timestamp: int, tz_sign: str, tz_hours: str, tz_minutes: str) -> str:
+    '''Format a date like the default date format of git: "Tue Mar 5 08:09:10 2024 +0530"'''
+    offset = datetime.timedelta(hours=int(tz_hours), minutes=int(tz_minutes))
+    if tz_sign == '-':
+        offset = -offset
+    dt = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc) + offset
+    return '%s %s %d %02d:%02d:%02d %d %s%s%s' % (WEEKDAYS[dt.weekday()], MONTHS[dt.month-1], dt.day,
+                                                   dt.hour, dt.minute, dt.second, dt.year, tz_sign, tz_hours, tz_minutes)
+
+
+def format_log_entry(sha1: str, commit_content: bytes, decorations: str) -> Optional[str]:
+    '''Return the output of "git log -1 --decorate=short" for a commit, from the content of the commit object.
+
+    Return None for the commits which can not be displayed exactly like git does: merge commits (git abbreviates
+    the parents depending on the size of the repository), unknown encodings or unusual author lines.
+    '''
+    raw_headers, sep, raw_message = commit_content.partition(b'\n\n')
+    if not sep:
+        return None
+
+    headers: Dict[bytes, bytes] = {}
+    nb_parents = 0
+    for header_line in raw_headers.split(b'\n'):
+        if header_line.startswith(b' '):
+            # continuation of a multi-line header, like a signature
+            continue
+        key, _, value = header_line.partition(b' ')
+        if key == b'parent':
+            nb_parents += 1
+        headers[key] = value
+    if nb_parents > 1 or b'author' not in headers:
+        return None
+
+    encoding = headers.get(b'encoding', b'utf-8').decode('ascii', errors='replace')
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        return None
+
+    mo = re_ident.match(headers[b'author'].decode(encoding, errors='replace'))
+    if mo is None:
+        return None
+    try:
+        date = format_git_date(int(mo.group(2)), mo.group(3), mo.group(4), mo.group(5))
+    except (OverflowError, ValueError, OSError):
+        return None
+
+    lines = [line.rstrip() for line in raw_message.decode(encoding, errors='replace').split('\n')]
+    while lines and not lines[0]:
+        lines.pop(0)
+    while lines and not lines[-1]:
+        lines.pop()
+    for idx, line in enumerate(lines):
+        if '\t' in line:
+            if not line.isascii():
+                # git expands the tabs according to the display width of the characters
+                return None
+            lines[idx] = line.expandtabs(LOG_TAB_SIZE)
+
+    log_lines = ['commit %s%s' % (sha1, decorations),
+                 'Author: %s' % mo.group(1),
+                 'Date:   %s' % date]
+    if lines:
+        log_lines.append('')
+        log_lines.extend('    ' + line for line in lines)
+    return '\n'.join(log_lines).replace('\r', '\n') + '\n'
+
+
+def log_output_is_default(repo_fullpath: str, git_refs: MgGitRefs) -> bool:
+    '''Return whether "git log" uses its default output format in this repository, so that its output can
+    be reproduced with format_log_entry()'''
+    global_entries = global_git_config()
+    if global_entries is None or any(section in LOG_CONFIG_SECTIONS
+                                     for section, _subsection, _key, _value in global_entries):
+        return False
+
+    # None when the repository configuration includes other files
+    entries = git_refs.config()
+    if entries is None or any(section in LOG_CONFIG_SECTIONS for section, _subsection, _key, _value in entries):
+        return False
+
+    if (Path(repo_fullpath) / '.mailmap').exists():
+        return False
+
+    assert git_refs.common_dir is not None
+    if any((git_refs.common_dir / fname).exists() for fname in ['shallow', 'info/grafts']):
+        # git log decorates the commits at the boundary of a shallow clone with "grafted"
+        return False
+
+    return True
+
+
+def read_head_tags(repo_fullpath: str, pool: MgCatFilePool) -> Optional[List[str]]:
+    '''Return the tags pointing to HEAD, sorted like "git tag --points-at HEAD" does.
+
+    Return None if this could not be determined without running git.'''
+    git_refs = MgGitRefs(repo_fullpath)
+    head_sha1 = git_refs.head_sha1()
+    refs = git_refs.list_refs()
+    if not head_sha1 or refs is None:
+        return None
+
+    refnames = refs_pointing_at(repo_fullpath, git_refs, refs, head_sha1, pool)
+    if refnames is None:
+        return None
+    return [refname[len('refs/tags/'):] for refname in refnames if refname.startswith('refs/tags/')]
+
+
+def read_last_commit(repo_fullpath: str, pool: MgCatFilePool) -> Optional[str]:
+    '''Return the output of "git log -1 --decorate=short" for the repository, built from the objects read
+    with its cat-file worker.
+
+    Return None if the output could not be built exactly like git would, git log should then be run.'''
+    git_refs = MgGitRefs(repo_fullpath)
+    head = git_refs.head()
+    if head is None or not head[1]:
+        # no commit yet, or HEAD can not be read
+        return None
+
+    refs = git_refs.list_refs()
+    if refs is None or any(refname.startswith(LOG_CHANGING_REF_PREFIXES) for refname in refs):
+        return None
+
+    if not log_output_is_default(repo_fullpath, git_refs):
+        return None
+
+    head_ref, head_sha1 = head
+    refnames = refs_pointing_at(repo_fullpath, git_refs, refs, head_sha1, pool)
+    if refnames is None:
+        return None
+    decorations = format_decorations(head_ref, refnames)
+    if decorations is None:
+        return None
+
+    objects = pool.read_objects(repo_fullpath, [head_sha1])
+    if not objects or objects[0] is None or objects[0][1] != 'commit':
+        return None
+    return format_log_entry(head_sha1, objects[0][2], decorations)
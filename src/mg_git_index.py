@@ -0,0 +1,255 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+from typing import Iterator, List, Optional, Sequence, Tuple, Union, overload
+import os, mmap, struct, logging
+from array import array
+from pathlib import Path
+
+from src.mg_git_refs import MgGitRefs
+
+logger = logging.getLogger('mg_git_index')
+dbg = logger.debug
+
+INDEX_SIGNATURE = b'DIRC'
+SUPPORTED_INDEX_VERSIONS = (2, 3, 4)
+
+# ctime, mtime, dev, ino, mode, uid, gid, size: 10 x 32 bits
+ENTRY_STAT_SIZE = 40
+SHA1_SIZE = 20
+ENTRY_FLAG_EXTENDED = 0x4000
+ENTRY_FLAG_STAGE_MASK = 0x3000
+
+# extensions which change the meaning of the entries: split index and sparse index
+UNSUPPORTED_EXTENSIONS = (b'link', b'sdir')
+
+# signature, version, number of entries
+INDEX_HEADER = struct.Struct('>4sII')
+ENTRY_FLAGS = struct.Struct('>H')
+
+
+def decode_varint(buf: 'mmap.mmap', pos: int) -> Tuple[int, int]:
+    '''Decode a variable length integer, as written by git in the version 4 of the index.
+    Return the value and the position after it.'''
+    c = buf[pos]
+    pos += 1
+    value = c & 0x7f
+    while c & 0x80:
+        c = buf[pos]
+        pos += 1
+        value = ((value + 1) << 7) + (c & 0x7f)
+    return value, pos
+
+
+class MgGitIndex(Sequence[Tuple[str, str]]):
+    '''The files of a git index with the sha1 of their blob, sorted by file name like git does.
+
+    Items are tuples (file name, sha1). The entries are stored in compact buffers instead of python objects:
+    all the file names in one bytes object, all the sha1 in another one, and the offsets of the file names in an
+    array. A repository with 200k files needs a few MB only.
+
+    Use read() to read the index file of a repository directly. The index is mapped in memory for the time of
+    the parsing only, so that git can replace it at any time.
+    '''
+
+    def __init__(self, paths: bytes = b'', path_offsets: Optional['array[int]'] = None, sha1s: bytes = b'',
+                 index_path: Optional[Path] = None, index_stat: Optional[Tuple[int, int, int]] = None,
+                 checksum: bytes = b'') -> None:
+        self.paths = paths
+        # offset of the start of each path in self.paths, plus the end offset of the last path
+        self.path_offsets: 'array[int]' = path_offsets if path_offsets is not None else array('L', [0])
+        self.sha1s = sha1s
+
+        # to check whether the index file changed since it was read
+        self.index_path = index_path
+        self.index_stat = index_stat
+        self.checksum = checksum
+
+
+    @classmethod
+    def from_entries(cls, entries: List[Tuple[str, str]]) -> 'MgGitIndex':
+        '''Build the index from a list of (file name, sha1) tuples, as reported by git ls-files -s'''
+        entries = sorted(entries, key=lambda entry: entry[0].encode('utf8'))
+        encoded_paths = [fname.encode('utf8') for fname, _sha1 in entries]
+        path_offsets = array('L', [0])
+        for encoded_path in encoded_paths:
+            path_offsets.append(path_offsets[-1] + len(encoded_path))
+        sha1s = b''.join(bytes.fromhex(sha1) for _fname, sha1 in entries)
+        return cls(b''.join(encoded_paths), path_offsets, sha1s)
+
+
+    @classmethod
+    def read(cls, repo_fullpath: str) -> Optional['MgGitIndex']:
+        '''Read the index file of the repository.
+
+        Return an empty index if the repository has no index file yet, or None if the index can not be read
+        this way (unsupported format or extension, repository using sha256), git should then be used.
+        '''
+        git_refs = MgGitRefs(repo_fullpath)
+        if git_refs.git_dir is None:
+            return None
+        object_format = git_refs.config_values('extensions', '', 'objectformat')
+        if object_format not in ([], ['sha1']):
+            return None
+
+        index_path = git_refs.git_dir / 'index'
+        try:
+            with open(index_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                if st.st_size == 0:
+                    return None
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    index = cls.parse(buf)
+        except FileNotFoundError:
+            # no file added yet
+            return cls()
+        except (OSError, ValueError, IndexError, struct.error) as exc:
+            dbg(f'Could not read index {index_path}: {exc}')
+            return None
+
+        if index is not None:
+            index.index_path = index_path
+            index.index_stat = (st.st_size, st.st_mtime_ns, st.st_ino)
+        return index
+
+
+    @classmethod
+    def parse(cls, buf: 'mmap.mmap') -> Optional['MgGitIndex']:
+        '''Parse the content of an index file. Return None if the index uses features which are not supported.
+        Raise ValueError if the index is corrupted.'''
+        signature, version, nb_entries = INDEX_HEADER.unpack_from(buf, 0)
+        if signature != INDEX_SIGNATURE:
+            raise ValueError('not an index file')
+        if version not in SUPPORTED_INDEX_VERSIONS:
+            return None
+
+        paths = bytearray()
+        path_offsets = array('L', [0])
+        sha1s = bytearray()
+        previous_path = b''
+        pos = INDEX_HEADER.size
+        for _i in range(nb_entries):
+            entry_start = pos
+            sha1_pos = pos + ENTRY_STAT_SIZE
+            sha1s += buf[sha1_pos:sha1_pos + SHA1_SIZE]
+            flags, = ENTRY_FLAGS.unpack_from(buf, sha1_pos + SHA1_SIZE)
+            pos = sha1_pos + SHA1_SIZE + ENTRY_FLAGS.size
+            if flags & ENTRY_FLAG_EXTENDED:
+                # extended flags, only in version 3 and later
+                pos += ENTRY_FLAGS.size
+
+            if version == 4:
+                # the path is compressed: number of bytes to remove from the previous path, then the suffix
+                nb_removed, pos = decode_varint(buf, pos)
+                end = buf.find(b'\0', pos)
+                if end == -1 or nb_removed > len(previous_path):
+                    raise ValueError('corrupted entry')
+                path = previous_path[:len(previous_path) - nb_removed] + buf[pos:end]
+                pos = end + 1
+            else:
+                end = buf.find(b'\0', pos)
+                if end == -1:
+                    raise ValueError('corrupted entry')
+                path = buf[pos:end]
+                # entries are padded with 1 to 8 NUL bytes to a multiple of 8 bytes
+                pos = entry_start + ((pos - entry_start + len(path) + 8) & ~7)
+
+            paths += path
+            path_offsets.append(len(paths))
+            previous_path = path
+
+        # extensions, followed by the checksum of the file
+        checksum_pos = len(buf) - SHA1_SIZE
+        while pos + 8 <= checksum_pos:
+            ext_signature = buf[pos:pos + 4]
+            ext_size, = struct.unpack_from('>I', buf, pos + 4)
+            if ext_signature in UNSUPPORTED_EXTENSIONS:
+                return None
+            pos += 8 + ext_size
+
+        return cls(bytes(paths), path_offsets, bytes(sha1s), checksum=buf[checksum_pos:])
+
+
+    def __len__(self) -> int:
+        return len(self.path_offsets) - 1
+
+
+    @overload
+    def __getitem__(self, idx: int) -> Tuple[str, str]: ...
+    @overload
+    def __getitem__(self, idx: slice) -> Sequence[Tuple[str, str]]: ...
+
+    def __getitem__(self, idx: Union[int, slice]) -> Union[Tuple[str, str], Sequence[Tuple[str, str]]]:
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('index entry out of range')
+        return self.path(idx), self.sha1(idx)
+
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        for idx in range(len(self)):
+            yield self.path(idx), self.sha1(idx)
+
+
+    def encoded_path(self, idx: int) -> bytes:
+        return self.paths[self.path_offsets[idx]:self.path_offsets[idx + 1]]
+
+
+    def path(self, idx: int) -> str:
+        return self.encoded_path(idx).decode('utf8', errors='replace')
+
+
+    def sha1(self, idx: int) -> str:
+        return self.sha1s[idx * SHA1_SIZE:(idx + 1) * SHA1_SIZE].hex()
+
+
+    def sha1_of(self, fname: str) -> Optional[str]:
+        '''Return the sha1 of the blob of this file, or None if the file is not in the index.
+        For a conflicted file, the sha1 of the first stage is returned.'''
+        encoded_fname = fname.encode('utf8')
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.encoded_path(mid) < encoded_fname:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self) and self.encoded_path(lo) == encoded_fname:
+            return self.sha1(lo)
+        return None
+
+
+    def is_up_to_date(self) -> bool:
+        '''Return whether the index file of the repository is still the one which was read. This is cheap: the
+        file is not read, except for its checksum.
+
+        Always False for an index which was not read from a file.'''
+        if self.index_path is None or self.index_stat is None:
+            return False
+        try:
+            with open(self.index_path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                if (st.st_size, st.st_mtime_ns, st.st_ino) != self.index_stat:
+                    return False
+                f.seek(-SHA1_SIZE, os.SEEK_END)
+                return f.read(SHA1_SIZE) == self.checksum
+        except OSError:
+            return False
@@ -0,0 +1,684 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+from typing import Dict, List, Optional, Tuple, Sequence
+import os, re, sys, shutil, logging
+from pathlib import Path
+from functools import lru_cache
+
+from src.mg_exec_core import GitProgram, CmdType, isRunningInsideFlatpak
+
+logger = logging.getLogger('mg_git_refs')
+dbg = logger.debug
+
+# references stored in the git directory of a worktree, all other references are shared by the worktrees
+PER_WORKTREE_REF_PREFIXES = ('refs/bisect/', 'refs/worktree/', 'refs/rewritten/')
+
+# rules used by git to find a reference from a short name, in order
+REF_PARSE_RULES = ['%s', 'refs/%s', 'refs/tags/%s', 'refs/heads/%s', 'refs/remotes/%s', 'refs/remotes/%s/HEAD']
+
+# a symbolic reference pointing to another symbolic reference, and so on...
+MAX_SYMREF_DEPTH = 5
+
+# files of the git directory which indicate that HEAD is detached by an operation in progress
+OPERATION_IN_PROGRESS_FILES = ['rebase-merge', 'rebase-apply', 'BISECT_LOG']
+
+re_sha1 = re.compile('^[0-9a-f]{40}([0-9a-f]{24})?$')
+# characters and sequences which can not appear in a reference name
+re_invalid_ref_name = re.compile(r'\.\.|[\x00-\x20~^:?*\[\\\x7f]|^/|/$|@\{|//')
+re_checkout_reflog = re.compile('checkout: moving from .*? to (.+)$')
+
+# (section, subsection, key, value), with section and key lowercase
+ConfigEntry = Tuple[str, str, str, str]
+
+# environment variables giving configuration entries to git, which we do not interpret
+GIT_CONFIG_ENV_ENTRIES = ['GIT_CONFIG_COUNT', 'GIT_CONFIG_PARAMETERS']
+
+# installation sub-directories of git for Windows containing the git executable in bin/
+WIN32_GIT_SUBDIRS = ['mingw64', 'mingw32', 'clangarm64']
+
+
+def git_admin_dirs(repo_fullpath: str) -> List[Path]:
+    '''Return the git administrative directories of a repository: the directory containing HEAD and index,
+    followed by the common directory containing the refs if different (worktrees).
+
+    Handles .git being a file pointing to the real git directory (submodules, worktrees).
+    Return an empty list if the repository has no git directory.
+    '''
+    git_dir = Path(repo_fullpath) / '.git'
+    if git_dir.is_file():
+        try:
+            content = git_dir.read_text(encoding='utf8', errors='replace').strip()
+        except OSError:
+            return []
+        if not content.startswith('gitdir:'):
+            return []
+        git_dir = (Path(repo_fullpath) / content[7:].strip()).resolve()
+
+    if not git_dir.is_dir():
+        return []
+
+    admin_dirs = [git_dir]
+    commondir_file = git_dir / 'commondir'
+    if commondir_file.is_file():
+        try:
+            admin_dirs.append((git_dir / commondir_file.read_text(encoding='utf8', errors='replace').strip()).resolve())
+        except OSError:
+            pass
+    return admin_dirs
+
+
+def parse_git_config(content: str) -> Optional[List[ConfigEntry]]:
+    '''Parse the content of a git configuration file into a list of entries, in the order of the file.
+
+    Return None if the content could not be parsed.
+    '''
+    entries: List[ConfigEntry] = []
+    section, subsection = '', ''
+    lines = content.splitlines()
+    idx = 0
+    while idx < len(lines):
+        line = lines[idx].strip()
+        idx += 1
+        if not line or line[0] in '#;':
+            continue
+
+        if line[0] == '[':
+            end = line.find(']')
+            if end == -1:
+                return None
+            header = line[1:end].strip()
+            rest = line[end+1:].strip()
+            if rest and rest[0] not in '#;':
+                # git allows a variable after the section header, we don't
+                return None
+            if '"' in header:
+                # [section "subsection"], subsection is case sensitive
+                section, _, quoted = header.partition(' ')
+                quoted = quoted.strip()
+                if len(quoted) < 2 or quoted[0] != '"' or quoted[-1] != '"':
+                    return None
+                subsection = re.sub(r'\\(.)', r'\1', quoted[1:-1])
+            elif '.' in header:
+                # deprecated [section.subsection] syntax, subsection is lowercase
+                section, _, subsection = header.partition('.')
+                subsection = subsection.lower()
+            else:
+                section, subsection = header, ''
+            section = section.lower()
+            continue
+
+        if not section:
+            return None
+
+        key, sep, raw_value = line.partition('=')
+        key = key.strip().lower()
+        if not sep:
+            # boolean variable without value
+            entries.append((section, subsection, key, 'true'))
+            continue
+
+        # the value may be continued on the next lines with a trailing backslash
+        value: List[str] = []
+        in_quotes = False
+        pending_space = ''
+        raw_value = raw_value.lstrip()
+        while True:
+            pos = 0
+            continued = False
+            while pos < len(raw_value):
+                c = raw_value[pos]
+                pos += 1
+                if c == '\\':
+                    if pos == len(raw_value):
+                        continued = True
+                        break
+                    escaped = raw_value[pos]
+                    pos += 1
+                    if escaped not in 'ntb"\\':
+                        return None
+                    value.append(pending_space + {'n': '\n', 't': '\t', 'b': '\b'}.get(escaped, escaped))
+                    pending_space = ''
+                elif c == '"':
+                    in_quotes = not in_quotes
+                elif not in_quotes and c in '#;':
+                    break
+                elif not in_quotes and c in ' \t':
+                    # inner spaces are kept, trailing spaces are dropped
+                    if value:
+                        pending_space += c
+                else:
+                    value.append(pending_space + c)
+                    pending_space = ''
+
+            if not continued:
+                break
+            if idx == len(lines):
+                return None
+            raw_value = lines[idx]
+            idx += 1
+
+        if in_quotes:
+            return None
+        entries.append((section, subsection, key, ''.join(value)))
+
+    return entries
+
+
+def git_env_bool(var: str) -> bool:
+    '''Return the value of a boolean environment variable of git'''
+    return os.environ.get(var, '').strip().lower() not in ('', '0', 'false', 'no', 'off')
+
+
+def git_system_config_paths(git_path: str) -> List[Path]:
+    '''Return the possible locations of the system configuration of git, which depends on the installation
+    directory of the git executable git_path'''
+    full_path = shutil.which(git_path) if git_path else None
+    # <prefix>/bin/git, or <install>/cmd/git.exe and <install>/mingw64/bin/git.exe for git for Windows
+    prefix = Path(full_path).parent.parent if full_path else None
+
+    if sys.platform == 'win32':
+        paths = []
+        if os.environ.get('PROGRAMDATA'):
+            # read by git for Windows before its own system configuration
+            paths.append(Path(os.environ['PROGRAMDATA']) / 'Git' / 'config')
+        if prefix is None:
+            prefix = Path(os.environ.get('ProgramFiles', r'C:\Program Files')) / 'Git'
+        elif prefix.name.lower() in WIN32_GIT_SUBDIRS:
+            prefix = prefix.parent
+        paths.append(prefix / 'etc' / 'gitconfig')
+        # location used by git for Windows before 2.24
+        paths.append(prefix / 'mingw64' / 'etc' / 'gitconfig')
+        return paths
+
+    paths = [Path('/etc/gitconfig')]
+    if prefix is not None and str(prefix) not in ('/', '/usr'):
+        # git installed in /usr/local, /opt/homebrew, ...
+        paths.append(prefix / 'etc' / 'gitconfig')
+    return paths
+
+
+def global_git_config_paths(git_path: str) -> List[Path]:
+    '''Return the system and user configuration files of git, in the order git reads them, whether they
+    exist or not'''
+    paths: List[Path] = []
+    if not git_env_bool('GIT_CONFIG_NOSYSTEM'):
+        if os.environ.get('GIT_CONFIG_SYSTEM'):
+            paths.append(Path(os.environ['GIT_CONFIG_SYSTEM']))
+        else:
+            paths.extend(git_system_config_paths(git_path))
+
+    if os.environ.get('GIT_CONFIG_GLOBAL'):
+        paths.append(Path(os.environ['GIT_CONFIG_GLOBAL']))
+    else:
+        home = os.environ.get('HOME') or os.path.expanduser('~')
+        xdg_config_home = os.environ.get('XDG_CONFIG_HOME') or os.path.join(home, '.config')
+        paths.append(Path(xdg_config_home) / 'git' / 'config')
+        paths.append(Path(home) / '.gitconfig')
+    return paths
+
+
+def git_executable_path() -> str:
+    '''Return the path of the git executable used by Multigit, or an empty string if git is not run directly'''
+    git_exec = GitProgram.get_executable()
+    return git_exec.path if git_exec.cmd_type == CmdType.DirectCmd else ''
+
+
+def global_git_config(git_path: Optional[str] = None) -> Optional[Sequence[ConfigEntry]]:
+    '''Return the entries of the system and user configuration of git, in the order git reads them.
+
+    Return None if they can not be interpreted without git: entries given by environment variables, files which
+    can not be parsed or which include other files, git running outside of the flatpak sandbox.
+
+    The files are parsed again only when they are modified. git_path is the git executable, by default the one
+    configured in Multigit.
+    '''
+    if isRunningInsideFlatpak() or any(var in os.environ for var in GIT_CONFIG_ENV_ENTRIES):
+        return None
+
+    if git_path is None:
+        git_path = git_executable_path()
+    files_state = []
+    for config_path in global_git_config_paths(git_path):
+        try:
+            st = os.stat(config_path)
+        except OSError:
+            continue
+        files_state.append((config_path, st.st_mtime_ns, st.st_size))
+    return read_config_files(tuple(files_state))
+
+
+@lru_cache(maxsize=8)
+def read_config_files(files_state: Tuple[Tuple[Path, int, int], ...]) -> Optional[Tuple[ConfigEntry, ...]]:
+    '''Parse the configuration files, identified with their modification time and size so that the result
+    can be cached. Return None if one of them can not be interpreted without git.'''
+    entries: List[ConfigEntry] = []
+    for config_path, _mtime, _size in files_state:
+        try:
+            parsed = parse_git_config(config_path.read_text(encoding='utf8', errors='replace'))
+        except OSError:
+            return None
+        if parsed is None:
+            dbg(f'Could not parse {config_path}')
+            return None
+        entries.extend(parsed)
+
+    if any(section in ('include', 'includeif') for section, _subsection, _key, _value in entries):
+        # the configuration is spread over other files
+        return None
+    return tuple(entries)
+
+
+class MgGitRefs:
+    '''Read-only access to the references and the configuration of a repository, by reading directly the files
+    of its git directory instead of running git.
+
+    The methods return None when the answer can not be determined reliably this way: the caller should
+    then ask git.
+    '''
+
+    def __init__(self, repo_fullpath: str) -> None:
+        admin_dirs = git_admin_dirs(repo_fullpath)
+        self.git_dir: Optional[Path] = admin_dirs[0] if admin_dirs else None
+        self.common_dir: Optional[Path] = admin_dirs[-1] if admin_dirs else None
+
+        # read on demand
+        self.packed_refs: Optional[Dict[str, str]] = None
+        self.packed_refs_peeled: Dict[str, str] = {}
+        self.packed_refs_fully_peeled = False
+        self.config_entries: Optional[List[ConfigEntry]] = None
+        self.config_read = False
+
+
+    def read_file(self, path: Path) -> Optional[str]:
+        '''Return the content of a file of the git directory, or None if it does not exist or can not be read'''
+        try:
+            return path.read_text(encoding='utf8')
+        except (OSError, UnicodeDecodeError):
+            return None
+
+
+    def config(self) -> Optional[List[ConfigEntry]]:
+        '''Return the entries of the repository configuration, or None if it can not be interpreted without git'''
+        if self.config_read:
+            return self.config_entries
+
+        self.config_read = True
+        if self.common_dir is None or self.git_dir is None:
+            return None
+
+        entries: List[ConfigEntry] = []
+        for config_path in [self.common_dir / 'config', self.git_dir / 'config.worktree']:
+            if not config_path.exists():
+                continue
+            content = self.read_file(config_path)
+            parsed = parse_git_config(content) if content is not None else None
+            if parsed is None:
+                dbg(f'Could not parse {config_path}')
+                return None
+            entries.extend(parsed)
+
+        if any(section in ('include', 'includeif') for section, _subsection, _key, _value in entries):
+            # the configuration is spread over other files
+            return None
+
+        self.config_entries = entries
+        return entries
+
+
+    def config_values(self, section: str, subsection: str, key: str) -> Optional[List[str]]:
+        '''Return all the values of a variable of the repository configuration, in order,
+        or None if the configuration can not be interpreted without git'''
+        entries = self.config()
+        if entries is None:
+            return None
+        return [value for (entry_section, entry_subsection, entry_key, value) in entries
+                if (entry_section, entry_subsection, entry_key) == (section, subsection, key)]
+
+
+    def refs_readable(self) -> bool:
+        '''Return whether the references of the repository can be read directly from the git directory'''
+        if self.git_dir is None or self.common_dir is None:
+            return False
+        ref_storage = self.config_values('extensions', '', 'refstorage')
+        if ref_storage is None or ref_storage not in ([], ['files']):
+            # reftable format, or unreadable configuration
+            return False
+        return True
+
+
+    def read_packed_refs(self) -> Dict[str, str]:
+        '''Return the references stored in the packed-refs file of the repository'''
+        if self.packed_refs is not None:
+            return self.packed_refs
+
+        self.packed_refs = {}
+        assert self.common_dir is not None
+        content = self.read_file(self.common_dir / 'packed-refs') or ''
+        last_ref = ''
+        for line in content.splitlines():
+            if line.startswith('#'):
+                # header, which tells whether the peeled value of all annotated tags is stored
+                self.packed_refs_fully_peeled = 'fully-peeled' in line.split()
+            elif line.startswith('^'):
+                # peeled value of the annotated tag of the previous line
+                self.packed_refs_peeled[last_ref] = line[1:].strip()
+            else:
+                sha1, _, last_ref = line.partition(' ')
+                self.packed_refs[last_ref.strip()] = sha1
+        return self.packed_refs
+
+
+    def read_loose_ref(self, refname: str) -> Optional[str]:
+        '''Return the content of a loose reference, or None if there is no such file'''
+        assert self.git_dir is not None and self.common_dir is not None
+        if refname == 'HEAD' or refname.startswith(PER_WORKTREE_REF_PREFIXES):
+            ref_dir = self.git_dir
+        else:
+            ref_dir = self.common_dir
+        ref_path = ref_dir / refname
+        if not ref_path.is_file():
+            return None
+        content = self.read_file(ref_path)
+        return content.strip() if content is not None else None
+
+
+    def resolve_ref(self, refname: str) -> Optional[str]:
+        '''Return the sha1 a reference points to, following symbolic references.
+
+        Return an empty string if the reference does not exist, or None if it can not be determined.
+        '''
+        if not self.refs_readable():
+            return None
+
+        for _depth in range(MAX_SYMREF_DEPTH):
+            content = self.read_loose_ref(refname)
+            if content is None:
+                return self.read_packed_refs().get(refname, '')
+            if content.startswith('ref:'):
+                refname = content[4:].strip()
+                continue
+            if not re_sha1.match(content):
+                return None
+            return content
+
+        return None
+
+
+    def head(self) -> Optional[Tuple[str, str]]:
+        '''Return a tuple (reference, sha1) describing where HEAD points to:
+        - the branch reference and the sha1 of its last commit: ('refs/heads/main', '1234...')
+        - the branch reference and an empty sha1 if the branch has no commit yet: ('refs/heads/main', '')
+        - an empty reference when HEAD is detached: ('', '1234...')
+
+        Return None if this can not be determined.
+        '''
+        if not self.refs_readable():
+            return None
+        content = self.read_loose_ref('HEAD')
+        if content is None:
+            return None
+        if content.startswith('ref:'):
+            refname = content[4:].strip()
+            sha1 = self.resolve_ref(refname)
+            if sha1 is None:
+                return None
+            return refname, sha1
+        if not re_sha1.match(content):
+            return None
+        return '', content
+
+
+    def head_sha1(self) -> Optional[str]:
+        '''Return the sha1 of HEAD, an empty string if the repository has no commit yet, or None if this
+        can not be determined'''
+        head = self.head()
+        if head is None:
+            return None
+        return head[1]
+
+
+    def dwim_ref(self, name: str) -> Optional[List[str]]:
+        '''Return the list of references matching the short name, like git does when this name is given on
+        the command-line, or None if this can not be determined'''
+        if not name or re_invalid_ref_name.search(name):
+            # revision expression or invalid name, this can not be a reference
+            return []
+        matching_refs = []
+        for rule in REF_PARSE_RULES:
+            refname = rule % name
+            sha1 = self.resolve_ref(refname)
+            if sha1 is None:
+                return None
+            if sha1:
+                matching_refs.append(refname)
+        return matching_refs
+
+
+    def ref_points_to(self, refname: str, sha1: str) -> Optional[bool]:
+        '''Return whether the reference points to the commit, possibly through an annotated tag,
+        or None if this can not be determined'''
+        ref_sha1 = self.resolve_ref(refname)
+        if ref_sha1 is None:
+            return None
+        if ref_sha1 == sha1:
+            return True
+        if not refname.startswith('refs/tags/'):
+            # only tags point to annotated tags
+            return False
+
+        if self.read_loose_ref(refname) is None:
+            if self.read_packed_refs_peeled().get(refname) == sha1:
+                return True
+            if self.packed_refs_fully_peeled:
+                # packed-refs knows the commit of all annotated tags
+                return False
+
+        # this could be an annotated tag, we would need to read it
+        return None
+
+
+    def read_packed_refs_peeled(self) -> Dict[str, str]:
+        self.read_packed_refs()
+        return self.packed_refs_peeled
+
+
+    def list_refs(self) -> Optional[Dict[str, str]]:
+        '''Return all the references of the repository with the sha1 they point to, following symbolic references.
+
+        Return None if the references can not be read reliably.'''
+        if not self.refs_readable():
+            return None
+        assert self.git_dir is not None and self.common_dir is not None
+
+        refnames = set(self.read_packed_refs())
+        for ref_dir in {self.git_dir, self.common_dir}:
+            for dirpath, _dirnames, fnames in os.walk(ref_dir / 'refs'):
+                for fname in fnames:
+                    refname = (Path(dirpath) / fname).relative_to(ref_dir).as_posix()
+                    if ref_dir != self.common_dir and not refname.startswith(PER_WORKTREE_REF_PREFIXES):
+                        # only the per-worktree references are in the git directory of a worktree
+                        continue
+                    if refname.endswith('.lock') or re_invalid_ref_name.search(refname):
+                        continue
+                    refnames.add(refname)
+
+        refs: Dict[str, str] = {}
+        for refname in refnames:
+            sha1 = self.resolve_ref(refname)
+            if sha1 is None:
+                return None
+            if sha1:
+                refs[refname] = sha1
+        return refs
+
+
+    def detached_head_description(self) -> Optional[Tuple[str, str]]:
+        '''When HEAD is detached, return what was checked out, like "git branch" does:
+        - ('at', name): HEAD is at the tag, remote branch or commit which was checked out
+        - ('from', name): some commits were done since the tag, remote branch or commit was checked out
+        - ('', ''): git does not know what was checked out
+
+        The commits are returned as full sha1, git displays them abbreviated.
+
+        Return None if this can not be determined without git.
+        '''
+        head = self.head()
+        if head is None or head[0] != '':
+            return None
+        head_sha1 = head[1]
+
+        assert self.git_dir is not None
+        if any((self.git_dir / fname).exists() for fname in OPERATION_IN_PROGRESS_FILES):
+            # git branch describes the operation in progress
+            return None
+
+        reflog = self.read_file(self.git_dir / 'logs' / 'HEAD')
+        if reflog is None:
+            return '', ''
+
+        # the last checkout tells what was checked out
+        for line in reversed(reflog.splitlines()):
+            fields, _, message = line.partition('\t')
+            mo = re_checkout_reflog.match(message)
+            if mo is None:
+                continue
+            checkout_sha1 = fields.split(' ', 2)[1]
+            target = mo.group(1)
+            break
+        else:
+            return '', ''
+
+        matching_refs = self.dwim_ref(target)
+        if matching_refs is None:
+            return None
+
+        detached_from = checkout_sha1
+        # "git checkout --detach" records HEAD as target: like git, only a reference is described by its name
+        if len(matching_refs) == 1 and matching_refs[0].startswith('refs/'):
+            points_to = self.ref_points_to(matching_refs[0], checkout_sha1)
+            if points_to is None:
+                return None
+            if points_to:
+                detached_from = matching_refs[0]
+                for prefix in ['refs/tags/', 'refs/remotes/']:
+                    if detached_from.startswith(prefix):
+                        detached_from = detached_from[len(prefix):]
+                        break
+
+        return ('at' if head_sha1 == checkout_sha1 else 'from'), detached_from
+
+
+    def remote_url(self) -> Optional[str]:
+        '''Return the fetch url of the remote origin, or of the first remote if there is no origin.
+        Return an empty string if no remote is configured, or None if the url can not be determined without git.
+        '''
+        entries = self.config()
+        if entries is None or url_rewriting_configured(entries):
+            return None
+
+        assert self.common_dir is not None
+        for legacy_remote_dir in ['remotes', 'branches']:
+            legacy_dir = self.common_dir / legacy_remote_dir
+            if legacy_dir.is_dir() and any(legacy_dir.iterdir()):
+                # remotes defined in files, as in the early days of git
+                return None
+
+        remotes = sorted({subsection for section, subsection, _key, _value in entries if section == 'remote'})
+        if len(remotes) == 0:
+            return ''
+
+        remote = 'origin' if 'origin' in remotes else remotes[0]
+        urls = self.config_values('remote', remote, 'url')
+        if not urls:
+            return None
+        return urls[0]
+
+
+    def upstream_branch(self, branch: str) -> Optional[str]:
+        '''Return the remote branch tracked by the local branch, as displayed by git: "origin/main"
+        Return an empty string if the branch has no upstream, or None if this can not be determined without git.
+        '''
+        remotes = self.config_values('branch', branch, 'remote')
+        merges = self.config_values('branch', branch, 'merge')
+        if remotes is None or merges is None:
+            return None
+        if not merges:
+            return ''
+        if len(merges) > 1 or len(remotes) != 1:
+            return None
+
+        remote, merge = remotes[0], merges[0]
+        if remote == '.':
+            # the upstream is a local branch
+            tracking_ref = merge
+        else:
+            tracking_ref = ''
+            for refspec in self.config_values('remote', remote, 'fetch') or []:
+                mapped = map_refspec(refspec, merge)
+                if mapped:
+                    tracking_ref = mapped
+                    break
+            if not tracking_ref:
+                return None
+
+        return self.shorten_ref(tracking_ref)
+
+
+    def shorten_ref(self, refname: str) -> Optional[str]:
+        '''Return the shortest unambiguous name of a reference, or None if this can not be determined'''
+        for prefix in ['refs/heads/', 'refs/tags/', 'refs/remotes/']:
+            if refname.startswith(prefix):
+                short_name = refname[len(prefix):]
+                break
+        else:
+            return None
+
+        matching_refs = self.dwim_ref(short_name)
+        if matching_refs is None or matching_refs not in ([], [refname]):
+            # git would use a longer name
+            return None
+        return short_name
+
+
+def map_refspec(refspec: str, refname: str) -> str:
+    '''Return the reference to which the refspec maps the reference, or an empty string if the refspec does not
+    apply to this reference'''
+    refspec = refspec.lstrip('+')
+    src, sep, dst = refspec.partition(':')
+    if not sep or src.startswith('^'):
+        return ''
+    if '*' not in src:
+        return dst if src == refname else ''
+
+    src_prefix, _, src_suffix = src.partition('*')
+    dst_prefix, _, dst_suffix = dst.partition('*')
+    if not refname.startswith(src_prefix) or not refname.endswith(src_suffix) \
+            or len(refname) < len(src_prefix) + len(src_suffix):
+        return ''
+    matched = refname[len(src_prefix):len(refname) - len(src_suffix)]
+    return dst_prefix + matched + dst_suffix
+
+
+def url_rewriting_configured(entries: List[ConfigEntry]) -> bool:
+    '''Return whether urls may be rewritten by url.<base>.insteadOf, in the repository configuration
+    or in the global configuration'''
+    global_entries = global_git_config()
+    if global_entries is None:
+        return True
+    return any(section == 'url' for section, _subsection, _key, _value in list(entries) + list(global_entries))
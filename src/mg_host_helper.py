@@ -0,0 +1,248 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging, json, threading, subprocess, itertools
+from pathlib import Path
+from functools import lru_cache
+
+from src import mg_config
+from src.mg_exec_core import ExecStatus, FLATPAK_SPAWN, EXIT_CODE_COULD_NOT_START_PROCESS, EXIT_CODE_CRASHED, \
+    isRunningInsideFlatpak
+
+logger = logging.getLogger('mg_host_helper')
+dbg = logger.debug
+warn = logger.warning
+
+# python interpreter used to run the helper on the flatpak host
+HOST_HELPER_PYTHON = 'python3'
+
+# maximum time to wait for the helper to answer its first request, before falling back to flatpak-spawn
+HOST_HELPER_START_TIMEOUT = 5.0
+
+# callbacks of a command executed through the helper
+HostCbDone = Callable[[ExecStatus, int, str], Any]
+HostCbOutput = Callable[[str], Any]
+
+
+@lru_cache(maxsize=1)
+def start_host_helper() -> Optional['MgHostHelper']:
+    '''Start the helper on the flatpak host, the first time it is needed.
+
+    Return None when not running inside flatpak, when the helper is disabled in the configuration
+    or when it could not be started.
+    '''
+    if not isRunningInsideFlatpak():
+        return None
+
+    if not mg_config.get_config_instance().get(mg_config.CONFIG_FLATPAK_HOST_HELPER, True):
+        dbg('start_host_helper() - helper disabled in the configuration')
+        return None
+
+    helper = MgHostHelper(FLATPAK_SPAWN + [HOST_HELPER_PYTHON, '-u', '-c', host_helper_source()])
+    if not helper.start():
+        warn('Could not start the helper on the flatpak host, using flatpak-spawn for each command')
+        return None
+    return helper
+
+
+def get_host_helper() -> Optional['MgHostHelper']:
+    '''Return the helper to run commands on the flatpak host, or None if commands must be run with flatpak-spawn'''
+    helper = start_host_helper()
+    if helper is None or not helper.alive:
+        return None
+    return helper
+
+
+def host_helper_source() -> str:
+    '''Return the source code of the helper, to be executed on the host where MultiGit files are not visible'''
+    return (Path(__file__).parent / 'mg_host_helper_main.py').read_text(encoding='utf8')
+
+
+class MgHostRequest:
+    '''A request sent to the helper, waiting for its response'''
+
+    def __init__(self, cb_done: Optional[HostCbDone], cb_output: Optional[HostCbOutput]) -> None:
+        self.cb_done = cb_done
+        self.cb_output = cb_output
+        self.output_chunks: List[str] = []
+        self.result: Optional[Tuple[ExecStatus, int, str]] = None
+        self.done = threading.Event()
+
+
+class MgHostHelper:
+    '''Client of the helper of mg_host_helper_main, which executes commands on the flatpak host.
+
+    The helper is one long-lived process started with flatpak-spawn. Many commands can be executed
+    concurrently through it, avoiding a D-Bus round trip and a flatpak-spawn process for each command.
+
+    The callbacks are called from the thread reading the helper output, not from the thread
+    which sent the request.
+    '''
+
+    def __init__(self, launch_cmd: List[str]) -> None:
+        self.launch_cmd = launch_cmd
+        self.process: Optional['subprocess.Popen[bytes]'] = None
+        self.alive = False
+        self.lock = threading.Lock()
+        self.requests: Dict[int, MgHostRequest] = {}
+        self.request_ids = itertools.count(1)
+
+
+    def start(self, timeout: float = HOST_HELPER_START_TIMEOUT) -> bool:
+        '''Start the helper and check that it answers. Return whether the helper is usable.'''
+        dbg(f'start() - launching helper with {self.launch_cmd[:-1]}')
+        try:
+            self.process = subprocess.Popen(self.launch_cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=subprocess.DEVNULL)
+        except OSError as exc:
+            warn(f'Could not launch the host helper: {exc}')
+            return False
+
+        self.alive = True
+        threading.Thread(target=self.read_responses, name='mg_host_helper', daemon=True).start()
+
+        req_id, request = self.new_request(None, None)
+        self.send({'id': req_id, 'op': 'ping'})
+        if not request.done.wait(timeout) or request.result is None or request.result[0] != ExecStatus.Ok:
+            self.stop()
+            return False
+
+        return True
+
+
+    def stop(self) -> None:
+        '''Stop the helper. The commands it is running are killed.'''
+        self.alive = False
+        if self.process is not None:
+            self.process.kill()
+            self.process.wait()
+
+
+    def new_request(self, cb_done: Optional[HostCbDone], cb_output: Optional[HostCbOutput]) -> Tuple[int, MgHostRequest]:
+        request = MgHostRequest(cb_done, cb_output)
+        with self.lock:
+            req_id = next(self.request_ids)
+            self.requests[req_id] = request
+        return req_id, request
+
+
+    def send(self, msg: Dict[str, Any]) -> None:
+        with self.lock:
+            if not self.alive:
+                return
+            assert self.process and self.process.stdin
+            try:
+                self.process.stdin.write(json.dumps(msg).encode('utf8') + b'\n')
+                self.process.stdin.flush()
+            except OSError as exc:
+                warn(f'Could not send request to the host helper: {exc}')
+
+
+    def exec_async(self, cmd_line: List[str], working_dir: str, cb_done: Optional[HostCbDone],
+                   cb_output: Optional[HostCbOutput] = None) -> int:
+        '''Execute the command on the host and return the id of the request.
+
+        cb_output is called with each new part of the output of the command.
+        cb_done is called with (exec_status, exit_code, output) when the command completes.
+        '''
+        req_id, _request = self.new_request(cb_done, cb_output)
+        dbg(f'exec_async() - request {req_id}: {cmd_line}')
+        self.send({'id': req_id, 'op': 'exec', 'cmd': cmd_line, 'cwd': working_dir})
+        if not self.alive:
+            self.finish_request(req_id, ExecStatus.FailedToStart, EXIT_CODE_COULD_NOT_START_PROCESS)
+        return req_id
+
+
+    def exec_blocking(self, cmd_line: List[str], working_dir: str = '') -> Tuple[ExecStatus, int, str]:
+        '''Execute the command on the host and return (exec_status, exit_code, output)'''
+        req_id, request = self.new_request(None, None)
+        self.send({'id': req_id, 'op': 'exec', 'cmd': cmd_line, 'cwd': working_dir})
+        if not self.alive:
+            self.finish_request(req_id, ExecStatus.FailedToStart, EXIT_CODE_COULD_NOT_START_PROCESS)
+        request.done.wait()
+        assert request.result is not None
+        return request.result
+
+
+    def kill(self, req_id: int) -> None:
+        '''Kill the command of this request. Its callback is still called, reporting a crash.'''
+        self.send({'id': req_id, 'op': 'kill'})
+
+
+    def file_exists(self, fpath: Path) -> bool:
+        '''Return whether the file exists on the host'''
+        req_id, request = self.new_request(None, None)
+        self.send({'id': req_id, 'op': 'exists', 'path': str(fpath)})
+        if not self.alive:
+            self.finish_request(req_id, ExecStatus.OtherError, EXIT_CODE_CRASHED)
+        request.done.wait()
+        assert request.result is not None
+        return request.result[:2] == (ExecStatus.Ok, 0)
+
+
+    def read_responses(self) -> None:
+        '''Thread reading the responses of the helper, until the helper exits'''
+        assert self.process and self.process.stdout
+        for line in self.process.stdout:
+            try:
+                msg = json.loads(line)
+                req_id = msg['id']
+            except (ValueError, KeyError):
+                warn(f'Invalid response from the host helper: {line!r}')
+                continue
+
+            with self.lock:
+                request = self.requests.get(req_id)
+            if request is None:
+                continue
+
+            if 'out' in msg:
+                request.output_chunks.append(msg['out'])
+                if request.cb_output:
+                    request.cb_output(msg['out'])
+                continue
+
+            exec_status = ExecStatus(msg['status'])
+            exit_code = msg['exit_code']
+            if exec_status == ExecStatus.FailedToStart:
+                exit_code = EXIT_CODE_COULD_NOT_START_PROCESS
+            elif exit_code < 0:
+                # killed by a signal
+                exec_status, exit_code = ExecStatus.Crashed, EXIT_CODE_CRASHED
+            self.finish_request(req_id, exec_status, exit_code)
+
+        if self.alive:
+            warn('The host helper has exited')
+        with self.lock:
+            self.alive = False
+            pending = list(self.requests)
+        for req_id in pending:
+            self.finish_request(req_id, ExecStatus.OtherError, EXIT_CODE_CRASHED)
+
+
+    def finish_request(self, req_id: int, exec_status: ExecStatus, exit_code: int) -> None:
+        with self.lock:
+            request = self.requests.pop(req_id, None)
+        if request is None:
+            return
+
+        output = ''.join(request.output_chunks).replace('\r', '\n')
+        request.result = (exec_status, exit_code, output)
+        request.done.set()
+        if request.cb_done:
+            request.cb_done(exec_status, exit_code, output)
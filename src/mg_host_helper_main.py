@@ -0,0 +1,127 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+'''Helper running on the flatpak host, to execute the commands of MultiGit without one flatpak-spawn per command.
+
+This script is sent as source code to python on the host (see mg_host_helper), so it must only use the python
+standard library. It reads requests on stdin and writes responses on stdout, one json object per line:
+
+    {"id": 1, "op": "exec", "cmd": ["git", "status"], "cwd": "/path/to/repo"}
+        -> {"id": 1, "out": "..."}  (zero or more times, as the output of the command arrives)
+        -> {"id": 1, "status": "Ok", "exit_code": 0}
+    {"id": 1, "op": "kill"}
+    {"id": 2, "op": "exists", "path": "/usr/bin/git"}
+        -> {"id": 2, "status": "Ok", "exit_code": 0}  (exit code 1 if the path does not exist)
+    {"id": 3, "op": "ping"}
+        -> {"id": 3, "status": "Ok", "exit_code": 0}
+
+The commands are executed concurrently, each one in its own thread.
+'''
+
+from typing import Any, Dict, Set
+import sys, os, json, threading, subprocess, codecs
+
+# values of ExecStatus
+STATUS_OK = 'Ok'
+STATUS_FAILED_TO_START = 'Failed to start'
+
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+
+class MgHostHelperServer:
+
+    def __init__(self) -> None:
+        self.out_lock = threading.Lock()
+        self.procs_lock = threading.Lock()
+        self.procs: Dict[int, 'subprocess.Popen[bytes]'] = {}
+        # requests killed before their process was started
+        self.killed: Set[int] = set()
+
+
+    def send(self, msg: Dict[str, Any]) -> None:
+        with self.out_lock:
+            sys.stdout.write(json.dumps(msg) + '\n')
+            sys.stdout.flush()
+
+
+    def run_cmd(self, req_id: int, cmd: Any, cwd: str) -> None:
+        '''Run the command and send its output progressively, then its exit code'''
+        try:
+            proc = subprocess.Popen(cmd, cwd=cwd or None, stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except (OSError, ValueError, TypeError):
+            self.send({'id': req_id, 'status': STATUS_FAILED_TO_START, 'exit_code': 0})
+            return
+
+        with self.procs_lock:
+            self.procs[req_id] = proc
+            if req_id in self.killed:
+                self.killed.discard(req_id)
+                proc.kill()
+
+        assert proc.stdout is not None
+        decoder = codecs.getincrementaldecoder('utf8')(errors='replace')
+        while True:
+            chunk = os.read(proc.stdout.fileno(), OUTPUT_CHUNK_SIZE)
+            text = decoder.decode(chunk, final=not chunk)
+            if text:
+                self.send({'id': req_id, 'out': text})
+            if not chunk:
+                break
+
+        returncode = proc.wait()
+        with self.procs_lock:
+            del self.procs[req_id]
+        self.send({'id': req_id, 'status': STATUS_OK, 'exit_code': returncode})
+
+
+    def kill(self, req_id: int) -> None:
+        with self.procs_lock:
+            proc = self.procs.get(req_id)
+            if proc is None:
+                self.killed.add(req_id)
+            else:
+                proc.kill()
+
+
+    def serve(self) -> None:
+        '''Process the requests until stdin is closed'''
+        for line in sys.stdin:
+            if not line.strip():
+                continue
+            req = json.loads(line)
+            req_id = req['id']
+            op = req.get('op', 'exec')
+            if op == 'exec':
+                threading.Thread(target=self.run_cmd, args=(req_id, req['cmd'], req.get('cwd', '')), daemon=True).start()
+            elif op == 'kill':
+                self.kill(req_id)
+            elif op == 'exists':
+                self.send({'id': req_id, 'status': STATUS_OK, 'exit_code': 0 if os.path.exists(req['path']) else 1})
+            elif op == 'ping':
+                self.send({'id': req_id, 'status': STATUS_OK, 'exit_code': 0})
+            else:
+                self.send({'id': req_id, 'status': STATUS_FAILED_TO_START, 'exit_code': 0})
+
+        # MultiGit has exited, do not leave its commands behind
+        with self.procs_lock:
+            for proc in self.procs.values():
+                proc.kill()
+
+
+if __name__ == '__main__':
+    MgHostHelperServer().serve()
@@ -0,0 +1,109 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from typing import Dict, List, Mapping, Sequence, Tuple, TextIO, Optional
+from types import ModuleType
+import builtins, sys, time, os, tempfile
+
+# number of modules listed in the import profile report
+IMPORT_PROFILE_NB_MODULES = 40
+
+# report file, in the temporary directory, used when there is no standard output
+IMPORT_PROFILE_FNAME = 'multigit_import_profile.txt'
+
+
+class MgImportProfiler:
+    '''Measure the time spent importing each module, by wrapping builtins.__import__.
+
+    For each module imported for the first time, the cumulative time includes the modules it imports
+    while the self time excludes them. This is similar to python -X importtime but also available
+    in the frozen executable, and focused on the modules which matter for Multigit startup.
+    '''
+
+    def __init__(self) -> None:
+        # module name -> (self time, cumulative time) in seconds
+        self.import_times: Dict[str, Tuple[float, float]] = {}
+        # time spent in nested imports, for each import in progress
+        self.nested_times: List[float] = []
+        self.original_import = builtins.__import__
+        self.start_time = 0.0
+
+
+    def start(self) -> None:
+        self.start_time = time.perf_counter()
+        builtins.__import__ = self.profiled_import
+
+
+    def stop(self) -> None:
+        builtins.__import__ = self.original_import
+
+
+    def profiled_import(self, name: str, globals: Optional[Mapping[str, object]] = None,
+                        locals: Optional[Mapping[str, object]] = None,
+                        fromlist: Optional[Sequence[str]] = (), level: int = 0) -> ModuleType:
+        if level != 0 or name in sys.modules:
+            # relative imports are rare and module already imported are cheap
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        self.nested_times.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = time.perf_counter() - start
+            nested = self.nested_times.pop()
+            if self.nested_times:
+                self.nested_times[-1] += cumulative
+            self.import_times[name] = (cumulative - nested, cumulative)
+
+
+    def report(self, out: TextIO, nb_modules: int = IMPORT_PROFILE_NB_MODULES) -> None:
+        '''Write the modules which took the longest to import, sorted by cumulative time'''
+        total = time.perf_counter() - self.start_time
+        out.write('Import profile: %d modules imported in %.1f ms\n' % (len(self.import_times), total * 1000))
+        out.write('%10s | %10s | %s\n' % ('self [ms]', 'cumul [ms]', 'module'))
+        by_cumulative = sorted(self.import_times.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (self_time, cumulative) in by_cumulative[:nb_modules]:
+            out.write('%10.1f | %10.1f | %s\n' % (self_time * 1000, cumulative * 1000, name))
+
+
+# installed by multigit.py when launched with --import-profile
+import_profiler: Optional[MgImportProfiler] = None
+
+
+def start_import_profile() -> None:
+    '''Start measuring the import times of all modules imported from now on'''
+    global import_profiler
+    import_profiler = MgImportProfiler()
+    import_profiler.start()
+
+
+def stop_import_profile(out: Optional[TextIO] = None) -> None:
+    '''Stop measuring the import times and report them, to the standard output by default.
+
+    The executable built without console has no standard output: the report is then written to
+    IMPORT_PROFILE_FNAME in the temporary directory.'''
+    if import_profiler is None:
+        return
+    import_profiler.stop()
+    # sys.stdout is looked up now, it may have been replaced since the import of this module
+    out = out or sys.stdout
+    if out is None:
+        with open(os.path.join(tempfile.gettempdir(), IMPORT_PROFILE_FNAME), 'w', encoding='utf8') as f:
+            import_profiler.report(f)
+        return
+    import_profiler.report(out)
@@ -15,16 +15,21 @@
 #
 
 
-from typing import cast, List, Optional, Dict
+from typing import cast, List, Optional, Dict, Set, Hashable
 import logging, pathlib
 
 from PySide6.QtWidgets import QMessageBox, QApplication, QWidget
 from PySide6.QtCore import Qt, Signal, QByteArray, QTimer, QPoint
+from PySide6.QtGui import QTextCursor
 
-from src.mg_repo_info import MultiRepo
+from src.mg_repo_info import MultiRepo, MgRepoInfo
+from src.mg_repo_cache import get_repo_cache_instance
+from src.mg_repo_watcher import MgRepoWatcher
+from src.mg_repo_scanner import MgRepoScanner
 from src.mg_repo_tree_item import MgRepoTreeItem
-from src.mg_repo_tree import TWI_TYPE_GROUP
-from src.mg_utils import htmlize_diff
+from src.mg_repo_tree import TWI_TYPE_GROUP, TWI_TYPE_REPO
+from src.mg_utils import HTML_HEADER, HTML_FOOTER
+from src.mg_view_cache import MgDiffView, get_view_cache_instance, repo_view_key, VIEW_DIFF, VIEW_LAST_COMMIT
 from src import mg_config as mgc
 from src.mg_const import COL_REPO_NAME, MAX_DIFF_LINES
 from src.gui.ui_multigit_widget import Ui_MultigitWidget
@@ -33,6 +38,14 @@ logger = logging.getLogger('mg_multigit_widget')
 dbg = logger.debug
 info = logger.info
 
+# delay after the last selection change before prefetching the views of the neighbour repositories, in ms
+VIEW_PREFETCH_DELAY = 300
+
+# span preserving the spaces of the diff lines. The font is repeated from HTML_HEADER, because the html appended
+# with QTextCursor.insertHtml() does not get the style of the document
+TAG_DIFF_OPEN = '<span style="white-space:pre-wrap; font-family:\'Courier New\'; font-size:8pt; font-weight:400">'
+TAG_DIFF_CLOSE = '</span>'
+
 
 class MgMultigitWidget(QWidget, Ui_MultigitWidget):
 
@@ -40,6 +53,8 @@ class MgMultigitWidget(QWidget, Ui_MultigitWidget):
 
     sig_request_dir_open = Signal()
     sig_dir_changed = Signal(str)
+    # emitted when repositories are found while scanning the base directory, and when the scan stops
+    sig_repo_scan_progress = Signal()
 
     def __init__(self) -> None:
         super().__init__()
@@ -48,6 +63,13 @@ class MgMultigitWidget(QWidget, Ui_MultigitWidget):
         self.repoTree.configureColumns()
 
         self.multiRepo = MultiRepo('')
+        # base directory opened only when the tab is activated for the first time, see setDeferredBaseDir()
+        self.deferredBaseDir: Optional[str] = None
+        # refresh repositories automatically when git modifies them
+        self.repoWatcher = MgRepoWatcher(self)
+        # scanning of the base directory, running in the background
+        self.repoScanner: Optional[MgRepoScanner] = None
+        self.repoNamesFoundByScan: Set[str] = set()
 
         self.config = mgc.get_config_instance()
 
@@ -69,6 +91,21 @@ class MgMultigitWidget(QWidget, Ui_MultigitWidget):
         self.tabWidget.setCurrentIndex(0)
         self.tabWidget.currentChanged.connect( self.slotTabWidgetIndexChanged )
 
+        # diff displayed in the modified files tab, rendered progressively as git outputs it
+        self.diffRepoName = ''
+        self.diffView = MgDiffView()
+        self.diffViewKey: Optional[Hashable] = None
+        self.buttonLoadMoreDiff.clicked.connect(self.slotLoadMoreDiff)
+        self.showDiffTruncated(False)
+
+        # the views of the repositories around the selection are prefetched, so that browsing is immediate
+        self.viewCache = get_view_cache_instance()
+        self.viewKeysPrefetching: Set[Hashable] = set()
+        self.prefetchTimer = QTimer(self)
+        self.prefetchTimer.setSingleShot(True)
+        self.prefetchTimer.setInterval(VIEW_PREFETCH_DELAY)
+        self.prefetchTimer.timeout.connect(self.slotPrefetchNeighbourViews)
+
 
 ##########################################################################
 #
@@ -84,8 +121,10 @@ class MgMultigitWidget(QWidget, Ui_MultigitWidget):
             QMessageBox.warning(self, 'Could not open path', 'Error: could not open path: %s' % baseDir)
             return
 
+        self.cancelRepoScan()
         self.sig_dir_changed.emit( baseDir or '' )
         self.repoTree.clear()
+        self.repoWatcher.setRepos([])
         if baseDir is None:
             self.lineEditBaseDir.setEnabled(False)
             self.lineEditBaseDir.setText("")
@@ -108,21 +147,102 @@ class MgMultigitWidget(QWidget, Ui_MultigitWidget):
             return
 
         self.repoTree.setFocus(Qt.FocusReason.OtherFocusReason)
-        try:
-            self.setCursor(Qt.CursorShape.WaitCursor)
-            QApplication.processEvents()
-            # we keep that one blocking, it's very quick anyways
-            self.multiRepo.find_git_repos()
+        self.multiRepo.clear()
+        # repositories are added to the view and refreshed as soon as they are found
+        self.startRepoScan()
 
-            items = self.repoTree.addRepos(self.multiRepo.repo_list)
 
-        finally:
-            # all items are visible now, we can restore the cursor
-            self.setCursor(Qt.CursorShape.ArrowCursor)
+    def startRepoScan(self) -> None:
+        '''Scan the base directory in the background for git repositories.
+
+        Each new repository is inserted in the view and refreshed as soon as it is found. When the
+        scan completes, the repositories which were not found are removed.'''
+        dbg('startRepoScan()')
+        self.cancelRepoScan()
+        self.repoNamesFoundByScan = set()
+        self.repoScanner = MgRepoScanner(self.multiRepo, self)
+        self.repoScanner.sig_git_dir_found.connect(self.slotGitDirFound)
+        self.repoScanner.finished.connect(self.slotRepoScanFinished)
+        self.repoScanner.finished.connect(self.repoScanner.deleteLater)
+        self.repoScanner.start()
+        self.sig_repo_scan_progress.emit()
+
+
+    def cancelRepoScan(self, waitForThread: bool = False) -> None:
+        '''Stop the scan of the base directory, if any. The repositories found so far are kept.
+
+        If waitForThread is True, return only when the scanning thread is finished.'''
+        scanner, self.repoScanner = self.repoScanner, None
+        if scanner is None:
+            return
+
+        dbg('cancelRepoScan()')
+        scanner.requestInterruption()
+        if waitForThread:
+            scanner.wait()
+        self.repoWatcher.setRepos(self.multiRepo.repo_list)
+        self.sig_repo_scan_progress.emit()
+
+
+    def isScanningRepos(self) -> bool:
+        return self.repoScanner is not None
+
+
+    def slotGitDirFound(self, gitDir: str) -> None:
+        '''Called by the repo scanner for every git directory found'''
+        if self.sender() is not self.repoScanner:
+            # result of a cancelled scan
+            return
 
-        # 2nd step, we fill the repo information
-        for it in items:
-            it.repoInfo.refresh()
+        self.repoNamesFoundByScan.add(self.multiRepo.repo_name_from_git_dir(gitDir))
+        repo = self.multiRepo.add_git_dir(gitDir)
+        if repo is None:
+            # already known
+            return
+
+        item = self.repoTree.addRepos([repo])[0]
+        self.connectRepoCache([repo])
+        if repo.info_from_git or repo.is_update_in_progress():
+            # the repository is also displayed in another tab, which already refreshes it
+            if repo.info_from_git:
+                item.fillRepoItem()
+            else:
+                item.markItemInProgress()
+            self.sig_repo_scan_progress.emit()
+            return
+
+        # display immediately the last known state of the repository, then refresh it
+        get_repo_cache_instance().restoreRepoState(repo)
+        if repo.head:
+            item.fillRepoItem()
+        self.repoTree.refreshQueue.requestRefresh(repo)
+        self.sig_repo_scan_progress.emit()
+
+
+    def slotRepoScanFinished(self) -> None:
+        '''Called when the repo scanner has scanned the whole base directory'''
+        if self.sender() is not self.repoScanner:
+            # cancelled scan
+            return
+
+        dbg('slotRepoScanFinished() - %d repos found' % len(self.repoNamesFoundByScan))
+        self.repoScanner = None
+        removedRepos = [repo for repo in self.multiRepo.repo_list if repo.name not in self.repoNamesFoundByScan]
+        if removedRepos:
+            self.multiRepo.adjust_git_repos([], removedRepos)
+            self.repoTree.deleteRepos(removedRepos)
+        self.repoWatcher.setRepos(self.multiRepo.repo_list)
+        # the repositories which disappeared are removed from the cache
+        get_repo_cache_instance().save()
+        self.sig_repo_scan_progress.emit()
+
+
+    def connectRepoCache(self, repos: List[MgRepoInfo]) -> None:
+        '''Keep the persistent repository cache up-to-date with the information collected on these repositories'''
+        repoCache = get_repo_cache_instance()
+        for repo in repos:
+            repo.repo_info_available.connect(lambda _repoName, repo=repo: repoCache.storeRepoState(repo))
+            repo.repo_deleted.connect(lambda _repoName, repo=repo: repoCache.forgetRepo(repo.fullpath))
 
 
     def slotItemSelectionChanged(self) -> None:
@@ -135,6 +255,8 @@ class MgMultigitWidget(QWidget, Ui_MultigitWidget):
 
         if len(items) == 0:
             # nothing is selected
+            self.diffRepoName = ''
+            self.showDiffTruncated(False)
             self.textEditModFiles.setText('')
             self.textEditCommit.setText('')
             return
@@ -153,10 +275,20 @@ class MgMultigitWidget(QWidget, Ui_MultigitWidget):
         currentRepo = items[0].repoInfo
         if self.tabWidget.widget(idx) == self.tabLastCommit:
             # showing last commit currently
-            currentRepo.ensure_last_commit(self.slotSetLastCommit)
+            key = repo_view_key(currentRepo, VIEW_LAST_COMMIT)
+            lastCommit = self.viewCache.get(key)
+            if lastCommit is not None:
+                self.textEditCommit.setText(lastCommit)
+            else:
+                def cbLastCommit(repoName: str, lastCommit: str) -> None:
+                    self.viewCache.put(key, lastCommit)
+                    self.slotSetLastCommit(repoName, lastCommit)
+
+                currentRepo.ensure_last_commit(cbLastCommit)
         else:
             # showing diff currently
-            currentRepo.ensure_diff(self.displayRepoDiff)
+            self.showRepoDiff(currentRepo)
+        self.prefetchTimer.start()
 
 
     def slotSetLastCommit(self, repo_name: str, last_commit: str) -> None:
@@ -175,20 +307,131 @@ class MgMultigitWidget(QWidget, Ui_MultigitWidget):
         self.textEditCommit.setText(last_commit)
 
 
-    def displayRepoDiff(self, repo_name: str, repo_diff: str) -> None:
-        dbg('displayRepoDiff("%s", ...)' % repo_name)
+    def showRepoDiff(self, repo: MgRepoInfo, loadMore: bool = False) -> None:
+        '''Display the diff of the repository in the modified files tab, limited to MAX_DIFF_LINES lines.
+
+        If loadMore is True, the diff already displayed is extended by MAX_DIFF_LINES lines.
+        '''
+        dbg('showRepoDiff("%s", loadMore=%s)' % (repo.name, loadMore))
+        if loadMore and repo.name == self.diffRepoName:
+            maxLines = self.diffView.nb_lines + MAX_DIFF_LINES
+        else:
+            self.diffRepoName = repo.name
+            self.diffViewKey = repo_view_key(repo, VIEW_DIFF)
+            maxLines = MAX_DIFF_LINES
+            diffView = self.viewCache.get(self.diffViewKey)
+            if diffView is not None:
+                self.diffView = diffView
+                self.textEditModFiles.setHtml(HTML_HEADER + TAG_DIFF_OPEN + diffView.html() + TAG_DIFF_CLOSE + HTML_FOOTER)
+                self.showDiffTruncated(diffView.truncated)
+                return
+
+            self.diffView = MgDiffView()
+            self.textEditModFiles.setHtml(HTML_HEADER + HTML_FOOTER)
+        self.showDiffTruncated(False)
+        repo.ensure_diff(self.displayRepoDiff, maxLines, self.appendRepoDiffLines, self.displayRepoDiffFailed)
+
+
+    def appendRepoDiffLines(self, repo_name: str, firstLineIdx: int, lines: List[str]) -> None:
+        '''Called with new lines of diff while git outputs them'''
+        if repo_name != self.diffRepoName:
+            # the selection changed between the time where the diff was requested and it was received
+            return
+
+        # the lines already displayed are received again when more lines are loaded
+        diffHtml = self.diffView.add_lines(firstLineIdx, lines)
+        if not diffHtml:
+            return
+
+        # append at the end of the document without moving the view
+        cursor = QTextCursor(self.textEditModFiles.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertHtml(TAG_DIFF_OPEN + diffHtml + TAG_DIFF_CLOSE)
+
+
+    def displayRepoDiff(self, repo_name: str, _repo_diff: str, truncated: bool) -> None:
+        '''Called when the diff is complete, or truncated to the number of lines requested'''
+        dbg('displayRepoDiff("%s", truncated=%s)' % (repo_name, truncated))
+        if repo_name != self.diffRepoName:
+            return
+
+        self.diffView.truncated = truncated
+        self.viewCache.put(self.diffViewKey, self.diffView)
+        self.showDiffTruncated(truncated)
+
+
+    def displayRepoDiffFailed(self, repo_name: str) -> None:
+        '''Called when git could not compute the diff: the lines received are kept but not cached'''
+        dbg('displayRepoDiffFailed("%s")' % repo_name)
+        if repo_name != self.diffRepoName:
+            return
+
+        self.showDiffTruncated(False)
+
+
+    def showDiffTruncated(self, truncated: bool) -> None:
+        '''Show the button to load more lines of diff, when the diff displayed is truncated'''
+        self.labelDiffTruncated.setVisible(truncated)
+        self.buttonLoadMoreDiff.setVisible(truncated)
+
+
+    def slotLoadMoreDiff(self) -> None:
+        '''Called when the user asks for more lines of diff'''
+        items = self.repoTree.selectedRepoItems()
+        if len(items) == 0:
+            return
+        self.showRepoDiff(items[0].repoInfo, loadMore=True)
+
+
+    def slotPrefetchNeighbourViews(self) -> None:
+        '''Prefetch the view of the current tab for the repositories just above and below the current one,
+        when the selection did not change for a while'''
         currentItem = self.repoTree.currentItem()
-        if currentItem is None:
+        if currentItem is None or not self.tabWidget.isVisible():
             return
 
-        currentRepoName = currentItem.text(COL_REPO_NAME)
-        if repo_name != currentRepoName:
-            logger.warning('Received diff result for repo "%s" but repo selected is "%s". Call ignored' % (repo_name, currentRepoName))
-            # the selection changed between the time where the lastCommit info was requested and it was received
-            # just ignore it
+        if not self.repoTree.refreshQueue.isIdle():
+            # the prefetch has the lowest priority: wait for the refreshes of the repositories to be over
+            self.prefetchTimer.start()
+            return
+
+        kind = VIEW_LAST_COMMIT if self.tabWidget.currentWidget() == self.tabLastCommit else VIEW_DIFF
+        for item in (self.repoTree.itemAbove(currentItem), self.repoTree.itemBelow(currentItem)):
+            if item is None or item.type() != TWI_TYPE_REPO:
+                continue
+            repo = cast(MgRepoTreeItem, item).repoInfo
+            key = repo_view_key(repo, kind)
+            if key is None or key in self.viewCache or key in self.viewKeysPrefetching:
+                continue
+            self.prefetchRepoView(repo, kind, key)
+
+
+    def prefetchRepoView(self, repo: MgRepoInfo, kind: str, key: Hashable) -> None:
+        '''Fill the view cache with the diff or last commit of the repository'''
+        dbg('prefetchRepoView("%s", %s)' % (repo.name, kind))
+        self.viewKeysPrefetching.add(key)
+
+        if kind == VIEW_LAST_COMMIT:
+            def cbLastCommit(_repoName: str, lastCommit: str) -> None:
+                self.viewKeysPrefetching.discard(key)
+                self.viewCache.put(key, lastCommit)
+
+            repo.ensure_last_commit(cbLastCommit)
             return
 
-        self.textEditModFiles.setText(htmlize_diff(repo_diff or '', MAX_DIFF_LINES))
+        diffView = MgDiffView()
+
+        def cbDiffDone(_repoName: str, _diff: str, truncated: bool) -> None:
+            self.viewKeysPrefetching.discard(key)
+            diffView.truncated = truncated
+            self.viewCache.put(key, diffView)
+
+        def cbDiffFailed(_repoName: str) -> None:
+            # nothing to cache, the view may be prefetched again later
+            self.viewKeysPrefetching.discard(key)
+
+        repo.ensure_diff(cbDiffDone, MAX_DIFF_LINES, lambda _repoName, firstLineIdx, lines: diffView.add_lines(firstLineIdx, lines),
+                         cbDiffFailed)
 
 
     def slotViewTabChanged(self, showTabLastCommit: bool, showTabModFiles: bool) -> None:
@@ -228,17 +471,58 @@ class MgMultigitWidget(QWidget, Ui_MultigitWidget):
 
     def openDir(self, newDir: str, ignoreNonExisting: bool = False) -> None:
         info('Opening dir: %s' % newDir)
+        self.deferredBaseDir = None
         self.buttonHistoryBaseDir.fillHistory(self.config.lruAsList(mgc.CONFIG_LAST_OPENED))
         self.setBaseDir(newDir)
 
 
+    def setDeferredBaseDir(self, baseDir: str) -> None:
+        '''Remember the base directory without opening it: no scan and no refresh is done until
+        loadDeferredBaseDir() is called, when the tab is activated for the first time.'''
+        dbg('setDeferredBaseDir( %s )' % baseDir)
+        self.deferredBaseDir = baseDir
+
+
+    def isDeferred(self) -> bool:
+        '''Return True if the base directory of the tab is not opened yet'''
+        return self.deferredBaseDir is not None
+
+
+    def loadDeferredBaseDir(self) -> None:
+        '''Open the base directory set with setDeferredBaseDir(), if not already done'''
+        if self.deferredBaseDir is None:
+            return
+        self.openDir(self.deferredBaseDir)
+
+
+    def baseDir(self) -> str:
+        '''Return the base directory of the tab, even if it is not opened yet'''
+        if self.deferredBaseDir is not None:
+            return self.deferredBaseDir
+        return self.multiRepo.base_dir
+
+
     def slotRefreshAll(self) -> None:
+        '''Refresh all repositories, then look for repositories added or removed in the background'''
         dbg('slotRefreshAll()')
         self.repoTree.setFocus(Qt.FocusReason.OtherFocusReason)
+        self.repoTree.refreshQueue.requestRefreshList(self.multiRepo.repo_list)
+
+        if not self.multiRepo.isEmpty() and not self.isScanningRepos():
+            # a scan in progress will already find the new repositories
+            self.startRepoScan()
+
+
+    def refreshAllAndWait(self) -> None:
+        '''Refresh all repositories, looking for repositories added or removed before returning.
+
+        Use this when the complete list of repositories is needed right after.'''
+        dbg('refreshAllAndWait()')
+        self.cancelRepoScan()
+        self.repoTree.setFocus(Qt.FocusReason.OtherFocusReason)
         try:
             self.setCursor(Qt.CursorShape.WaitCursor)
             QApplication.processEvents()
-            # we keep that one blocking, it's very quick anyways
             added_repo, rm_repo = self.multiRepo.find_git_repos_added_removed()
 
             self.repoTree.deleteRepos(rm_repo)
@@ -252,10 +536,11 @@ class MgMultigitWidget(QWidget, Ui_MultigitWidget):
 
         # 2nd step, update multi-repo
         self.multiRepo.adjust_git_repos(added_repo, rm_repo)
+        self.connectRepoCache(added_repo)
+        self.repoWatcher.setRepos(self.multiRepo.repo_list)
 
         # 3rd step: update all the repos
-        for it in self.multiRepo.repo_list:
-            it.refresh()
+        self.repoTree.refreshQueue.requestRefreshList(self.multiRepo.repo_list)
 
 
     def slotGitFetchAll(self) -> None:
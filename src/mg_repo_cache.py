@@ -0,0 +1,171 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from typing import Dict, Any, List
+import os, ast, logging, traceback, time
+from pathlib import Path
+from pprint import pformat
+from functools import lru_cache
+
+from src.mg_repo_info import MgRepoInfo
+from src.mg_git_refs import git_admin_dirs
+from src import mg_config as mgc
+
+logger = logging.getLogger('mg_repo_cache')
+dbg = logger.debug
+warn = logger.warning
+
+REPO_CACHE_FNAME = 'multigit_repo_cache.config'
+
+# files of the git admin directory whose modification means that the repository state changed
+FINGERPRINT_FILES = ['HEAD', 'index', 'config', 'packed-refs', 'FETCH_HEAD']
+
+# entries of repositories not seen by Multigit for this duration are removed from the cache
+REPO_CACHE_MAX_AGE_DAYS = 90
+
+
+@lru_cache(maxsize=1)
+def get_repo_cache_instance() -> 'MgRepoStateCache':
+    '''Return the repository state cache of Multigit, stored next to the configuration file'''
+    cache = MgRepoStateCache(str(mgc.get_config_instance().config_path.parent / REPO_CACHE_FNAME))
+    cache.load()
+    return cache
+
+
+def repo_fingerprint(repo_fullpath: str) -> List[int]:
+    '''Return a fingerprint of the repository state, made of the modification times of the git files
+    which change when HEAD, the index, the refs or the remote configuration change.
+
+    Missing files count as 0. Return an empty list if the git directory can not be found.
+    '''
+    admin_dirs = git_admin_dirs(repo_fullpath)
+    fingerprint: List[int] = []
+    for admin_dir in admin_dirs:
+        for fname in FINGERPRINT_FILES:
+            try:
+                fingerprint.append(os.stat(admin_dir / fname).st_mtime_ns)
+            except OSError:
+                fingerprint.append(0)
+
+        fingerprint += refs_dirs_fingerprint(admin_dir)
+
+    return fingerprint
+
+
+def refs_dirs_fingerprint(admin_dir: Path) -> List[int]:
+    '''Return the modification times of the directories containing the loose refs of a git admin directory'''
+    fingerprint: List[int] = []
+    # refs are updated by renaming a lock file, which changes the mtime of the directory containing them
+    for dirpath, _dirnames, _filenames in os.walk(admin_dir / 'refs'):
+        try:
+            fingerprint.append(os.stat(dirpath).st_mtime_ns)
+        except OSError:
+            fingerprint.append(0)
+    return fingerprint
+
+
+class MgRepoStateCache:
+    '''Persistent cache of the last known state of repositories, keyed by repository full path.
+
+    Each entry stores the fields of MgRepoInfo.CACHED_STATE_FIELDS along with the fingerprint
+    of the repository at the time the state was collected. This allows to display the repository
+    state immediately when opening a directory, and to know which repositories have changed since.
+    '''
+
+    def __init__(self, cache_path: str) -> None:
+        self.cache_path = Path(cache_path)
+        self.cache_dict: Dict[str, Dict[str, Any]] = {}
+        self.modified = False
+
+
+    def load(self) -> None:
+        '''Load the cache from disk. An unreadable cache is simply ignored.'''
+        self.cache_dict = {}
+        self.modified = False
+        if not self.cache_path.exists():
+            return
+
+        try:
+            with open(self.cache_path, 'r', encoding='utf8') as f:
+                cache_dict = ast.literal_eval(f.read())
+            if isinstance(cache_dict, dict):
+                self.cache_dict = cache_dict
+        except Exception:
+            # this is only a cache, we start from an empty one
+            warn('Could not read repository cache %s, ignoring it' % self.cache_path)
+            dbg(traceback.format_exc())
+
+
+    def prune(self) -> None:
+        '''Remove the entries of repositories which no longer exist, or which were not seen for
+        more than REPO_CACHE_MAX_AGE_DAYS'''
+        oldest_seen = time.time() - REPO_CACHE_MAX_AGE_DAYS * 24 * 3600
+        for repo_fullpath, state in list(self.cache_dict.items()):
+            if state.get('last_seen', 0) < oldest_seen or not os.path.isdir(repo_fullpath):
+                dbg('Removing %s from repository cache' % repo_fullpath)
+                del self.cache_dict[repo_fullpath]
+                self.modified = True
+
+
+    def save(self) -> None:
+        '''Save the cache to disk, if it was modified. Obsolete entries are removed first.'''
+        self.prune()
+        if not self.modified:
+            return
+        dbg('Saving repository cache to %s' % self.cache_path)
+        try:
+            if not self.cache_path.parent.exists():
+                self.cache_path.parent.mkdir(parents=True)
+            with open(self.cache_path, 'w', encoding='utf8') as f:
+                f.write(pformat(self.cache_dict, indent=4, width=200))
+            self.modified = False
+        except OSError:
+            warn('Could not save repository cache %s' % self.cache_path)
+
+
+    def storeRepoState(self, repo: MgRepoInfo) -> None:
+        '''Record the current state of the repository along with its fingerprint'''
+        state = repo.cached_state()
+        previous_state = self.cache_dict.get(repo.fullpath)
+        if state['url'] is None and previous_state is not None:
+            # url is not always fetched, keep the last known one
+            state['url'] = previous_state.get('url')
+        state['fingerprint'] = repo_fingerprint(repo.fullpath)
+        state['last_seen'] = int(time.time())
+        self.cache_dict[repo.fullpath] = state
+        self.modified = True
+
+
+    def restoreRepoState(self, repo: MgRepoInfo) -> bool:
+        '''Fill the repository with its cached state, if any.
+
+        Return True if the repository did not change since the state was cached, False if there is no cached state
+        or if the repository changed and needs a refresh.
+        '''
+        state = self.cache_dict.get(repo.fullpath)
+        if state is None:
+            return False
+
+        repo.fill_from_cached_state(state)
+        fingerprint = repo_fingerprint(repo.fullpath)
+        return len(fingerprint) > 0 and fingerprint == state.get('fingerprint')
+
+
+    def forgetRepo(self, repo_fullpath: str) -> None:
+        '''Remove a repository from the cache'''
+        if self.cache_dict.pop(repo_fullpath, None) is not None:
+            self.modified = True
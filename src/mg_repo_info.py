@@ -15,16 +15,23 @@
 #
 
 
-from typing import Dict, Tuple, Optional, List, Callable, Any, Sequence
-import logging, re, csv, pathlib, os
+from typing import Dict, Tuple, Optional, List, Callable, Any, Sequence, Iterator
+import logging, re, csv, pathlib, os, enum
 
 from PySide6.QtCore import Signal, QObject, QCoreApplication
 from PySide6.QtWidgets import QMessageBox
 
 from src.mg_const import MSG_NO_COMMIT, MSG_REMOTE_TOPUSH_TOPULL, MSG_REMOTE_SYNCHRO_OK, MSG_REMOTE_TOPULL, \
-    MSG_REMOTE_TOPUSH, MSG_REMOTE_BRANCH_GONE, MSG_LOCAL_BRANCH, SHORT_SHA1_NB_DIGITS, MSG_EMPTY_REPO, MSG_REMOTE_NA
-from src.mg_tools import ExecGit, scan_git_dirs
+    MSG_REMOTE_TOPUSH, MSG_REMOTE_BRANCH_GONE, MSG_LOCAL_BRANCH, SHORT_SHA1_NB_DIGITS, MSG_EMPTY_REPO, MSG_REMOTE_NA, \
+    MAX_DIFF_LINES, MAX_PATIENCE_DIFF_SIZE
+from src.mg_tools import ExecGit, RunProcess, scan_git_dirs
+from src.mg_exec_core import ExecStatus, EXIT_CODE_CRASHED
+from src.mg_git_refs import MgGitRefs
+from src.mg_git_index import MgGitIndex
+from src.mg_git_cat_file import get_cat_file_pool, read_last_commit, read_head_tags
+from src.mg_repo_registry import MgRepoState, SharedField, get_repo_registry
 from src.mg_utils import anonymise_git_url, normalize_path
+from src import mg_config as mgc
 
 logger = logging.getLogger('mg_repo_info')
 dbg = logger.debug
@@ -72,6 +79,29 @@ def is_not_sha1(ref: str) -> bool:
     return False
 
 
+def remote_synchro_from_ahead_behind(nb_ahead: int, nb_behind: int) -> str:
+    '''Return the remote synchro message for a branch with nb_ahead commits to push and nb_behind commits to pull'''
+    if nb_ahead > 0 and nb_behind > 0:
+        return MSG_REMOTE_TOPUSH_TOPULL % (nb_ahead, nb_behind)
+    elif nb_ahead > 0:
+        return MSG_REMOTE_TOPUSH % nb_ahead
+    elif nb_behind > 0:
+        return MSG_REMOTE_TOPULL % nb_behind
+    return MSG_REMOTE_SYNCHRO_OK
+
+
+class RefreshScope(enum.Flag):
+    '''Information of a repository which an operation may change, see MgRepoInfo.partial_refresh()'''
+    Nothing = 0
+    # commits to push and to pull, and the list of remote branches: fetch, push
+    RemoteSynchro = enum.auto()
+    # tags pointing at HEAD and list of all tags: tag, fetch
+    Tags = enum.auto()
+    # status, HEAD, commit sha1, last commit, branches: commit, checkout, merge, pull, ... and any unknown operation
+    WorkTree = enum.auto()
+    All = RemoteSynchro | Tags | WorkTree
+
+
 class MultiRepo:
     '''Public fields:
     - base_path: base path for finding all contained git repositories
@@ -116,20 +146,66 @@ class MultiRepo:
         '''Return the number of repos'''
         return len(self.repo_names)
 
-    def find_git_repos(self) -> List[str]:
-        '''Return a list of git repos contained in base_dir, including base_dir itself, sorted by name'''
-        dbg(f'MultiRepo.find_git_repos() - self.base_dir={self.base_dir}')
+    def scan_git_dirs(self, should_stop: Optional[Callable[[], bool]] = None) -> Iterator[str]:
+        '''Return the git directories (.git) found in base_dir, using the scan options of the configuration.
+
+        should_stop is called regularly during the scan, which is interrupted when it returns True.'''
+        config = mgc.get_config_instance()
+        return scan_git_dirs(str(self.base_path),
+                             ignore_globs=config.get(mgc.CONFIG_SCAN_IGNORE_GLOBS),
+                             max_depth=config.get(mgc.CONFIG_SCAN_MAX_DEPTH),
+                             nested_repos=config.get(mgc.CONFIG_SCAN_NESTED_REPOS, True),
+                             should_stop=should_stop)
+
+
+    def repo_name_from_git_dir(self, git_dir: str) -> str:
+        '''Return the name of the repository of a git directory (.git) found in base_dir'''
+        return normalize_path(pathlib.Path(git_dir).parent.relative_to(self.base_path))
+
+
+    def add_git_dir(self, git_dir: str) -> Optional['MgRepoInfo']:
+        '''Add the repository of a git directory (.git) found in base_dir, keeping the repositories sorted by name.
+
+        Return the new MgRepoInfo, or None if the repository is already known.'''
+        repo_name = self.repo_name_from_git_dir(git_dir)
+        if repo_name in self.repo_dict:
+            return None
+
+        repo_info = MgRepoInfo(repo_name, str(pathlib.Path(git_dir).parent.resolve()), repo_name, shared=True)
+        key = repo_name.lower()
+        lo, hi = 0, len(self.repo_names)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.repo_names[mid].lower() <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        self.repo_names.insert(lo, repo_name)
+        self.repo_list.insert(lo, repo_info)
+        self.repo_dict[repo_name] = repo_info
+        repo_info.repo_deleted.connect(self.slotRepoDeleted)
+        return repo_info
+
+
+    def clear(self) -> None:
+        '''Forget all the repositories'''
         self.repo_dict = {}
         self.repo_list = []
         self.repo_names = []
+
+
+    def find_git_repos(self) -> List[str]:
+        '''Return a list of git repos contained in base_dir, including base_dir itself, sorted by name'''
+        dbg(f'MultiRepo.find_git_repos() - self.base_dir={self.base_dir}')
+        self.clear()
         self.base_path = pathlib.Path(self.base_dir)
-        for d in scan_git_dirs(str(self.base_path)):
+        for d in self.scan_git_dirs():
             repo = pathlib.Path(d).parent
             repo_name = normalize_path(repo.relative_to(self.base_path))
             self.repo_names.append(repo_name)
 
             repo_path = str(repo.resolve())
-            repo_info = MgRepoInfo(repo_name, repo_path, repo_name)
+            repo_info = MgRepoInfo(repo_name, repo_path, repo_name, shared=True)
             self.repo_dict[repo_name] = repo_info
             self.repo_list.append(repo_info)
             repo_info.repo_deleted.connect(self.slotRepoDeleted)
@@ -164,7 +240,7 @@ class MultiRepo:
         if self.base_dir == '':
             return [], []
         self.base_path = pathlib.Path(self.base_dir)
-        for d in scan_git_dirs(str(self.base_path)):
+        for d in self.scan_git_dirs():
             repo = pathlib.Path(d).parent
             repo_name = normalize_path(repo.relative_to(self.base_path))
             new_repo_names.append(repo_name)
@@ -174,7 +250,7 @@ class MultiRepo:
         added_repo = []
         for repo_name in added_repo_names:
             repo_path = normalize_path((self.base_path / repo_name).resolve())
-            repo_info = MgRepoInfo(repo_name, repo_path, repo_name)
+            repo_info = MgRepoInfo(repo_name, repo_path, repo_name, shared=True)
             added_repo.append(repo_info)
 
         rm_repo = [ self.repo_dict[repo_name] for repo_name in rm_repo_names ]
@@ -243,41 +319,54 @@ class MgRepoInfo(QObject):
 
     name: str                   # name of the repo == relative path to the base directory
     relpath: str                # the relative path of this repo to the base dir, usually same as name
-    fullpath: str               # the full path to the repository, used for running git commands
-    url: Optional[str]          # None when not filled yet, string (possibly empty) when filled
-    status: str                 # emtpy string when not filled, string when filled. Description of the modified files
-    tag: str                    # current tag we are on, if any. Empty string when not pointing on a tag
-    branch: str                 # current branch we are on, if any. Emtpy string when not on a branch, "<empty repo>" is also a valid value
-    head: str                   # description of what head points: "branch XXX", "tag XXX", "commit XXX", "<empty repo>"
-    last_commit: str            # message of the last commit
-    commit_date: Optional[str]  # date of the last commit
-    commit_sha1: Optional[str]  # sha1 of the last commit, None if not set
-    diff: Optional[str]         # diff of the last commit if any
-    diff_summary: Optional[str] # list of modified files in the diff
-    remote_branch: str          # remote-branch of any, or empty string
-    remote_synchro: str         # informative message about sync with remote branch:
-                                    # "xx to push, yy to pull"
-                                    # "remote branch gone"
-                                    # "NA for local branch"
-                                    # "up-to-date"
-    branches_local: List[str]   # list of all local branches on this repo
-    branches_remote: List[str]  # list of all remote branches on this repo
-    branches_filled: bool       # True when the attributes branches_* have been filled
-    tags: Optional[str]         # all the tags pointing at this commit. None when not filled, comma separated list of tags
-    all_tags: List[str]   # all tags existing on this repo
-    all_tags_filled: bool           # set when all tags of the repo
-    files_sha1: List[Tuple[str, str]]  # List of (files, sha1)
-    files_sha1_filled: bool           # set when files sha1 of the repo is filled
-    is_deleted: bool                # set to True when emitting the signal repo_deleted
-
-    tag_or_commit: Optional[str]    # internal field, used in log -1
-    force_blocking_git: bool        # internal field, used in ensure_all_filled()
-
+    fullpath = SharedField[str]()                       # the full path to the repository, used for running git commands
+    url = SharedField[Optional[str]]()                  # None when not filled yet, string (possibly empty) when filled
+    status = SharedField[str]()                         # emtpy string when not filled, string when filled. Description of the modified files
+    tag = SharedField[str]()                            # current tag we are on, if any. Empty string when not pointing on a tag
+    branch = SharedField[str]()                         # current branch we are on, if any. Emtpy string when not on a branch, "<empty repo>" is also a valid value
+    head = SharedField[str]()                           # description of what head points: "branch XXX", "tag XXX", "commit XXX", "<empty repo>"
+    last_commit = SharedField[str]()                    # message of the last commit
+    commit_date = SharedField[Optional[str]]()          # date of the last commit
+    commit_sha1 = SharedField[Optional[str]]()          # sha1 of the last commit, None if not set
+    diff = SharedField[Optional[str]]()                 # diff of the working tree, limited to the number of lines requested
+    diff_truncated = SharedField[bool]()                # True when diff does not contain the whole diff of the working tree
+    modified_files = SharedField[Optional[List[str]]]()  # files modified in the working tree, None when not filled
+    diff_summary = SharedField[Optional[str]]()         # list of modified files in the diff
+    remote_branch = SharedField[str]()                  # remote-branch of any, or empty string
+    remote_synchro = SharedField[str]()                 # informative message about sync with remote branch:
+                                                            # "xx to push, yy to pull"
+                                                            # "remote branch gone"
+                                                            # "NA for local branch"
+                                                            # "up-to-date"
+    branches_local = SharedField[List[str]]()           # list of all local branches on this repo
+    branches_remote = SharedField[List[str]]()          # list of all remote branches on this repo
+    branches_filled = SharedField[bool]()               # True when the attributes branches_* have been filled
+    tags = SharedField[Optional[str]]()                 # all the tags pointing at this commit. None when not filled, comma separated list of tags
+    all_tags = SharedField[List[str]]()                 # all tags existing on this repo
+    all_tags_filled = SharedField[bool]()               # set when all tags of the repo
+    files_sha1 = SharedField[MgGitIndex]()              # sorted sequence of (files, sha1)
+    files_sha1_filled = SharedField[bool]()             # set when files sha1 of the repo is filled
+    is_deleted = SharedField[bool]()                    # set to True when emitting the signal repo_deleted
+
+    force_blocking_git = SharedField[bool]()            # internal field, used in ensure_all_filled()
+    requests_in_flight = SharedField[Dict[str, List[Callable[[], Any]]]]()  # git requests running, with the callbacks waiting for them
+    refresh_pending = SharedField[Optional[bool]]()     # refresh to run when the current one is over, with its clearUrl argument
+    info_from_git = SharedField[bool]()                 # True when the basic information was filled by git, not by the persistent cache
+    fingerprint = SharedField[Optional[List[int]]]()    # fingerprint of the repository when its information was read, see MgRepoWatcher
+
+    # name and relpath depend on the base directory of the MgRepoInfo. The SharedField are stored in the state
+    # shared with the other MgRepoInfo of the same repository, when the repository is displayed in several tabs
+    state: MgRepoState
+
+
+    # fields saved and restored by the persistent repository cache
+    CACHED_STATE_FIELDS = ['head', 'branch', 'tag', 'status', 'remote_branch', 'remote_synchro', 'commit_sha1', 'url']
 
     # signals to emit
     repo_update_in_progress = Signal(str)
     repo_info_available = Signal(str)
     repo_deleted = Signal(str)
+    repo_update_done = Signal(str)      # emitted when fill_repo_info() is over, successful or not
 
 
     def __repr__(self) -> str:
@@ -285,21 +374,48 @@ class MgRepoInfo(QObject):
         return s
 
 
-    def __init__(self, name: str, fullpath: str, relpath: str = '') -> None:
+    def __init__(self, name: str, fullpath: str, relpath: str = '', shared: bool = False) -> None:
+        '''Create the information of a repository.
+
+        If shared is True, the state of the repository is shared with the other MgRepoInfo created with shared=True
+        for the same repository, through the registry of repositories.'''
         super().__init__()
 
         # normalize the name between / and \
         self.name = normalize_path(name)
         self.relpath = normalize_path(relpath)
+
+        resolved_fullpath = normalize_path(pathlib.Path(fullpath).resolve())
+        self.state = get_repo_registry().state_for(resolved_fullpath) if shared else MgRepoState()
+        self.state.add_repo_info(self)
+        if self.state.initialized:
+            # information already collected for another tab
+            return
+        self.state.initialized = True
+
         self.force_blocking_git = False
 
-        self.cb_repo_info_available: Optional[Callable[[str], Any]] = None
+        # requests are identified by the information they fill: 'repo_info', 'url', 'last_commit', 'branches',
+        # 'all_tags', 'files_sha1'
+        self.requests_in_flight = {}
+        self.refresh_pending = None
 
         # full path to our repo
-        self.fullpath = normalize_path(pathlib.Path(fullpath).resolve())
+        self.fullpath = resolved_fullpath
 
+        self.files_sha1 = MgGitIndex()
+        self.files_sha1_filled = False
+        self.fingerprint = None
         self._clear_all()
 
+
+    def for_each_repo_info(self, action: Callable[['MgRepoInfo'], Any]) -> None:
+        '''Apply the action to all the MgRepoInfo sharing the state of this repository, typically to emit a signal
+        to the items of all tabs'''
+        for repo_info in self.state.repo_infos():
+            action(repo_info)
+
+
     def _clear_all(self, clearUrl: bool = True) -> None:
         dbg(f'clear_all(clearUrl={clearUrl}) - {self.name}')
         self._clear_basic_info()
@@ -307,9 +423,9 @@ class MgRepoInfo(QObject):
             self.url = None
         self.last_commit = ''
         self.diff = None
+        self.diff_truncated = False
         self.diff_summary = None
         self.commit_sha1 = None
-        self.tag_or_commit = None
         self.commit_date = None
         self.branches_filled = False
         self.branches_local = []
@@ -327,7 +443,7 @@ class MgRepoInfo(QObject):
         if not os.path.exists(self.fullpath)  \
             or not os.path.exists(os.path.join(self.fullpath, '.git')):
             self.is_deleted = True
-            self.repo_deleted.emit(self.relpath)
+            self.for_each_repo_info(lambda repo_info: repo_info.repo_deleted.emit(repo_info.relpath))
             return True
 
         return False
@@ -341,12 +457,16 @@ class MgRepoInfo(QObject):
         self.head = ''
         self.remote_branch = ''
         self.status = ''
+        self.info_from_git = False
+        self.modified_files = None
         self.remote_synchro = ''
         self.tags = None
         self.all_tags = []
         self.all_tags_filled = False
-        self.files_sha1 = []
-        self.files_sha1_filled = False
+        # the files of the index are kept as long as the index file does not change
+        if not self.files_sha1.is_up_to_date():
+            self.files_sha1 = MgGitIndex()
+            self.files_sha1_filled = False
 
 
     def deepRefresh(self) -> 'MgRepoInfo':
@@ -370,13 +490,53 @@ class MgRepoInfo(QObject):
 
 
     def _refresh(self, clearUrl: bool) -> 'MgRepoInfo':
-        '''Reread all relevant information from git repositories, and keep or clear url depending on parameter'''
+        '''Reread all relevant information from git repositories, and keep or clear url depending on parameter.
+
+        If the information is already being read, the repository may have changed since git started: a single
+        refresh is run when the current one is over, whatever the number of calls in the meantime.'''
         dbg(f'_refresh(clearUrl={clearUrl}) - %s' % self.name)
+        if self.is_update_in_progress() and not self.force_blocking_git:
+            self.refresh_pending = bool(self.refresh_pending) or clearUrl
+            return self
         self._clear_all(clearUrl)
         self.fill_repo_info()
         return self
 
 
+    def partial_refresh(self, scope: RefreshScope) -> 'MgRepoInfo':
+        '''Reread only the information which an operation may have changed, with the cheapest git query:
+        - WorkTree needs git status, this is a regular refresh()
+        - RemoteSynchro counts the commits ahead and behind the remote branch, without scanning the working tree
+        - Tags are only cleared, they are read again when needed
+
+        The last commit is cleared by RemoteSynchro and Tags, because it is decorated with the branches and tags
+        pointing at it. Keep the remote url.'''
+        dbg(f'partial_refresh({scope}) - {self.name}')
+        if scope & RefreshScope.WorkTree or (scope and (self.is_update_in_progress() or not self.info_from_git)):
+            # the other information is not known from git yet or is being read: a regular refresh is needed
+            return self.refresh()
+
+        if scope & (RefreshScope.Tags | RefreshScope.RemoteSynchro):
+            # git log --decorate of the last commit shows the tags and remote branches
+            self.last_commit = ''
+
+        if scope & RefreshScope.Tags:
+            self.tags = None
+            self.all_tags = []
+            self.all_tags_filled = False
+
+        if scope & RefreshScope.RemoteSynchro:
+            self.branches_filled = False
+            self.branches_local = []
+            self.branches_remote = []
+            if not self.remote_branch and self.head.startswith('branch ') \
+                    and MgGitRefs(self.fullpath).upstream_branch(self.branch) != '':
+                # a remote branch may have been configured, for example by git push --set-upstream
+                return self.refresh()
+            self.fill_remote_synchro()
+        return self
+
+
     def nice_status(self) -> str:
         '''Nicer status line, longer to display'''
         s = self.status
@@ -403,16 +563,78 @@ class MgRepoInfo(QObject):
         '''Called when basic information has been filled (result of calling fill_repo_info()).
 
         Actions:
-        * calls the callback self.cb_repo_info_available if set, and reset it to None
+        * calls the callbacks waiting for the information
         * emit the signal repo_info_available
+        * run the refresh requested in the meantime, if any
+        * emit the signal repo_update_done
+        '''
+        self.complete_request_in_flight('repo_info')
+        self.info_from_git = True
+        self.for_each_repo_info(lambda repo_info: repo_info.repo_info_available.emit(repo_info.name))
+        self.run_pending_refresh()
+        self.for_each_repo_info(lambda repo_info: repo_info.repo_update_done.emit(repo_info.name))
+
+
+    def repo_info_failed(self) -> None:
+        '''Called when git could not fill the basic information. The callbacks waiting for it are not called.'''
+        self.requests_in_flight.pop('repo_info', None)
+        self.run_pending_refresh()
+        self.for_each_repo_info(lambda repo_info: repo_info.repo_update_done.emit(repo_info.name))
+
+
+    def run_pending_refresh(self) -> None:
+        '''Run the refresh requested while the basic information was being filled'''
+        if self.refresh_pending is None or self.is_deleted:
+            self.refresh_pending = None
+            return
+        clear_url = self.refresh_pending
+        self.refresh_pending = None
+        self._refresh(clear_url)
+
+
+    def is_update_in_progress(self) -> bool:
+        '''Return True while the basic information is being filled'''
+        return 'repo_info' in self.requests_in_flight
+
+
+    def join_request_in_flight(self, request: str, cb: Optional[Callable[[], Any]] = None) -> bool:
+        '''Register a callback to call when the information filled by the request is available.
+
+        Return True when the same request is already running: the callback is called when it completes and
+        no other git command should be started. Return False when the caller must run the request and call
+        complete_request_in_flight() when it is done.
+
+        Blocking calls never wait for a running request, since the information must be available when they
+        return. Their completion also serves the callbacks of the running request.
         '''
-        if self.cb_repo_info_available is not None:
-            # set self.cb_repo_info_available to None first, to avoid recursive calls
-            cb_repo_info_available = self.cb_repo_info_available
-            self.cb_repo_info_available = None
-            cb_repo_info_available(self.name)
+        running = request in self.requests_in_flight
+        callbacks = self.requests_in_flight.setdefault(request, [])
+        if cb is not None:
+            callbacks.append(cb)
+        return running and not self.force_blocking_git
+
+
+    def complete_request_in_flight(self, request: str) -> None:
+        '''Call the callbacks waiting for the request, which is no longer running'''
+        # remove the request first, so that callbacks may start a new one
+        for cb in self.requests_in_flight.pop(request, []):
+            cb()
+
 
-        self.repo_info_available.emit(self.name)
+    def cached_state(self) -> Dict[str, Any]:
+        '''Return the fields of the repository state which are stored in the persistent cache'''
+        return { field: getattr(self, field) for field in self.CACHED_STATE_FIELDS }
+
+
+    def fill_from_cached_state(self, state: Dict[str, Any]) -> None:
+        '''Fill the repository state from a previously cached state.
+
+        The information may be outdated, so the signal repo_info_available is not emitted: it is reserved
+        to information coming from git.'''
+        dbg('fill_from_cached_state() - %s' % self.name)
+        for field in self.CACHED_STATE_FIELDS:
+            if field in state:
+                setattr(self, field, state[field])
 
 
     def ensure_all_filled(self) -> 'MgRepoInfo':
@@ -436,7 +658,8 @@ class MgRepoInfo(QObject):
             self.ensure_last_commit()
             self.ensure_tags()
             self.ensure_diff_summary()
-            self.ensure_diff()
+            # the properties display the whole diff, not the first lines like the modified files pane
+            self.ensure_diff(max_lines=-1)
             self.ensure_commit_date()
         finally:
             self.force_blocking_git = old_force_blocking_git
@@ -478,7 +701,7 @@ class MgRepoInfo(QObject):
                 self.ensure_url(local_cb_url)
 
             # basic information is missing
-            if self.head == '':
+            if self.head == '' and not self.fill_head_from_refs():
                 self.fill_repo_info(local_cb_fill_repo_info)
                 return
 
@@ -521,36 +744,139 @@ class MgRepoInfo(QObject):
          - last_commit
          - commit_date (side-effect)
          - commit_sha1 (side-effect)
+         - tags (side-effect)
          '''
 
-        # local function to allow calling the callback
+        local_cb_last_commit: Optional[Callable[[], None]] = None
+        if cb_last_commit:
+            def local_cb_last_commit() -> None:
+                cb_last_commit(self.name, self.last_commit)
+
+        if self.join_request_in_flight('last_commit', local_cb_last_commit):
+            return
+
+        # local function to allow calling the callbacks
         def local_fill_last_commit_git_log_done(repo_name: str, git_exit_code: int, git_output: str) -> None:
             self.cb_fill_repo_info_log_done(repo_name, git_exit_code, git_output)
-            if cb_last_commit:
-                cb_last_commit(repo_name, self.last_commit)
+            self.complete_request_in_flight('last_commit')
+
+        # no need to run git when the commit can be read with the cat-file worker of the repository
+        log_out = read_last_commit(self.fullpath, get_cat_file_pool())
+        if log_out is not None:
+            local_fill_last_commit_git_log_done(self.name, 0, log_out)
+            return
 
         # errors possible for empty repository
-        self.git_exec_async_here(['log', '-1'], local_fill_last_commit_git_log_done, allow_errors=True)
+        self.git_exec_async_here(['log', '-1', '--decorate=short'], local_fill_last_commit_git_log_done, allow_errors=True)
 
 
-    def ensure_diff(self, cb_fill_diff: Optional[Callable[[str, str], Any]] = None) -> None:
-        '''Ensure that diff information is filled'''
-        dbg('ensure_diff() - %s' % self.name)
-        if self.diff is not None:
+    def ensure_diff(self, cb_fill_diff: Optional[Callable[[str, str, bool], Any]] = None,
+                    max_lines: int = MAX_DIFF_LINES,
+                    cb_diff_lines: Optional[Callable[[str, int, List[str]], Any]] = None,
+                    cb_diff_failed: Optional[Callable[[str], Any]] = None) -> None:
+        '''Ensure that diff information is filled, with at most max_lines lines of diff (-1 for no limit).
+
+        git is stopped as soon as max_lines lines are received, so that a huge diff does not freeze the UI
+        nor fill the memory. The patience algorithm is not used when the modified files are too big.
+
+        cb_diff_lines is called with the index of the first line and the new lines, as soon as they are received.
+        cb_fill_diff is called at the end, with the diff and True if the diff was truncated to max_lines.
+        cb_diff_failed is called instead of cb_fill_diff if git fails, with the name of the repository.
+        '''
+        dbg('ensure_diff(max_lines=%d) - %s' % (max_lines, self.name))
+        if self.diff is not None and (not self.diff_truncated or 0 <= max_lines <= self.diff.count('\n') + 1):
+            lines = self.diff.split('\n')
+            truncated = self.diff_truncated
+            if 0 <= max_lines < len(lines):
+                lines = lines[:max_lines]
+                truncated = True
+            if cb_diff_lines:
+                cb_diff_lines(self.name, 0, lines)
             if cb_fill_diff:
-                cb_fill_diff(self.name, self.diff)
+                cb_fill_diff(self.name, '\n'.join(lines), truncated)
             return
 
+        diff_lines: List[str] = []
+        partial_line = ''
+        output_streamed = False
+        diff_done = False
+        process: Optional[RunProcess] = None
+
+        def diff_finished(truncated: bool) -> None:
+            nonlocal diff_done
+            diff_done = True
+            self.diff = '\n'.join(diff_lines)
+            self.diff_truncated = truncated
+            if cb_fill_diff:
+                cb_fill_diff(self.name, self.diff, truncated)
+
+        def add_diff_lines(lines: List[str]) -> None:
+            truncated = max_lines != -1 and len(diff_lines) + len(lines) > max_lines
+            if truncated:
+                lines = lines[:max_lines - len(diff_lines)]
+            first_line_idx = len(diff_lines)
+            diff_lines.extend(lines)
+            if cb_diff_lines and lines:
+                cb_diff_lines(self.name, first_line_idx, lines)
+            if truncated:
+                if process is not None:
+                    # we have all the lines we need, no need to let git compute the rest of the diff
+                    process.abortProcessInProgress(call_cb_done=False)
+                diff_finished(True)
+
+        def local_cb_diff_output(diff_out: str) -> None:
+            nonlocal partial_line, output_streamed
+            output_streamed = True
+            if diff_done:
+                return
+            lines = (partial_line + diff_out).split('\n')
+            partial_line = lines.pop()
+            add_diff_lines([l.rstrip('\r') for l in lines])
+
         def local_cb_fill_diff_done(repo_name: str, exit_code: int, diff_out: str) -> None:
+            if diff_done:
+                return
             if exit_code != 0:
                 self.abortBecauseRepoDeleted()
+                if cb_diff_failed:
+                    cb_diff_failed(self.name)
                 return
-            self.diff = diff_out
-            if cb_fill_diff:
-                cb_fill_diff(repo_name, self.diff)
+            if output_streamed:
+                lines = [partial_line] if partial_line else []
+            else:
+                # blocking execution, the output was not streamed
+                lines = diff_out.split('\n')
+                if lines[-1] == '':
+                    lines.pop()
+            add_diff_lines(lines)
+            if not diff_done:
+                diff_finished(False)
+
+        args = ['diff', '-u', '--stat']
+        if self.modified_files_size() <= MAX_PATIENCE_DIFF_SIZE:
+            args.insert(2, '--patience')
 
         # errors possible when repo is deleted
-        self.git_exec_async_here(['diff', '-u', '--patience', '--stat'], local_cb_fill_diff_done, allow_errors=True)
+        process = self.git_exec_async_here(args, local_cb_fill_diff_done, allow_errors=True,
+                                           output_callback=local_cb_diff_output)
+
+
+    def modified_files_size(self) -> int:
+        '''Return the total size of the modified files of the working tree, as known by the last status.
+
+        The size is unknown if the status was not run, we then consider the files as big.
+        '''
+        if self.modified_files is None:
+            return MAX_PATIENCE_DIFF_SIZE + 1
+
+        total_size = 0
+        for fname in self.modified_files:
+            try:
+                total_size += os.stat(os.path.join(self.fullpath, fname)).st_size
+            except OSError:
+                # deleted file, or file name quoted by git
+                pass
+        return total_size
 
 
     def ensure_diff_summary(self, cb_fill_diff_summary: Optional[Callable[[str, str], Any]] = None, blocking: bool = False) -> None:
@@ -598,6 +924,10 @@ class MgRepoInfo(QObject):
         '''Ensure that the sha1 information is available. If blocking is True,
         the function will return only after the sha1 is available.'''
 
+        if self.commit_sha1 is None:
+            # no need to run git when HEAD can be read directly
+            self.commit_sha1 = MgGitRefs(self.fullpath).head_sha1()
+
         if self.commit_sha1 is not None:
             # we already have it
             if cb_commit_sha1:
@@ -631,6 +961,11 @@ class MgRepoInfo(QObject):
             # no commits means no tags...
             self.tags = ''
             return
+
+        tags = read_head_tags(self.fullpath, get_cat_file_pool())
+        if tags is not None:
+            self.tags = ' '.join(tags)
+            return
         self.tags = ' '.join(self.git_exec_blocking_here('tag', '--points-at', 'HEAD').strip().split('\n'))
 
 
@@ -638,12 +973,25 @@ class MgRepoInfo(QObject):
         '''Fill the URL part of the repo: field url and calls the callback if any when done'''
         dbg('fill_repo_url() - %s' % self.name)
 
+        url = MgGitRefs(self.fullpath).remote_url()
+        if url is not None:
+            # no need to run git, the url is in the configuration
+            self.url = url
+            if cb_url:
+                cb_url(url)
+            return
+
+        local_cb_url: Optional[Callable[[], None]] = None
         if cb_url:
-            def local_cb_fill_git_remote_done(repo_name: str, git_exit_code: int, remote_out: str) -> None:
-                self.cb_fill_git_remote_done(repo_name, git_exit_code, remote_out)
+            def local_cb_url() -> None:
                 cb_url(self.url or '')
-        else:
-            local_cb_fill_git_remote_done = self.cb_fill_git_remote_done
+
+        if self.join_request_in_flight('url', local_cb_url):
+            return
+
+        def local_cb_fill_git_remote_done(repo_name: str, git_exit_code: int, remote_out: str) -> None:
+            self.cb_fill_git_remote_done(repo_name, git_exit_code, remote_out)
+            self.complete_request_in_flight('url')
 
         # errors possible when repo is deleted
         self.git_exec_async_here(['remote', '--verbose'], local_cb_fill_git_remote_done, allow_errors=True)
@@ -684,102 +1032,112 @@ class MgRepoInfo(QObject):
         - branch
         - tag
         - remote_synchro
+        - remote_branch
+        - commit_sha1
 
         May also fill:
         - diff
         - last_commit
         - commit_date
-        - commit_sha1
         - tags
+
+        This is done with a single git status call, plus a git branch call when HEAD is detached.
         '''
         dbg('fill_repo_info() - %s' % self.name)
+        local_cb_repo_info_available: Optional[Callable[[], None]] = None
+        if cb_repo_info_available:
+            def local_cb_repo_info_available() -> None:
+                cb_repo_info_available(self.name)
+
+        if self.join_request_in_flight('repo_info', local_cb_repo_info_available):
+            return
+
         self._clear_basic_info()
-        self.cb_repo_info_available = cb_repo_info_available
-        self.repo_update_in_progress.emit(self.name)
+        self.for_each_repo_info(lambda repo_info: repo_info.repo_update_in_progress.emit(repo_info.name))
         # errors possible when repo is deleted
-        self.git_exec_async_here(['status', '--porcelain', '--branch'], self.cb_fill_repo_info_status_done,
+        self.git_exec_async_here(['status', '--porcelain=v2', '--branch'], self.cb_fill_repo_info_status_done,
                                  allow_errors=True)
 
 
+    # applied to "XY <fname>", with XY the status code of the file
     re_status_mod_files = re.compile('([MDRCUA ][MDRCUA]|[MDRCUA][MDRCUA ]) (.+)')
     re_status_conflict_files = re.compile('(AA|DD|U.|.U) (.+)')
 
 
     def cb_fill_repo_info_status_done(self, _repo_name: str, git_exit_code: int, status_out: str) -> None:
-        '''Called after git status'''
+        '''Called after git status --porcelain=v2 --branch'''
         dbg(f'fill_repo_info_status_done() - {self.name}, exit_code={git_exit_code}')
         if git_exit_code != 0:
             self.abortBecauseRepoDeleted()
+            self.repo_info_failed()
             return
 
-        '''git status output:
-        "## No commits yet on master
+        '''git status output, header lines:
+        "# branch.oid <commit sha1>"
+            -> sha1 of HEAD
+        "# branch.oid (initial)"
             -> no commit yet
-        "## Initial commit on master" 
-            -> ???
-        "## <branch name>" 
-            -> on a branch, no remote
-        "## <branch name>...<remote branch name>" 
-            -> on a branch, with remote, up-to-date
-        "## <branch name>...<remote branch name> [behind N]" 
-            -> on a branch, with remote, not uptodate
-        "## <branch name>...<remote branch name> [ahead N]" 
-            -> on a branch, with remote, not uptodate
-        "## HEAD (no branch)" 
+        "# branch.head <branch name>"
+            -> on a branch
+        "# branch.head (detached)"
             -> detached head
-
-        "?? filename"
+        "# branch.upstream <remote branch name>"
+            -> on a branch, with remote
+        "# branch.ab +<ahead> -<behind>"
+            -> on a branch, with remote, ahead / behind information.
+               Missing when the remote branch is gone
+
+        file lines:
+        "1 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <path>"
+            -> modified file, XY uses '.' for unmodified
+        "2 <XY> <sub> <mH> <mI> <mW> <hH> <hI> <X><score> <path><tab><origPath>"
+            -> renamed or copied file
+        "u <XY> <sub> <m1> <m2> <m3> <mW> <h1> <h2> <h3> <path>"
+            -> conflicted file
+        "? <path>"
             -> untracked files
-
-        " M <fname with or without quotes>"
-        " D <fname>"
-        " R <fname>"
-        " C <fname>"
-        " U <fname>"
-            -> modified file name
-        " A <fname> -> <fname>"
-            -> renamed file name
         '''
-        status_out_lines = status_out.split('\n')
-        conflict_files = [ self.re_status_conflict_files.match(l).group(2)  # type: ignore # mypy does not understand theat the None value is excluded from the list
-                      for l in status_out_lines
-                      if self.re_status_conflict_files.match(l)
-                      ]
-        mod_files = [ self.re_status_mod_files.match(l).group(2)  # type: ignore # mypy does not understand theat the None value is excluded from the list
-                        for l in status_out_lines 
-                        if self.re_status_mod_files.match(l)
-        ]
-        
-        # mod_files also captures conflict files, so trim them out
-        mod_files = [ f for f in mod_files if f not in conflict_files ]
-
-
-        if len(mod_files)  + len(conflict_files) == 0:
+        oid = branch_head = upstream = ab = ''
+        nb_mod_files, nb_conflict_files = 0, 0
+        modified_files = []
+        for l in status_out.split('\n'):
+            if l.startswith('# branch.oid '):
+                oid = l[13:]
+            elif l.startswith('# branch.head '):
+                branch_head = l[14:]
+            elif l.startswith('# branch.upstream '):
+                upstream = l[18:]
+            elif l.startswith('# branch.ab '):
+                ab = l[12:]
+            elif l.startswith(('1 ', '2 ', 'u ')):
+                # porcelain v2 uses '.' where porcelain v1 uses ' ' for unmodified
+                xy_fname = l[2:4].replace('.', ' ') + ' ' + l[5:]
+                if l[3] != '.':
+                    # modified in the working tree, the path is the last field
+                    nb_fields = {'1': 8, '2': 9, 'u': 10}[l[0]]
+                    fields = l.split(' ', nb_fields)
+                    if len(fields) > nb_fields:
+                        modified_files.append(fields[nb_fields].split('\t')[0])
+                if self.re_status_conflict_files.match(xy_fname):
+                    nb_conflict_files += 1
+                elif self.re_status_mod_files.match(xy_fname):
+                    nb_mod_files += 1
+
+        self.modified_files = modified_files
+        if nb_mod_files + nb_conflict_files == 0:
             # nothing modifed, no conflicts
             self.status = 'OK'
             self.diff = ''
+        elif nb_mod_files > 0 and nb_conflict_files > 0:
+            self.status = f'{nb_conflict_files} conflicted, {nb_mod_files} modified'
+        elif nb_mod_files > 0:
+            self.status = f'{nb_mod_files} modified'
         else:
-            self.status = ''
-            if len(mod_files) > 0 and len(conflict_files) > 0:
-                self.status = f'{len(conflict_files)} conflicted, {len(mod_files)} modified'
-            elif len(mod_files) > 0:
-                self.status = f'{len(mod_files)} modified'
-            elif len(conflict_files) > 0:
-                self.status = f'{len(conflict_files)} conflicted'
-
-        if '## HEAD (no branch)' in status_out:
-            # HEAD is detached
-            self.git_exec_async_here(['branch'], self.cb_fill_repo_info_branch_done)
-            return
+            self.status = f'{nb_conflict_files} conflicted'
 
-        # HEAD is not detached, we are on a branch or on an empty repo
-
-        if '## No commits yet on' in status_out or \
-            '## Initial commit on' in status_out:
-            # repo is only initialized, no commit, no branch yet:
-            #   output: "## No commits yet on master"
-            # or repo is cloned from an empty repo:
-            #   output: "## No commits yet on master...origin/master [gone]"
+        if oid == '(initial)':
+            # repo is only initialized, no commit, no branch yet
+            # or repo is cloned from an empty repo (upstream is then present but gone)
             self.branch = MSG_EMPTY_REPO
             self.head = MSG_EMPTY_REPO
             self.tags = ''
@@ -790,60 +1148,47 @@ class MgRepoInfo(QObject):
             self.repo_info_is_available()
             return
 
-        # HEAD is not detached, we are on a branch, we can fetch its name from status
-        # we can also fetch the remote name, and the status vs remote branch (ahead, behind)
-        status_out_header = [l for l in status_out_lines if l.startswith('##') ][0]
-        if '...' in status_out_header:
-            # branch + remote-tracking branch
-            self.branch, remote_branch_and_remote_status = status_out_header[3:].split('...')
-            self.head = 'branch %s' % self.branch
-
-            if '[' not in remote_branch_and_remote_status:
-                self.remote_branch = remote_branch_and_remote_status
-                self.remote_synchro = MSG_REMOTE_SYNCHRO_OK
-            else:
-                # ahead / behind info is present
-                self.remote_branch, remote_status = remote_branch_and_remote_status.split(' [')
-                remote_status = remote_status.strip(']')
-                # remote_status is either: "gone, ahead 33", "behind 2", "ahead 2, behind 3"
-                if remote_status == 'gone':
-                    # possible cases:
-                    # - cloning an empty repo
-                    #     output: '## No commits yet on master...origin/master [gone]
-                    #     => this is already handled at the beginninig of this function, when looking for
-                    #        the string "No commits yet on master". So no need to handle it here
-                    # - cloning from a branch, then the remote branch is deleted
-                    #     output:  ## master...origin/master [gone]
-
-                    # happens when the tracking branch is gone, or when cloning an empty repo
-                    # and then comitting to it
-                    self.remote_synchro = MSG_REMOTE_BRANCH_GONE
-                else:
-                    nb_ahead, nb_behind = match_ahead_behind(remote_status)
-                    if nb_ahead > 0 and nb_behind > 0:
-                        self.remote_synchro = MSG_REMOTE_TOPUSH_TOPULL % (nb_ahead, nb_behind)
-                    elif nb_ahead > 0:
-                        self.remote_synchro = MSG_REMOTE_TOPUSH % nb_ahead
-                    elif nb_behind > 0:
-                        self.remote_synchro = MSG_REMOTE_TOPULL % nb_behind
-                    else:
-                        assert False, "neither ahead nor behind are positive: ahead = %d, behind = %d" % (nb_ahead, nb_behind)
+        self.commit_sha1 = oid
 
-        else:
-            self.branch = status_out_header[3:]
-            self.head = 'branch %s' % self.branch
+        if branch_head == '(detached)':
+            # HEAD is detached, the reflog tells us what was checked out. In the cases we can not
+            # interpret, git branch tells us.
+            detached_head = MgGitRefs(self.fullpath).detached_head_description()
+            if detached_head is None:
+                # errors are handled by the callback, which must be called to end the request
+                self.git_exec_async_here(['branch'], self.cb_fill_repo_info_branch_done, allow_errors=True)
+                return
+            self.fill_detached_head(*detached_head)
+            return
+
+        # HEAD is not detached, we are on a branch
+        self.branch = branch_head
+        self.head = 'branch %s' % self.branch
+
+        if not upstream:
             self.remote_synchro = MSG_LOCAL_BRANCH
+        else:
+            self.remote_branch = upstream
+            if not ab:
+                # possible cases:
+                # - cloning from a branch, then the remote branch is deleted
+                # - cloning an empty repo and then comitting to it
+                self.remote_synchro = MSG_REMOTE_BRANCH_GONE
+            else:
+                nb_ahead, nb_behind = [ abs(int(v)) for v in ab.split(' ') ]
+                self.remote_synchro = remote_synchro_from_ahead_behind(nb_ahead, nb_behind)
 
         self.repo_info_is_available()
         return
 
 
     def cb_fill_repo_info_branch_done(self, _repo_name: str, git_exit_code: int, branch_out: str) -> None:
-        '''Called after "git branch" to fetch the status of the local and remote branch more precisely'''
+        '''Called after "git branch" to find out on what the head is detached'''
         dbg('fill_repo_info_branch_done() - %s' % self.name)
         if git_exit_code != 0:
-            # error already notified to user by previous callback
-            self.abortBecauseRepoDeleted()
+            if not self.abortBecauseRepoDeleted():
+                warn(f'git branch failed on {self.name}: {branch_out}')
+            self.repo_info_failed()
             return
 
         '''git branch output:
@@ -860,33 +1205,16 @@ class MgRepoInfo(QObject):
         '''
         branch_out_lines = branch_out.split('\n')
 
-        # if we need to call "git log -1", we need a local function callback to emit the signal repo_info_available
-        def local_fill_repo_info_log_done(repo_name: str, git_exit_code: int, git_log_out: str) -> None:
-            self.cb_fill_repo_info_log_done(repo_name, git_exit_code, git_log_out)
-            self.repo_info_is_available()
-
         if '* (HEAD detached at' in branch_out:
             # branch output: * (HEAD detached at XXX) => tag-name or commit, used directly by checkout
             tag_line = [l for l in branch_out_lines if 'HEAD detached' in l]
-            self.tag_or_commit = tag_line[0][20:-1]
-            if is_not_sha1(self.tag_or_commit):
-                # this is a tag
-                self.tag = self.tag_or_commit
-                self.head = 'tag %s' % self.tag
-            else:
-                # we can not tell if we are on a commit SHA1 or a tag
-                # check using the commit sha1
-                self.git_exec_async_here(['log', '-1'], local_fill_repo_info_log_done, allow_errors=True)
-                return
-
-            self.repo_info_is_available()
+            self.fill_detached_head('at', tag_line[0][20:-1])
             return
 
         if '* (HEAD detached from' in branch_out or '(no branch)' in branch_out:
             # branch output: * (HEAD detached from XXX) => checkout + commit has occured
             # branch output: * (no branch) => no information provided on where we are detached
-            # use git-log to fetch the commit
-            self.git_exec_async_here(['log', '-1'], local_fill_repo_info_log_done, allow_errors=True)
+            self.fill_detached_head('from', '')
             return
 
         # we know there is one branch there
@@ -897,8 +1225,96 @@ class MgRepoInfo(QObject):
         return
 
 
+    def fill_detached_head(self, detached_how: str, tag_or_commit: str) -> None:
+        '''Fill the head and tag fields when HEAD is detached:
+        - detached_how is 'at': HEAD is at the tag or commit which was checked out
+        - else, commits occured since the checkout or we don't know what was checked out
+        '''
+        commit_sha1 = self.commit_sha1 or ''
+        if detached_how == 'at' and (is_not_sha1(tag_or_commit) or tag_or_commit not in commit_sha1):
+            # this is a tag
+            self.tag = tag_or_commit
+            self.head = 'tag %s' % self.tag
+        elif detached_how == 'at':
+            # this was a commit
+            self.head = 'commit %s' % tag_or_commit[:SHORT_SHA1_NB_DIGITS]
+        else:
+            # git status already gave us the commit
+            self.head = 'commit %s' % commit_sha1[:SHORT_SHA1_NB_DIGITS]
+
+        self.repo_info_is_available()
+
+
+    def fill_remote_synchro(self) -> None:
+        '''Fill the field remote_synchro again after the remote branches changed, for example after a fetch.
+
+        This is done with git rev-list, which only counts the commits to push and to pull: unlike git status,
+        the working tree is not scanned. The other basic information is kept.'''
+        dbg('fill_remote_synchro() - %s' % self.name)
+        if not self.remote_branch:
+            # local branch, detached HEAD or empty repository: the remote branches do not matter
+            return
+
+        if self.join_request_in_flight('repo_info'):
+            return
+
+        self.for_each_repo_info(lambda repo_info: repo_info.repo_update_in_progress.emit(repo_info.name))
+        # errors possible when the remote branch is gone
+        self.git_exec_async_here(['rev-list', '--left-right', '--count', 'HEAD...@{upstream}'],
+                                 self.cb_fill_remote_synchro_done, allow_errors=True)
+
+
+    def cb_fill_remote_synchro_done(self, _repo_name: str, git_exit_code: int, rev_list_out: str) -> None:
+        '''Called after "git rev-list --left-right --count HEAD...@{upstream}", which outputs: "<ahead>\t<behind>"'''
+        dbg(f'fill_remote_synchro_done() - {self.name}, exit_code={git_exit_code}')
+        counts = rev_list_out.split()
+        if git_exit_code != 0 or len(counts) != 2 or not all(v.isdigit() for v in counts):
+            if self.abortBecauseRepoDeleted():
+                self.repo_info_failed()
+                return
+            # the remote branch is probably gone, git status tells
+            self._clear_basic_info()
+            self.git_exec_async_here(['status', '--porcelain=v2', '--branch'], self.cb_fill_repo_info_status_done,
+                                     allow_errors=True)
+            return
+
+        self.remote_synchro = remote_synchro_from_ahead_behind(int(counts[0]), int(counts[1]))
+        self.repo_info_is_available()
+
+
+    def fill_head_from_refs(self) -> bool:
+        '''Fill the fields head, branch, remote_branch and commit_sha1 by reading the git directory, when HEAD is
+        on a branch. This is much faster than fill_repo_info() but does not fill the status and the remote synchro.
+
+        Return False if the information could not be read this way.'''
+        git_refs = MgGitRefs(self.fullpath)
+        head = git_refs.head()
+        if head is None or not head[0].startswith('refs/heads/'):
+            # detached head or unreadable HEAD
+            return False
+
+        branch = head[0][len('refs/heads/'):]
+        if head[1] == '':
+            # no commit yet, this is only known by git status, which says the branch does not exist yet
+            return False
+
+        remote_branch = git_refs.upstream_branch(branch)
+        if remote_branch is None:
+            return False
+
+        dbg('fill_head_from_refs() - %s' % self.name)
+        self.branch = branch
+        self.head = 'branch %s' % branch
+        self.remote_branch = remote_branch
+        self.commit_sha1 = head[1]
+        return True
+
+
+    re_log_decoration_tag = re.compile('tag: ([^,)]+)')
+
+
     def cb_fill_repo_info_log_done(self, _repo_name: str, git_exit_code: int, git_log_out: str) -> None:
-        '''Called after "git log -1" to parse the result'''
+        '''Called after "git log -1 --decorate=short" to parse the result'''
         dbg('fill_repo_info_log_done() - %s' % self.name)
         # git returns an error on empty repo, don't bother. Else log -1 should always work
         if git_exit_code != 0:
@@ -910,6 +1326,10 @@ class MgRepoInfo(QObject):
             if self.abortBecauseRepoDeleted():
                 return
 
+            if not git_log_out.startswith('commit '):
+                # no commit to describe, or git crashed
+                return
+
         self.last_commit = git_log_out
         log_out_lines = git_log_out.split('\n')
 
@@ -920,25 +1340,12 @@ class MgRepoInfo(QObject):
         else:
             warn('Could not locate the Date line inside the log -1 response')
 
+        # first line is: commit <sha1> (HEAD -> main, tag: v1.0, origin/main)
         self.commit_sha1 = log_out_lines[0].split(' ')[1].strip()
-        if self.tag_or_commit:
-            # we had the message "detached at XXX" and we try to figure out
-            # if XXX is a commit or a tag
-            if self.tag_or_commit in self.commit_sha1:
-                # this was a commit
-                self.head = 'commit %s' % self.tag_or_commit[:SHORT_SHA1_NB_DIGITS]
-            else:
-                # this was a tag
-                self.head = 'tag %s' % self.tag_or_commit
-                self.tag = self.tag_or_commit
-            self.tag_or_commit = None
-
-        elif self.head == '':
-            # head is not set yet, we were on a detached head with no information
-            self.head = 'commit %s' % self.commit_sha1[:SHORT_SHA1_NB_DIGITS]
-        else:
-            # we are just parsing the output of log -1, nothing special to do here
-            pass
+        if git_exit_code == 0:
+            # the decoration gives us the tags pointing at HEAD for free
+            decoration = log_out_lines[0].partition(' (')[2]
+            self.tags = ' '.join(sorted(self.re_log_decoration_tag.findall(decoration)))
 
 
     def ensure_branches_filled(self, cb_branches_filled_done: Optional[Callable[[str], None]] = None, blocking: bool = False) -> None:
@@ -990,10 +1397,17 @@ class MgRepoInfo(QObject):
 
         If provided, the callback function is called with the name of the repository'''
 
+        local_cb_branches_filled_done: Optional[Callable[[], None]] = None
+        if cb_branches_filled_done:
+            def local_cb_branches_filled_done() -> None:
+                cb_branches_filled_done(self.name)
+
+        if self.join_request_in_flight('branches', local_cb_branches_filled_done):
+            return
+
         def local_cb_fill_branches_done(repo_name: str, git_exit_code: int, git_output: str) -> None:
             self.cb_fill_branches_done(repo_name, git_exit_code, git_output)
-            if cb_branches_filled_done:
-                cb_branches_filled_done(repo_name)
+            self.complete_request_in_flight('branches')
 
         # errors possible when repo is deleted
         self.git_exec_async_here(['branch', '--all'], local_cb_fill_branches_done, allow_errors=True)
@@ -1056,10 +1470,17 @@ class MgRepoInfo(QObject):
                 cb_all_tags_filled_done(self.name)
             return
 
+        local_cb_all_tags_filled_done: Optional[Callable[[], None]] = None
+        if cb_all_tags_filled_done:
+            def local_cb_all_tags_filled_done() -> None:
+                cb_all_tags_filled_done(self.name)
+
+        if self.join_request_in_flight('all_tags', local_cb_all_tags_filled_done):
+            return
+
         def local_cb_fill_all_tags_done(repo_name: str, git_exit_code: int, git_output: str) -> None:
             self.cb_fill_all_tags_done(repo_name, git_exit_code, git_output)
-            if cb_all_tags_filled_done:
-                cb_all_tags_filled_done(repo_name)
+            self.complete_request_in_flight('all_tags')
 
         self.git_exec_async_here(['tag', '--list', '--sort', 'creatordate'], local_cb_fill_all_tags_done, allow_errors=True)
 
@@ -1109,13 +1530,30 @@ class MgRepoInfo(QObject):
 
 
     def fill_files_sha1(self, cb_fill_files_sha1_done: Optional[Callable[[str], None]] = None) -> None:
-        '''Fill the URL part of the repo: field url and calls the callback if any when done'''
+        '''Fill the field files_sha1 and calls the callback if any when done.
+
+        The index file is read directly when possible, else git ls-files is used.'''
         dbg('fill_files_sha1() - %s' % self.name)
 
-        def local_cb_fill_files_sha1_done(repo_name: str, git_exit_code: int, remote_out: str) -> None:
-            self.cb_fill_files_sha1_done(repo_name, git_exit_code, remote_out)
+        index = MgGitIndex.read(self.fullpath)
+        if index is not None:
+            self.files_sha1 = index
+            self.files_sha1_filled = True
             if cb_fill_files_sha1_done:
                 cb_fill_files_sha1_done(self.name)
+            return
+
+        local_cb_files_sha1_filled: Optional[Callable[[], None]] = None
+        if cb_fill_files_sha1_done:
+            def local_cb_files_sha1_filled() -> None:
+                cb_fill_files_sha1_done(self.name)
+
+        if self.join_request_in_flight('files_sha1', local_cb_files_sha1_filled):
+            return
+
+        def local_cb_fill_files_sha1_done(repo_name: str, git_exit_code: int, remote_out: str) -> None:
+            self.cb_fill_files_sha1_done(repo_name, git_exit_code, remote_out)
+            self.complete_request_in_flight('files_sha1')
 
         # errors possible when repo is deleted
         self.git_exec_async_here(['ls-files', '-s'], local_cb_fill_files_sha1_done, allow_errors=True)
@@ -1126,16 +1564,18 @@ class MgRepoInfo(QObject):
             self.abortBecauseRepoDeleted()
             return
 
-        self.files_sha1 = []
+        files_sha1 = []
         for line in git_output.split('\n'):
             line = line.strip('\t \n')
             if not len(line):
                 continue
 
-            _0, sha1, _2, fname, *_3 = line.replace('\t', ' ').split(' ')
-            self.files_sha1.append((fname, sha1))
+            # <mode> <sha1> <stage>\t<file>
+            file_info, _, fname = line.partition('\t')
+            _0, sha1, *_2 = file_info.split(' ')
+            files_sha1.append((fname, sha1))
 
-        self.files_sha1.sort()
+        self.files_sha1 = MgGitIndex.from_entries(files_sha1)
         self.files_sha1_filled = True
 
 
@@ -1161,27 +1601,42 @@ class MgRepoInfo(QObject):
 
 
     def git_exec_async_here(self, args: Sequence[str], cb_git_done: Optional[Callable[[str, int, str], Any]],
-                            allow_errors: bool = False) -> None:
+                            allow_errors: bool = False,
+                            output_callback: Optional[Callable[[str], Any]] = None) -> Optional[RunProcess]:
         '''Execute git on the current repo with a callback for when the command is over.
 
+        output_callback is called with the new git output whenever it is available. It is not called for
+        blocking calls, the output is then only available in the callback.
+
+        Return the git process for asynchronous calls, None for blocking calls.
+
         Note that if self.force_blocking_git is True, the call will be turned into
         a blocking call instead of an async call. The callback is called in both situations.
 
         if allow_errors is False, a message box is displayed if git returns an exit code different than 0. If you
-        have your own handling of git errors, set allow_errors to True.
+        have your own handling of git errors, set allow_errors to True: the callback is then also called when git
+        crashes or is killed, with a non zero exit code, so that the request in progress always completes.
         '''
         git_args = ['-C', self.fullpath] + list(args)
 
         cb_process_done = None
+        cb_process_failed = None
         if cb_git_done:
             # adapt the callback by including the repo name
             def cb_process_done(git_exit_code: int, git_output: str) -> None:
                 cb_git_done(self.name, git_exit_code, git_output)
 
+            if allow_errors:
+                def cb_process_failed(_exec_status: ExecStatus, git_exit_code: int, git_output: str) -> None:
+                    # the exit code of a crashed process may be 0
+                    cb_git_done(self.name, git_exit_code or EXIT_CODE_CRASHED, git_output)
+
         if self.force_blocking_git:
-            ExecGit.exec_blocking(git_args, allow_errors=allow_errors, callback=cb_process_done)
-        else:
-            ExecGit.exec_non_blocking(git_args, allow_errors=allow_errors, callback=cb_process_done)
+            ExecGit.exec_blocking(git_args, allow_errors=allow_errors, callback=cb_process_done,
+                                  failure_callback=cb_process_failed)
+            return None
+        return ExecGit.exec_non_blocking(git_args, allow_errors=allow_errors, callback=cb_process_done,
+                                         output_callback=output_callback, failure_callback=cb_process_failed)
 
 
 
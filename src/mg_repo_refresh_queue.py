@@ -0,0 +1,192 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from typing import Callable, Dict, List, Optional, Set
+import logging, os, functools, weakref
+
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from src.mg_repo_info import MgRepoInfo
+from src.mg_repo_registry import MgRepoState
+
+logger = logging.getLogger('mg_repo_refresh_queue')
+dbg = logger.debug
+
+# number of repositories refreshed at the same time, the other ones wait in the queue
+REFRESH_MAX_RUNNING = max(4, os.cpu_count() or 1)
+
+# priorities of the refresh of a repository, the lowest value is refreshed first
+PRIORITY_SELECTED = 0
+PRIORITY_VISIBLE = 1
+PRIORITY_NEAR_VIEWPORT = 2
+PRIORITY_OTHER = 3
+
+
+@functools.lru_cache(maxsize=1)
+def get_refresh_queue() -> 'MgRepoRefreshQueue':
+    '''Return the queue of the refreshes of the repositories, shared by all tabs'''
+    return MgRepoRefreshQueue()
+
+
+class MgRepoRefreshQueue(QObject):
+    '''Refresh repositories with a limited number of refreshes running at the same time, the repositories
+    with the highest priority first.
+
+    The priorities are provided by the views through the priority getters registered with addPriorityGetter().
+    They return the priority of the repositories displayed in a prominent place: selected, visible or close to
+    the viewport. The other repositories have the priority PRIORITY_OTHER and are refreshed in the order of
+    the requests.
+
+    The queue is shared by all tabs: the repositories are identified by their shared state, so that a
+    repository displayed in several tabs is refreshed only once, with the best priority given by the tabs.
+    The priorities are computed again when a view calls priorityChanged(), for example when it is scrolled.
+    '''
+
+    # emitted when the last refresh of the queue is over
+    sigIdle = Signal()
+
+    def __init__(self, maxRunning: int = REFRESH_MAX_RUNNING, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.maxRunning = maxRunning
+        self.priorityGetters: List['weakref.WeakMethod[Callable[[], Dict[MgRepoInfo, int]]]'] = []
+
+        # repositories waiting for a refresh, in the order of the requests, with the MgRepoInfo which requested it
+        self.pendingRepos: Dict[MgRepoState, List[MgRepoInfo]] = {}
+        # pending repositories whose url must be read again
+        self.pendingClearUrl: Set[MgRepoState] = set()
+        # pending repositories sorted by priority, None when it must be computed again
+        self.sortedRepos: Optional[List[MgRepoState]] = None
+        # repositories being refreshed, with the slot connected to their repo_update_done signal
+        self.runningRepos: Dict[MgRepoState, Callable[[str], None]] = {}
+
+        self.dispatchTimer = QTimer(self)
+        self.dispatchTimer.setSingleShot(True)
+        self.dispatchTimer.setInterval(0)
+        self.dispatchTimer.timeout.connect(self.slotDispatch)
+
+
+    def addPriorityGetter(self, priorityGetter: Callable[[], Dict[MgRepoInfo, int]]) -> None:
+        '''Register a method returning the priorities of the repositories of a view. Only a weak reference
+        is kept, the view does not need to unregister.'''
+        self.priorityGetters.append(weakref.WeakMethod(priorityGetter))
+        self.priorityChanged()
+
+
+    def priorities(self) -> Dict[MgRepoState, int]:
+        '''Return the best priority given by the views to each repository'''
+        priorities: Dict[MgRepoState, int] = {}
+        for getterRef in self.priorityGetters[:]:
+            getter = getterRef()
+            try:
+                viewPriorities = getter() if getter is not None else None
+            except RuntimeError:
+                # the C++ object of the view was deleted
+                viewPriorities = None
+            if viewPriorities is None:
+                self.priorityGetters.remove(getterRef)
+                continue
+            for repo, priority in viewPriorities.items():
+                priorities[repo.state] = min(priority, priorities.get(repo.state, PRIORITY_OTHER))
+        return priorities
+
+
+    def requestRefresh(self, repo: MgRepoInfo, clearUrl: bool = False) -> None:
+        '''Refresh this repository as soon as its priority allows it'''
+        requesters = self.pendingRepos.setdefault(repo.state, [])
+        if repo not in requesters:
+            requesters.append(repo)
+        if clearUrl:
+            self.pendingClearUrl.add(repo.state)
+        self.sortedRepos = None
+        self.scheduleDispatch()
+
+
+    def requestRefreshList(self, repos: List[MgRepoInfo]) -> None:
+        '''Refresh all these repositories'''
+        for repo in repos:
+            self.requestRefresh(repo)
+
+
+    def priorityChanged(self) -> None:
+        '''Called when the priorities returned by a priority getter changed'''
+        self.sortedRepos = None
+
+
+    def cancelRefresh(self, repos: List[MgRepoInfo]) -> None:
+        '''Forget the pending refreshes requested through these repositories, for example because their view
+        is cleared. The refreshes already running continue, as well as the ones requested by other views.'''
+        for repo in repos:
+            requesters = self.pendingRepos.get(repo.state)
+            if requesters is None or repo not in requesters:
+                continue
+            requesters.remove(repo)
+            if not requesters:
+                del self.pendingRepos[repo.state]
+                self.pendingClearUrl.discard(repo.state)
+        self.sortedRepos = None
+
+
+    def isIdle(self) -> bool:
+        '''Return True when no refresh is running nor pending'''
+        return not self.pendingRepos and not self.runningRepos
+
+
+    def scheduleDispatch(self) -> None:
+        '''Start pending refreshes when returning to the event loop, so that many requests are sorted only once'''
+        if not self.dispatchTimer.isActive():
+            self.dispatchTimer.start()
+
+
+    def slotDispatch(self) -> None:
+        '''Start the refresh of the pending repositories with the highest priority, up to maxRunning'''
+        while self.pendingRepos and len(self.runningRepos) < self.maxRunning:
+            if self.sortedRepos is None:
+                priorities = self.priorities()
+                # the sort is stable, the order of the requests is kept for repositories of the same priority.
+                # The list is reversed to pop the next repository from its end.
+                self.sortedRepos = sorted(self.pendingRepos,
+                                          key=lambda state: priorities.get(state, PRIORITY_OTHER))[::-1]
+            state = self.sortedRepos.pop()
+            repo = self.pendingRepos.pop(state)[0]
+            clearUrl = state in self.pendingClearUrl
+            self.pendingClearUrl.discard(state)
+            if state not in self.runningRepos:
+                slotDone = functools.partial(self.slotRepoUpdateDone, repo)
+                self.runningRepos[state] = slotDone
+                repo.repo_update_done.connect(slotDone)
+
+            # when requested again while being refreshed, the repository runs a single refresh after the current one
+            if clearUrl:
+                repo.deepRefresh()
+            else:
+                repo.refresh()
+
+        if self.isIdle():
+            self.sigIdle.emit()
+
+
+    def slotRepoUpdateDone(self, repo: MgRepoInfo, _repoName: str) -> None:
+        '''Called when a repository has been refreshed'''
+        if repo.is_update_in_progress():
+            # another refresh requested in the meantime is running
+            return
+
+        slotDone = self.runningRepos.pop(repo.state, None)
+        if slotDone is None:
+            return
+        repo.repo_update_done.disconnect(slotDone)
+        self.scheduleDispatch()
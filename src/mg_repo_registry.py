@@ -0,0 +1,113 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from typing import TYPE_CHECKING, Generic, TypeVar, List, Any, Optional, Type, Union, overload
+import logging, weakref
+from functools import lru_cache
+
+if TYPE_CHECKING:
+    from src.mg_repo_info import MgRepoInfo
+
+logger = logging.getLogger('mg_repo_registry')
+dbg = logger.debug
+
+T = TypeVar('T')
+
+
+@lru_cache(maxsize=1)
+def get_repo_registry() -> 'MgRepoRegistry':
+    '''Return the registry of the repositories, shared by all tabs'''
+    return MgRepoRegistry()
+
+
+class MgRepoState:
+    '''Information collected on a repository, shared by all the MgRepoInfo of this repository.
+
+    The fields are the ones described in MgRepoInfo, they are created by the first MgRepoInfo.
+    '''
+
+    def __init__(self) -> None:
+        # the MgRepoInfo using this state, one for each tab displaying the repository, in the order of creation
+        self._repo_info_refs: 'List[weakref.ref[MgRepoInfo]]' = []
+        self.initialized = False
+
+
+    def add_repo_info(self, repo_info: 'MgRepoInfo') -> None:
+        self._repo_info_refs.append(weakref.ref(repo_info))
+
+
+    def repo_infos(self) -> 'List[MgRepoInfo]':
+        '''Return the MgRepoInfo using this state, in the order they were created. The deleted ones are forgotten.'''
+        repo_infos = [repo_info for repo_info in (ref() for ref in self._repo_info_refs) if repo_info is not None]
+        if len(repo_infos) != len(self._repo_info_refs):
+            self._repo_info_refs = [weakref.ref(repo_info) for repo_info in repo_infos]
+        return repo_infos
+
+
+class SharedField(Generic[T]):
+    '''Attribute of MgRepoInfo stored in its MgRepoState, so that all the MgRepoInfo of a repository see the
+    same value. Declared on MgRepoInfo with the type of the field:
+
+        url = SharedField[Optional[str]]()
+    '''
+
+    def __set_name__(self, owner: Type[Any], name: str) -> None:
+        self.name = name
+
+
+    @overload
+    def __get__(self, obj: None, objtype: Optional[Type[Any]] = None) -> 'SharedField[T]': ...
+    @overload
+    def __get__(self, obj: object, objtype: Optional[Type[Any]] = None) -> T: ...
+    def __get__(self, obj: Optional[object], objtype: Optional[Type[Any]] = None) -> 'Union[T, SharedField[T]]':
+        if obj is None:
+            return self
+        try:
+            value: T = getattr(getattr(obj, 'state'), self.name)
+            return value
+        except AttributeError:
+            # report the attribute of MgRepoInfo, not the one of MgRepoState
+            raise AttributeError(f'{type(obj).__name__!r} object has no attribute {self.name!r}') from None
+
+
+    def __set__(self, obj: object, value: T) -> None:
+        setattr(getattr(obj, 'state'), self.name, value)
+
+
+class MgRepoRegistry:
+    '''Process-wide registry of the state of the repositories, by full path of the repository.
+
+    When several tabs display the same repository, for example a tab on a directory and another tab on one
+    of its sub-directories, their MgRepoInfo share the same state: the repository is refreshed only once and
+    its information is stored only once. A state is forgotten when no MgRepoInfo uses it anymore.
+    '''
+
+    def __init__(self) -> None:
+        self.states: 'weakref.WeakValueDictionary[str, MgRepoState]' = weakref.WeakValueDictionary()
+
+
+    def state_for(self, fullpath: str) -> MgRepoState:
+        '''Return the state of the repository located at fullpath, which must be resolved and normalized'''
+        state = self.states.get(fullpath)
+        if state is None:
+            state = MgRepoState()
+            self.states[fullpath] = state
+        return state
+
+
+    def __len__(self) -> int:
+        return len(self.states)
@@ -0,0 +1,53 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+from typing import Optional
+import logging
+
+from PySide6.QtCore import QObject, QThread, Signal
+
+from src.mg_repo_info import MultiRepo
+
+logger = logging.getLogger('mg_repo_scanner')
+dbg = logger.debug
+
+
+class MgRepoScanner(QThread):
+    '''Scan the base directory of a MultiRepo for git repositories in a background thread.
+
+    sig_git_dir_found is emitted with the path of each git directory (.git) as soon as it is found, in no
+    particular order. The scan can be stopped with requestInterruption(), wasInterrupted() tells afterwards
+    whether all the repositories were found.
+    '''
+
+    sig_git_dir_found = Signal(str)
+
+    def __init__(self, multiRepo: MultiRepo, parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.multiRepo = multiRepo
+
+
+    def run(self) -> None:
+        dbg(f'MgRepoScanner.run() - scanning {self.multiRepo.base_dir}')
+        for gitDir in self.multiRepo.scan_git_dirs(should_stop=self.isInterruptionRequested):
+            self.sig_git_dir_found.emit(gitDir)
+        dbg(f'MgRepoScanner.run() - done, interrupted={self.isInterruptionRequested()}')
+
+
+    def wasInterrupted(self) -> bool:
+        return self.isInterruptionRequested()
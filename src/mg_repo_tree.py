@@ -15,23 +15,22 @@
 #
 
 
-from typing import List, Any, Optional, Dict, Callable, cast, Tuple, Type
+from typing import List, Any, Optional, Dict, Callable, cast, Tuple, Type, Set, Iterable
 import logging
 import functools
 import enum
 
 from PySide6.QtWidgets import QTreeWidget, QMenu, QApplication, QMessageBox, QAbstractItemView, QTreeWidgetItem, QHeaderView, QDialog
-from PySide6.QtGui import QIcon, QMouseEvent, QContextMenuEvent, QPixmap, QAction
-from PySide6.QtCore import Qt, QPoint, Signal, QPoint
+from PySide6.QtGui import QIcon, QMouseEvent, QContextMenuEvent, QPixmap, QAction, QResizeEvent
+from PySide6.QtCore import Qt, QPoint, Signal, QPoint, QTimer
 
 from src import mg_const
 from src import mg_config as mgc
 from src.mg_tools import ExecTortoiseGit, ExecExplorer, ExecTool
 from src.mg_repo_info import MgRepoInfo
 from src.mg_repo_tree_item import MgRepoTreeItem
+from src.mg_repo_refresh_queue import get_refresh_queue, PRIORITY_SELECTED, PRIORITY_VISIBLE, PRIORITY_NEAR_VIEWPORT
 from src.mg_exec_window import MgExecWindow
-from src.mg_dialog_view_properties import runDialogGitProperties
-from src.mg_dialog_settings import runDialogEditSettings
 from src.mg_actions import MgActions
 from src.mg_plugin_mgr import pluginMgrInstance
 
@@ -42,6 +41,17 @@ warn = logger.warning
 TWI_TYPE_REPO = QTreeWidgetItem.ItemType.Type # 0
 TWI_TYPE_GROUP = cast(int, QTreeWidgetItem.ItemType.UserType) # 1000
 
+# delay in ms for grouping the resize of the columns when many items are updated
+COLUMN_RESIZE_DELAY = 50
+
+# delay in ms for grouping the updates when the viewport is scrolled or resized
+VIEWPORT_CHANGED_DELAY = 50
+
+# when nothing is refreshed, interval in ms between two fillings of the columns of items outside of the viewport,
+# and number of items filled each time
+IDLE_COLUMN_FILL_INTERVAL = 100
+IDLE_COLUMN_FILL_BATCH = 20
+
 '''
 What to keep in mg_window:
 --------------------------
@@ -99,6 +109,32 @@ class MgRepoTree(QTreeWidget):
 
         self.configureColumns()
 
+        # columns whose content changed, resized together when the timer expires
+        self.dirtyColumns: Set[int] = set()
+        self.columnResizeTimer = QTimer(self)
+        self.columnResizeTimer.setSingleShot(True)
+        self.columnResizeTimer.setInterval(COLUMN_RESIZE_DELAY)
+        self.columnResizeTimer.timeout.connect(self.slotResizeDirtyColumns)
+
+        # the repositories are refreshed with the selected and visible ones first, through the queue shared by all tabs
+        self.refreshQueue = get_refresh_queue()
+        self.refreshQueue.addPriorityGetter(self.repoRefreshPriorities)
+        self.refreshQueue.sigIdle.connect(self.startIdleColumnFill)
+
+        # the priorities and the columns filled lazily follow the viewport
+        self.viewportChangedTimer = QTimer(self)
+        self.viewportChangedTimer.setSingleShot(True)
+        self.viewportChangedTimer.setInterval(VIEWPORT_CHANGED_DELAY)
+        self.viewportChangedTimer.timeout.connect(self.slotViewportChanged)
+        self.verticalScrollBar().valueChanged.connect(self.markViewportChanged)
+        self.header().sortIndicatorChanged.connect(self.markViewportChanged)
+        self.itemSelectionChanged.connect(self.markViewportChanged)
+
+        # the columns of the items outside of the viewport are filled when nothing else is going on
+        self.idleColumnFillTimer = QTimer(self)
+        self.idleColumnFillTimer.setInterval(IDLE_COLUMN_FILL_INTERVAL)
+        self.idleColumnFillTimer.timeout.connect(self.slotIdleColumnFill)
+
         # calling slot to adjust the status of the column
         self.slotViewColSha1Changed(mgc.get_config_instance().get(mgc.CONFIG_VIEW_COL_SHA1, True))
         self.slotViewColUrlChanged (mgc.get_config_instance().get(mgc.CONFIG_VIEW_COL_URL, True))
@@ -122,6 +158,8 @@ class MgRepoTree(QTreeWidget):
         self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
         self.setAllColumnsShowFocus(True)
         self.header().setSortIndicatorShown(True)
+        # sorting requested in the constructor is lost, the columns did not exist yet
+        self.sortByColumn(mg_const.COL_REPO_NAME, Qt.SortOrder.AscendingOrder)
         self.headerItem().setToolTip(mg_const.COL_UPDATE, mg_const.MSG_TOOLTIP_UPDATE)
         self.headerItem().setToolTip(mg_const.COL_STATUS, mg_const.MSG_TOOLTIP_STATUS)
         self.headerItem().setToolTip(mg_const.COL_REMOTE_SYNCHRO, mg_const.MSG_TOOLTIP_REMOTE_SYNCHRO)
@@ -134,6 +172,8 @@ class MgRepoTree(QTreeWidget):
         for repoItem in self.allRepoItems():
             repoItem.clearRepoConnections()
 
+        self.refreshQueue.cancelRefresh(self.allRepos())
+        self.idleColumnFillTimer.stop()
         super().clear()
 
 
@@ -141,18 +181,18 @@ class MgRepoTree(QTreeWidget):
         '''Called when menu item View->Columns->Sha1 changes value'''
         self.setColumnHidden(mg_const.COL_SHA1, not showColSha1)
         if showColSha1:
-            # ensure that sha1 information is fetched from all repos
-            for repoItem in self.allRepoItems():
-                repoItem.repoInfo.ensure_sha1(repoItem.cbSha1available)
+            # sha1 information is fetched for the visible items first, then for all items
+            self.markViewportChanged()
+            self.startIdleColumnFill()
 
 
     def slotViewColUrlChanged(self, showColUrl: bool) -> None:
         '''Called when menu item View->Columns->Url changes value'''
         self.setColumnHidden(mg_const.COL_URL, not showColUrl)
         if showColUrl:
-            # ensure that URL information is fetched from all repos
-            for repoItem in self.allRepoItems():
-                repoItem.repoInfo.ensure_url(repoItem.cbUrlAvailable)
+            # URL information is fetched for the visible items first, then for all items
+            self.markViewportChanged()
+            self.startIdleColumnFill()
 
 
     def availableScmUpdated(self) -> None:
@@ -258,8 +298,8 @@ class MgRepoTree(QTreeWidget):
                 self.setCurrentItem(item)
                 noSelectedItem = False
 
-            self.autoAdjustColumnSize()
-
+        self.markColumnsDirty()
+        self.markViewportChanged()
         return items
 
 
@@ -270,6 +310,106 @@ class MgRepoTree(QTreeWidget):
         QApplication.processEvents()
 
 
+    def markColumnsDirty(self, columns: Optional[Iterable[int]] = None) -> None:
+        '''Request a resize of the columns to their content, all columns if columns is None.
+
+        The resize is delayed so that many item updates result in only one resize.'''
+        self.dirtyColumns.update(range(self.columnCount()) if columns is None else columns)
+        if not self.columnResizeTimer.isActive():
+            self.columnResizeTimer.start()
+
+
+    def slotResizeDirtyColumns(self) -> None:
+        '''Resize the columns whose content changed since the last resize'''
+        dirtyColumns, self.dirtyColumns = self.dirtyColumns, set()
+        for col in sorted(dirtyColumns):
+            if not self.isColumnHidden(col):
+                self.resizeColumnToContents(col)
+
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        super().resizeEvent(event)
+        self.markViewportChanged()
+
+
+    def markViewportChanged(self) -> None:
+        '''Request an update of the refresh priorities and of the columns filled lazily, after the viewport was
+        scrolled, resized or its content changed.'''
+        if not self.viewportChangedTimer.isActive():
+            self.viewportChangedTimer.start()
+
+
+    def slotViewportChanged(self) -> None:
+        '''Update the refresh priorities and fill the columns of the items which came into view'''
+        self.refreshQueue.priorityChanged()
+        visibleItems, nearItems = self.repoItemsAroundViewport()
+        for item in visibleItems + nearItems:
+            item.fillNextColumns()
+
+
+    def repoItemsAroundViewport(self) -> Tuple[List[MgRepoTreeItem], List[MgRepoTreeItem]]:
+        '''Return the items visible in the viewport, and the items within one page above or below it'''
+        visibleItems: List[MgRepoTreeItem] = []
+        nearItems: List[MgRepoTreeItem] = []
+        item = self.itemAt(QPoint(0, 0)) or self.topLevelItem(0)
+        if item is None:
+            return visibleItems, nearItems
+
+        above = self.itemAbove(item)
+        height = self.viewport().height()
+        while item is not None and self.visualItemRect(item).top() < height:
+            if item.type() == TWI_TYPE_REPO:
+                visibleItems.append(cast(MgRepoTreeItem, item))
+            item = self.itemBelow(item)
+
+        below = item
+        for _ in range(max(len(visibleItems), 1)):
+            for nearItem in (above, below):
+                if nearItem is not None and nearItem.type() == TWI_TYPE_REPO:
+                    nearItems.append(cast(MgRepoTreeItem, nearItem))
+            above = above and self.itemAbove(above)
+            below = below and self.itemBelow(below)
+        return visibleItems, nearItems
+
+
+    def isItemNearViewport(self, item: QTreeWidgetItem) -> bool:
+        '''Return True if the item is visible in the viewport or within one page above or below it'''
+        rect = self.visualItemRect(item)
+        height = self.viewport().height()
+        return not rect.isEmpty() and -height <= rect.bottom() and rect.top() < 2 * height
+
+
+    def repoRefreshPriorities(self) -> Dict[MgRepoInfo, int]:
+        '''Return the refresh priority of the repositories selected or displayed around the viewport'''
+        visibleItems, nearItems = self.repoItemsAroundViewport()
+        priorities = {item.repoInfo: PRIORITY_NEAR_VIEWPORT for item in nearItems}
+        priorities.update((item.repoInfo, PRIORITY_VISIBLE) for item in visibleItems)
+        priorities.update((repo, PRIORITY_SELECTED) for repo in self.selectedRepos())
+        return priorities
+
+
+    def startIdleColumnFill(self) -> None:
+        '''Fill progressively the columns of the items outside of the viewport'''
+        if not self.idleColumnFillTimer.isActive():
+            self.idleColumnFillTimer.start()
+
+
+    def slotIdleColumnFill(self) -> None:
+        '''Fill the columns of a few items, if no repository is being refreshed'''
+        if not self.refreshQueue.isIdle():
+            # we are called again when the queue is idle
+            self.idleColumnFillTimer.stop()
+            return
+
+        items = [item for item in self.allRepoItems() if item.hasUnfilledColumns()]
+        if not items:
+            self.idleColumnFillTimer.stop()
+            return
+
+        for item in items[:IDLE_COLUMN_FILL_BATCH]:
+            item.fillNextColumns(offscreen=True)
+
+
     def selectedRepoItems(self) -> List[MgRepoTreeItem]:
         '''Return the list of selected MgRepoTreeItem'''
         items = [item for item in self.selectedItems() if item.type() == TWI_TYPE_REPO]
@@ -388,6 +528,7 @@ class MgRepoTree(QTreeWidget):
         if double_click_action == mg_const.DBC_UNDEFINED:
             button = QMessageBox.question(self, "Action for double-click", "Action for double-click is not yet defined.\nDo you want to open the settings dialog to define it ?")
             if button == QMessageBox.StandardButton.Yes:
+                from src.mg_dialog_settings import runDialogEditSettings
                 runDialogEditSettings(self, tabPage=0)
             return
 
@@ -412,8 +553,7 @@ class MgRepoTree(QTreeWidget):
             # clear items before updating them, this is better visually
             it.markItemInProgress()
 
-        for it in items:
-            it.repoInfo.refresh()
+        self.refreshQueue.requestRefreshList([it.repoInfo for it in items])
 
 
     def slotMenuCopyAboutToShow(self) -> None:
@@ -482,6 +622,7 @@ class MgRepoTree(QTreeWidget):
         dbg('slotGitProperties()')
         if not self.confirmIfNoSelectedItems():
             return
+        from src.mg_dialog_view_properties import runDialogGitProperties
         runDialogGitProperties(self, self.selectedRepoItems()[0].repoInfo)
 
 
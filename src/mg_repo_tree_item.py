@@ -15,7 +15,7 @@
 #
 
 
-from typing import Any, TYPE_CHECKING, Optional, cast, Tuple
+from typing import Any, TYPE_CHECKING, Optional, cast, Tuple, List
 import logging
 
 from PySide6.QtCore import Qt
@@ -216,14 +216,32 @@ class MgRepoTreeItem(QTreeWidgetItem):
         self.setFont(col, f)
 
 
+    def hasUnfilledColumns(self) -> bool:
+        '''Return True if some displayed columns were not filled yet'''
+        treeWidget = self.treeWidget()
+        if treeWidget is None:
+            return False
+        return (not self.filledColumns & self.ColumnFlags.fieldSHA and not treeWidget.isColumnHidden(COL_SHA1)) \
+            or (not self.filledColumns & self.ColumnFlags.fieldURL and not treeWidget.isColumnHidden(COL_URL))
+
+
     @ignoreCppObjectDeletedError
-    def fillNextColumns(self) -> None:
-        """ fills columns in a precise order StatusInt, StatusDev,SHA1,URL"""
+    def fillNextColumns(self, offscreen: bool = False) -> None:
+        """ fills columns in a precise order StatusInt, StatusDev,SHA1,URL
+
+        On the main repository tree, the columns are filled only when the item is around the viewport,
+        unless offscreen is True. The other items are filled when they are scrolled into view or when
+        the tree is idle."""
 
         ### Strange, but we have seen that in the field!
         if self.treeWidget() is None:
             return
 
+        from src.mg_repo_tree import MgRepoTree
+        treeWidget = self.treeWidget()
+        if not offscreen and isinstance(treeWidget, MgRepoTree) and not treeWidget.isItemNearViewport(self):
+            return
+
         if not self.filledColumns & self.ColumnFlags.fieldSHA and not self.treeWidget().isColumnHidden(COL_SHA1):
             # to avoid starting to fill a column multiple times
             self.filledColumns |= self.ColumnFlags.fieldSHA
@@ -244,7 +262,7 @@ class MgRepoTreeItem(QTreeWidgetItem):
         '''Called when sha1 information is eventually available'''
         self.setText(COL_SHA1, commit_sha1[:SHORT_SHA1_NB_DIGITS])
         self.setToolTip(COL_SHA1, commit_sha1)  # full sha1
-        self.autoAdjustColumnSize(self.treeWidget())
+        self.autoAdjustColumnSize(self.treeWidget(), [COL_SHA1])
         self.fillNextColumns()
 
 
@@ -252,16 +270,23 @@ class MgRepoTreeItem(QTreeWidgetItem):
     def cbUrlAvailable(self, url: str) -> None:
         '''Called when url information is eventually available'''
         self.setText(COL_URL, url)
-        self.autoAdjustColumnSize(self.treeWidget())
+        self.autoAdjustColumnSize(self.treeWidget(), [COL_URL])
         self.fillNextColumns()
 
 
     @staticmethod
-    def autoAdjustColumnSize(treeWidget: Optional[QTreeWidget]) -> None:
-        '''Adjust automatically the column size to the largest item'''
+    def autoAdjustColumnSize(treeWidget: Optional[QTreeWidget], columns: Optional[List[int]] = None) -> None:
+        '''Adjust automatically the column size to the largest item.
+
+        On the main repository tree, the resize is grouped with the one of the other items being updated.'''
         if treeWidget is None:
             return
 
+        from src.mg_repo_tree import MgRepoTree
+        if isinstance(treeWidget, MgRepoTree):
+            treeWidget.markColumnsDirty(columns)
+            return
+
         for i in range(treeWidget.columnCount()):
             treeWidget.resizeColumnToContents(i)
         QApplication.processEvents()
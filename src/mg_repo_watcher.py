@@ -0,0 +1,159 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from typing import Dict, List, Set
+import logging, os
+
+from PySide6.QtCore import QObject, QTimer, QFileSystemWatcher
+
+from src.mg_repo_info import MgRepoInfo
+from src.mg_repo_cache import repo_fingerprint
+from src.mg_git_refs import git_admin_dirs
+
+logger = logging.getLogger('mg_repo_watcher')
+dbg = logger.debug
+
+# delay in ms to wait for git to finish modifying a repository before refreshing it
+WATCHER_DEBOUNCE_DELAY = 500
+
+# interval in ms between two checks of the repositories which could not be watched
+WATCHER_POLLING_INTERVAL = 5000
+
+
+class MgRepoWatcher(QObject):
+    '''Refresh repositories automatically when their git directory changes.
+
+    For each repository, the git directory and the refs directories are watched. This catches
+    modifications of HEAD, index, packed-refs, FETCH_HEAD and of the refs, which git performs by
+    renaming a lock file into its final location.
+
+    Notifications are collected for WATCHER_DEBOUNCE_DELAY ms, then only the repositories whose
+    fingerprint actually changed are refreshed.
+
+    When the system refuses to watch more directories, the remaining repositories are polled
+    every WATCHER_POLLING_INTERVAL ms instead.
+    '''
+
+    def __init__(self, parent: QObject) -> None:
+        super().__init__(parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.slotDirectoryChanged)
+
+        self.repoByWatchedDir: Dict[str, MgRepoInfo] = {}
+        self.pendingRepos: Set[MgRepoInfo] = set()
+        self.polledRepos: List[MgRepoInfo] = []
+
+        self.debounceTimer = QTimer(self)
+        self.debounceTimer.setSingleShot(True)
+        self.debounceTimer.setInterval(WATCHER_DEBOUNCE_DELAY)
+        self.debounceTimer.timeout.connect(self.slotRefreshPendingRepos)
+
+        self.pollingTimer = QTimer(self)
+        self.pollingTimer.setInterval(WATCHER_POLLING_INTERVAL)
+        self.pollingTimer.timeout.connect(self.slotPollRepos)
+
+
+    def setRepos(self, repos: List[MgRepoInfo]) -> None:
+        '''Watch exactly this list of repositories, forgetting the previously watched ones'''
+        dbg('setRepos() - %d repos' % len(repos))
+        watchedDirs = self.watcher.directories()
+        if watchedDirs:
+            self.watcher.removePaths(watchedDirs)
+        for repo in set(self.repoByWatchedDir.values()) | set(self.polledRepos):
+            repo.repo_info_available.disconnect(self.slotRepoInfoAvailable)
+        self.repoByWatchedDir = {}
+        self.pendingRepos = set()
+        self.polledRepos = []
+        self.debounceTimer.stop()
+        self.pollingTimer.stop()
+
+        for repo in repos:
+            repo.repo_info_available.connect(self.slotRepoInfoAvailable)
+            self.watchRepo(repo)
+
+
+    def watchRepo(self, repo: MgRepoInfo) -> None:
+        '''Watch the git directories of this repository, or poll it if they can not be watched'''
+        repoDirs: List[str] = []
+        for adminDir in git_admin_dirs(repo.fullpath):
+            repoDirs.append(str(adminDir))
+            for dirpath, _dirnames, _filenames in os.walk(adminDir / 'refs'):
+                repoDirs.append(dirpath)
+
+        # the watcher stops watching the directories which are deleted, like the refs directory of a branch
+        # namespace: forget them, so that they are watched again if they were created again
+        watchedDirs = set(self.watcher.directories())
+        for d in [d for d, dirRepo in self.repoByWatchedDir.items() if dirRepo is repo and d not in watchedDirs]:
+            del self.repoByWatchedDir[d]
+
+        newDirs = [d for d in repoDirs if d not in self.repoByWatchedDir]
+        for d in newDirs:
+            self.repoByWatchedDir[d] = repo
+
+        failedDirs = self.watcher.addPaths(newDirs) if newDirs else []
+        if failedDirs and repo not in self.polledRepos:
+            dbg('Could not watch %s, polling it instead' % repo.name)
+            self.polledRepos.append(repo)
+            if not self.pollingTimer.isActive():
+                self.pollingTimer.start()
+
+
+    def slotRepoInfoAvailable(self, repoName: str) -> None:
+        '''Record the fingerprint of a repository after its information was collected, so that
+        the modifications performed by git while collecting it do not trigger another refresh'''
+        repo = self.sender()
+        if isinstance(repo, MgRepoInfo):
+            # the fingerprint is stored in the repository, shared with the watchers of the other tabs
+            repo.fingerprint = repo_fingerprint(repo.fullpath)
+
+
+    def slotDirectoryChanged(self, path: str) -> None:
+        '''Called when one of the watched directory changed'''
+        repo = self.repoByWatchedDir.get(path)
+        if repo is None:
+            return
+        self.pendingRepos.add(repo)
+        # restart the timer, to wait for git to complete its work
+        self.debounceTimer.start()
+
+
+    def slotRefreshPendingRepos(self) -> None:
+        '''Refresh the repositories which received change notifications and whose fingerprint changed'''
+        pendingRepos, self.pendingRepos = self.pendingRepos, set()
+        for repo in pendingRepos:
+            self.refreshIfChanged(repo)
+
+
+    def slotPollRepos(self) -> None:
+        '''Check the repositories which could not be watched'''
+        for repo in self.polledRepos:
+            self.refreshIfChanged(repo)
+
+
+    def refreshIfChanged(self, repo: MgRepoInfo) -> None:
+        '''Refresh the repository if its fingerprint changed since the last time its information was collected'''
+        if repo.is_deleted:
+            return
+        fingerprint = repo_fingerprint(repo.fullpath)
+        if fingerprint == repo.fingerprint:
+            return
+
+        dbg('Repository %s changed, refreshing it' % repo.name)
+        repo.fingerprint = fingerprint
+        # new refs directories may have been created
+        self.watchRepo(repo)
+        repo.refresh()
@@ -17,9 +17,9 @@
 
 from typing import Sequence, Union, Optional, Callable, Tuple, Any, List, Dict, Type, Generator, TYPE_CHECKING
 
-import logging, sys, os, shlex
+import logging, sys, os, shlex, codecs, fnmatch
 from pathlib import Path
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
 from enum import Enum, auto
 from dataclasses import dataclass
 import itertools
@@ -28,6 +28,12 @@ from PySide6.QtCore import QObject, QProcess, Signal, SignalInstance
 from PySide6.QtWidgets import QMessageBox, QApplication, QWidget
 
 from src import mg_config
+from src.mg_exec_core import (GIT_EXIT_CODE_SEGFAULT_OF_GIT_WITH_STACKTRACE, GIT_EXIT_CODE_SEGFAULT_OF_GIT_NO_STACKTRACE,
+                              EXIT_CODE_COULD_NOT_START_PROCESS, GIT_EXIT_CODE_STOPPED_BECAUSE_AUTH_FAILURE, EXIT_CODE_CRASHED,
+                              FLATPAK_SPAWN, SNAP_BIN_DIR, CmdType, ExecStatus, MgExecutable, isRunningInsideFlatpak,
+                              build_cmd_line, log_process_output, flatpak_host_file_exists, process_failure_msg,
+                              ExecProgram, GitProgram)
+from src.mg_host_helper import MgHostHelper, get_host_helper
 if TYPE_CHECKING:
     from src.mg_repo_info import MgRepoInfo
     from src.mg_repo_tree import MgRepoTree
@@ -41,92 +47,9 @@ warn = logger.warning
 error = logger.error
 log_git_cmd = logging.getLogger(mg_const.LOGGER_GIT_CMD).info
 
-GIT_EXIT_CODE_SEGFAULT_OF_GIT_WITH_STACKTRACE = -100
-GIT_EXIT_CODE_SEGFAULT_OF_GIT_NO_STACKTRACE = -101
-EXIT_CODE_COULD_NOT_START_PROCESS = -102
-GIT_EXIT_CODE_STOPPED_BECAUSE_AUTH_FAILURE = -103
-EXIT_CODE_CRASHED = -104
-
-FLATPAK_SPAWN = ['flatpak-spawn', '--host']
-SNAP_BIN_DIR = '/snap/bin'
-
-class CmdType(Enum):
-    NoCmd               = 'NoCmd'         # empty value, means that the program could not be found
-    DirectCmd           = 'DirectCmd'
-    FlatpakProgram      = 'FlatpakProgram'
-    SnapProgram         = 'SnapProgram'
-
-
-class ExecStatus(Enum):
-    Ok            = 'Ok'
-    FailedToStart = 'Failed to start'
-    Crashed       = 'Crash'
-    OtherError    = 'Other error'
-
-
-@dataclass
-class MgExecutable:
-    '''Class to represent an executable program with its type and path'''
-    cmd_type: CmdType = CmdType.NoCmd
-
-    # used to launch the command, this is the name of the executable available on the command-line
-    # or the path to the executable, to be launched either directly or with flatpak spawn depending on cmd_type
-    path: str = ''
-
-    # flatpak program ID, when cmd_type is CmdType.FlatpakProgram
-    name: str = ''
-
-    def is_empty(self) -> bool:
-        '''Shortcut to check if the executable is empty (not found)'''
-        return self.cmd_type == CmdType.NoCmd
-    
-    def __str__(self) -> str:
-        if self.is_empty():
-            return 'NoCmd()'
-        elif self.cmd_type == CmdType.FlatpakProgram:
-            return f'FlatpakProgram({self.name})'
-        else:
-            return f'{self.cmd_type}({self.path})'
-
-
-def isRunningInsideFlatpak() -> bool:
-    """Return TTrue if running inside a flatpak container.
-
-    Used to use proper flatpak launcher when launching an external program"""
-    return 'FLATPAK_ID' in os.environ
-
-
-class ExecTool:
-    # Program display name to use when presenting to the user
-    DISPLAY_NAME: str = ''
-
-    # List of platform (as returned by sys.platform()) where we can run this tool
-    SUPPORTED_PLATFORMS: List[str]
-
-    WIN32_PATH_CANDIDATES: List[Path] = []
-    LINUX_PATH_CANDIDATES: List[Path] = []
-    DARWIN_PATH_CANDIDATES: List[Path] = []
-
-    EXEC_NAME_WIN32: str = ''
-    EXEC_NAME_DARWIN: str = ''
-    EXEC_NAME_LINUX: str = ''
-    # Snap executable name under /snap/bin 
-    EXEC_NAME_SNAP: str = ''
-    # Flatpak application ID (for example org.gnome.gitg). Empty means "no Flatpak app".
-    EXEC_NAME_FLATPAK: str = ''
-
-    # When False,the program we are looking for is specific and we can filter the browse dialog with
-    # the program executable name. If True, the program is generic and we will not filter the the browse
-    # dialog box.
-    GENERIC_PROGRAM: bool = False
-
-    # if not None, this is a command which we can run to detect the program. Typically, this is ['--version']
-    INNOCUOUS_COMMAND: Optional[List[str]] = None
 
-    # name of the configuration entry to store the executable configuration
-    # information (path, auto-detection, flatpak app name, ...). The prefix 
-    # is completed with CONFIG_SUFFIX_* to store the different information.
-    CONFIG_ENTRY_BASE: str
+class ExecTool(ExecProgram):
+    '''External program launched from the GUI: menu actions, message boxes and asynchronous execution'''
 
     ACTION_IDX_NAME = 0
     ACTION_IDX_CMD_LINE = 1
@@ -139,9 +62,6 @@ class ExecTool:
         #    ...
     ]
 
-    SESSION_CACHE: Dict[Type['ExecTool'], MgExecutable] = {
-    }
-
     @staticmethod
     def getExecTools() -> 'List[Type[ExecTool]]':
         return [ExecSublimeMerge, ExecSourceTree, ExecGitGui, ExecGitK, ExecGitBash]
@@ -187,221 +107,6 @@ class ExecTool:
         cls.runAction(action, selectedRepos)
 
 
-    @classmethod
-    def platform_supported(cls) -> bool:
-        '''Return whether the current platform is supported'''
-        return sys.platform in cls.SUPPORTED_PLATFORMS
-
-
-    @classmethod
-    def flatpak_supported(cls) -> bool:
-        '''Return whether the current platform supports Flatpak'''
-        return sys.platform == 'linux'
-
-
-    @classmethod
-    def snap_supported(cls) -> bool:
-        '''Return whether the current platform supports Snap'''
-        return sys.platform == 'linux'
-
-
-    @classmethod
-    def config_read_entry(cls, suffix: str, default_value: Any = None) -> Any:
-        '''Read the configuration entry CONFIG_ENTRY_BASE + suffix and return its value'''
-        config = mg_config.get_config_instance()
-        return config.get(cls.CONFIG_ENTRY_BASE + suffix, default_value=default_value)
-
-
-    @classmethod
-    def config_write_entry(cls, suffix: str, value: Any) -> None:
-        '''Write the value in the configuration entry CONFIG_ENTRY_BASE + suffix'''
-        config = mg_config.get_config_instance()
-        config[cls.CONFIG_ENTRY_BASE + suffix] = value
-
-
-    @classmethod
-    def config_read_exec(cls) -> MgExecutable:
-        '''Read the configuration entry and return an MgExecutanble with the stored information.
-
-        A default empty exec is returned if:
-        - the config entry does not exist
-        - the config entry for cmd_type has an unknown value
-        - the config entry declares flatpak but this is not supported on this platform
-        - the config entry declares snap but this is not supported on this platform
-        '''
-        config = mg_config.get_config_instance()
-        cmd_type_config_entry = cls.CONFIG_ENTRY_BASE + mg_config.SUFFIX_CMD_TYPE
-        cmd_type_str = config.get(cmd_type_config_entry)
-        if cmd_type_str is None:
-            dbg(f'config_read_exec() - no config entry for cmd type: {cmd_type_config_entry}, returning empty MgExecutable')
-            return MgExecutable()
-        name = config.get(cls.CONFIG_ENTRY_BASE + mg_config.SUFFIX_APP_NAME, '')
-        path = config.get(cls.CONFIG_ENTRY_BASE + mg_config.SUFFIX_MANUAL_PATH, '')
-        try:
-            exec = MgExecutable(cmd_type=CmdType(cmd_type_str), name=name, path=path)
-        except ValueError:
-            warn(f'config_read_exec() - Unsupported config value for {cmd_type_config_entry} : {cmd_type_str}')
-            dbg('config_read_exec() - Returning empty MgExecutable')
-            return MgExecutable()
-
-        if (not cls.flatpak_supported()) and exec.cmd_type == CmdType.FlatpakProgram \
-                or (not cls.snap_supported()) and exec.cmd_type == CmdType.SnapProgram:
-            # config is inconsistent, fix it
-            warn(f'config_read_exec() - Config inconsistent with platform capabilities: cmd_type={exec.cmd_type}')
-            dbg('config_read_exec() - Returning empty MgExecutable')
-            return MgExecutable()
-
-        dbg(f'config_read_exec() - Returning {exec}')
-        return exec
-
-
-    @classmethod
-    def autodetect_executable(cls) -> MgExecutable:
-        '''Autodetect the executable location according to the command defintions and return a MgExecutable.
-
-        The order of detection is:
-        - run the on the command line the command defined in INNOCUOUS_COMMAND
-        - scan the locations defined in the relevant *_PATH_CANDIDATES for the current platform
-        - if EXEC_NAME_FLATPAK is defined, look for a Flatpak app with this ID
-
-        The MgExecutable is empty when the program could not be found. Else it contains the information to launch the program.
-        '''
-        if not cls.platform_supported():
-            return MgExecutable()
-
-        # check if we have it in cache
-        if cls in cls.SESSION_CACHE:
-            return cls.SESSION_CACHE[cls]
-
-        if cls.INNOCUOUS_COMMAND:
-            exec = MgExecutable(CmdType.DirectCmd, path=cls.get_exec_name())
-
-            exec_status, exit_code, _output = RunProcess().exec_blocking(exec, cmd_args=cls.INNOCUOUS_COMMAND)
-            if exec_status == ExecStatus.Ok and exit_code == 0:
-                # program is on the path, use it
-                cls.SESSION_CACHE[cls] = exec
-                return exec
-
-        exec = cls.find_prog_exec()
-
-        # put it in cash for next time
-        if not exec.is_empty():
-            cls.SESSION_CACHE[cls] = exec
-
-        # return the result even if we could not find anything
-        return exec
-
-
-    @classmethod
-    def get_executable(cls) -> MgExecutable:
-        '''Check if the configuration `autodetect` is True or None and in this case,
-        auto-detects the program location. 
-        
-        Else, simply return the value stored in the configuration file.
-        '''
-        if not cls.platform_supported():
-            return MgExecutable()
-
-        if cls.config_read_entry(mg_config.SUFFIX_AUTODETECT) in (None, True):
-            result = cls.autodetect_executable()
-        else:
-            result = cls.config_read_exec()
-        return result
-
-
-    @classmethod
-    def get_exec_name(cls) -> str:
-        if sys.platform == 'win32':
-            return cls.EXEC_NAME_WIN32
-        elif sys.platform == 'linux':
-            return cls.EXEC_NAME_LINUX
-        elif sys.platform == 'darwin':
-            return cls.EXEC_NAME_DARWIN
-        else:
-            raise ValueError('Platform not supported: ', sys.platform)
-
-
-    @classmethod
-    def get_path_candidates(cls) -> List[Path]:
-        if sys.platform == 'win32':
-            path_candidates = list(cls.WIN32_PATH_CANDIDATES)
-        elif sys.platform == 'linux':
-            path_candidates = list(cls.LINUX_PATH_CANDIDATES)
-        elif sys.platform == 'darwin':
-            path_candidates = list(cls.DARWIN_PATH_CANDIDATES)
-        else:
-            raise ValueError(f'Unsupported platform for find_prog_exed(): {sys.platform}')
-
-        return path_candidates
-
-
-    @classmethod
-    def find_prog_exec(cls) -> MgExecutable:
-        '''Scans locations path_candidates to see if the expected program exists. When running inside a flatpak sandbox,
-        looks for the program on the host file system with flatpak-spawn.
-
-        If not found, and if EXEC_NAME_SNAP is defined, looks for a an executable with this name in /snap/bin.
-
-        If not found, and if EXEC_NAME_FLATPAK is defined, looks for a Flatpak app with this ID.
-        
-        Return the program at this location if found or an empty MgExecutable
-        '''
-        path_candidates = cls.get_path_candidates()
-        exec_name = cls.get_exec_name()
-        
-        dbg(f'find_prog_exec({cls.__name__}) - exec_name={exec_name}, path_candidates={path_candidates}')
-
-        possible_full_paths = [
-            Path(possible_path) / exec_name for possible_path in path_candidates
-        ]
-        if cls.EXEC_NAME_SNAP:
-            possible_full_paths.append(Path(SNAP_BIN_DIR) / cls.EXEC_NAME_SNAP)
-        
-        for candidate_path in possible_full_paths:
-            dbg('find_prog_exec() - looking at: {}'.format(str(candidate_path)))
-
-            if isRunningInsideFlatpak():
-                if not flatpak_host_file_exists(candidate_path):
-                    continue
-                dbg('Found program at flatpak host: {}'.format(str(candidate_path)))
-                return MgExecutable(CmdType.DirectCmd, str(candidate_path))
-            else:
-                if not candidate_path.exists():
-                    continue
-                dbg('Found program at: {}'.format(str(candidate_path)))
-                return MgExecutable(CmdType.DirectCmd, str(candidate_path))
-            
-        # not found on the path candidates
-
-        result = MgExecutable()
-        if cls.EXEC_NAME_FLATPAK:
-            # look for program in flatpak list of program
-            # ok, we have it !
-            result = cls.find_flatpak_program()
-
-        # could not find the wanted program
-        return result
-
-
-    @classmethod
-    def find_flatpak_program(cls) -> MgExecutable:
-        '''Detect a Flatpak app by ID and return a filled MgExecutable if found, else an empty MgExecutable.'''
-        app_id = cls.EXEC_NAME_FLATPAK.strip()
-        if not app_id:
-            return MgExecutable()
-
-        exec = MgExecutable(CmdType.DirectCmd, path='flatpak')
-        cmd_args = ['info', '--show-ref', app_id]
-        exec_status, exit_code, _output = RunProcess().exec_blocking(exec, cmd_args)
-
-        if exec_status == ExecStatus.Ok and exit_code == 0:
-            dbg(f'find_flatpak_program() - found flatpak app: {app_id}')
-            return MgExecutable(CmdType.FlatpakProgram, name=app_id)
-
-        dbg(f'find_flatpak_program() - flatpak app not found: {app_id}')
-        return MgExecutable()
-
-
     @classmethod
     def shouldShow(cls) -> bool:
         '''Return whether to show the program in menu:
@@ -436,39 +141,16 @@ class ExecTool:
 
         return True if the execution is successful or error is within the allowed errors.
         '''
-        def qmsgbox_critical(parent: Optional[QWidget], title: str, msg: str) -> None:
-            if with_msg_box:
-                QMessageBox.critical(parent, title, msg)
+        if not with_msg_box:
+            return super().handle_process_return(exec_status, exit_code, output, allow_errors)
+
+        failure = process_failure_msg(cls.DISPLAY_NAME, exec_status, exit_code, output, allow_errors)
+        if failure is not None:
+            is_critical, title, msg = failure
+            if is_critical:
+                QMessageBox.critical(None, title, msg)
             else:
-                print(msg)
-
-        def qmsgbox_warning(parent: Optional[QWidget], title: str, msg: str) -> None:
-            if with_msg_box:
-                QMessageBox.warning(parent, title, msg)
-            else:
-                print(msg)
-
-        if exec_status == ExecStatus.FailedToStart and not allow_errors:
-            qmsgbox_critical(None,
-                                 f'Could not start {cls.DISPLAY_NAME}',
-                                 f'Error: Could not start {cls.DISPLAY_NAME}\n\nPlease adjust the execution information in the preference dialog')
-            return False
-
-        if exec_status == ExecStatus.Crashed:
-            qmsgbox_critical(None,
-                                 f'Execution error for {cls.DISPLAY_NAME}',
-                                 f'Error: Execution of {cls.DISPLAY_NAME} crashed.\n\nPlease check the logs and adjust the execution information in the preference dialog')
-            return False
-
-        if exec_status == ExecStatus.OtherError:
-            qmsgbox_critical(None,
-                                 f'Execution error for {cls.DISPLAY_NAME}',
-                                 f'Error: Execution of {cls.DISPLAY_NAME} failed.\n\nPlease check the logs and adjust the execution information in the preference dialog')
-            return False
-
-        if exit_code != 0 and not allow_errors:
-            qmsgbox_warning(None, f'Execution error for {cls.DISPLAY_NAME}',
-                                f'Error: {cls.DISPLAY_NAME} returned with exit code {exit_code}.\n\nOutput:\n{output}')
+                QMessageBox.warning(None, title, msg)
             return False
 
         # ok, execution was successful
@@ -483,6 +165,7 @@ class ExecTool:
                           allow_errors: bool = False,
                           callback: Optional[Callable[[int, str], Any]] = None,
                           output_callback: Union[None, Callable[[str], Any], SignalInstance] = None,
+                          failure_callback: Optional[Callable[[ExecStatus, int, str], Any]] = None,
                           ) -> 'Optional[RunProcess]':
         '''Run the program with the arguments listed in cmd_args, in the working directory.
 
@@ -492,7 +175,10 @@ class ExecTool:
         If allow_errors is False and the process does not start or return with non zero exit code, an error message is displayed.
         If the process crashes or reports another kind of error, an error message is displayed.
 
-        output_callback is called with the process output whenever a new output is available.
+        When callback is not called, failure_callback is called instead with the execution status, the exit code and
+        the output, for example when the process crashed or was killed.
+
+        output_callback is called with the new process output whenever a new output is available.
         '''
         exec = cls.get_executable()
         if exec.is_empty():
@@ -503,6 +189,8 @@ class ExecTool:
             if cls.handle_process_return(exec_status, exit_code, output, allow_errors):
                 if callback is not None:
                     callback(exit_code, output)
+            elif failure_callback is not None:
+                failure_callback(exec_status, exit_code, output)
 
         rp = RunProcess()
         if output_callback:
@@ -516,9 +204,12 @@ class ExecTool:
     @classmethod
     def exec_blocking(cls, cmd_args: List[str], workdir: str = '', allow_errors: bool = False,
                       callback: Optional[Callable[[int, str], Any]] = None,
+                      failure_callback: Optional[Callable[[ExecStatus, int, str], Any]] = None,
                       ) -> str:
         '''Run the program with the arguments listed in cmd_args, in the working directory.
         Raises an exception if the command did not return with 0 status.
+
+        See exec_non_blocking() for callback and failure_callback.
         '''
         exec = cls.get_executable()
         if exec.is_empty():
@@ -530,6 +221,8 @@ class ExecTool:
         if cls.handle_process_return(exec_status, exit_code, output, allow_errors):
             if callback is not None:
                 callback(exit_code, output)
+        elif failure_callback is not None:
+            failure_callback(exec_status, exit_code, output)
 
         return output
 
@@ -547,38 +240,8 @@ class ExecTool:
 #       Git Stuff
 #######################################################
 
-class ExecGit(ExecTool):
-    DISPLAY_NAME = 'Git'
-
-    SUPPORTED_PLATFORMS = ['win32', 'linux', 'darwin']
-
-    WIN32_PATH_CANDIDATES: List[Path] = [
-        Path(os.environ.get("ProgramFiles", '')) / "Git" / "bin",
-        Path(os.environ.get("ProgramFiles", '')) / "Git" / "cmd",
-        Path(os.environ.get("ProgramFiles(x86)", '')) / "Git" / "bin",
-        Path(os.environ.get("ProgramFiles(x86)", '')) / "Git" / "cmd",
-        Path(os.environ.get("PROGRAMW6432", '')) / "Git" / "bin",
-        Path(os.environ.get("PROGRAMW6432", '')) / "Git" / "cmd",
-    ]
-
-    LINUX_PATH_CANDIDATES = [
-        Path('/usr/local/bin'),
-        Path('/usr/bin'),
-    ]
-
-    DARWIN_PATH_CANDIDATES = [
-        Path('/usr/local/bin'),
-        Path('/usr/bin'),
-    ]
-
-    EXEC_NAME_LINUX = 'git'
-    EXEC_NAME_DARWIN = 'git'
-    EXEC_NAME_WIN32 = 'git.exe'
-    EXEC_NAME_FLATPAK = ''
-
-    INNOCUOUS_COMMAND = ['--version']
-
-    CONFIG_ENTRY_BASE = 'CONFIG_GIT'
+class ExecGit(GitProgram, ExecTool):
+    '''Git for the GUI: the program lookup is in GitProgram, shared with the command-line tool'''
 
     @classmethod
     def checkFound(cls) -> bool:
@@ -595,6 +258,7 @@ class ExecGit(ExecTool):
                           allow_errors: bool = False,
                           callback: Optional[Callable[[int, str], Any]] = None,
                           output_callback: Union[None, Callable[[str], Any], SignalInstance] = None,
+                          failure_callback: Optional[Callable[[ExecStatus, int, str], Any]] = None,
                           ) -> 'Optional[RunProcess]':
 
         if MgAuthFailureMgr.shouldStopBecauseGitAuthFailureInProgress(cmd_args):
@@ -628,7 +292,7 @@ class ExecGit(ExecTool):
                 callback(exit_code, cmd_out)
 
 
-        return super().exec_non_blocking(cmd_args, workdir, allow_errors, local_callback, output_callback)
+        return super().exec_non_blocking(cmd_args, workdir, allow_errors, local_callback, output_callback, failure_callback)
 
 
 #######################################################
@@ -854,13 +518,15 @@ class ExecExplorer(ExecTool):
     def exec_non_blocking(cls, cmd_args: List[str], workdir: str = '', allow_errors: bool = False,
                           callback: Optional[Callable[[int, str], Any]] = None,
                           output_callback: Union[None, Callable[[str], Any], SignalInstance] = None,
+                          failure_callback: Optional[Callable[[ExecStatus, int, str], Any]] = None,
                           ) -> 'Optional[RunProcess]':
         '''Same as default exec_non_blocking but defaults to allow_errors for Windows'''
         override_allow_errors = allow_errors
         if sys.platform == 'win32':
             # on Windows, launching the explorer returns -1, so make sure we ignore it
             override_allow_errors = True
-        return super().exec_non_blocking(cmd_args, workdir, override_allow_errors, callback, output_callback)
+        return super().exec_non_blocking(cmd_args, workdir, override_allow_errors, callback, output_callback,
+                                         failure_callback)
 
 
 #######################################################
@@ -882,7 +548,11 @@ class RunProcess(QObject):
     - asynchronous execution is slightly easier than when dealing directly with QProcess
     - asynchronous execution can be forced to blocking execution, convenient for testing
 
-    You can use the signal sigProcessOutput to track the progressive output of the process.
+    You can use the signal sigProcessOutput to track the progressive output of the process. Each emission
+    carries only the output received since the previous one.
+
+    Inside flatpak, when the host helper is available (see mg_host_helper), the command is sent to the helper
+    instead of being started with a QProcess running flatpak-spawn.
 
     '''
 
@@ -892,6 +562,10 @@ class RunProcess(QObject):
     sigProcessOutput = Signal(str)
     exec_status: ExecStatus
 
+    # output and result of the command executed by the host helper, emitted from the helper thread
+    sigHostOutput = Signal(str)
+    sigHostDone = Signal(object)
+
     def __init__(self) -> None:
         super().__init__(QApplication.instance())
 
@@ -902,14 +576,29 @@ class RunProcess(QObject):
         self.process = None
         self.cb_done = None
         self.exec_status = ExecStatus.Ok
-        self.partial_stdout = ''
+        self.clear_stdout()
         self.emit_output = False
+        self.host_helper: Optional[MgHostHelper] = None
+        self.host_request_id: Optional[int] = None
+        self.sigHostOutput.connect(self.slotHostOutput)
+        self.sigHostDone.connect(self.slotHostDone)
 
 
     def nice_cmdline(self) -> str:
         return  ' '.join(self.cmd_line)
 
 
+    def clear_stdout(self) -> None:
+        '''Reset the output collected so far'''
+        # chunks of output received so far, joined only when the process is finished
+        self.stdout_chunks: List[str] = []
+        # utf8 characters may be split between two chunks
+        self.stdout_decoder = codecs.getincrementaldecoder('utf8')(errors='replace')
+        # beginning of the last line received, to detect git messages split between two chunks
+        self.stdout_line_head = ''
+        self.auth_failure_reported = False
+
+
     def create_process(self, exec: MgExecutable, cmd_args: List[str], working_dir: str = '',
                        emit_output: bool = False,
                        ) -> None:
@@ -924,23 +613,7 @@ class RunProcess(QObject):
         May block while a process is currently under execution
         '''
         dbg(f'create_process({exec} {cmd_args}, working_dir={working_dir})')
-        cmd_type = exec.cmd_type
-
-        assert not exec.is_empty(), f'Can not execute: {exec}'
-
-        self.cmd_line = cmd_args
-
-        if exec.cmd_type in [CmdType.DirectCmd]:
-            self.cmd_line = [exec.path] + self.cmd_line
-
-        if cmd_type == CmdType.FlatpakProgram:
-            self.cmd_line = ['flatpak', 'run', exec.name] + self.cmd_line
-
-        if cmd_type == CmdType.SnapProgram:
-            self.cmd_line = [f'{SNAP_BIN_DIR}/{exec.name}'] + self.cmd_line
-
-        if isRunningInsideFlatpak():
-            self.cmd_line = FLATPAK_SPAWN + self.cmd_line
+        self.cmd_line = build_cmd_line(exec, cmd_args)
 
         dbg(f'create_process() cmd_line={self.cmd_line}')
 
@@ -959,18 +632,35 @@ class RunProcess(QObject):
             self.process.readyReadStandardOutput.connect(self.slotReadyReadStdout)
 
     def slotReadyReadStdout(self) -> None:
-        '''Slot called when data is available from the process stdout channel'''
+        '''Slot called when data is available from the process stdout channel.
+
+        Only the new output is emitted with sigProcessOutput, not the full output received so far.'''
         assert self.process
         btext = bytes(self.process.readAllStandardOutput())
-        self.partial_stdout += btext.decode('utf8', errors='replace')
+        text = self.stdout_decoder.decode(btext)
+        self.stdout_chunks.append(text)
         dbg('%s - partial git output:' % self.nice_cmdline())
         dbg(b'"%r"' % btext)
-        if self.emit_output:
-            self.sigProcessOutput.emit(self.partial_stdout)
+        self.handle_new_output(text)
+
 
-        if hasGitAuthFailureMsg(self.partial_stdout):
+    def handle_new_output(self, text: str) -> None:
+        '''Emit the new output of the process and look for git authentication failures in it'''
+        if self.emit_output and text:
+            self.sigProcessOutput.emit(text)
+
+        if not self.auth_failure_reported and hasGitAuthFailureMsg(self.stdout_line_head + text):
+            self.auth_failure_reported = True
             MgAuthFailureMgr.gitAuthFailed()
 
+        # the auth failure message is at the beginning of a line, keeping the beginning of the last line is enough
+        last_nl = text.rfind('\n')
+        if last_nl == -1:
+            self.stdout_line_head += text
+        else:
+            self.stdout_line_head = text[last_nl+1:]
+        self.stdout_line_head = self.stdout_line_head[:len(mg_const.GIT_AUTH_FAILURE_MARKER)]
+
 
     def exec_blocking(self, exec: MgExecutable, cmd_args: List[str], working_dir: str = '') -> Tuple[ExecStatus, int, str]:
         '''Execute a program in blocking mode.
@@ -980,6 +670,12 @@ class RunProcess(QObject):
         Return the program exit code and the standard output of the command.
         '''
         self.is_exec_blocking = True
+        helper = get_host_helper() if isRunningInsideFlatpak() else None
+        if helper is not None:
+            self.cmd_line = build_cmd_line(exec, cmd_args, flatpak_spawn=False)
+            dbg('Executing blocking with host helper: {}'.format(self.nice_cmdline()))
+            return self.host_finished(helper.exec_blocking(self.cmd_line, working_dir))
+
         self.create_process(exec, cmd_args, working_dir=working_dir)
 
         assert self.process
@@ -1033,6 +729,17 @@ class RunProcess(QObject):
             return
         self.is_exec_blocking = False
 
+        helper = get_host_helper() if isRunningInsideFlatpak() else None
+        if helper is not None:
+            self.cmd_line = build_cmd_line(exec, cmd_args, flatpak_spawn=False)
+            self.emit_output = emit_output
+            self.host_helper = helper
+            dbg('Executing async with host helper: {}'.format(self.nice_cmdline()))
+            self.host_request_id = helper.exec_async(self.cmd_line, working_dir,
+                                                     cb_done=lambda *result: self.sigHostDone.emit(result),
+                                                     cb_output=self.sigHostOutput.emit)
+            return
+
         self.create_process(exec, cmd_args, working_dir=working_dir,
                             emit_output=emit_output)
 
@@ -1059,27 +766,53 @@ class RunProcess(QObject):
             self.exec_status = ExecStatus.OtherError
 
 
+    def slotHostOutput(self, text: str) -> None:
+        '''Slot called with the new output of the command executed by the host helper'''
+        self.handle_new_output(text)
+
+
+    def slotHostDone(self, result: Tuple[ExecStatus, int, str]) -> None:
+        '''Slot called when the command executed asynchronously by the host helper is over'''
+        self.host_finished(result)
+
+
+    def host_finished(self, result: Tuple[ExecStatus, int, str]) -> Tuple[ExecStatus, int, str]:
+        '''Called by both blocking and async execution with the host helper, when execution is over.
+
+        Calls the cb_done if any.
+        '''
+        exec_status, exit_code, cmd_out = result
+        dbg('Host helper command finished for "%s" with status %s, exit code %d' % (self.nice_cmdline(), exec_status, exit_code))
+        log_process_output(self.cmd_line, cmd_out)
+        cb_done = self.cb_done
+        self.clean()
+
+        if cb_done is not None:
+            dbg('Calling process done callback')
+            cb_done(exec_status, exit_code, cmd_out)
+
+        return exec_status, exit_code, cmd_out
+
+
     def clean(self) -> None:
-        '''Clean the fields: process, cb_done, exec_status, partial_stdout'''
+        '''Clean the fields: process, cb_done, exec_status, stdout'''
         self.process = None
+        self.host_helper = None
+        self.host_request_id = None
         self.cb_done = None
         self.exec_status = ExecStatus.Ok
-        self.partial_stdout = ''
+        self.clear_stdout()
 
 
     def process_cmd_out_finished(self) -> str:
         '''Retrieve the pending output of the process and return the complete process output'''
         assert self.process is not None
         btext = bytes(self.process.readAllStandardOutput())
-        cmd_out = self.partial_stdout + btext.decode('utf8', errors='replace').replace('\r', '\n')
-        self.partial_stdout = ''
-
-        cmd_out_dbg = cmd_out if len(cmd_out) < mg_const.MAX_GIT_DBG_OUT_CHAR else \
-            cmd_out[:mg_const.MAX_GIT_DBG_OUT_CHAR] + '\n<output truncated to {} characters>'.format(mg_const.MAX_GIT_DBG_OUT_CHAR)
-        dbg('stdout: {}'.format(cmd_out_dbg))
+        self.stdout_chunks.append(self.stdout_decoder.decode(btext, final=True).replace('\r', '\n'))
+        cmd_out = ''.join(self.stdout_chunks)
+        self.clear_stdout()
 
-        log_git_cmd(self.nice_cmdline())
-        log_git_cmd('\t' + '\n\t'.join(cmd_out_dbg.split('\n')))
+        log_process_output(self.cmd_line, cmd_out)
 
         return cmd_out
 
@@ -1109,12 +842,22 @@ class RunProcess(QObject):
         return exec_status, exit_code, cmd_out
 
 
-    def abortProcessInProgress(self) -> None:
+    def abortProcessInProgress(self, call_cb_done: bool = True) -> None:
         '''Abort the running process.
 
+        If call_cb_done is False, the process is stopped silently: the done callback is not called, so the
+        killed process is not reported as a crash.
+
         Does nothing if there is no process running
         '''
-        if self.process:
+        if self.host_helper is not None and self.host_request_id is not None:
+            if not call_cb_done:
+                self.cb_done = None
+            dbg('abortProcessInProgress() for %s, killing process of the host helper' % self.nice_cmdline())
+            self.host_helper.kill(self.host_request_id)
+        elif self.process:
+            if not call_cb_done:
+                self.cb_done = None
             dbg('abortProcessInProgress() for %s, killing process ' % self.nice_cmdline())
             self.process.kill()
         else:
@@ -1160,59 +903,123 @@ def is_git_repo(git_dir: Path) -> bool:
     return True
 
 
-def scan_git_dirs(base_path: str) -> Generator[str, str, None]:
-    '''Return the list of Git directories (.git) within the given directory tree
-    The traversal is breadth-first and it follows the symbolic links
-    '''
-    dbg(f'scan_git_dirs({base_path})')
+# number of threads listing directories in parallel when scanning for git repositories
+SCAN_NB_WORKERS = 8
 
-    visited = set()
+# directory names which are not scanned for git repositories
+DEFAULT_SCAN_IGNORE_GLOBS = ['node_modules']
 
-    path_to_visit = deque([base_path])
-    while path_to_visit:
-        dirpath = path_to_visit.popleft()
+DirIdentity = Union[Tuple[int, int], str]
 
-        resolved_path = str(Path(dirpath).resolve())
-        if resolved_path in visited:
-            # already visited, cycle created by symbolic links
-            continue
 
-        visited.add(resolved_path)
+def dir_identity(dirpath: str) -> DirIdentity:
+    '''Return a value identifying a directory, whatever the path used to reach it (symbolic links, junctions).
 
-        try:
-            dir_content = os.scandir(dirpath)
-        except PermissionError:
-            dbg(f'scan_git_dirs() - PermissionError when trying to access {dirpath}, skipping it')
-            continue
+    This is the device and inode of the directory, or its resolved path if the filesystem does not provide inodes.
+    '''
+    st = os.stat(dirpath)
+    if st.st_ino == 0:
+        return str(Path(dirpath).resolve())
+    return (st.st_dev, st.st_ino)
 
+
+def scan_one_dir_for_git(dirpath: str, ignore_globs: Sequence[str]) -> Tuple[Optional[str], List[Tuple[str, DirIdentity]]]:
+    '''List one directory, and return a tuple of:
+    - the path of the .git entry of this directory, or None if this directory is not a git repository
+    - the list of subdirectories to scan, with their identity
+
+    Symbolic links are followed.
+    '''
+    git_dir = None
+    subdirs: List[Tuple[str, DirIdentity]] = []
+    try:
+        dir_content = os.scandir(dirpath)
+    except OSError:
+        dbg(f'scan_git_dirs() - could not access {dirpath}, skipping it')
+        return None, []
+
+    with dir_content:
         for entry in dir_content:
             try:
-              if entry.name == '.git':
-                  if is_git_repo(Path(entry.path)):
-                      yield entry.path
-                  continue 
+                if entry.name == '.git':
+                    if is_git_repo(Path(entry.path)):
+                        git_dir = entry.path
+                    continue
+
+                if entry.name.startswith('.'):
+                    # directries starting with . are often not relevant, don't scan them
+                    continue
 
-              if not entry.is_dir(follow_symlinks=True):
-                  continue
+                if any(fnmatch.fnmatch(entry.name, pattern) for pattern in ignore_globs):
+                    continue
 
-              if entry.name.startswith('.'):
-                  # directries starting with . are often not relevant, don't scan them
-                  continue
+                if not entry.is_dir(follow_symlinks=True):
+                    continue
+
+                subdirs.append((entry.path, dir_identity(entry.path)))
 
             except OSError:
                 # we could not access the entry for some reason, it's ok,just continue scanning
                 continue
-           
-            path_to_visit.append(entry.path)
+
+    return git_dir, subdirs
 
 
+def scan_git_dirs(base_path: str,
+                  ignore_globs: Optional[Sequence[str]] = None,
+                  max_depth: Optional[int] = None,
+                  nested_repos: bool = True,
+                  nb_workers: int = SCAN_NB_WORKERS,
+                  should_stop: Optional[Callable[[], bool]] = None,
+                  ) -> Generator[str, str, None]:
+    '''Return the list of Git directories (.git) within the given directory tree, in no particular order.
+
+    The directories are listed by a pool of threads and symbolic links are followed.
+
+    ignore_globs: directory names matching one of these patterns are not scanned, defaults to DEFAULT_SCAN_IGNORE_GLOBS
+    max_depth: maximum depth of directories to scan below base_path, None for no limit
+    nested_repos: if False, the directories below a git repository are not scanned
+    should_stop: called after each directory listed, the scan is interrupted if it returns True
+    '''
+    dbg(f'scan_git_dirs({base_path})')
+    if ignore_globs is None:
+        ignore_globs = DEFAULT_SCAN_IGNORE_GLOBS
+
+    try:
+        visited = {dir_identity(base_path)}
+    except OSError:
+        dbg(f'scan_git_dirs() - could not access {base_path}')
+        return
+
+    executor = ThreadPoolExecutor(max_workers=nb_workers, thread_name_prefix='scan_git_dirs')
+    pending: 'Dict[Future[Tuple[Optional[str], List[Tuple[str, DirIdentity]]]], int]' = {}
+    try:
+        pending[executor.submit(scan_one_dir_for_git, base_path, ignore_globs)] = 0
+        while pending:
+            done, _not_done = wait(pending, return_when=FIRST_COMPLETED)
+            if should_stop is not None and should_stop():
+                dbg(f'scan_git_dirs({base_path}) - interrupted')
+                return
+            for future in done:
+                depth = pending.pop(future)
+                git_dir, subdirs = future.result()
+                if git_dir is not None:
+                    yield git_dir
+                    if not nested_repos:
+                        continue
+
+                if max_depth is not None and depth >= max_depth:
+                    continue
 
-def flatpak_host_file_exists(fpath: Path) -> bool:
-    '''Check whether a given file exists on the flatpak host file system, by using sh to run a test command on the host.'''
-    # assumption here: sh is on the path on the host. Very very likely
-    # If it turns out to be a wrong assumption we can always organise a search for a shell or a python
-    assert isRunningInsideFlatpak(), 'flatpak_host_file_exists() should only be called when running inside flatpak'
-    USE_SH_TO_CHECK_THAT_FILE_EXISTS = ['sh', '-c', f'[ -e "{fpath}" ]']
-    exec = MgExecutable(CmdType.DirectCmd, path=USE_SH_TO_CHECK_THAT_FILE_EXISTS[0])
-    exec_status, exit_code, output = RunProcess().exec_blocking(exec, cmd_args=USE_SH_TO_CHECK_THAT_FILE_EXISTS[1:])
-    return exec_status == ExecStatus.Ok and exit_code == 0
+                for subdir, identity in subdirs:
+                    if identity in visited:
+                        # already visited, cycle created by symbolic links or directory reachable by two paths
+                        continue
+                    visited.add(identity)
+                    pending[executor.submit(scan_one_dir_for_git, subdir, ignore_globs)] = depth + 1
+    finally:
+        # when the caller stops iterating, don't scan the remaining directories
+        # (cancel_futures argument of shutdown() requires Python 3.9)
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
@@ -15,10 +15,12 @@
 #
 
 
-from typing import cast, Match, Any, Iterable, Sequence, Union, List, Iterator, Optional
+from typing import cast, Match, Any, Iterable, Sequence, Union, List, Iterator, Optional, TYPE_CHECKING
 import html, os, pathlib, re, shutil, stat, logging, time, subprocess, sys, shlex
 
-from PySide6.QtWidgets import QTreeWidget, QTreeWidgetItem
+# keep this module importable without PySide6, for the command-line tool
+if TYPE_CHECKING:
+    from PySide6.QtWidgets import QTreeWidget, QTreeWidgetItem
 
 from src.mg_const import MSG_BIG_DIFF, GIT_AUTH_FAILURE_MARKER
 
@@ -54,23 +56,22 @@ re_line_removed = re.compile(r'^-.*')
 re_stat_line = re.compile(r'( .* \|.* \d+ )(\+*)(-*)(.*)')
 
 
-def htmlize_diff(s: str, maxLines: int = -1) -> str:
-    '''Transform a diff multi-line string into a html colorized
-    string suitable for QTextEdit rich-text mode.
+class DiffHtmlRenderer:
+    '''Transform the lines of a diff into html colorized lines suitable for QTextEdit rich-text mode.
 
-    If maxLines is not -1, this defines a maximum number of lines
-    which will be contained in the html output.
+    The lines are rendered one by one, in the order of the diff, so that a diff can be displayed
+    progressively while it is received.
     '''
-    out = [HTML_HEADER]
-    in_stat_data = True
-    lines = s.split('\n')
-    if maxLines != -1 and len(lines) > maxLines:
-        lines = lines[:maxLines]
-        lines.extend( [ '[...]', MSG_BIG_DIFF ] )
 
-    for l in lines:
+    def __init__(self) -> None:
+        # the diff starts with the output of --stat, if any
+        self.in_stat_data = True
+
+
+    def render_line(self, l: str) -> str:
+        '''Return the html for the next line of the diff, including the line break'''
         lesc = html.escape(l)
-        if in_stat_data and len(l) and l[0] == ' ':
+        if self.in_stat_data and len(l) and l[0] == ' ':
             if re_stat_line.match(l):
                 mo = cast(Match[str], re_stat_line.match(l))
                 lout = mo.group(1)
@@ -78,32 +79,42 @@ def htmlize_diff(s: str, maxLines: int = -1) -> str:
                     lout += TAG_GREEN_OPEN + mo.group(2) + TAG_GREEN_CLOSE
                 if len(mo.group(3)):
                     lout += TAG_RED_OPEN + mo.group(3) + TAG_RED_CLOSE
-                out.append(mo.group(4) + lout + TAG_NL)
-            else:
-                out.append(l + TAG_NL)
-            continue
-        else:
-            in_stat_data = False
+                return mo.group(4) + lout + TAG_NL
+            return l + TAG_NL
+
+        self.in_stat_data = False
 
         if re_highlight.match(l):
-            out.append(TAG_YELLOW_OPEN + l + TAG_YELLOW_CLOSE + TAG_NL)
-            continue
+            return TAG_YELLOW_OPEN + l + TAG_YELLOW_CLOSE + TAG_NL
 
         if re_hunk_header.match(l):
             mo = cast(Match[str], re_hunk_header.match(l))
-            out.append(TAG_BLUE_OPEN + mo.group(1) + TAG_BLUE_CLOSE + mo.group(2) + TAG_NL)
-            continue
+            return TAG_BLUE_OPEN + mo.group(1) + TAG_BLUE_CLOSE + mo.group(2) + TAG_NL
 
         if re_line_added.match(l):
-            out.append(TAG_GREEN_OPEN + lesc + TAG_GREEN_CLOSE + TAG_NL)
-            continue
+            return TAG_GREEN_OPEN + lesc + TAG_GREEN_CLOSE + TAG_NL
 
         if re_line_removed.match(l):
-            out.append(TAG_RED_OPEN + lesc + TAG_RED_CLOSE + TAG_NL)
-            continue
+            return TAG_RED_OPEN + lesc + TAG_RED_CLOSE + TAG_NL
+
+        return lesc + TAG_NL
+
+
+def htmlize_diff(s: str, maxLines: int = -1) -> str:
+    '''Transform a diff multi-line string into a html colorized
+    string suitable for QTextEdit rich-text mode.
 
-        out.append(lesc + TAG_NL)
+    If maxLines is not -1, this defines a maximum number of lines
+    which will be contained in the html output.
+    '''
+    out = [HTML_HEADER]
+    lines = s.split('\n')
+    if maxLines != -1 and len(lines) > maxLines:
+        lines = lines[:maxLines]
+        lines.extend( [ '[...]', MSG_BIG_DIFF ] )
 
+    renderer = DiffHtmlRenderer()
+    out.extend(renderer.render_line(l) for l in lines)
     out.append(HTML_FOOTER)
 
     return '\n'.join(out)
@@ -125,6 +136,57 @@ def handle_cr_in_text(s: str) -> str:
     return '\n'.join(out_lines)
 
 
+class CrTextAccumulator:
+    '''Incremental version of handle_cr_in_text(), for a text received by chunks.
+
+    The completed lines are in self.lines and the line in progress, with its CR already handled, in
+    self.current_line. Each chunk is processed only once, so the cost is linear in the size of the text.
+    '''
+
+    def __init__(self) -> None:
+        self.lines: List[str] = []
+        self.current_line = ''
+        # a CR was received on the current line: the next text received replaces it
+        self.pending_cr = False
+
+
+    def feed(self, text: str) -> int:
+        '''Add some text and return the index of the first line modified by this text'''
+        first_modified_line = len(self.lines)
+        text_lines = text.split('\n')
+        for idx, text_line in enumerate(text_lines):
+            if idx > 0:
+                # a new line was started, the current one is complete
+                self.lines.append(self.current_line)
+                self.current_line = ''
+                self.pending_cr = False
+
+            for cr_idx, part in enumerate(text_line.split('\r')):
+                if cr_idx > 0:
+                    self.pending_cr = True
+                if not part:
+                    continue
+                if self.pending_cr:
+                    self.current_line = part
+                    self.pending_cr = False
+                else:
+                    self.current_line += part
+
+        return first_modified_line
+
+
+    def nb_lines(self) -> int:
+        '''Return the number of lines, the line in progress being counted only when not empty'''
+        return len(self.lines) + (1 if self.current_line else 0)
+
+
+    def line(self, idx: int) -> str:
+        '''Return the line at index idx, the line in progress being at index len(self.lines)'''
+        if idx == len(self.lines):
+            return self.current_line
+        return self.lines[idx]
+
+
 def anonymise_git_url(url: str) -> str:
     '''Remove current username from url:
     - for https, simply remove the username
@@ -234,6 +296,10 @@ def tryHardDeletingDirList(dirIter: Iterable[str]) -> str:
         # kill tgitcache before anything. If it was running, it would prevent deletion of directories
         subprocess.call(['taskkill', '/t', '/f', '/im', 'tgitcache.exe'])
 
+    # same for the git cat-file processes kept open by MultiGit
+    from src.mg_git_cat_file import get_cat_file_pool
+    get_cat_file_pool().close_workers_under(dirList)
+
     # delete subdirs before deleting main dir
     dirList.sort(reverse=True)
 
@@ -380,21 +446,22 @@ def isGitCommandRequiringAuth(cmdline: Sequence[str]) -> bool:
 
 
 
-def treeWidgetFlatIterator(item_or_tree: Union[QTreeWidget, QTreeWidgetItem]) -> List[QTreeWidgetItem]:
+def treeWidgetFlatIterator(item_or_tree: 'Union[QTreeWidget, QTreeWidgetItem]') -> 'List[QTreeWidgetItem]':
     '''Iterates through either the QTreeWidget top-level items or through the items of the Item.
 
     This allows to use the same recursive function on a tree or an item.
     '''
+    from PySide6.QtWidgets import QTreeWidget, QTreeWidgetItem
     if isinstance(item_or_tree, QTreeWidget):
         return [cast(QTreeWidgetItem, item_or_tree.topLevelItem(idx)) for idx in range(item_or_tree.topLevelItemCount())]
 
     return [item_or_tree.child(idx) for idx in range(item_or_tree.childCount())]
 
 
-def treeWidgetDeepIterator(treeWidget: QTreeWidget) -> Iterator[QTreeWidgetItem]:
+def treeWidgetDeepIterator(treeWidget: 'QTreeWidget') -> 'Iterator[QTreeWidgetItem]':
     '''Returns all QTreeWidgetItems in a depth-first-search.
     '''
-    def yieldChild(item: QTreeWidgetItem) -> Iterator[QTreeWidgetItem]:
+    def yieldChild(item: 'QTreeWidgetItem') -> 'Iterator[QTreeWidgetItem]':
         for itemChildIdx in range(item.childCount()):
             itemChild = item.child(itemChildIdx)
             yield itemChild
@@ -409,7 +476,7 @@ def treeWidgetDeepIterator(treeWidget: QTreeWidget) -> Iterator[QTreeWidgetItem]
 
 
 INDENT_TEXT = ' ' * 4
-def collectColumnText(depth: int, item: QTreeWidgetItem, emptyColumnLookForNextCol: bool = False) -> List[str]:
+def collectColumnText(depth: int, item: 'QTreeWidgetItem', emptyColumnLookForNextCol: bool = False) -> List[str]:
     '''Collect text of item and all child, with an indentation. Should be called with an initial depth of 0'''
     idx = 0
     coltext = item.text(idx).strip()
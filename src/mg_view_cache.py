@@ -0,0 +1,151 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from typing import Any, Hashable, List, Optional, Tuple
+import os, logging
+from collections import OrderedDict
+from functools import lru_cache
+
+from src.mg_repo_info import MgRepoInfo
+from src.mg_git_refs import git_admin_dirs
+from src.mg_repo_cache import refs_dirs_fingerprint
+from src.mg_utils import DiffHtmlRenderer
+
+logger = logging.getLogger('mg_view_cache')
+dbg = logger.debug
+
+# maximum number of diff and last commit views kept in memory
+VIEW_CACHE_MAX_ENTRIES = 100
+
+# kinds of views cached
+VIEW_LAST_COMMIT = 'last_commit'
+VIEW_DIFF = 'diff'
+
+
+@lru_cache(maxsize=1)
+def get_view_cache_instance() -> 'MgViewCache':
+    '''Return the cache of diff and last commit views, shared by all tabs'''
+    return MgViewCache()
+
+
+def file_fingerprint(fpath: str) -> Tuple[int, int, int]:
+    '''Return the size, modification time and inode of a file, or zeros if the file does not exist'''
+    try:
+        st = os.stat(fpath)
+    except OSError:
+        return (0, 0, 0)
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def repo_view_key(repo: MgRepoInfo, kind: str) -> Optional[Hashable]:
+    '''Return the key identifying the view of a repository in the cache: the repository, its HEAD and
+    the fingerprint of its index. The diff also depends on the files modified in the working tree, the last
+    commit on the refs, because it is decorated with the branches and tags pointing at it.
+
+    Return None when the view can not be cached, because the state of the repository is not known yet.
+    '''
+    if not repo.commit_sha1:
+        return None
+
+    admin_dirs = git_admin_dirs(repo.fullpath)
+    if not admin_dirs:
+        return None
+
+    key: Tuple[Any, ...] = (kind, repo.fullpath, repo.commit_sha1, repo.head,
+                            file_fingerprint(str(admin_dirs[0] / 'index')))
+    if kind == VIEW_DIFF:
+        if repo.modified_files is None:
+            return None
+        key += tuple((fname, file_fingerprint(os.path.join(repo.fullpath, fname))) for fname in repo.modified_files)
+    elif kind == VIEW_LAST_COMMIT:
+        refs_dir = admin_dirs[-1]
+        key += (file_fingerprint(str(refs_dir / 'packed-refs')), tuple(refs_dirs_fingerprint(refs_dir)))
+    return key
+
+
+class MgDiffView:
+    '''Diff of a repository rendered as html, as displayed in the modified files tab.
+
+    The diff is rendered progressively with add_lines(), possibly receiving the same lines several
+    times when more lines of the diff are loaded.
+    '''
+
+    def __init__(self) -> None:
+        self.renderer = DiffHtmlRenderer()
+        self.html_lines: List[str] = []
+        self.truncated = False
+
+
+    @property
+    def nb_lines(self) -> int:
+        return len(self.html_lines)
+
+
+    def add_lines(self, first_line_idx: int, lines: List[str]) -> str:
+        '''Render the lines of the diff starting at first_line_idx which are not rendered yet.
+
+        Return the html of the new lines, an empty string if there are no new lines.'''
+        nb_lines_rendered = self.nb_lines - first_line_idx
+        if nb_lines_rendered < 0 or nb_lines_rendered >= len(lines):
+            return ''
+
+        new_html_lines = [self.renderer.render_line(l) for l in lines[nb_lines_rendered:]]
+        self.html_lines.extend(new_html_lines)
+        return ''.join(new_html_lines)
+
+
+    def html(self) -> str:
+        '''Return the html of all the lines rendered'''
+        return ''.join(self.html_lines)
+
+
+class MgViewCache:
+    '''Least recently used cache of the views of repositories: rendered diff (MgDiffView) and last commit.
+
+    The keys are provided by repo_view_key(), so that a view is no longer used as soon as the repository
+    changes, even if the repository information was refreshed in the meantime.
+    '''
+
+    def __init__(self, max_entries: int = VIEW_CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self.entries: 'OrderedDict[Hashable, Any]' = OrderedDict()
+
+
+    def get(self, key: Optional[Hashable]) -> Any:
+        '''Return the view stored for this key, or None'''
+        if key is None or key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+
+    def put(self, key: Optional[Hashable], view: Any) -> None:
+        '''Store a view, evicting the least recently used ones if the cache is full'''
+        if key is None:
+            return
+        self.entries[key] = view
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+    def __contains__(self, key: Optional[Hashable]) -> bool:
+        return key is not None and key in self.entries
+
+
+    def clear(self) -> None:
+        self.entries.clear()
@@ -15,10 +15,11 @@
 #
 
 
-from typing import cast, List, Optional, Callable, Any, Union, Literal
+from typing import cast, List, Optional, Callable, Any, Union, Literal, Set, Dict
 import logging, pathlib
 
-from PySide6.QtWidgets import QMainWindow, QFileDialog, QMessageBox, QApplication, QLineEdit, QTabBar, QMenu, QDialog
+from PySide6.QtWidgets import QMainWindow, QFileDialog, QMessageBox, QApplication, QLineEdit, QTabBar, QMenu, QDialog, \
+    QPushButton
 from PySide6.QtCore import QTimer, Qt, QPoint
 from PySide6.QtGui import QCloseEvent, QAction
 
@@ -26,18 +27,15 @@ from src.gui.ui_main_window import Ui_MainWindow
 from src.gui.ui_dialog_quit import Ui_quitConfirmDialog
 from src.mg_actions import MgActions
 from src.mg_dialog_whatisnew import showWhatIsNew, showLaunchDialog, showGettingStarted
-from src.mg_dialog_export_mgit import runDialogExportMgit
-from src.mg_dialog_export_csv import runDialogExportCsv
-from src.mg_dialog_clone_from_mgit import runDialogCloneFromMgitFile
-from src.mg_dialog_apply_mgit_file import runDialogApplyMgitFile
-from src.mg_dialog_about import showDialogAbout
 from src.mg_plugin_mgr import pluginMgrInstance
 from src.mg_multigit_widget import MgMultigitWidget
 from src.mg_repo_tree import MgRepoTree
 from src.mg_tools import ExecExplorer, ExecGit, ExecTool
-from src.mg_dialog_settings import runDialogEditSettings
 from src.mg_exec_window import MgExecWindow
 from src import mg_config as mgc
+from src.mg_repo_cache import get_repo_cache_instance
+from src.mg_repo_refresh_queue import get_refresh_queue
+from src.mg_adaptive_concurrency import cpu_load
 from src.mg_const import VERSION, DISPLAY_FETCH_ON_STARTUP_COUNTDOWN_INIT
 from src.mg_tabwidget import MgTabBar
 
@@ -46,6 +44,12 @@ logger = logging.getLogger('mg_main_window')
 dbg = logger.debug
 info = logger.info
 
+# delay in ms between two checks of whether the machine is idle, to load the tabs not activated yet
+WARM_TABS_DELAY = 10000
+
+# number of runnable processes per cpu below which the machine is considered idle
+CPU_LOAD_IDLE = 0.3
+
 
 class MgMainWindow(QMainWindow, Ui_MainWindow):
 
@@ -64,6 +68,18 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
         else:
             self.setGeometry(self.x(), self.y(), 1000, 700)  # default reasonable window size when no configuration
 
+        # allow to stop the scanning of the base directory of the current tab
+        self.buttonStopRepoScan = QPushButton('Stop scanning', self)
+        self.buttonStopRepoScan.setVisible(False)
+        self.buttonStopRepoScan.clicked.connect(lambda: self.currentMultigit().cancelRepoScan())
+        self.statusbar.addPermanentWidget(self.buttonStopRepoScan)
+
+        # the tabs not activated yet are loaded in the background when the machine is idle, if configured
+        self.warmTabsTimer = QTimer(self)
+        self.warmTabsTimer.setSingleShot(True)
+        self.warmTabsTimer.setInterval(WARM_TABS_DELAY)
+        self.warmTabsTimer.timeout.connect(self.slotWarmNextTab)
+
         self.mgActions = MgActions(self)
         self.setupMenus()
         self.setupConnections()
@@ -190,6 +206,9 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
         self.mgActions.actionRenameTab.triggered.connect( self.slotRenameTab )
         self.mgActions.actionCloseTab.triggered.connect( self.slotCloseTab )
 
+        # the repository cache is saved each time the refresh of repositories completes, so that it survives a crash
+        get_refresh_queue().sigIdle.connect(lambda: get_repo_cache_instance().save())
+
 
         ### menu Git
         self.mgActions.actionGitFetchAll.triggered.connect(self.dispatchToActiveMultigitTab('slotGitFetchAll'))
@@ -263,16 +282,21 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
         # that there are sometimes buffer overflow in this buffer, creating bugs in the config file.
         self.config[mgc.CONFIG_SPLITTER_STATE_V2] = [int(v) for v in bytes(self.currentMultigit().splitter.saveState())]
 
-        all_open_tabs = [(self.tabRepos.tabText(tabIdx), cast(MgMultigitWidget, self.tabRepos.widget(tabIdx)).multiRepo.base_dir)
+        all_open_tabs = [(self.tabName(tabIdx), self.multigitWidgetFromIdx(tabIdx).baseDir())
                          for tabIdx in range(self.tabRepos.count())
                          ]
         self.config[mgc.CONFIG_TABS_OPENED] = all_open_tabs
         self.config[mgc.CONFIG_TABS_CURRENT] = self.tabRepos.currentIndex()
+        self.saveTabsRepoNames()
 
         all_mg_widgets = [ (self.tabRepos.tabText(tabIdx), cast(MgMultigitWidget, self.tabRepos.widget(tabIdx)))
                              for tabIdx in range(self.tabRepos.count())
                          ]
+        for _tabName, mgWidget in all_mg_widgets:
+            mgWidget.cancelRepoScan(waitForThread=True)
+
         self.config.save()
+        get_repo_cache_instance().save()
         return super().closeEvent(event)
 
 
@@ -305,10 +329,31 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
                 #       in this case, we use the last opened directory (previous behavior with no tabs)
                 tabsToOpen = [(None, self.config.lruGetFirst(mgc.CONFIG_LAST_OPENED))]
 
-        for tabName, base_dir in reversed(tabsToOpen):
-            idx = self.addTab(base_dir, pos=0)
-            if tabName:
-                self.tabRepos.setTabText(idx, tabName)
+        # only the current tab is loaded, the other ones are scanned and refreshed when activated for the first time
+        tabsRepoNames = self.config.get(mgc.CONFIG_TABS_REPO_NAMES) or {}
+        for tabName, base_dir in tabsToOpen:
+            idx = self.createTab()
+            if base_dir is None:
+                continue
+            self.multigitWidgetFromIdx(idx).setDeferredBaseDir(base_dir)
+            tabName = tabName or pathlib.Path(base_dir).name
+            self.tabRepos.tabBar().setTabData(idx, tabName)
+            self.tabRepos.setTabToolTip(idx, base_dir)
+            if base_dir in tabsRepoNames:
+                tabName += f' ({len(tabsRepoNames[base_dir])})'
+            self.tabRepos.setTabText(idx, tabName)
+
+        currentIdx = 0
+        if len(self.argv) <= 1:
+            currentIdx = self.config.get(mgc.CONFIG_TABS_CURRENT) or 0
+            if not (isinstance(currentIdx, int) and 0 <= currentIdx < self.tabRepos.count()):
+                currentIdx = 0
+        self.tabRepos.setCurrentIndex(currentIdx)
+        # the tab is not loaded by slotCurrentTabChanged() if it was already the current one
+        self.loadDeferredTab(currentIdx)
+
+        if self.config.get(mgc.CONFIG_WARM_TABS_WHEN_IDLE, False):
+            self.warmTabsTimer.start()
 
         fetchReposOnStartup = self.config[mgc.CONFIG_FETCH_ON_STARTUP]
         if fetchReposOnStartup is None or self.config[mgc.CONFIG_DISPLAY_FETCH_ON_STARTUP_COUNTDOWN] is None:
@@ -350,6 +395,8 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
 
     def slotCloneFromMgitFile(self) -> None:
         dbg('slotCloneFromMgitFile()')
+        # dialogs are imported on first use, to speed-up startup
+        from src.mg_dialog_clone_from_mgit import runDialogCloneFromMgitFile
         return runDialogCloneFromMgitFile(self)
 
 
@@ -389,33 +436,47 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
         gitExecWindow = MgExecWindow(self)
         gitExecWindow.setWindowTitle('Fetching all repositories on startup')
 
+        # repositories displayed in several tabs are fetched only once
+        fetchedRepoPaths: Set[str] = set()
         for tabIdx in range(self.tabRepos.count()):
-            multiRepo = self.multigitWidgetFromIdx(tabIdx).multiRepo
+            mgw = self.multigitWidgetFromIdx(tabIdx)
+            if mgw.isDeferred():
+                # the repositories of the tab must be known to fetch them
+                self.loadDeferredTab(tabIdx)
+                mgw.refreshAllAndWait()
+            multiRepo = mgw.multiRepo
+            repos = [repo for repo in multiRepo.repo_list if repo.fullpath not in fetchedRepoPaths]
+            if not repos:
+                continue
+            fetchedRepoPaths.update(repo.fullpath for repo in repos)
             cmd = ['fetch', '--prune']
-            gitExecWindow.execOneGitCommand(f'Fetching all repositories for {multiRepo.base_dir}', cmd, multiRepo.repo_list)
+            gitExecWindow.execOneGitCommand(f'Fetching all repositories for {multiRepo.base_dir}', cmd, repos)
 
 
     def slotExportCsv(self) -> None:
         '''Export to a CSV file'''
         dbg('slotExportCsv()')
         # force refresh to calculate git dirs added or removed in the meantime
-        self.currentMultigit().slotRefreshAll()
+        self.currentMultigit().refreshAllAndWait()
+        from src.mg_dialog_export_csv import runDialogExportCsv
         runDialogExportCsv(self, self.currentMultigit().multiRepo)
 
 
     def slotExportToMgit(self) -> None:
         dbg('slotExportToMgit()')
         # force refresh to calculate git dirs added or removed in the meantime
-        self.currentMultigit().slotRefreshAll()
+        self.currentMultigit().refreshAllAndWait()
+        from src.mg_dialog_export_mgit import runDialogExportMgit
         runDialogExportMgit(self, self.currentMultigit().multiRepo.repo_list)
 
 
     def slotApplyMgitFile(self) -> None:
         dbg('slotApplyMgitFile()')
         # force refresh to calculate git dirs added or removed in the meantime
-        self.currentMultigit().slotRefreshAll()
+        self.currentMultigit().refreshAllAndWait()
         baseDir = self.currentMultigit().multiRepo.base_dir
         allRepos = self.currentMultigit().multiRepo.repo_list[:]
+        from src.mg_dialog_apply_mgit_file import runDialogApplyMgitFile
         runDialogApplyMgitFile(self, baseDir, allRepos)
 
 
@@ -430,6 +491,7 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
 
 
     def editSettings(self, startingPage: Union[Literal[0], Literal[1]]) -> None:
+        from src.mg_dialog_settings import runDialogEditSettings
         runDialogEditSettings(self, tabPage=startingPage)
         self.mgActions.enableAvailableScm()
         for repoTree in self.allTreeOfMultigitTab():
@@ -438,6 +500,7 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
 
     def slotAbout(self) -> None:
         '''Show about dialog'''
+        from src.mg_dialog_about import showDialogAbout
         showDialogAbout(self)
 
 
@@ -537,15 +600,22 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
     def slotAddTab(self, pos: int = -1) -> int:
         '''Create a new empty tab, and return the tab index. If pos is not specified or is -1, add the tab
         at the end of the tab list. Else, add it add the expected position.'''
+        tabIdx = self.createTab(pos)
+        self.tabRepos.setCurrentIndex(tabIdx)
+        return tabIdx
+
+
+    def createTab(self, pos: int = -1) -> int:
+        '''Create a new empty tab without activating it, and return the tab index. See slotAddTab() for pos.'''
         multigitWidget = MgMultigitWidget()
         if pos == -1:
             pos = self.tabRepos.count()
         tabIdx = self.tabRepos.insertTab(pos, multigitWidget, 'MultiGit')
-        self.tabRepos.setCurrentIndex(tabIdx)
         multigitWidget.sig_dir_changed.connect(self.slotTabBaseDirChanged)
         multigitWidget.sig_dir_changed.connect(self.updateRecentDirMenu)
         multigitWidget.sig_request_dir_open.connect( self.slotOpenDir )
         multigitWidget.repoTree.itemSelectionChanged.connect( self.updateStatusBar )
+        multigitWidget.sig_repo_scan_progress.connect( self.updateStatusBar )
         multigitWidget.repoTree.show_column_menu.connect(self.menuColumns.popup)
         self.slotViewTabChanged()
         return tabIdx
@@ -595,6 +665,7 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
             return
         idx = self.tabRepos.currentIndex()
         # to help destroy pending signals, connections, callbacks
+        self.currentMultigit().cancelRepoScan(waitForThread=True)
         self.currentMultigit().repoTree.clear()
         self.tabRepos.removeTab(idx)
 
@@ -612,6 +683,9 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
 
     def slotCurrentTabChanged(self, tabIdx: int) -> None:
         '''Called when active tab changes'''
+        if tabIdx < 0:
+            return
+        self.loadDeferredTab(tabIdx)
         baseDir = self.currentMultigit().multiRepo.base_dir
         self.updateWindowTitleFromBaseDir(baseDir)
 
@@ -619,10 +693,74 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
     def slotTabBaseDirChanged(self, baseDir: str) -> None:
         '''Called when opening a new base directory in a tab'''
         dirName = pathlib.Path(baseDir).name
-        tabidx = self.tabRepos.currentIndex()
+        # the directory may be opened in a tab loaded in the background
+        tabidx = self.tabRepos.indexOf(cast(MgMultigitWidget, self.sender()))
+        if tabidx == -1:
+            tabidx = self.tabRepos.currentIndex()
         self.tabRepos.setTabToolTip(tabidx, baseDir)
         self.tabRepos.setTabText(tabidx, dirName)
-        self.updateWindowTitleFromBaseDir(baseDir)
+        if tabidx == self.tabRepos.currentIndex():
+            self.updateWindowTitleFromBaseDir(baseDir)
+
+
+    def tabName(self, tabIdx: int) -> str:
+        '''Return the name of the tab, without the number of repositories displayed on the tabs not loaded yet'''
+        tabName = self.tabRepos.tabBar().tabData(tabIdx)
+        if self.multigitWidgetFromIdx(tabIdx).isDeferred() and isinstance(tabName, str):
+            return tabName
+        return self.tabRepos.tabText(tabIdx)
+
+
+    def loadDeferredTab(self, tabIdx: int) -> None:
+        '''Open the base directory of a tab which was not loaded on startup: scan it and refresh its repositories'''
+        mgw = self.multigitWidgetFromIdx(tabIdx)
+        if mgw is None or not mgw.isDeferred():
+            return
+        dbg(f'loadDeferredTab({tabIdx}) - {mgw.baseDir()}')
+        tabName = self.tabName(tabIdx)
+        mgw.loadDeferredBaseDir()
+        self.tabRepos.setTabText(tabIdx, tabName)
+
+
+    def saveTabsRepoNames(self) -> None:
+        '''Store the names of the repositories of each tab, to display their number in the tabs which are
+        not loaded on the next startup'''
+        previousRepoNames = self.config.get(mgc.CONFIG_TABS_REPO_NAMES) or {}
+        tabsRepoNames: Dict[str, List[str]] = {}
+        for tabIdx in range(self.tabRepos.count()):
+            mgw = self.multigitWidgetFromIdx(tabIdx)
+            baseDir = mgw.baseDir()
+            if not baseDir:
+                continue
+            if mgw.isDeferred() or mgw.isScanningRepos():
+                # the list of repositories is unknown or incomplete, keep the previous one
+                if baseDir in previousRepoNames:
+                    tabsRepoNames.setdefault(baseDir, previousRepoNames[baseDir])
+                continue
+            tabsRepoNames[baseDir] = [repo.name for repo in mgw.multiRepo.repo_list]
+        self.config[mgc.CONFIG_TABS_REPO_NAMES] = tabsRepoNames
+
+
+    def isMachineIdle(self) -> bool:
+        '''Return True when no repository is being scanned or refreshed and the machine is not busy'''
+        if not get_refresh_queue().isIdle():
+            return False
+        if any(self.multigitWidgetFromIdx(tabIdx).isScanningRepos() for tabIdx in range(self.tabRepos.count())):
+            return False
+        load = cpu_load()
+        # when the load is not available, we can not tell that the machine is idle
+        return load is not None and load < CPU_LOAD_IDLE
+
+
+    def slotWarmNextTab(self) -> None:
+        '''Load the next tab not activated yet when the machine is idle, then check again later for the other ones'''
+        deferredTabs = [tabIdx for tabIdx in range(self.tabRepos.count())
+                        if self.multigitWidgetFromIdx(tabIdx).isDeferred()]
+        if not deferredTabs:
+            return
+        if self.isMachineIdle():
+            self.loadDeferredTab(deferredTabs[0])
+        self.warmTabsTimer.start()
 
 
     def updateWindowTitleFromBaseDir(self, baseDir: str) -> None:
@@ -637,11 +775,17 @@ class MgMainWindow(QMainWindow, Ui_MainWindow):
     def updateStatusBar(self) -> None:
         if self.currentMultigit() is None:
             self.statusbar.clearMessage()
+            self.buttonStopRepoScan.setVisible(False)
             return
 
         nbRepo = len(self.currentMultigit().multiRepo)
-        nbRepoSelected = len(self.currentMultigit().repoTree.selectedRepoItems())
-        msg = f'{nbRepo} repositories, {nbRepoSelected} selected'
+        isScanning = self.currentMultigit().isScanningRepos()
+        self.buttonStopRepoScan.setVisible(isScanning)
+        if isScanning:
+            msg = f'Scanning... {nbRepo} repositories found'
+        else:
+            nbRepoSelected = len(self.currentMultigit().repoTree.selectedRepoItems())
+            msg = f'{nbRepo} repositories, {nbRepoSelected} selected'
         self.statusbar.showMessage(msg, 0)
 
 
@@ -0,0 +1,100 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+from typing import Optional, List
+
+import unittest
+
+from src.mg_adaptive_concurrency import MgAdaptiveConcurrency
+
+
+class FakeClock:
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.clock = FakeClock()
+        self.load: Optional[float] = None
+        self.ac = MgAdaptiveConcurrency(initial_limit=4, min_limit=1, max_limit=8,
+                                        get_cpu_load=lambda: self.load, clock=self.clock)
+
+
+    def runWindow(self, duration: float, latency: float = 1.0) -> None:
+        '''Complete a full window of jobs in the given duration'''
+        for _ in range(self.ac.limit):
+            self.clock.now += duration / self.ac.limit
+            self.ac.job_done(latency)
+
+
+    def test_ramp_up_while_throughput_improves(self) -> None:
+        limits: List[int] = []
+        # first window: no reference, the limit is probed upwards
+        self.runWindow(4.0)
+        limits.append(self.ac.limit)
+        # 5 jobs in 2.5s: throughput doubled
+        self.runWindow(2.5)
+        limits.append(self.ac.limit)
+        # 6 jobs in 3s: same throughput, limit is kept
+        self.runWindow(3.0)
+        limits.append(self.ac.limit)
+        self.assertEqual(limits, [5, 6, 6])
+
+        # throughput degrades: back off by one
+        self.runWindow(12.0)
+        self.assertEqual(self.ac.limit, 5)
+
+
+    def test_max_limit(self) -> None:
+        for i in range(10):
+            self.runWindow(8.0 / (i+1))
+        self.assertEqual(self.ac.limit, 8)
+
+
+    def test_backoff_on_crash_and_auth_failure(self) -> None:
+        self.ac.job_done(1.0, crashed=True)
+        self.assertEqual(self.ac.limit, 2)
+        self.ac.job_done(1.0, auth_failed=True)
+        self.assertEqual(self.ac.limit, 1)
+        self.ac.job_done(1.0, crashed=True)
+        self.assertEqual(self.ac.limit, 1)
+
+
+    def test_latency_inflation(self) -> None:
+        self.runWindow(4.0, latency=1.0)
+        self.assertEqual(self.ac.limit, 5)
+        # same throughput but jobs take 3 times longer
+        self.runWindow(5.0, latency=3.0)
+        self.assertEqual(self.ac.limit, 4)
+
+
+    def test_cpu_load(self) -> None:
+        self.load = 1.2
+        # throughput improves but cpu is busy
+        self.runWindow(4.0)
+        self.assertEqual(self.ac.limit, 4)
+
+        self.load = 2.0
+        self.runWindow(1.0)
+        self.assertEqual(self.ac.limit, 3)
+
@@ -20,7 +20,7 @@ from typing import List, Tuple
 import unittest
 
 from src.mg_clone_execution import addPreconditionToEnsureCloneOrderLogic, \
-    build_taskgroup_dep_graph, addPreconditionsToTaskGroup
+    build_taskgroup_dep_graph, addPreconditionsToTaskGroup, computeCloneParents
 from src.mg_exec_task_item import MgExecTaskGroup
 from src.mg_repo_info import MgRepoInfo
 
@@ -179,3 +179,20 @@ class TestCloneGraphOrdering(unittest.TestCase):
         # - 'doc/whats/up'
 
 
+    def test_computeCloneParents(self):
+        repoNames, _ = self.buildTaskGroups()
+        parents = computeCloneParents(repoNames)
+
+        self.assertEqual(parents, {
+            'dev': None,
+            'dev/subdev1': 'dev',
+            'dev/subdev1/subdev1_sub1': 'dev/subdev1',
+            'dev/subdev1/subdev1_sub2': 'dev/subdev1',
+            'dev/subdev2': 'dev',
+            'dev/subdev2/toto/subdev2_sub1': 'dev/subdev2',
+            'test': None,
+            'test/extern/subtest1': 'test',
+            'doc/whats/up': None,
+        })
+
+        self.assertEqual(computeCloneParents(['tata\\tutu', 'tata']), {'tata': None, 'tata\\tutu': 'tata'})
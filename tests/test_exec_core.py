@@ -0,0 +1,65 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest, subprocess, sys, os
+from pathlib import Path
+
+from src.mg_exec_core import (build_cmd_line, run_process_blocking, process_failure_msg, MgExecutable, CmdType,
+                              ExecStatus, EXIT_CODE_COULD_NOT_START_PROCESS)
+
+ROOT_DIR = Path(__file__).parent.parent
+
+
+class TestExecCore(unittest.TestCase):
+
+    def test_mgitcmd_does_not_import_pyside(self) -> None:
+        # run in a separate interpreter, PySide6 is already loaded by the other tests
+        out = subprocess.check_output([sys.executable, '-c',
+                                       'import sys, mgitcmd; print([m for m in sys.modules if m.startswith("PySide6")])'],
+                                      cwd=ROOT_DIR, text=True)
+        self.assertEqual(out.strip(), '[]')
+
+
+    def test_build_cmd_line(self) -> None:
+        if 'FLATPAK_ID' in os.environ:
+            self.skipTest('command-line is prefixed with flatpak-spawn')
+
+        self.assertEqual(build_cmd_line(MgExecutable(CmdType.DirectCmd, path='git'), ['status']), ['git', 'status'])
+        self.assertEqual(build_cmd_line(MgExecutable(CmdType.FlatpakProgram, name='com.sublimemerge.App'), ['.']),
+                         ['flatpak', 'run', 'com.sublimemerge.App', '.'])
+        self.assertEqual(build_cmd_line(MgExecutable(CmdType.SnapProgram, name='sublime-merge'), []),
+                         ['/snap/bin/sublime-merge'])
+
+
+    def test_run_process_blocking(self) -> None:
+        python = MgExecutable(CmdType.DirectCmd, path=sys.executable)
+        self.assertEqual(run_process_blocking(python, ['-c', 'import sys; print("a\\rb"); sys.exit(3)']),
+                         (ExecStatus.Ok, 3, 'a\nb\n'))
+
+        exec_status, exit_code, output = run_process_blocking(MgExecutable(CmdType.DirectCmd, path='/does/not/exist'), [])
+        self.assertEqual((exec_status, exit_code), (ExecStatus.FailedToStart, EXIT_CODE_COULD_NOT_START_PROCESS))
+
+
+    def test_process_failure_msg(self) -> None:
+        self.assertIsNone(process_failure_msg('Git', ExecStatus.Ok, 0, '', allow_errors=False))
+        self.assertIsNone(process_failure_msg('Git', ExecStatus.Ok, 1, '', allow_errors=True))
+        self.assertEqual(process_failure_msg('Git', ExecStatus.Ok, 1, 'oops', allow_errors=False),
+                         (False, 'Execution error for Git', 'Error: Git returned with exit code 1.\n\nOutput:\noops'))
+        failure = process_failure_msg('Git', ExecStatus.Crashed, 0, '', allow_errors=True)
+        assert failure is not None
+        self.assertTrue(failure[0])
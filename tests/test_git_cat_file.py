@@ -0,0 +1,153 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest, tempfile, shutil, subprocess, os, time
+from pathlib import Path
+
+from src.mg_exec_core import MgExecutable, CmdType
+from src.mg_git_cat_file import MgCatFilePool, read_last_commit, read_head_tags, format_git_date, format_decorations
+
+GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME='Jérôme Doe', GIT_AUTHOR_EMAIL='jd@example.com',
+               GIT_COMMITTER_NAME='philou', GIT_COMMITTER_EMAIL='phil_tests@github',
+               GIT_AUTHOR_DATE='2024-03-05T08:09:10+0530', GIT_CONFIG_NOSYSTEM='1', HOME='')
+
+
+def git(repo: Path, *args: str, stdin: str = '') -> str:
+    return subprocess.run(['git', '-C', str(repo), *args], input=stdin, env=GIT_ENV, check=True,
+                          capture_output=True, text=True).stdout
+
+
+class TestGitCatFile(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix='test_git_cat_file_'))
+        self.repo = self.tmp_dir / 'repo'
+        git(self.tmp_dir, 'init', '-q', '-b', 'main', 'repo')
+        git(self.repo, 'commit', '-q', '--allow-empty', '-m', 'first commit')
+        self.pool = MgCatFilePool(lambda: MgExecutable(CmdType.DirectCmd, 'git'))
+
+
+    def tearDown(self) -> None:
+        self.pool.close_all()
+        shutil.rmtree(self.tmp_dir)
+
+
+    def assertSameAsGitLog(self) -> None:
+        self.assertEqual(read_last_commit(str(self.repo), self.pool), git(self.repo, 'log', '-1', '--decorate=short'))
+
+
+    def test_read_objects(self) -> None:
+        head_sha1 = git(self.repo, 'rev-parse', 'HEAD').strip()
+        objects = self.pool.read_objects(str(self.repo), ['HEAD', 'does-not-exist', head_sha1 + '^{tree}'])
+        assert objects is not None
+        assert objects[0] is not None and objects[2] is not None
+        self.assertEqual(objects[0][:2], (head_sha1, 'commit'))
+        self.assertIn(b'\n\nfirst commit\n', objects[0][2])
+        self.assertIsNone(objects[1])
+        self.assertEqual(objects[2][1:], ('tree', b''))
+
+        # many requests at once do not block on the pipes
+        objects = self.pool.read_objects(str(self.repo), ['HEAD'] * 1000)
+        assert objects is not None
+        self.assertEqual(len(objects), 1000)
+        self.assertEqual(len(self.pool), 1)
+
+
+    def test_pool_limits(self) -> None:
+        pool = MgCatFilePool(lambda: MgExecutable(CmdType.DirectCmd, 'git'), max_workers=2, idle_timeout=0.2)
+        try:
+            other_repos = [self.tmp_dir / 'other1', self.tmp_dir / 'other2']
+            for other_repo in other_repos:
+                git(self.tmp_dir, 'init', '-q', other_repo.name)
+
+            for repo in [self.repo] + other_repos:
+                self.assertIsNotNone(pool.read_objects(str(repo), ['HEAD']))
+            # the least recently used worker was closed
+            self.assertEqual(list(pool.workers), [str(repo) for repo in other_repos])
+
+            pool.close_workers_under([str(other_repos[0])])
+            self.assertEqual(list(pool.workers), [str(other_repos[1])])
+
+            # idle workers are closed
+            time.sleep(0.5)
+            self.assertEqual(len(pool), 0)
+        finally:
+            pool.close_all()
+
+
+    def test_read_last_commit(self) -> None:
+        self.assertSameAsGitLog()
+
+        git(self.repo, 'commit', '-q', '--allow-empty', '-F', '-',
+            stdin='\n  \nsubject  \n\n\tindented\twith tabs\n\n\nlast line\n\n')
+        git(self.repo, 'tag', 'v1.0')
+        git(self.repo, 'tag', '-a', 'v1.1', '-m', 'annotated')
+        git(self.repo, 'branch', 'other')
+        git(self.repo, 'update-ref', 'refs/remotes/origin/main', 'HEAD')
+        git(self.repo, 'symbolic-ref', 'refs/remotes/origin/HEAD', 'refs/remotes/origin/main')
+        self.assertSameAsGitLog()
+        self.assertEqual(read_head_tags(str(self.repo), self.pool), ['v1.0', 'v1.1'])
+
+        # packed references
+        git(self.repo, 'pack-refs', '--all')
+        self.assertSameAsGitLog()
+        self.assertEqual(read_head_tags(str(self.repo), self.pool), ['v1.0', 'v1.1'])
+
+        git(self.repo, 'checkout', '-q', '--detach')
+        self.assertSameAsGitLog()
+
+
+    def test_read_last_commit_not_supported(self) -> None:
+        # merge commits
+        git(self.repo, 'checkout', '-q', '-b', 'feature')
+        git(self.repo, 'commit', '-q', '--allow-empty', '-m', 'feature')
+        git(self.repo, 'checkout', '-q', 'main')
+        git(self.repo, 'merge', '-q', '--no-ff', '-m', 'merge', 'feature')
+        self.assertIsNone(read_last_commit(str(self.repo), self.pool))
+
+        git(self.repo, 'commit', '-q', '--allow-empty', '-m', 'after merge')
+        self.assertSameAsGitLog()
+
+        # references not decorated by all git versions
+        git(self.repo, 'update-ref', 'refs/custom/ref', 'HEAD')
+        self.assertIsNone(read_last_commit(str(self.repo), self.pool))
+        git(self.repo, 'update-ref', '-d', 'refs/custom/ref')
+
+        # configuration of git log
+        git(self.repo, 'config', 'log.date', 'iso')
+        self.assertIsNone(read_last_commit(str(self.repo), self.pool))
+        git(self.repo, 'config', '--unset', 'log.date')
+        self.assertSameAsGitLog()
+
+        # the repository configuration includes a file which may configure git log
+        (self.repo / '.git' / 'log.config').write_text('[format]\n\tpretty = oneline\n')
+        git(self.repo, 'config', 'include.path', 'log.config')
+        self.assertIsNone(read_last_commit(str(self.repo), self.pool))
+
+
+    def test_format_git_date(self) -> None:
+        self.assertEqual(format_git_date(1709606350, '+', '05', '30'), 'Tue Mar 5 08:09:10 2024 +0530')
+        self.assertEqual(format_git_date(1709606350, '-', '08', '00'), 'Mon Mar 4 18:39:10 2024 -0800')
+
+
+    def test_format_decorations(self) -> None:
+        self.assertEqual(format_decorations('refs/heads/main', ['refs/heads/main', 'refs/remotes/origin/main',
+                                                                'refs/stash', 'refs/tags/v1']),
+                         ' (HEAD -> main, tag: v1, refs/stash, origin/main)')
+        self.assertEqual(format_decorations('', []), ' (HEAD)')
+        self.assertIsNone(format_decorations('', ['refs/custom/ref']))
@@ -0,0 +1,84 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest, tempfile, shutil, subprocess
+from pathlib import Path
+
+from src.mg_git_index import MgGitIndex
+
+
+def git(repo: Path, *args: str) -> str:
+    return subprocess.run(['git', '-C', str(repo), '-c', 'core.quotePath=false'] + list(args),
+                          check=True, capture_output=True, encoding='utf8').stdout
+
+
+class TestGitIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.repo = Path(tempfile.mkdtemp(prefix='test_git_index_'))
+        git(self.repo, 'init', '--quiet')
+        for fname in ['a', 'dir/b', 'dir/sub/c', 'dir with space/d', 'é.txt', 'z']:
+            (self.repo / fname).parent.mkdir(parents=True, exist_ok=True)
+            (self.repo / fname).write_text(fname)
+        git(self.repo, 'add', '--all')
+
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.repo)
+
+
+    def ls_files(self) -> list:
+        return sorted((line.split('\t')[1], line.split(' ')[1]) for line in git(self.repo, 'ls-files', '-s').splitlines())
+
+
+    def test_read_index_versions(self) -> None:
+        for version in ['2', '3', '4']:
+            git(self.repo, 'update-index', '--index-version', version)
+            index = MgGitIndex.read(str(self.repo))
+            assert index is not None
+            self.assertEqual(list(index), self.ls_files())
+            self.assertEqual(index[0], self.ls_files()[0])
+            self.assertEqual(index.sha1_of('dir/sub/c'), dict(self.ls_files())['dir/sub/c'])
+            self.assertEqual(index.sha1_of('dir'), None)
+
+
+    def test_index_up_to_date(self) -> None:
+        index = MgGitIndex.read(str(self.repo))
+        assert index is not None
+        self.assertTrue(index.is_up_to_date())
+
+        (self.repo / 'a').write_text('modified')
+        git(self.repo, 'add', 'a')
+        self.assertFalse(index.is_up_to_date())
+
+        self.assertFalse(MgGitIndex.from_entries(self.ls_files()).is_up_to_date())
+
+
+    def test_no_index(self) -> None:
+        (self.repo / '.git' / 'index').unlink()
+        index = MgGitIndex.read(str(self.repo))
+        assert index is not None
+        self.assertEqual(len(index), 0)
+        self.assertEqual(MgGitIndex.read(str(self.repo / 'dir')), None)
+
+
+    def test_from_entries(self) -> None:
+        index = MgGitIndex.from_entries([('b', '1' * 40), ('a', '2' * 40)])
+        self.assertEqual(list(index), [('a', '2' * 40), ('b', '1' * 40)])
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.sha1_of('b'), '1' * 40)
@@ -0,0 +1,252 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest, tempfile, shutil, os, sys
+from pathlib import Path
+from unittest import mock
+
+from src.mg_git_refs import MgGitRefs, parse_git_config, map_refspec, global_git_config, global_git_config_paths, \
+    git_system_config_paths
+
+SHA1_A = 'a' * 40
+SHA1_B = 'b' * 40
+SHA1_C = 'c' * 40
+
+
+class TestGitRefs(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.repo_dir = Path(tempfile.mkdtemp(prefix='test_git_refs_'))
+        self.git_dir = self.repo_dir / '.git'
+        (self.git_dir / 'refs' / 'heads').mkdir(parents=True)
+        (self.git_dir / 'logs').mkdir()
+        self.write('config', '[core]\n\tbare = false\n')
+
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.repo_dir)
+
+
+    def write(self, fname: str, content: str) -> None:
+        path = self.git_dir / fname
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+    def test_parse_git_config(self) -> None:
+        self.assertEqual(parse_git_config('''# comment
+[core]
+    bare = false
+    ignoreCase
+[remote "origin"]
+\turl = "https://host/my repo.git"  ; comment
+\tfetch = +refs/heads/*:refs/remotes/origin/*
+[Branch "Main"]
+    remote = origin # comment
+    merge = refs/heads/Main
+[branch.Dev]
+    description = first line \\
+second line
+'''), [
+            ('core', '', 'bare', 'false'),
+            ('core', '', 'ignorecase', 'true'),
+            ('remote', 'origin', 'url', 'https://host/my repo.git'),
+            ('remote', 'origin', 'fetch', '+refs/heads/*:refs/remotes/origin/*'),
+            ('branch', 'Main', 'remote', 'origin'),
+            ('branch', 'Main', 'merge', 'refs/heads/Main'),
+            ('branch', 'dev', 'description', 'first line second line'),
+        ])
+
+        self.assertEqual(parse_git_config('url = outside of section'), None)
+        self.assertEqual(parse_git_config('[core\n'), None)
+        self.assertEqual(parse_git_config('[core]\nname = "unterminated\n'), None)
+
+
+    def test_global_git_config(self) -> None:
+        global_config = self.repo_dir / 'global.config'
+        system_config = self.repo_dir / 'system.config'
+        with mock.patch.dict(os.environ, {'GIT_CONFIG_GLOBAL': str(global_config), 'GIT_CONFIG_NOSYSTEM': '1'}):
+            self.assertEqual(global_git_config_paths('git'), [global_config])
+            self.assertEqual(global_git_config('git'), ())
+
+            global_config.write_text('[user]\n\tname = Me\n')
+            self.assertEqual(global_git_config('git'), (('user', '', 'name', 'Me'),))
+            # the file is read again when it is modified
+            global_config.write_text('[user]\n\tname = Someone else\n')
+            os.utime(global_config, ns=(0, 0))
+            self.assertEqual(global_git_config('git'), (('user', '', 'name', 'Someone else'),))
+
+            global_config.write_text('[includeIf "gitdir:~/work/"]\n\tpath = work.config\n')
+            self.assertIsNone(global_git_config('git'))
+
+        with mock.patch.dict(os.environ, {'GIT_CONFIG_GLOBAL': str(global_config), 'GIT_CONFIG_SYSTEM': str(system_config),
+                                          'GIT_CONFIG_NOSYSTEM': 'false'}):
+            self.assertEqual(global_git_config_paths('git'), [system_config, global_config])
+
+        with mock.patch.dict(os.environ, {'GIT_CONFIG_COUNT': '1'}):
+            self.assertIsNone(global_git_config('git'))
+
+
+    def test_git_system_config_paths(self) -> None:
+        install_dir = Path('C:/Program Files/Git')
+        with mock.patch.object(sys, 'platform', 'win32'), mock.patch.dict(os.environ, {'PROGRAMDATA': 'C:/ProgramData'}):
+            for git_exe in [install_dir / 'cmd' / 'git.exe', install_dir / 'mingw64' / 'bin' / 'git.exe']:
+                with mock.patch('shutil.which', return_value=str(git_exe)):
+                    self.assertEqual(git_system_config_paths('git'), [
+                        Path('C:/ProgramData') / 'Git' / 'config',
+                        install_dir / 'etc' / 'gitconfig',
+                        install_dir / 'mingw64' / 'etc' / 'gitconfig',
+                    ])
+
+        with mock.patch.object(sys, 'platform', 'darwin'), \
+                mock.patch('shutil.which', return_value='/opt/homebrew/bin/git'):
+            self.assertEqual(git_system_config_paths('git'),
+                             [Path('/etc/gitconfig'), Path('/opt/homebrew/etc/gitconfig')])
+
+
+    def test_map_refspec(self) -> None:
+        self.assertEqual(map_refspec('+refs/heads/*:refs/remotes/origin/*', 'refs/heads/main'), 'refs/remotes/origin/main')
+        self.assertEqual(map_refspec('refs/heads/main:refs/remotes/origin/main', 'refs/heads/main'), 'refs/remotes/origin/main')
+        self.assertEqual(map_refspec('refs/heads/main:refs/remotes/origin/main', 'refs/heads/dev'), '')
+        self.assertEqual(map_refspec('refs/tags/*:refs/tags/*', 'refs/heads/main'), '')
+        self.assertEqual(map_refspec('^refs/heads/tmp/*', 'refs/heads/tmp/x'), '')
+
+
+    def test_head(self) -> None:
+        # branch with no commit yet
+        self.write('HEAD', 'ref: refs/heads/main\n')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).head(), ('refs/heads/main', ''))
+
+        # loose ref
+        self.write('refs/heads/main', SHA1_A + '\n')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).head(), ('refs/heads/main', SHA1_A))
+
+        # packed ref
+        (self.git_dir / 'refs' / 'heads' / 'main').unlink()
+        self.write('packed-refs', f'# pack-refs with: peeled fully-peeled sorted \n{SHA1_B} refs/heads/main\n')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).head(), ('refs/heads/main', SHA1_B))
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).head_sha1(), SHA1_B)
+
+        # detached
+        self.write('HEAD', SHA1_C + '\n')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).head(), ('', SHA1_C))
+
+        # refs stored as reftable
+        self.write('config', '[core]\n\trepositoryformatversion = 1\n[extensions]\n\trefStorage = reftable\n')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).head(), None)
+
+        # not a repository
+        self.assertEqual(MgGitRefs(str(self.repo_dir / 'refs')).head(), None)
+
+
+    def test_worktree(self) -> None:
+        self.write('refs/heads/feature', SHA1_A + '\n')
+        self.write('worktrees/wt/HEAD', 'ref: refs/heads/feature\n')
+        self.write('worktrees/wt/commondir', '../..\n')
+        worktree_dir = self.repo_dir / 'wt'
+        worktree_dir.mkdir()
+        (worktree_dir / '.git').write_text(f'gitdir: {self.git_dir / "worktrees" / "wt"}\n')
+        self.assertEqual(MgGitRefs(str(worktree_dir)).head(), ('refs/heads/feature', SHA1_A))
+
+
+    def test_list_refs(self) -> None:
+        self.write('HEAD', 'ref: refs/heads/main\n')
+        self.write('refs/heads/main', SHA1_A + '\n')
+        self.write('refs/heads/main.lock', SHA1_C + '\n')
+        self.write('refs/remotes/origin/HEAD', 'ref: refs/remotes/origin/main\n')
+        self.write('refs/remotes/origin/gone', 'ref: refs/remotes/origin/deleted\n')
+        self.write('refs/tags/v1.0', SHA1_C + '\n')
+        self.write('packed-refs', f'# pack-refs with: peeled fully-peeled sorted \n{SHA1_B} refs/remotes/origin/main\n'
+                                  f'{SHA1_A} refs/tags/v1.0\n')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).list_refs(), {
+            'refs/heads/main': SHA1_A,
+            'refs/remotes/origin/HEAD': SHA1_B,
+            'refs/remotes/origin/main': SHA1_B,
+            # loose references take precedence over packed ones
+            'refs/tags/v1.0': SHA1_C,
+        })
+
+
+    def test_detached_head_description(self) -> None:
+        self.write('HEAD', SHA1_A + '\n')
+        self.write('refs/tags/v1.0', SHA1_A + '\n')
+        self.write('packed-refs', f'# pack-refs with: peeled fully-peeled sorted \n'
+                                  f'{SHA1_C} refs/tags/annotated\n^{SHA1_B}\n'
+                                  f'{SHA1_B} refs/remotes/origin/main\n')
+
+        def detached_after_checkout(target: str, checkout_sha1: str) -> object:
+            self.write('logs/HEAD', f'{SHA1_C} {checkout_sha1} Me <me@host> 1700000000 +0100\tcheckout: moving from main to {target}\n')
+            return MgGitRefs(str(self.repo_dir)).detached_head_description()
+
+        self.assertEqual(detached_after_checkout('v1.0', SHA1_A), ('at', 'v1.0'))
+        self.assertEqual(detached_after_checkout('origin/main', SHA1_B), ('from', 'origin/main'))
+        self.assertEqual(detached_after_checkout('annotated', SHA1_B), ('from', 'annotated'))
+        self.assertEqual(detached_after_checkout(SHA1_A, SHA1_A), ('at', SHA1_A))
+        self.assertEqual(detached_after_checkout('HEAD~1', SHA1_A), ('at', SHA1_A))
+        # loose tag which does not point to the commit, it may be an annotated tag: git has to tell
+        self.assertEqual(detached_after_checkout('v1.0', SHA1_B), None)
+        # the remote branch moved since the checkout
+        self.assertEqual(detached_after_checkout('origin/main', SHA1_A), ('at', SHA1_A))
+        # git checkout --detach: HEAD is not a branch or a tag, git describes the commit
+        self.assertEqual(detached_after_checkout('HEAD', SHA1_A), ('at', SHA1_A))
+
+        self.write('logs/HEAD', '')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).detached_head_description(), ('', ''))
+
+        # operation in progress, described by git
+        (self.git_dir / 'rebase-merge').mkdir()
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).detached_head_description(), None)
+
+
+    def test_remote_url_and_upstream(self) -> None:
+        self.write('HEAD', 'ref: refs/heads/main\n')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).remote_url(), '')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).upstream_branch('main'), '')
+
+        self.write('config', '''[remote "zzz"]
+\turl = https://host/zzz.git
+\tfetch = +refs/heads/*:refs/remotes/zzz/*
+[remote "aaa"]
+\turl = https://host/aaa.git
+\tfetch = +refs/heads/*:refs/remotes/aaa/*
+[branch "main"]
+\tremote = zzz
+\tmerge = refs/heads/main
+[branch "local"]
+\tremote = .
+\tmerge = refs/heads/main
+''')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).remote_url(), 'https://host/aaa.git')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).upstream_branch('main'), 'zzz/main')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).upstream_branch('local'), 'main')
+
+        with open(self.git_dir / 'config', 'a') as f:
+            f.write('[remote "origin"]\n\turl = https://host/origin.git\n')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).remote_url(), 'https://host/origin.git')
+
+        # urls rewritten by the user configuration
+        global_config = self.repo_dir / 'global.config'
+        global_config.write_text('[url "https://mirror/"]\n\tinsteadOf = https://host/\n')
+        with mock.patch.dict(os.environ, {'GIT_CONFIG_GLOBAL': str(global_config), 'GIT_CONFIG_NOSYSTEM': '1'}):
+            self.assertEqual(MgGitRefs(str(self.repo_dir)).remote_url(), None)
+
+        # the configuration includes other files
+        with open(self.git_dir / 'config', 'a') as f:
+            f.write('[include]\n\tpath = other.config\n')
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).remote_url(), None)
+        self.assertEqual(MgGitRefs(str(self.repo_dir)).upstream_branch('main'), None)
@@ -0,0 +1,98 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest, sys, time, threading, tempfile
+from pathlib import Path
+from typing import List, Tuple
+
+from src.mg_exec_core import ExecStatus, EXIT_CODE_COULD_NOT_START_PROCESS, EXIT_CODE_CRASHED
+from src.mg_host_helper import MgHostHelper, host_helper_source
+
+
+class TestHostHelper(unittest.TestCase):
+    '''The helper is run as a local subprocess, the same way it is run on the flatpak host'''
+
+    def setUp(self) -> None:
+        self.helper = MgHostHelper([sys.executable, '-u', '-c', host_helper_source()])
+        self.assertTrue(self.helper.start())
+
+
+    def tearDown(self) -> None:
+        self.helper.stop()
+
+
+    def python_cmd(self, code: str) -> List[str]:
+        return [sys.executable, '-c', code]
+
+
+    def test_exec_blocking(self) -> None:
+        self.assertEqual(self.helper.exec_blocking(self.python_cmd('import sys; print("a\\rb"); sys.exit(3)')),
+                         (ExecStatus.Ok, 3, 'a\nb\n'))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            exec_status, exit_code, output = self.helper.exec_blocking(self.python_cmd('import os; print(os.getcwd())'), tmpdir)
+            self.assertEqual(Path(output.strip()).resolve(), Path(tmpdir).resolve())
+
+        self.assertEqual(self.helper.exec_blocking(['/does/not/exist']),
+                         (ExecStatus.FailedToStart, EXIT_CODE_COULD_NOT_START_PROCESS, ''))
+
+
+    def test_exec_async_concurrent(self) -> None:
+        results: List[Tuple[ExecStatus, int, str]] = []
+        outputs: List[str] = []
+        all_done = threading.Event()
+
+        def cb_done(exec_status: ExecStatus, exit_code: int, output: str) -> None:
+            results.append((exec_status, exit_code, output))
+            if len(results) == 4:
+                all_done.set()
+
+        start = time.monotonic()
+        for i in range(4):
+            self.helper.exec_async(self.python_cmd(f'import time; time.sleep(0.5); print({i})'), '', cb_done, outputs.append)
+        self.assertTrue(all_done.wait(10))
+
+        # the commands were executed concurrently
+        self.assertLess(time.monotonic() - start, 1.9)
+        self.assertEqual(sorted(results), [(ExecStatus.Ok, 0, f'{i}\n') for i in range(4)])
+        # the output is received in chunks, possibly interleaved between commands
+        self.assertEqual(sorted(''.join(outputs)), sorted('0\n1\n2\n3\n'))
+
+
+    def test_kill(self) -> None:
+        results: List[Tuple[ExecStatus, int, str]] = []
+        done = threading.Event()
+
+        def cb_done(exec_status: ExecStatus, exit_code: int, output: str) -> None:
+            results.append((exec_status, exit_code, output))
+            done.set()
+
+        req_id = self.helper.exec_async(self.python_cmd('import time; time.sleep(30)'), '', cb_done)
+        self.helper.kill(req_id)
+        self.assertTrue(done.wait(10))
+        self.assertEqual(results, [(ExecStatus.Crashed, EXIT_CODE_CRASHED, '')])
+
+
+    def test_file_exists(self) -> None:
+        self.assertTrue(self.helper.file_exists(Path(sys.executable)))
+        self.assertFalse(self.helper.file_exists(Path('/does/not/exist')))
+
+
+    def test_helper_exit(self) -> None:
+        self.helper.stop()
+        self.assertFalse(self.helper.alive)
+        self.assertEqual(self.helper.exec_blocking(self.python_cmd('print(1)'))[0], ExecStatus.FailedToStart)
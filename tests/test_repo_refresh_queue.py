@@ -0,0 +1,122 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+
+import unittest, tempfile, shutil, subprocess, time, os
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from PySide6.QtWidgets import QApplication
+
+import src.mg_tools
+from src.mg_repo_info import MgRepoInfo
+from src.mg_repo_refresh_queue import MgRepoRefreshQueue, PRIORITY_SELECTED, PRIORITY_VISIBLE, PRIORITY_NEAR_VIEWPORT
+
+GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME='philou', GIT_AUTHOR_EMAIL='phil_tests@github',
+               GIT_COMMITTER_NAME='philou', GIT_COMMITTER_EMAIL='phil_tests@github')
+
+
+class TestRepoRefreshQueue(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = QApplication.instance() or QApplication([])
+        self.old_force_blocking = src.mg_tools.FORCE_ASYNC_TO_BLOCKING_CALLS
+        src.mg_tools.FORCE_ASYNC_TO_BLOCKING_CALLS = False
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix='test_refresh_queue_'))
+        self.repos: List[MgRepoInfo] = []
+        for name in ['r1', 'r2', 'r3', 'r4', 'r5']:
+            subprocess.run(['git', 'init', '-q', str(self.tmp_dir / name)], check=True)
+            subprocess.run(['git', '-C', str(self.tmp_dir / name), 'commit', '-q', '--allow-empty', '-m', 'first'],
+                           check=True, env=GIT_ENV)
+            self.repos.append(MgRepoInfo(name, str(self.tmp_dir / name)))
+
+        self.refresh_order: List[str] = []
+        for repo in self.repos:
+            repo.repo_update_in_progress.connect(self.refresh_order.append)
+
+
+    def tearDown(self) -> None:
+        src.mg_tools.FORCE_ASYNC_TO_BLOCKING_CALLS = self.old_force_blocking
+        shutil.rmtree(self.tmp_dir)
+
+
+    def wait_for(self, condition: Callable[[], bool]) -> None:
+        deadline = time.time() + 10
+        while not condition() and time.time() < deadline:
+            self.app.processEvents()
+            time.sleep(0.005)
+        self.assertTrue(condition())
+
+
+    def priorities(self) -> Dict[MgRepoInfo, int]:
+        return self.view_priorities
+
+
+    def test_priorities(self) -> None:
+        r1, r2, r3, r4, r5 = self.repos
+        self.view_priorities = {r4: PRIORITY_SELECTED, r2: PRIORITY_VISIBLE, r5: PRIORITY_VISIBLE, r1: PRIORITY_NEAR_VIEWPORT}
+        queue = MgRepoRefreshQueue(maxRunning=1)
+        queue.addPriorityGetter(self.priorities)
+        idle = []
+        queue.sigIdle.connect(lambda: idle.append(True))
+        queue.requestRefreshList(self.repos)
+        self.assertEqual(self.refresh_order, [])
+
+        self.wait_for(lambda: len(self.refresh_order) == 1)
+        # the viewport moved while the first repository is refreshed
+        self.view_priorities = {r3: PRIORITY_VISIBLE}
+        queue.priorityChanged()
+
+        self.wait_for(lambda: bool(idle))
+        self.assertEqual(self.refresh_order, ['r4', 'r3', 'r1', 'r2', 'r5'])
+        self.assertTrue(queue.isIdle())
+        self.assertTrue(all(repo.head for repo in self.repos))
+
+
+    def test_refresh_requested_again(self) -> None:
+        r1, r2 = self.repos[:2]
+        queue = MgRepoRefreshQueue(maxRunning=1)
+        queue.requestRefresh(r1)
+        queue.requestRefresh(r2)
+        queue.requestRefresh(r1)
+        self.wait_for(lambda: len(self.refresh_order) == 1)
+        # requested again while running: refreshed once more, in the order of the requests
+        queue.requestRefresh(r1, clearUrl=True)
+        queue.requestRefresh(r1)
+        self.wait_for(queue.isIdle)
+        self.assertEqual(self.refresh_order, ['r1', 'r2', 'r1'])
+
+        queue.requestRefreshList(self.repos)
+        queue.cancelRefresh(self.repos)
+        self.wait_for(queue.isIdle)
+        self.assertEqual(len(self.refresh_order), 3)
+
+
+    def test_shared_repositories(self) -> None:
+        # the same repository displayed in two tabs is refreshed once, with the best priority of the tabs
+        r1 = self.repos[0]
+        r2_tab1 = MgRepoInfo('r2', self.repos[1].fullpath, shared=True)
+        r2_tab2 = MgRepoInfo('other/r2', self.repos[1].fullpath, shared=True)
+        r2_tab1.repo_update_in_progress.connect(self.refresh_order.append)
+        r2_tab2.repo_update_in_progress.connect(self.refresh_order.append)
+        self.view_priorities = {r2_tab2: PRIORITY_SELECTED}
+        queue = MgRepoRefreshQueue(maxRunning=1)
+        queue.addPriorityGetter(self.priorities)
+        queue.requestRefreshList([r1, r2_tab1])
+        queue.requestRefresh(r2_tab2)
+        self.wait_for(queue.isIdle)
+        self.assertEqual(self.refresh_order, ['r2', 'other/r2', 'r1'])
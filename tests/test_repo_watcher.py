@@ -0,0 +1,83 @@
+#    Copyright (c) 2019-2023 IDEMIA
+#    Author: IDEMIA (Philippe Fremy, Florent Oulieres)
+# 
+#     Licensed under the Apache License, Version 2.0 (the "License");
+#     you may not use this file except in compliance with the License.
+#     You may obtain a copy of the License at
+# 
+#         http://www.apache.org/licenses/LICENSE-2.0
+# 
+#     Unless required by applicable law or agreed to in writing, software
+#     distributed under the License is distributed on an "AS IS" BASIS,
+#     WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#     See the License for the specific language governing permissions and
+#     limitations under the License.
+#
+
+
+import unittest, tempfile, shutil, subprocess, time, os
+from pathlib import Path
+from typing import Callable
+
+from PySide6.QtCore import QObject
+from PySide6.QtWidgets import QApplication
+
+from src.mg_repo_info import MgRepoInfo
+from src.mg_repo_watcher import MgRepoWatcher
+
+GIT_ENV = dict(os.environ, GIT_AUTHOR_NAME='philou', GIT_AUTHOR_EMAIL='phil_tests@github',
+               GIT_COMMITTER_NAME='philou', GIT_COMMITTER_EMAIL='phil_tests@github')
+
+
+class TestRepoWatcher(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.app = QApplication.instance() or QApplication([])
+        self.tmp_dir = Path(tempfile.mkdtemp(prefix='test_repo_watcher_'))
+        self.repo_dir = self.tmp_dir / 'repo'
+        self.git('init', '-q', str(self.repo_dir))
+        self.git('-C', str(self.repo_dir), 'commit', '-q', '--allow-empty', '-m', 'first')
+        self.repo = MgRepoInfo('repo', str(self.repo_dir))
+        self.parent = QObject()
+        self.watcher = MgRepoWatcher(self.parent)
+
+
+    def tearDown(self) -> None:
+        self.watcher.setRepos([])
+        shutil.rmtree(self.tmp_dir)
+
+
+    def git(self, *args: str) -> None:
+        subprocess.run(['git', *args], check=True, env=GIT_ENV)
+
+
+    def wait_for(self, condition: Callable[[], bool]) -> None:
+        deadline = time.time() + 10
+        while not condition() and time.time() < deadline:
+            self.app.processEvents()
+            time.sleep(0.005)
+        self.assertTrue(condition())
+
+
+    def test_watched_dirs(self) -> None:
+        self.watcher.setRepos([self.repo])
+        watched = self.watcher.watcher.directories()
+        self.assertIn(str(self.repo_dir.resolve() / '.git'), watched)
+        self.assertIn(str(self.repo_dir.resolve() / '.git' / 'refs' / 'heads'), watched)
+        self.assertEqual(set(self.watcher.repoByWatchedDir.values()), {self.repo})
+
+
+    def test_refs_dir_deleted_and_created_again(self) -> None:
+        feature_dir = str(self.repo_dir.resolve() / '.git' / 'refs' / 'heads' / 'feature')
+        self.git('-C', str(self.repo_dir), 'branch', 'feature/one')
+        self.watcher.setRepos([self.repo])
+        self.assertIn(feature_dir, self.watcher.watcher.directories())
+
+        # deleting the last branch of the namespace deletes its directory, which is no longer watched
+        self.git('-C', str(self.repo_dir), 'branch', '-D', 'feature/one')
+        self.wait_for(lambda: feature_dir not in self.watcher.watcher.directories())
+
+        self.git('-C', str(self.repo_dir), 'branch', 'feature/two')
+        self.watcher.watchRepo(self.repo)
+        self.assertIn(feature_dir, self.watcher.watcher.directories())
+        self.assertIs(self.watcher.repoByWatchedDir[feature_dir], self.repo)
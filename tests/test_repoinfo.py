@@ -16,7 +16,8 @@
 
 
 from typing import Union, Any
-import unittest, tempfile, datetime, collections, pathlib, os, stat, shutil
+import unittest, tempfile, datetime, collections, pathlib, os, stat, shutil, time, gc
+from unittest import mock
 from logging import warning
 import os
 import sys
@@ -25,8 +26,13 @@ import os.path
 from multigit import init_logging
 import src.mg_tools
 from src.mg_tools import ExecGit
-from src.mg_const import MSG_EMPTY_REPO, MSG_NO_COMMIT, MSG_LOCAL_BRANCH, MSG_REMOTE_SYNCHRO_OK, SHORT_SHA1_NB_DIGITS
-from src.mg_repo_info import MgRepoInfo, MultiRepo
+from src.mg_exec_core import CmdType, MgExecutable
+from src.mg_const import MSG_EMPTY_REPO, MSG_NO_COMMIT, MSG_LOCAL_BRANCH, MSG_REMOTE_SYNCHRO_OK, SHORT_SHA1_NB_DIGITS, \
+    MSG_REMOTE_TOPUSH_TOPULL, MSG_REMOTE_BRANCH_GONE, MSG_REMOTE_TOPULL, MAX_DIFF_LINES
+from src.mg_repo_info import MgRepoInfo, MultiRepo, RefreshScope
+from src.mg_exec_task_item import gitCmdRefreshScope
+from src.mg_repo_cache import MgRepoStateCache
+from src.mg_repo_registry import get_repo_registry
 
 # More tests to write
 # * detached head from a remote branch
@@ -275,6 +281,55 @@ class TestRepoInfo(TempGitDirReady):
         self.assertEqual(ri.branches_local, [DEFAULT_BRANCH_NAME])
         self.assertEqual(ri.branches_remote, [])
 
+    def test_repo_info_status_v2(self) -> None:
+        ri = MgRepoInfo('toto', '.', '.')
+        ri.cb_fill_repo_info_status_done('toto', 0, '''# branch.oid 0123456789abcdef0123456789abcdef01234567
+# branch.head dev
+# branch.upstream origin/dev
+# branch.ab +2 -3
+1 .M N... 100644 100644 100644 1111111111111111111111111111111111111111 1111111111111111111111111111111111111111 toto.txt
+2 R. N... 100644 100644 100644 1111111111111111111111111111111111111111 1111111111111111111111111111111111111111 R100 new name.txt	old name.txt
+u UU N... 100644 100644 100644 100644 1111111111111111111111111111111111111111 2222222222222222222222222222222222222222 3333333333333333333333333333333333333333 conflict.txt
+? untracked.txt
+''')
+        self.assertEqual(ri.status, '1 conflicted, 2 modified')
+        self.assertEqual(ri.branch, 'dev')
+        self.assertEqual(ri.head, 'branch dev')
+        self.assertEqual(ri.remote_branch, 'origin/dev')
+        self.assertEqual(ri.remote_synchro, MSG_REMOTE_TOPUSH_TOPULL % (2, 3))
+        self.assertEqual(ri.commit_sha1, '0123456789abcdef0123456789abcdef01234567')
+        # only files modified in the working tree are part of git diff
+        self.assertEqual(ri.modified_files, ['toto.txt', 'conflict.txt'])
+
+        # remote branch is gone
+        ri = MgRepoInfo('toto', '.', '.')
+        ri.cb_fill_repo_info_status_done('toto', 0, '''# branch.oid 0123456789abcdef0123456789abcdef01234567
+# branch.head dev
+# branch.upstream origin/dev
+''')
+        self.assertEqual(ri.status, 'OK')
+        self.assertEqual(ri.remote_synchro, MSG_REMOTE_BRANCH_GONE)
+
+        # up-to-date with remote
+        ri = MgRepoInfo('toto', '.', '.')
+        ri.cb_fill_repo_info_status_done('toto', 0, '''# branch.oid 0123456789abcdef0123456789abcdef01234567
+# branch.head dev
+# branch.upstream origin/dev
+# branch.ab +0 -0
+''')
+        self.assertEqual(ri.remote_synchro, MSG_REMOTE_SYNCHRO_OK)
+
+        # cloned from an empty repo
+        ri = MgRepoInfo('toto', '.', '.')
+        ri.cb_fill_repo_info_status_done('toto', 0, '''# branch.oid (initial)
+# branch.head master
+# branch.upstream origin/master
+''')
+        self.assertEqual(ri.head, MSG_EMPTY_REPO)
+        self.assertEqual(ri.commit_sha1, '')
+        self.assertEqual(ri.last_commit, MSG_NO_COMMIT)
+
+
     def test_repo_info_submodule(self) -> None:
         print('    - test_repo_info_submodule')
         
@@ -508,7 +563,8 @@ class TestRepoInfo(TempGitDirReady):
                            last_commit='',
                            tags=None,
                     ))
-        self.assertEqual(ric.commit_sha1, None)
+        # git status already provides the sha1
+        self.assertTrue(ric.commit_sha1.startswith(commit_sha1))
         ric.ensure_last_commit()
         self.assertTrue(ric.last_commit.startswith('commit %s' % commit_sha1))
         self.assertTrue(('extend %s' % fname) in ric.last_commit)
@@ -743,6 +799,8 @@ class TestRepoInfo(TempGitDirReady):
                                        last_commit=ric.last_commit,
                                        tags=None,
                                        ))
+        self.assertTrue(ric.commit_sha1.startswith(commit_sha1))
+        ric.ensure_last_commit()
         self.assertTrue(ric.last_commit.startswith('commit %s' % commit_sha1))
         ric.ensure_tags()
         self.assertEqual(ric.tags, '')
@@ -922,6 +980,116 @@ class TestRepoInfo(TempGitDirReady):
 
         rmtree_failsafe(strange_dir1)
 
+    def test_shared_repo_state(self) -> None:
+        base_dir = pathlib.Path(self.gitdir) / 'shared'
+        (base_dir / 'sub' / 'repo').mkdir(parents=True)
+        git_init_repo(base_dir / 'sub' / 'repo')
+        add_content(base_dir / 'sub' / 'repo', 'file1')
+
+        mr_base = MultiRepo(str(base_dir))
+        mr_base.find_git_repos()
+        mr_sub = MultiRepo(str(base_dir / 'sub'))
+        mr_sub.find_git_repos()
+        repo_base = mr_base.repo_list[0]
+        repo_sub = mr_sub['repo']
+        self.assertIsNot(repo_base, repo_sub)
+        self.assertIs(repo_base.state, repo_sub.state)
+        self.assertEqual(repo_sub.name, 'repo')
+
+        # one refresh updates both, and each one emits its signals with its own name
+        available = []
+        repo_base.repo_info_available.connect(available.append)
+        repo_sub.repo_info_available.connect(available.append)
+        repo_base.refresh()
+        self.assertEqual(sorted(available), sorted([repo_base.name, 'repo']))
+        self.assertEqual(repo_sub.head, f'branch {DEFAULT_BRANCH_NAME}')
+        self.assertTrue(repo_sub.info_from_git)
+
+        # repositories not created by MultiRepo keep their own state
+        self.assertIsNot(MgRepoInfo('repo', str(base_dir / 'sub' / 'repo')).state, repo_sub.state)
+
+        # the state is forgotten when no tab uses it anymore
+        fullpath = repo_sub.fullpath
+        del repo_base, repo_sub, mr_base, mr_sub
+        gc.collect()
+        self.assertNotIn(fullpath, get_repo_registry().states)
+
+        rmtree_failsafe(base_dir)
+
+
+    def test_ensure_all_filled_full_diff(self) -> None:
+        repo_dir = pathlib.Path(self.gitdir) / 'big_diff'
+        repo_dir.mkdir()
+        git_init_repo(repo_dir)
+        add_content(repo_dir, 'file1')
+        with open(repo_dir / 'file1', 'a') as f:
+            f.write(''.join('line %d\n' % i for i in range(MAX_DIFF_LINES)))
+
+        ric = MgRepoInfo('big_diff', str(repo_dir))
+        ric.ensure_diff()
+        self.assertTrue(ric.diff_truncated)
+
+        # the properties show the whole diff
+        ric.ensure_all_filled()
+        self.assertFalse(ric.diff_truncated)
+        assert ric.diff is not None
+        self.assertIn('+line %d' % (MAX_DIFF_LINES - 1), ric.diff)
+
+        rmtree_failsafe(repo_dir)
+
+
+    def test_ensure_diff_failed(self) -> None:
+        repo_dir = pathlib.Path(self.gitdir) / 'diff_failed'
+        repo_dir.mkdir()
+        git_init_repo(repo_dir)
+        add_content(repo_dir, 'file1')
+        ric = MgRepoInfo('diff_failed', str(repo_dir))
+        rmtree_failsafe(repo_dir / '.git')
+
+        done, failed = [], []
+        ric.ensure_diff(lambda repo_name, diff, truncated: done.append(repo_name),
+                        cb_diff_failed=failed.append)
+        self.assertEqual(done, [])
+        self.assertEqual(failed, ['diff_failed'])
+        self.assertIsNone(ric.diff)
+
+        rmtree_failsafe(repo_dir)
+
+
+    def test_scan_git_dirs_options(self) -> None:
+        base_dir = pathlib.Path(self.gitdir) / 'scan'
+        for subdir in ['a', 'a/nested', 'b/c/d', 'node_modules/e']:
+            (base_dir / subdir).mkdir(parents=True)
+            git_init_repo(str(base_dir / subdir))
+        os.chdir(self.gitdir)
+
+        def scan(**kwargs: Any) -> set:
+            return {os.path.relpath(os.path.dirname(d), base_dir) for d in src.mg_tools.scan_git_dirs(str(base_dir), **kwargs)}
+
+        # node_modules is ignored by default
+        self.assertEqual(scan(), {'a', os.path.join('a', 'nested'), os.path.join('b', 'c', 'd')})
+        self.assertEqual(scan(ignore_globs=[]), {'a', os.path.join('a', 'nested'), os.path.join('b', 'c', 'd'),
+                                                 os.path.join('node_modules', 'e')})
+        self.assertEqual(scan(ignore_globs=['b*', 'node_*']), {'a', os.path.join('a', 'nested')})
+        self.assertEqual(scan(max_depth=2), {'a', os.path.join('a', 'nested')})
+        self.assertEqual(scan(nested_repos=False), {'a', os.path.join('b', 'c', 'd')})
+        self.assertEqual(scan(nb_workers=1), scan())
+
+        rmtree_failsafe(base_dir)
+
+
+    def test_multirepo_add_git_dir(self) -> None:
+        mr = MultiRepo(str(self.gitdir))
+        for name in ['Zeta', 'alpha', 'Mid', 'beta']:
+            repo = mr.add_git_dir(str(self.gitdir / name / '.git'))
+            assert repo is not None
+            self.assertEqual(repo.name, name)
+        self.assertEqual(mr.add_git_dir(str(self.gitdir / 'Mid' / '.git')), None)
+        self.assertEqual(mr.repo_names, ['alpha', 'beta', 'Mid', 'Zeta'])
+        self.assertEqual([repo.name for repo in mr.repo_list], mr.repo_names)
+        self.assertEqual(set(mr.repo_dict), set(mr.repo_names))
+
+
     def test_find_git_repos_with_symlinks(self) -> None:
         try:
             self.run_test_find_git_repos_with_symlinks()
@@ -1189,3 +1357,260 @@ class TestRepoInfo(TempGitDirReady):
         self.assertEqual(ric.branches_filled, True)
         self.assertEqual(ric.branches_remote, [f'origin/{DEFAULT_BRANCH_NAME}'])
         self.assertEqual(ric.branches_local, [])
+
+
+
+class TestRepoStateCache(TempGitDirReady):
+
+    def test_repo_state_cache(self) -> None:
+        repo_dir = pathlib.Path(self.gitdir) / 'cached_repo'
+        repo_dir.mkdir()
+        git_init_repo(repo_dir)
+        sha1 = add_content(repo_dir, 'file1')
+        cache_path = pathlib.Path(self.gitdir) / 'repo_cache.config'
+
+        cache = MgRepoStateCache(str(cache_path))
+        ric = MgRepoInfo('cached_repo', str(repo_dir))
+        self.assertEqual(cache.restoreRepoState(ric), False)
+        ric.refresh()
+        cache.storeRepoState(ric)
+        cache.save()
+
+        # a new cache instance reads the state from disk
+        cache = MgRepoStateCache(str(cache_path))
+        cache.load()
+        ric2 = MgRepoInfo('cached_repo', str(repo_dir))
+        self.assertEqual(cache.restoreRepoState(ric2), True)
+        self.assertEqual(to_named_tuple(ric2), to_named_tuple(ric))
+        self.assertTrue(ric2.commit_sha1.startswith(sha1))
+
+        # a new commit changes the fingerprint
+        time.sleep(0.01)
+        add_content(repo_dir, 'file2')
+        ric3 = MgRepoInfo('cached_repo', str(repo_dir))
+        self.assertEqual(cache.restoreRepoState(ric3), False)
+        self.assertEqual(ric3.head, f'branch {DEFAULT_BRANCH_NAME}')
+
+        # corrupted cache is ignored
+        cache_path.write_text('{ invalid')
+        cache.load()
+        self.assertEqual(cache.cache_dict, {})
+
+
+    def test_repo_state_cache_prune(self) -> None:
+        repo_dir = pathlib.Path(self.gitdir) / 'pruned_repo'
+        repo_dir.mkdir()
+        git_init_repo(repo_dir)
+        add_content(repo_dir, 'file1')
+        cache_path = pathlib.Path(self.gitdir) / 'repo_cache.config'
+
+        cache = MgRepoStateCache(str(cache_path))
+        ric = MgRepoInfo('pruned_repo', str(repo_dir))
+        ric.refresh()
+        cache.storeRepoState(ric)
+        cache.cache_dict[str(repo_dir) + '_deleted'] = dict(cache.cache_dict[str(repo_dir)])
+        cache.cache_dict[str(repo_dir) + '_old'] = dict(cache.cache_dict[str(repo_dir)], last_seen=0)
+        cache.save()
+
+        # only the existing and recently seen repository is kept
+        cache = MgRepoStateCache(str(cache_path))
+        cache.load()
+        self.assertEqual(list(cache.cache_dict.keys()), [str(repo_dir)])
+
+        # a repository removed from the disk is removed from the cache on the next save
+        rmtree_failsafe(repo_dir)
+        cache.save()
+        cache.load()
+        self.assertEqual(cache.cache_dict, {})
+
+
+class TestRepoInfoRequestsInFlight(TempGitDirReady):
+    '''Check that concurrent requests on one repository run git only once, with real asynchronous git calls'''
+
+    def setUp(self) -> None:
+        from PySide6.QtWidgets import QApplication
+        self.app = QApplication.instance() or QApplication([])
+        src.mg_tools.FORCE_ASYNC_TO_BLOCKING_CALLS = False
+        self.repo_dir = pathlib.Path(self.gitdir) / f'repo_in_flight_{self._testMethodName}'
+        self.repo_dir.mkdir()
+        git_init_repo(self.repo_dir)
+        add_content(self.repo_dir, 'file1')
+
+
+    def tearDown(self) -> None:
+        src.mg_tools.FORCE_ASYNC_TO_BLOCKING_CALLS = True
+
+
+    def wait_for_requests(self, ric: MgRepoInfo) -> None:
+        deadline = time.time() + 10
+        while (ric.requests_in_flight or ric.refresh_pending is not None) and time.time() < deadline:
+            self.app.processEvents()
+            time.sleep(0.005)
+        self.assertEqual(ric.requests_in_flight, {})
+
+
+    def test_requests_coalesced(self) -> None:
+        ric = MgRepoInfo('repo', str(self.repo_dir))
+        calls = []
+        ric.ensure_branches_filled(lambda name: calls.append(('branches1', name)))
+        ric.ensure_branches_filled(lambda name: calls.append(('branches2', name)))
+        ric.ensure_all_tags_filled(lambda name: calls.append(('tags', name)))
+        self.assertEqual(len(ric.requests_in_flight['branches']), 2)
+        self.wait_for_requests(ric)
+        self.assertEqual(sorted(calls), [('branches1', 'repo'), ('branches2', 'repo'), ('tags', 'repo')])
+        self.assertEqual(ric.branches_local, [DEFAULT_BRANCH_NAME])
+
+        # a blocking call does not wait for the running request, and serves its callbacks
+        calls.clear()
+        ric.fill_branches(lambda name: calls.append(('async', name)))
+        ric.force_blocking_git = True
+        ric.fill_branches(lambda name: calls.append(('blocking', name)))
+        ric.force_blocking_git = False
+        self.assertEqual(calls, [('async', 'repo'), ('blocking', 'repo')])
+        # let the asynchronous git finish: its callbacks were already called
+        deadline = time.time() + 0.5
+        while time.time() < deadline:
+            self.app.processEvents()
+            time.sleep(0.005)
+        self.assertEqual(len(calls), 2)
+
+
+    def test_refresh_coalesced(self) -> None:
+        ric = MgRepoInfo('repo', str(self.repo_dir))
+        available = []
+        ric.repo_info_available.connect(available.append)
+        ric.refresh()
+        ric.refresh()
+        ric.deepRefresh()
+        ric.refresh()
+        self.assertEqual(ric.refresh_pending, True)
+        self.wait_for_requests(ric)
+        # the refresh requested during the first one is run once, after it
+        self.assertEqual(available, ['repo', 'repo'])
+        self.assertEqual(ric.head, f'branch {DEFAULT_BRANCH_NAME}')
+
+
+    @unittest.skipIf(sys.platform == 'win32', 'the wrapper crashing git is a shell script')
+    def test_request_ends_when_git_crashes(self) -> None:
+        wrapper = self.repo_dir.parent / f'git_crashing_{self._testMethodName}.sh'
+        wrapper.write_text('#!/bin/sh\n'
+                           'for arg in "$@"; do [ "$arg" = status ] && kill -SEGV $$; done\n'
+                           'exec git "$@"\n')
+        wrapper.chmod(0o755)
+
+        ric = MgRepoInfo('repo', str(self.repo_dir))
+        update_done = []
+        ric.repo_update_done.connect(update_done.append)
+        crashing_git = MgExecutable(CmdType.DirectCmd, path=str(wrapper))
+        with mock.patch.object(ExecGit, 'get_executable', return_value=crashing_git), \
+                mock.patch('src.mg_tools.QMessageBox.critical') as msg_box_critical:
+            ric.refresh()
+            self.wait_for_requests(ric)
+        # the crash is reported, and ends the request
+        self.assertEqual(msg_box_critical.call_count, 1)
+        self.assertEqual(update_done, ['repo'])
+        self.assertEqual(ric.status, '')
+
+        # the next refreshes are not blocked
+        ric.refresh()
+        self.wait_for_requests(ric)
+        self.assertEqual(update_done, ['repo', 'repo'])
+        self.assertEqual(ric.status, 'OK')
+
+
+class TestRepoInfoPartialRefresh(TempGitDirReady):
+    '''Check that only the information changed by an operation is read again after it'''
+
+    def setUp(self) -> None:
+        self.origin_dir = pathlib.Path(self.gitdir) / f'origin_{self._testMethodName}'
+        self.clone_dir = pathlib.Path(self.gitdir) / f'clone_{self._testMethodName}'
+        self.origin_dir.mkdir()
+        git_init_repo(self.origin_dir)
+        add_content(self.origin_dir, 'file1')
+        git_exec('clone', str(self.origin_dir), str(self.clone_dir))
+        git_set_commit_author(self.clone_dir)
+
+
+    def test_git_cmd_refresh_scope(self) -> None:
+        self.assertEqual(gitCmdRefreshScope(['fetch', '--prune']), RefreshScope.RemoteSynchro | RefreshScope.Tags)
+        self.assertEqual(gitCmdRefreshScope(['-C', 'some/path', 'push']), RefreshScope.RemoteSynchro)
+        self.assertEqual(gitCmdRefreshScope(['tag', '-d', 'v1']), RefreshScope.Tags)
+        self.assertEqual(gitCmdRefreshScope(['commit', '-m', 'fetch']), RefreshScope.All)
+        self.assertEqual(gitCmdRefreshScope([]), RefreshScope.All)
+
+
+    def test_partial_refresh_after_fetch(self) -> None:
+        ric = MgRepoInfo('clone', str(self.clone_dir))
+        ric.refresh()
+        self.assertEqual(ric.remote_synchro, MSG_REMOTE_SYNCHRO_OK)
+        with open(self.clone_dir / 'file1', 'a') as f:
+            f.write('modified\n')
+        ric.refresh()
+        self.assertEqual(ric.status, '1 modified')
+
+        add_content(self.origin_dir, 'file1')
+        git_exec('fetch', gitdir=self.clone_dir)
+        # modified after the last refresh, only git status would see it
+        with open(self.clone_dir / 'file2', 'w') as f:
+            f.write('new file\n')
+        git_exec('add', 'file2', gitdir=self.clone_dir)
+
+        ric.partial_refresh(RefreshScope.RemoteSynchro | RefreshScope.Tags)
+        self.assertEqual(ric.remote_synchro, MSG_REMOTE_TOPULL % 1)
+        self.assertEqual(ric.status, '1 modified')
+        self.assertEqual(ric.head, f'branch {DEFAULT_BRANCH_NAME}')
+
+        ric.partial_refresh(RefreshScope.WorkTree)
+        self.assertEqual(ric.status, '2 modified')
+        self.assertEqual(ric.remote_synchro, MSG_REMOTE_TOPULL % 1)
+
+        ric.partial_refresh(RefreshScope.Nothing)
+        self.assertEqual(ric.status, '2 modified')
+
+
+    def test_partial_refresh_remote_branch_gone(self) -> None:
+        git_exec('checkout', '-b', 'feature', gitdir=self.clone_dir)
+        git_exec('push', '--set-upstream', 'origin', 'feature', gitdir=self.clone_dir)
+        ric = MgRepoInfo('clone', str(self.clone_dir))
+        ric.refresh()
+        self.assertEqual(ric.remote_synchro, MSG_REMOTE_SYNCHRO_OK)
+
+        git_exec('branch', '-D', 'feature', gitdir=self.origin_dir)
+        git_exec('fetch', '--prune', gitdir=self.clone_dir)
+        ric.partial_refresh(RefreshScope.RemoteSynchro)
+        # git status tells that the remote branch is gone
+        self.assertEqual(ric.remote_synchro, MSG_REMOTE_BRANCH_GONE)
+        self.assertEqual(ric.head, 'branch feature')
+        self.assertEqual(ric.requests_in_flight, {})
+
+
+    def test_partial_refresh_after_push_set_upstream(self) -> None:
+        git_exec('checkout', '-b', 'local_branch', gitdir=self.clone_dir)
+        ric = MgRepoInfo('clone', str(self.clone_dir))
+        ric.refresh()
+        self.assertEqual(ric.remote_synchro, MSG_LOCAL_BRANCH)
+
+        git_exec('push', '--set-upstream', 'origin', 'local_branch', gitdir=self.clone_dir)
+        ric.partial_refresh(RefreshScope.RemoteSynchro)
+        self.assertEqual(ric.remote_branch, 'origin/local_branch')
+        self.assertEqual(ric.remote_synchro, MSG_REMOTE_SYNCHRO_OK)
+
+
+    def test_partial_refresh_tags(self) -> None:
+        ric = MgRepoInfo('clone', str(self.clone_dir))
+        ric.refresh()
+        ric.ensure_tags()
+        self.assertEqual(ric.tags, '')
+        ric.ensure_last_commit()
+        self.assertNotIn('v1.0', ric.last_commit)
+
+        git_exec('tag', 'v1.0', gitdir=self.clone_dir)
+        ric.partial_refresh(RefreshScope.Tags)
+        self.assertEqual(ric.tags, None)
+        # the last commit is decorated with the tags
+        self.assertEqual(ric.last_commit, '')
+        ric.ensure_tags()
+        self.assertEqual(ric.tags, 'v1.0')
+        ric.ensure_last_commit()
+        self.assertIn('tag: v1.0', ric.last_commit)
+        self.assertEqual(ric.remote_synchro, MSG_REMOTE_SYNCHRO_OK)
@@ -15,17 +15,23 @@
 #
 
 
-import unittest, os, sys, pathlib
+import unittest, os, sys, pathlib, io, tempfile
+from unittest import mock
 
-from PySide6.QtWidgets import QApplication, QTreeWidget, QTreeWidgetItem
+from PySide6.QtGui import QTextCursor, QTextCharFormat
+from PySide6.QtWidgets import QApplication, QTreeWidget, QTreeWidgetItem, QTextEdit
 
 from src.mg_utils import htmlize_diff, handle_cr_in_text, set_username_on_git_url, add_suffix_if_missing, extractInt, \
     hasGitAuthFailureMsg, isGitCommandRequiringAuth, anonymise_git_url, strip_protocol_from_url, collectColumnText, \
-    normalize_path
+    normalize_path, CrTextAccumulator, DiffHtmlRenderer, HTML_HEADER, HTML_FOOTER
 
 from src.mg_config import MgConfig
 from src.mg_const import MSG_BIG_DIFF
 from src.mg_repo_info import match_ahead_behind, is_not_sha1, MgRepoInfo
+from src.mg_view_cache import MgViewCache, MgDiffView
+from src.mg_multigit_widget import TAG_DIFF_OPEN, TAG_DIFF_CLOSE
+from src import mg_import_profile
+from src.mg_import_profile import MgImportProfiler, IMPORT_PROFILE_FNAME
 
 
 #######################################################
@@ -164,6 +170,27 @@ class TestUtilityFunctions(unittest.TestCase):
         self.assertEqual( handle_cr_in_text('abc\ndef\rDEF\r123\n'),'abc\n123\n')
 
 
+    def test_cr_text_accumulator(self):
+        text = 'Cloning into toto...\nReceiving objects:  10%\rReceiving objects:  50%\r' \
+               'Receiving objects: 100%, done.\r\nResolving deltas: 100%\r\ndone\n'
+        for chunk_size in [1, 3, 7, len(text)]:
+            with self.subTest(chunk_size):
+                acc = CrTextAccumulator()
+                for i in range(0, len(text), chunk_size):
+                    acc.feed(text[i:i+chunk_size])
+                self.assertEqual([acc.line(i) for i in range(acc.nb_lines())] + [''],
+                                 handle_cr_in_text(text).split('\n'))
+
+        acc = CrTextAccumulator()
+        self.assertEqual(acc.feed('abc\ndef\r'), 0)
+        self.assertEqual((acc.nb_lines(), acc.line(1)), (2, 'def'))
+        # the line in progress is replaced
+        self.assertEqual(acc.feed('DEF'), 1)
+        self.assertEqual((acc.nb_lines(), acc.line(1)), (2, 'DEF'))
+        self.assertEqual(acc.feed('\n123'), 1)
+        self.assertEqual([acc.line(i) for i in range(acc.nb_lines())], ['abc', 'DEF', '123'])
+
+
     def test_match_ahead_behind(self):
         self.assertEqual(match_ahead_behind('ahead 33'), (33, 0))
         self.assertEqual(match_ahead_behind('behind 22'), (0, 22))
@@ -444,6 +471,110 @@ p, li { white-space: pre-wrap;font-family:'Courier New'; font-size:8pt; font-wei
         sout = htmlize_diff(sin, 1000)
         self.assertEqual(sout, sout_ref)
 
+    def test_diff_html_renderer(self) -> None:
+        sin = ''' test/test_gui.py    | 16 ++++++++++++++++
+ 2 files changed, 17 insertions(+), 5 deletions(-)
+
+diff --git a/test/test_gui.py b/test/test_gui.py
+@@ -11,6 +11,22 @@ from PyQt5.QtTest import QTest
+ from src.main_form import MainForm
++from src.const import CONST_33
+- <removed>
+'''
+        # rendering the lines one by one gives the same result as rendering the whole diff
+        renderer = DiffHtmlRenderer()
+        lines = sin.split('\n')
+        sout = '\n'.join([HTML_HEADER] + [renderer.render_line(l) for l in lines] + [HTML_FOOTER])
+        self.assertEqual(sout, htmlize_diff(sin))
+        self.assertFalse(renderer.in_stat_data)
+
+        self.assertEqual(DiffHtmlRenderer().render_line('- <removed>'),
+                         '<span style="background-color:#ffdddd;">- &lt;removed&gt;</span><br/>')
+
+    def test_view_cache(self) -> None:
+        cache = MgViewCache(max_entries=2)
+        cache.put('a', 'view a')
+        cache.put('b', 'view b')
+        cache.put(None, 'not cached')
+        self.assertEqual(cache.get('a'), 'view a')
+        # b is the least recently used
+        cache.put('c', 'view c')
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('a'), 'view a')
+        self.assertEqual(cache.get('c'), 'view c')
+        self.assertIsNone(cache.get(None))
+
+        view = MgDiffView()
+        self.assertEqual(view.add_lines(0, ['+a', '-b']), DiffHtmlRenderer().render_line('+a') + DiffHtmlRenderer().render_line('-b'))
+        # lines already rendered are ignored when more lines are loaded
+        self.assertEqual(view.add_lines(0, ['+a', '-b', 'c']), 'c<br/>')
+        self.assertEqual(view.add_lines(2, ['c']), '')
+        self.assertEqual(view.nb_lines, 3)
+
+    def test_streamed_diff_font(self) -> None:
+        app = QApplication.instance() or QApplication([])
+
+        def last_char_format(textEdit: QTextEdit) -> QTextCharFormat:
+            cursor = QTextCursor(textEdit.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            return cursor.charFormat()
+
+        # the diff displayed at once, from the view cache
+        textEditCached = QTextEdit()
+        textEditCached.setHtml(HTML_HEADER + TAG_DIFF_OPEN + DiffHtmlRenderer().render_line('+a') + 'b'
+                               + TAG_DIFF_CLOSE + HTML_FOOTER)
+        cachedFormat = last_char_format(textEditCached)
+        self.assertEqual(cachedFormat.fontFamilies(), ['Courier New'])
+
+        # the same diff, appended while git outputs it
+        textEditStreamed = QTextEdit()
+        textEditStreamed.setHtml(HTML_HEADER + HTML_FOOTER)
+        cursor = QTextCursor(textEditStreamed.document())
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertHtml(TAG_DIFF_OPEN + DiffHtmlRenderer().render_line('+a') + 'b' + TAG_DIFF_CLOSE)
+        streamedFormat = last_char_format(textEditStreamed)
+        self.assertEqual(streamedFormat.fontFamilies(), cachedFormat.fontFamilies())
+        self.assertEqual(streamedFormat.fontPointSize(), cachedFormat.fontPointSize())
+        self.assertEqual(streamedFormat.fontWeight(), cachedFormat.fontWeight())
+
+    def test_import_profiler(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (pathlib.Path(tmpdir) / 'mg_profiled_outer.py').write_text('import mg_profiled_inner\n')
+            (pathlib.Path(tmpdir) / 'mg_profiled_inner.py').write_text('import time\ntime.sleep(0.01)\n')
+            sys.path.insert(0, tmpdir)
+            profiler = MgImportProfiler()
+            profiler.start()
+            try:
+                import mg_profiled_outer
+            finally:
+                profiler.stop()
+                sys.path.remove(tmpdir)
+                sys.modules.pop('mg_profiled_outer', None)
+                sys.modules.pop('mg_profiled_inner', None)
+
+        outer_self, outer_cumul = profiler.import_times['mg_profiled_outer']
+        inner_self, inner_cumul = profiler.import_times['mg_profiled_inner']
+        self.assertGreaterEqual(inner_self, 0.01)
+        self.assertGreaterEqual(outer_cumul, inner_cumul)
+        # the time of the nested import is not part of the self time of the outer module
+        self.assertLess(outer_self, inner_self)
+
+        out = io.StringIO()
+        profiler.report(out)
+        lines = out.getvalue().split('\n')
+        self.assertIn('mg_profiled_outer', lines[2])
+        self.assertIn('mg_profiled_inner', lines[3])
+
+    def test_stop_import_profile_without_stdout(self) -> None:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            profiler = MgImportProfiler()
+            # like the executable built without console
+            with mock.patch.object(mg_import_profile, 'import_profiler', profiler), \
+                    mock.patch.object(sys, 'stdout', None), mock.patch.object(tempfile, 'tempdir', tmpdir):
+                mg_import_profile.stop_import_profile()
+            report = (pathlib.Path(tmpdir) / IMPORT_PROFILE_FNAME).read_text(encoding='utf8')
+        self.assertTrue(report.startswith('Import profile:'))
+
     def test_normalize_path(self) -> None:
         assert normalize_path(r'toto\titi\tutu', 'win32') == r'toto\titi\tutu'
         assert normalize_path(r'toto/titi/tutu', 'win32') == r'toto\titi\tutu'